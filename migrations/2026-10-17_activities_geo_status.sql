@@ -0,0 +1,18 @@
+-- Migration: deferred geocoding for activities (ACTIVITY_GEOCODE_MODE=deferred)
+-- Pending activities have no coordinates yet; a background worker fills lat/lng
+-- from address and sets geo_status to 'ready' (or 'failed' with geo_error).
+-- While the geocoder is down an activity may get the town-level fallback
+-- (data/sk_obce.csv) as 'approximate'; the worker refines it once the geocoder answers.
+SET AUTOCOMMIT = 0;
+START TRANSACTION;
+/*!40101 SET NAMES utf8mb4 */;
+
+ALTER TABLE activities
+  MODIFY lat DECIMAL(9,6) NULL,
+  MODIFY lng DECIMAL(9,6) NULL,
+  ADD COLUMN address VARCHAR(500) CHARACTER SET utf8mb4 COLLATE utf8mb4_slovak_ci NULL AFTER lng,
+  ADD COLUMN geo_status ENUM('pending','ready','approximate','failed') NOT NULL DEFAULT 'ready' AFTER address,
+  ADD COLUMN geo_error VARCHAR(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_slovak_ci NULL AFTER geo_status,
+  ADD KEY idx_activities_geo_status (geo_status);
+
+COMMIT;
@@ -0,0 +1,11 @@
+-- Migration: geohash prefix index for viewport (bbox) and radius (near) queries
+-- Fill existing rows with:  flask --app app activities-geohash
+SET AUTOCOMMIT = 0;
+START TRANSACTION;
+/*!40101 SET NAMES utf8mb4 */;
+
+ALTER TABLE activities
+  ADD COLUMN geohash CHAR(9) CHARACTER SET ascii COLLATE ascii_bin NULL AFTER lng,
+  ADD KEY idx_activities_geohash (geohash);
+
+COMMIT;
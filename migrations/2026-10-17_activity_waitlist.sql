@@ -0,0 +1,27 @@
+-- Migration: FIFO waitlist for full activities
+-- Signups claim a seat with a conditional UPDATE on attendees_count; cancellations
+-- promote the head of this table in the same transaction.
+SET AUTOCOMMIT = 0;
+START TRANSACTION;
+/*!40101 SET NAMES utf8mb4 */;
+
+CREATE TABLE IF NOT EXISTS activity_waitlist (
+  id_waitlist INT(11) NOT NULL AUTO_INCREMENT,
+  activity_id INT(11) NOT NULL,
+  user_id INT(11) NOT NULL,
+  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (id_waitlist),
+  UNIQUE KEY uq_waitlist_activity_user (activity_id, user_id),
+  KEY idx_waitlist_queue (activity_id, id_waitlist),
+  KEY idx_waitlist_user (user_id),
+  CONSTRAINT fk_waitlist_activity FOREIGN KEY (activity_id) REFERENCES activities(id_activity)
+    ON DELETE CASCADE,
+  CONSTRAINT fk_waitlist_user FOREIGN KEY (user_id) REFERENCES users(id_user)
+    ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_slovak_ci;
+
+-- Resync counters that may have drifted under the old check-then-insert signup.
+UPDATE activities a
+SET a.attendees_count = (SELECT COUNT(*) FROM activity_signups s WHERE s.activity_id = a.id_activity);
+
+COMMIT;
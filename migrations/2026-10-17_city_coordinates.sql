@@ -0,0 +1,18 @@
+-- Migration: persistent city coordinates used by distance matching
+-- Seed from the bundled gazetteer:  flask --app app gazetteer-load
+-- Nominatim fallbacks are written here by the app (source = 'nominatim').
+SET AUTOCOMMIT = 0;
+START TRANSACTION;
+/*!40101 SET NAMES utf8mb4 */;
+
+CREATE TABLE IF NOT EXISTS city_coordinates (
+  name_key VARCHAR(191) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
+  name VARCHAR(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_slovak_ci NOT NULL,
+  lat DECIMAL(9,6) NOT NULL,
+  lng DECIMAL(9,6) NOT NULL,
+  source ENUM('gazetteer','nominatim','manual') NOT NULL DEFAULT 'gazetteer',
+  updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (name_key)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_slovak_ci;
+
+COMMIT;
@@ -0,0 +1,16 @@
+-- Migration: content-addressed embedding cache shared by all workers
+-- cache_key = sha256(model_name + "\n" + canonical hobby text)
+SET AUTOCOMMIT = 0;
+START TRANSACTION;
+/*!40101 SET NAMES utf8mb4 */;
+
+CREATE TABLE IF NOT EXISTS embedding_cache (
+  cache_key CHAR(64) CHARACTER SET ascii NOT NULL,
+  model_name VARCHAR(255) NOT NULL,
+  embedding MEDIUMBLOB NOT NULL,
+  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (cache_key),
+  KEY idx_embedding_cache_model (model_name)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_slovak_ci;
+
+COMMIT;
@@ -0,0 +1,19 @@
+-- Migration: geocoding results shared by all app workers
+-- key_hash = sha256 of the normalized address; lat/lng NULL caches "no result".
+-- Expired rows are ignored on read; purge them with:  flask --app app geocode-cache-purge
+SET AUTOCOMMIT = 0;
+START TRANSACTION;
+/*!40101 SET NAMES utf8mb4 */;
+
+CREATE TABLE IF NOT EXISTS geocode_cache (
+  key_hash CHAR(64) CHARACTER SET ascii COLLATE ascii_bin NOT NULL,
+  query VARCHAR(500) NOT NULL,
+  lat DECIMAL(9,6) NULL,
+  lng DECIMAL(9,6) NULL,
+  expires_at DATETIME NOT NULL,
+  updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (key_hash),
+  KEY idx_geocode_cache_expires (expires_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_slovak_ci;
+
+COMMIT;
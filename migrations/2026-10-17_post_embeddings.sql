@@ -0,0 +1,20 @@
+-- Migration: post embeddings for GET /api/posts?q=...&mode=semantic|hybrid
+-- Vectors of "passage: title. category. description" from the same model as user matching.
+-- pending = queued, no vector yet; stale = post edited, old vector still served; ready = up to date
+-- Fill with:  flask --app app posts-embed
+SET AUTOCOMMIT = 0;
+START TRANSACTION;
+/*!40101 SET NAMES utf8mb4 */;
+
+CREATE TABLE IF NOT EXISTS post_embeddings (
+  post_id INT(11) NOT NULL,
+  embedding MEDIUMBLOB NULL,
+  model_name VARCHAR(255) NOT NULL,
+  status ENUM('pending','ready','stale') NOT NULL DEFAULT 'pending',
+  updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (post_id),
+  KEY idx_post_embeddings_status (status),
+  CONSTRAINT fk_post_embeddings_post FOREIGN KEY (post_id) REFERENCES posts(id_post) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_slovak_ci;
+
+COMMIT;
@@ -0,0 +1,30 @@
+-- Migration: full-text search for GET /api/posts?q=
+-- post_search holds a diacritics-folded copy of each post's searchable text
+-- (title, description, category, author role and name) with ngram FULLTEXT indexes.
+-- Fill with:  flask --app app posts-search-rebuild
+-- Afterwards the app keeps it current on post create/update and author renames.
+SET AUTOCOMMIT = 0;
+START TRANSACTION;
+/*!40101 SET NAMES utf8mb4 */;
+
+CREATE TABLE IF NOT EXISTS post_search (
+  post_id INT(11) NOT NULL,
+  title_f VARCHAR(255) NOT NULL DEFAULT '',
+  description_f TEXT NOT NULL,
+  category_f VARCHAR(255) NOT NULL DEFAULT '',
+  role_f VARCHAR(255) NOT NULL DEFAULT '',
+  author_f VARCHAR(255) NOT NULL DEFAULT '',
+  updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (post_id),
+  KEY idx_post_search_title (title_f),
+  -- one index over all fields filters the matches, one per field weights them
+  FULLTEXT KEY ft_post_search_all (title_f, description_f, category_f, role_f, author_f) WITH PARSER ngram,
+  FULLTEXT KEY ft_post_search_title (title_f) WITH PARSER ngram,
+  FULLTEXT KEY ft_post_search_description (description_f) WITH PARSER ngram,
+  FULLTEXT KEY ft_post_search_category (category_f) WITH PARSER ngram,
+  FULLTEXT KEY ft_post_search_role (role_f) WITH PARSER ngram,
+  FULLTEXT KEY ft_post_search_author (author_f) WITH PARSER ngram,
+  CONSTRAINT fk_post_search_post FOREIGN KEY (post_id) REFERENCES posts(id_post) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_slovak_ci;
+
+COMMIT;
@@ -0,0 +1,135 @@
+-- Migration: per-table change versions for ETag / Last-Modified on read endpoints
+-- Triggers bump table_versions on every write, so a conditional GET only has to read
+-- a few primary-key rows to decide between 304 and a full response.
+-- Re-runnable (INSERT IGNORE, DROP TRIGGER IF EXISTS): apply it again when a table is added.
+-- Tables created by later migrations (user_rating_stats) add their own triggers there.
+SET AUTOCOMMIT = 0;
+START TRANSACTION;
+/*!40101 SET NAMES utf8mb4 */;
+
+CREATE TABLE IF NOT EXISTS table_versions (
+  table_name VARCHAR(64) NOT NULL,
+  version BIGINT UNSIGNED NOT NULL DEFAULT 1,
+  updated_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+  PRIMARY KEY (table_name)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_slovak_ci;
+
+INSERT IGNORE INTO table_versions (table_name) VALUES
+  ('articles'),
+  ('hobby'),
+  ('hobby_kategoria'),
+  ('posts'),
+  ('users'),
+  ('post_search'),
+  ('post_embeddings');
+
+-- articles
+DROP TRIGGER IF EXISTS trg_articles_version_ai;
+CREATE TRIGGER trg_articles_version_ai AFTER INSERT ON articles FOR EACH ROW
+  INSERT INTO table_versions (table_name) VALUES ('articles')
+  ON DUPLICATE KEY UPDATE version = version + 1, updated_at = CURRENT_TIMESTAMP(6);
+DROP TRIGGER IF EXISTS trg_articles_version_au;
+CREATE TRIGGER trg_articles_version_au AFTER UPDATE ON articles FOR EACH ROW
+  INSERT INTO table_versions (table_name) VALUES ('articles')
+  ON DUPLICATE KEY UPDATE version = version + 1, updated_at = CURRENT_TIMESTAMP(6);
+DROP TRIGGER IF EXISTS trg_articles_version_ad;
+CREATE TRIGGER trg_articles_version_ad AFTER DELETE ON articles FOR EACH ROW
+  INSERT INTO table_versions (table_name) VALUES ('articles')
+  ON DUPLICATE KEY UPDATE version = version + 1, updated_at = CURRENT_TIMESTAMP(6);
+
+-- hobby
+DROP TRIGGER IF EXISTS trg_hobby_version_ai;
+CREATE TRIGGER trg_hobby_version_ai AFTER INSERT ON hobby FOR EACH ROW
+  INSERT INTO table_versions (table_name) VALUES ('hobby')
+  ON DUPLICATE KEY UPDATE version = version + 1, updated_at = CURRENT_TIMESTAMP(6);
+DROP TRIGGER IF EXISTS trg_hobby_version_au;
+CREATE TRIGGER trg_hobby_version_au AFTER UPDATE ON hobby FOR EACH ROW
+  INSERT INTO table_versions (table_name) VALUES ('hobby')
+  ON DUPLICATE KEY UPDATE version = version + 1, updated_at = CURRENT_TIMESTAMP(6);
+DROP TRIGGER IF EXISTS trg_hobby_version_ad;
+CREATE TRIGGER trg_hobby_version_ad AFTER DELETE ON hobby FOR EACH ROW
+  INSERT INTO table_versions (table_name) VALUES ('hobby')
+  ON DUPLICATE KEY UPDATE version = version + 1, updated_at = CURRENT_TIMESTAMP(6);
+
+-- hobby_kategoria
+DROP TRIGGER IF EXISTS trg_hobby_kategoria_version_ai;
+CREATE TRIGGER trg_hobby_kategoria_version_ai AFTER INSERT ON hobby_kategoria FOR EACH ROW
+  INSERT INTO table_versions (table_name) VALUES ('hobby_kategoria')
+  ON DUPLICATE KEY UPDATE version = version + 1, updated_at = CURRENT_TIMESTAMP(6);
+DROP TRIGGER IF EXISTS trg_hobby_kategoria_version_au;
+CREATE TRIGGER trg_hobby_kategoria_version_au AFTER UPDATE ON hobby_kategoria FOR EACH ROW
+  INSERT INTO table_versions (table_name) VALUES ('hobby_kategoria')
+  ON DUPLICATE KEY UPDATE version = version + 1, updated_at = CURRENT_TIMESTAMP(6);
+DROP TRIGGER IF EXISTS trg_hobby_kategoria_version_ad;
+CREATE TRIGGER trg_hobby_kategoria_version_ad AFTER DELETE ON hobby_kategoria FOR EACH ROW
+  INSERT INTO table_versions (table_name) VALUES ('hobby_kategoria')
+  ON DUPLICATE KEY UPDATE version = version + 1, updated_at = CURRENT_TIMESTAMP(6);
+
+-- posts
+DROP TRIGGER IF EXISTS trg_posts_version_ai;
+CREATE TRIGGER trg_posts_version_ai AFTER INSERT ON posts FOR EACH ROW
+  INSERT INTO table_versions (table_name) VALUES ('posts')
+  ON DUPLICATE KEY UPDATE version = version + 1, updated_at = CURRENT_TIMESTAMP(6);
+DROP TRIGGER IF EXISTS trg_posts_version_au;
+CREATE TRIGGER trg_posts_version_au AFTER UPDATE ON posts FOR EACH ROW
+  INSERT INTO table_versions (table_name) VALUES ('posts')
+  ON DUPLICATE KEY UPDATE version = version + 1, updated_at = CURRENT_TIMESTAMP(6);
+DROP TRIGGER IF EXISTS trg_posts_version_ad;
+CREATE TRIGGER trg_posts_version_ad AFTER DELETE ON posts FOR EACH ROW
+  INSERT INTO table_versions (table_name) VALUES ('posts')
+  ON DUPLICATE KEY UPDATE version = version + 1, updated_at = CURRENT_TIMESTAMP(6);
+
+-- users
+DROP TRIGGER IF EXISTS trg_users_version_ai;
+CREATE TRIGGER trg_users_version_ai AFTER INSERT ON users FOR EACH ROW
+  INSERT INTO table_versions (table_name) VALUES ('users')
+  ON DUPLICATE KEY UPDATE version = version + 1, updated_at = CURRENT_TIMESTAMP(6);
+-- only the columns the cached endpoints return or filter on; background writes
+-- (lat/lng backfill, users-geocode) must not invalidate every ETag
+DROP TRIGGER IF EXISTS trg_users_version_au;
+DELIMITER $$
+CREATE TRIGGER trg_users_version_au AFTER UPDATE ON users FOR EACH ROW
+  IF NOT (OLD.id_user <=> NEW.id_user
+          AND OLD.meno <=> NEW.meno
+          AND OLD.priezvisko <=> NEW.priezvisko
+          AND OLD.mail <=> NEW.mail
+          AND OLD.rola <=> NEW.rola
+          AND OLD.soft_del <=> NEW.soft_del) THEN
+    INSERT INTO table_versions (table_name) VALUES ('users')
+    ON DUPLICATE KEY UPDATE version = version + 1, updated_at = CURRENT_TIMESTAMP(6);
+  END IF$$
+DELIMITER ;
+DROP TRIGGER IF EXISTS trg_users_version_ad;
+CREATE TRIGGER trg_users_version_ad AFTER DELETE ON users FOR EACH ROW
+  INSERT INTO table_versions (table_name) VALUES ('users')
+  ON DUPLICATE KEY UPDATE version = version + 1, updated_at = CURRENT_TIMESTAMP(6);
+
+-- post_search (ranked full-text search; rewritten after the posts commit)
+DROP TRIGGER IF EXISTS trg_post_search_version_ai;
+CREATE TRIGGER trg_post_search_version_ai AFTER INSERT ON post_search FOR EACH ROW
+  INSERT INTO table_versions (table_name) VALUES ('post_search')
+  ON DUPLICATE KEY UPDATE version = version + 1, updated_at = CURRENT_TIMESTAMP(6);
+DROP TRIGGER IF EXISTS trg_post_search_version_au;
+CREATE TRIGGER trg_post_search_version_au AFTER UPDATE ON post_search FOR EACH ROW
+  INSERT INTO table_versions (table_name) VALUES ('post_search')
+  ON DUPLICATE KEY UPDATE version = version + 1, updated_at = CURRENT_TIMESTAMP(6);
+DROP TRIGGER IF EXISTS trg_post_search_version_ad;
+CREATE TRIGGER trg_post_search_version_ad AFTER DELETE ON post_search FOR EACH ROW
+  INSERT INTO table_versions (table_name) VALUES ('post_search')
+  ON DUPLICATE KEY UPDATE version = version + 1, updated_at = CURRENT_TIMESTAMP(6);
+
+-- post_embeddings
+DROP TRIGGER IF EXISTS trg_post_embeddings_version_ai;
+CREATE TRIGGER trg_post_embeddings_version_ai AFTER INSERT ON post_embeddings FOR EACH ROW
+  INSERT INTO table_versions (table_name) VALUES ('post_embeddings')
+  ON DUPLICATE KEY UPDATE version = version + 1, updated_at = CURRENT_TIMESTAMP(6);
+DROP TRIGGER IF EXISTS trg_post_embeddings_version_au;
+CREATE TRIGGER trg_post_embeddings_version_au AFTER UPDATE ON post_embeddings FOR EACH ROW
+  INSERT INTO table_versions (table_name) VALUES ('post_embeddings')
+  ON DUPLICATE KEY UPDATE version = version + 1, updated_at = CURRENT_TIMESTAMP(6);
+DROP TRIGGER IF EXISTS trg_post_embeddings_version_ad;
+CREATE TRIGGER trg_post_embeddings_version_ad AFTER DELETE ON post_embeddings FOR EACH ROW
+  INSERT INTO table_versions (table_name) VALUES ('post_embeddings')
+  ON DUPLICATE KEY UPDATE version = version + 1, updated_at = CURRENT_TIMESTAMP(6);
+
+COMMIT;
@@ -0,0 +1,11 @@
+-- Migration: store user_embeddings.embedding as binary (versioned float32/float16 blob)
+-- Existing JSON text is kept byte-for-byte; the app reads both formats.
+-- Afterwards convert old rows in batches:  flask --app app embeddings-convert --batch-size 500
+SET AUTOCOMMIT = 0;
+START TRANSACTION;
+/*!40101 SET NAMES utf8mb4 */;
+
+ALTER TABLE user_embeddings
+  MODIFY embedding MEDIUMBLOB NOT NULL;
+
+COMMIT;
@@ -0,0 +1,12 @@
+-- Migration: embedding job status on user_embeddings
+-- pending = queued, no vector yet; stale = hobbies changed, old vector still served; ready = up to date
+SET AUTOCOMMIT = 0;
+START TRANSACTION;
+/*!40101 SET NAMES utf8mb4 */;
+
+ALTER TABLE user_embeddings
+  MODIFY embedding MEDIUMBLOB NULL,
+  ADD COLUMN status ENUM('pending','ready','stale') NOT NULL DEFAULT 'ready' AFTER model_name,
+  ADD KEY idx_user_embeddings_status (status);
+
+COMMIT;
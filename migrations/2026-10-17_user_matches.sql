@@ -0,0 +1,22 @@
+-- Migration: precomputed same-city matches served by POST /api/match/batch
+-- Fill with:  flask --app app matches-build
+-- Afterwards the app keeps the table current as embeddings, cities and users change.
+SET AUTOCOMMIT = 0;
+START TRANSACTION;
+/*!40101 SET NAMES utf8mb4 */;
+
+CREATE TABLE IF NOT EXISTS user_matches (
+  user_id INT(11) NOT NULL,
+  match_user_id INT(11) NOT NULL,
+  match_role VARCHAR(50) NULL,
+  rank_pos SMALLINT UNSIGNED NOT NULL,
+  similarity FLOAT NOT NULL,
+  updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (user_id, match_user_id),
+  KEY idx_user_matches_role (user_id, match_role, similarity),
+  KEY idx_user_matches_member (match_user_id),
+  CONSTRAINT fk_user_matches_user FOREIGN KEY (user_id) REFERENCES users(id_user) ON DELETE CASCADE,
+  CONSTRAINT fk_user_matches_match FOREIGN KEY (match_user_id) REFERENCES users(id_user) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_slovak_ci;
+
+COMMIT;
@@ -0,0 +1,53 @@
+-- Migration: per-user rating aggregates joined by primary key from list queries
+-- upsert_user_rating keeps rows current in the same transaction as the rating.
+-- Repair drift with:  flask --app app rating-stats-rebuild
+SET AUTOCOMMIT = 0;
+START TRANSACTION;
+/*!40101 SET NAMES utf8mb4 */;
+
+CREATE TABLE IF NOT EXISTS user_rating_stats (
+  user_id INT(11) NOT NULL,
+  rating_sum INT(11) NOT NULL DEFAULT 0,
+  rating_count INT(11) NOT NULL DEFAULT 0,
+  avg_rating DECIMAL(7,4) AS (IF(rating_count > 0, rating_sum / rating_count, NULL)) STORED,
+  count_1 INT(11) NOT NULL DEFAULT 0,
+  count_2 INT(11) NOT NULL DEFAULT 0,
+  count_3 INT(11) NOT NULL DEFAULT 0,
+  count_4 INT(11) NOT NULL DEFAULT 0,
+  count_5 INT(11) NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (user_id),
+  KEY idx_user_rating_stats_avg (avg_rating, rating_count),
+  CONSTRAINT fk_user_rating_stats_user FOREIGN KEY (user_id) REFERENCES users(id_user) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_slovak_ci;
+
+INSERT INTO user_rating_stats (user_id, rating_sum, rating_count, count_1, count_2, count_3, count_4, count_5)
+SELECT user_id, SUM(rating), COUNT(*),
+       SUM(rating = 1), SUM(rating = 2), SUM(rating = 3), SUM(rating = 4), SUM(rating = 5)
+FROM user_ratings
+GROUP BY user_id
+ON DUPLICATE KEY UPDATE
+  rating_sum = VALUES(rating_sum),
+  rating_count = VALUES(rating_count),
+  count_1 = VALUES(count_1),
+  count_2 = VALUES(count_2),
+  count_3 = VALUES(count_3),
+  count_4 = VALUES(count_4),
+  count_5 = VALUES(count_5);
+
+-- change versions for ETag / Last-Modified (table_versions comes from its own migration)
+INSERT IGNORE INTO table_versions (table_name) VALUES ('user_rating_stats');
+DROP TRIGGER IF EXISTS trg_user_rating_stats_version_ai;
+CREATE TRIGGER trg_user_rating_stats_version_ai AFTER INSERT ON user_rating_stats FOR EACH ROW
+  INSERT INTO table_versions (table_name) VALUES ('user_rating_stats')
+  ON DUPLICATE KEY UPDATE version = version + 1, updated_at = CURRENT_TIMESTAMP(6);
+DROP TRIGGER IF EXISTS trg_user_rating_stats_version_au;
+CREATE TRIGGER trg_user_rating_stats_version_au AFTER UPDATE ON user_rating_stats FOR EACH ROW
+  INSERT INTO table_versions (table_name) VALUES ('user_rating_stats')
+  ON DUPLICATE KEY UPDATE version = version + 1, updated_at = CURRENT_TIMESTAMP(6);
+DROP TRIGGER IF EXISTS trg_user_rating_stats_version_ad;
+CREATE TRIGGER trg_user_rating_stats_version_ad AFTER DELETE ON user_rating_stats FOR EACH ROW
+  INSERT INTO table_versions (table_name) VALUES ('user_rating_stats')
+  ON DUPLICATE KEY UPDATE version = version + 1, updated_at = CURRENT_TIMESTAMP(6);
+
+COMMIT;
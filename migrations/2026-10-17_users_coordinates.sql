@@ -0,0 +1,14 @@
+-- Migration: user coordinates for distance matching
+-- lat/lng are resolved from users.mesto; backfill existing rows with:
+--   flask --app app users-geocode
+-- idx_users_lat_lng serves the bounding-box prefilter in find_best_matches_for_user.
+SET AUTOCOMMIT = 0;
+START TRANSACTION;
+/*!40101 SET NAMES utf8mb4 */;
+
+ALTER TABLE users
+  ADD COLUMN lat DECIMAL(9,6) NULL AFTER mesto,
+  ADD COLUMN lng DECIMAL(9,6) NULL AFTER lat,
+  ADD KEY idx_users_lat_lng (lat, lng);
+
+COMMIT;
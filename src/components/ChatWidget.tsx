@@ -3,6 +3,7 @@ import type { FormEvent } from "react";
 import { useChat } from "./ChatContext";
 import { MessageCircle, X } from "lucide-react";
 import ChatJitsiCall from "./ChatJitsiCall";
+import { fetchMatches, isAbortError } from "../lib/matches";
 
 type MatchUser = {
   id_user: number;
@@ -67,6 +68,7 @@ export default function ChatWidget() {
   const [matchUsers, setMatchUsers] = useState<MatchUser[]>([]);
   const [selectedMemberIds, setSelectedMemberIds] = useState<number[]>([]);
   const [matchLoading, setMatchLoading] = useState(false);
+  const [matchPending, setMatchPending] = useState(false);
   const [matchError, setMatchError] = useState<string | null>(null);
   const [membersOpen, setMembersOpen] = useState(false);
   const [membersLoading, setMembersLoading] = useState(false);
@@ -90,37 +92,35 @@ export default function ChatWidget() {
       return;
     }
 
-    let cancelled = false;
+    const controller = new AbortController();
 
     const run = async () => {
       setMatchLoading(true);
+      setMatchPending(false);
       setMatchError(null);
       try {
-        const res = await fetch(`${API_BASE_URL}/api/match/${uid}?top_n=50&distance_km=100`);
+        const data = await fetchMatches<MatchUser>(
+          `${API_BASE_URL}/api/match/${uid}?top_n=50&distance_km=100`,
+          { signal: controller.signal, onPending: () => setMatchPending(true) }
+        );
         console.log("[CHAT][GROUP] candidates loaded", {
           top_n: 50,
           distance_km: 100,
         });
-        if (!res.ok) {
-          const text = await res.text();
-          throw new Error(text || "Nepodarilo sa načítať match zoznam.");
-        }
-        const data: MatchUser[] = await res.json();
-        if (!cancelled) setMatchUsers(data);
+        setMatchUsers(data);
       } catch (e: any) {
-        if (!cancelled) {
-          setMatchUsers([]);
-          setMatchError(e?.message || "Nepodarilo sa načítať match zoznam.");
-        }
-      } finally {
-        if (!cancelled) setMatchLoading(false);
+        if (isAbortError(e)) return;
+        setMatchUsers([]);
+        setMatchError(e?.message || "Nepodarilo sa načítať match zoznam.");
       }
+      setMatchPending(false);
+      setMatchLoading(false);
     };
 
     run();
 
     return () => {
-      cancelled = true;
+      controller.abort();
     };
   }, [mode, currentUserId]);
 
@@ -347,7 +347,9 @@ export default function ChatWidget() {
             <div className="flex-1 min-h-0 border border-gray-200 dark:border-gray-700 rounded-xl overflow-hidden">
               <div className="h-full overflow-y-auto">
                 {matchLoading && (
-                  <div className="p-3 text-sm text-gray-500">Načítavam odporúčania…</div>
+                  <div className="p-3 text-sm text-gray-500">
+                    {matchPending ? "Odporúčania sa počítajú…" : "Načítavam odporúčania…"}
+                  </div>
                 )}
 
                 {!matchLoading && matchError && (
@@ -1,5 +1,5 @@
 import { useEffect, useState } from "react";
-import { MapContainer, TileLayer, Marker, Popup } from "react-leaflet";
+import { MapContainer, TileLayer, Marker, Popup, useMapEvents } from "react-leaflet";
 import { useNavigate } from "react-router-dom";
 import L from "leaflet";
 import "leaflet/dist/leaflet.css";
@@ -22,6 +22,34 @@ interface Pin {
 
 interface MapProps {
   pins: Pin[];
+  // volá sa s "minLat,minLng,maxLat,maxLng" po každom posune / zoome mapy
+  onBoundsChange?: (bbox: string) => void;
+}
+
+const clamp = (v: number, min: number, max: number) => Math.min(max, Math.max(min, v));
+
+function BoundsWatcher({ onChange }: { onChange: (bbox: string) => void }) {
+  const report = () => {
+    const b = map.getBounds();
+    onChange(
+      [
+        clamp(b.getSouth(), -90, 90),
+        clamp(b.getWest(), -180, 180),
+        clamp(b.getNorth(), -90, 90),
+        clamp(b.getEast(), -180, 180),
+      ]
+        .map((v) => v.toFixed(5))
+        .join(",")
+    );
+  };
+  const map = useMapEvents({ moveend: report });
+
+  useEffect(() => {
+    report();
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, []);
+
+  return null;
 }
 
 const iconSize: [number, number] = [32, 48];
@@ -36,7 +64,7 @@ const icons: Record<string, L.Icon> = {
   "default": L.icon({ iconUrl: bluePin, iconSize }),
 };
 
-export default function Map({ pins }: MapProps) {
+export default function Map({ pins, onBoundsChange }: MapProps) {
   const [isDark, setIsDark] = useState(false);
   const navigate = useNavigate();
 
@@ -72,6 +100,7 @@ export default function Map({ pins }: MapProps) {
           url={mapStyle}
           attribution="&copy; OpenStreetMap & Carto contributors"
         />
+        {onBoundsChange && <BoundsWatcher onChange={onBoundsChange} />}
         {pins.map((pin) => (
           <Marker
             key={pin.id}
@@ -0,0 +1,70 @@
+// Načítanie odporúčaní z /api/match/<id>.
+// 202 = vektor používateľa sa ešte počíta na pozadí, 503 + "warming_up" = model
+// sa načítava. Ani jedno nie je chyba: počkáme podľa Retry-After a skúsime znova.
+
+const DEFAULT_RETRY_MS = 3000;
+const MAX_RETRY_MS = 30000;
+const MAX_ATTEMPTS = 30;
+
+function retryAfterMs(header: string | null): number {
+  const seconds = Number(header);
+  if (!header || !Number.isFinite(seconds) || seconds <= 0) return DEFAULT_RETRY_MS;
+  return Math.min(seconds * 1000, MAX_RETRY_MS);
+}
+
+function wait(ms: number, signal?: AbortSignal): Promise<void> {
+  return new Promise((resolve, reject) => {
+    if (signal?.aborted) {
+      reject(new DOMException("Aborted", "AbortError"));
+      return;
+    }
+    const timer = window.setTimeout(resolve, ms);
+    signal?.addEventListener(
+      "abort",
+      () => {
+        window.clearTimeout(timer);
+        reject(new DOMException("Aborted", "AbortError"));
+      },
+      { once: true }
+    );
+  });
+}
+
+async function isPending(res: Response): Promise<boolean> {
+  if (res.status === 202) return true;
+  if (res.status !== 503) return false;
+  const body = await res.clone().json().catch(() => null);
+  return body?.status === "warming_up";
+}
+
+/**
+ * Zoznam odporúčaní; kým sa počítajú, volá onPending a opakuje požiadavku.
+ * Pri zrušení cez signal vyhodí AbortError (volajúci ho má ignorovať).
+ */
+export async function fetchMatches<T>(
+  url: string,
+  options: { signal?: AbortSignal; onPending?: () => void } = {}
+): Promise<T[]> {
+  const { signal, onPending } = options;
+  for (let attempt = 1; ; attempt++) {
+    const res = await fetch(url, { signal });
+    if (await isPending(res)) {
+      if (attempt >= MAX_ATTEMPTS) {
+        throw new Error("Odporúčania sa stále pripravujú, skúste to neskôr.");
+      }
+      onPending?.();
+      await wait(retryAfterMs(res.headers.get("Retry-After")), signal);
+      continue;
+    }
+    if (!res.ok) {
+      const text = await res.text();
+      throw new Error(text || "Nepodarilo sa načítať odporúčania.");
+    }
+    const data = await res.json();
+    return Array.isArray(data) ? data : [];
+  }
+}
+
+export function isAbortError(e: unknown): boolean {
+  return e instanceof DOMException && e.name === "AbortError";
+}
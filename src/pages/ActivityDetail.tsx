@@ -12,6 +12,7 @@ interface Activity {
   attendees_count: number;
   lat: number;
   lng: number;
+  geo_status?: "pending" | "ready" | "approximate" | "failed";
   user_id: number;
 }
 
@@ -102,13 +103,18 @@ export default function ActivityDetail() {
     if (!Number.isFinite(activityId)) return;
     setSignupsLoading(true);
     try {
-      const res = await fetch(`/api/activities/${activityId}/signups`);
-      if (res.ok) {
-        const rows = await res.json();
-        setSignups(Array.isArray(rows) ? rows : []);
-      } else {
-        setSignups([]);
-      }
+      const rows: any[] = [];
+      let cursor: string | null = null;
+      do {
+        const qs = new URLSearchParams({ page_size: "500" });
+        if (cursor) qs.set("cursor", cursor);
+        const res = await fetch(`/api/activities/${activityId}/signups?${qs.toString()}`);
+        if (!res.ok) throw new Error();
+        const data = await res.json();
+        rows.push(...(Array.isArray(data?.items) ? data.items : []));
+        cursor = data?.pagination?.next_cursor ?? null;
+      } while (cursor);
+      setSignups(rows);
     } catch {
       setSignups([]);
     } finally {
@@ -180,18 +186,18 @@ export default function ActivityDetail() {
       navigate("/login");
       return;
     }
-    if (isFull) {
-      alert("Kapacita je naplnena.");
-      return;
-    }
     try {
       const res = await fetch(`/api/activities/${activityId}/signup`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ user_id: currentUserId }),
+        // plna kapacita -> zaradenie na cakaciu listinu
+        body: JSON.stringify({ user_id: currentUserId, waitlist: isFull }),
       });
       const data = await res.json().catch(() => null);
       if (!res.ok) throw new Error(data?.error || "Prihlasenie zlyhalo.");
+      if (data?.status === "waitlisted") {
+        alert(`Ste na cakacej listine (poradie ${data.position}).`);
+      }
       if (activity && typeof data?.attendees_count === "number") {
         setActivity({ ...activity, attendees_count: data.attendees_count });
       }
@@ -383,17 +389,32 @@ export default function ActivityDetail() {
 
         {/* Mini-mapa pre tuto aktivitu */}
         <div className="rounded-xl overflow-hidden border border-gray-300 dark:border-gray-700 shadow">
-          <Map
-            pins={[
-              {
-                id: activity.id_activity,
-                name: activity.title,
-                lat: activity.lat,
-                lng: activity.lng,
-                description: activity.description || "",
-              },
-            ]}
-          />
+          {["ready", "approximate"].includes(activity.geo_status ?? "ready") ? (
+            <>
+              <Map
+                pins={[
+                  {
+                    id: activity.id_activity,
+                    name: activity.title,
+                    lat: activity.lat,
+                    lng: activity.lng,
+                    description: activity.description || "",
+                  },
+                ]}
+              />
+              {activity.geo_status === "approximate" && (
+                <p className="p-2 text-xs text-gray-500">
+                  Poloha je zatiaľ približná (stred obce), spresní sa automaticky.
+                </p>
+              )}
+            </>
+          ) : (
+            <p className="p-4 text-sm text-gray-500">
+              {activity.geo_status === "pending"
+                ? "Poloha aktivity sa ešte spracováva."
+                : "Polohu aktivity sa nepodarilo určiť."}
+            </p>
+          )}
         </div>
 
         {/* Prihlasenie / odhlasenie */}
@@ -409,12 +430,11 @@ export default function ActivityDetail() {
             ) : (
               <button
                 onClick={handleSignup}
-                disabled={isFull}
                 className={`px-4 py-2 rounded-lg text-white transition ${
-                  isFull ? "bg-gray-400 cursor-not-allowed" : "bg-blue-600 hover:bg-blue-700"
+                  isFull ? "bg-gray-500 hover:bg-gray-600" : "bg-blue-600 hover:bg-blue-700"
                 }`}
               >
-                {isFull ? "Kapacita plna" : "Prihlasit sa"}
+                {isFull ? "Kapacita plna - cakacia listina" : "Prihlasit sa"}
               </button>
             )}
             <span className="text-sm text-gray-600">
@@ -426,6 +446,14 @@ export default function ActivityDetail() {
             <div className="flex items-center justify-between mb-3">
               <p className="text-sm font-semibold text-gray-800 dark:text-gray-100">Prihlaseni uzivatelia</p>
               {signupsLoading && <span className="text-xs text-gray-500">Nacitavam...</span>}
+              {canEdit && signups.length > 0 && (
+                <a
+                  href={`/api/activities/${activityId}/signups/export?format=csv`}
+                  className="text-xs text-blue-600 hover:underline"
+                >
+                  Export CSV
+                </a>
+              )}
             </div>
             {signups.length === 0 ? (
               <p className="text-sm text-gray-500">Zatial nikto.</p>
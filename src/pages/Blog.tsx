@@ -12,6 +12,7 @@ export type Activity = {
   attendees_count: number;
   lat: number;
   lng: number;
+  geo_status?: "pending" | "ready" | "approximate" | "failed";
 };
 
 export default function Blog() {
@@ -46,12 +47,14 @@ export default function Blog() {
 
   const pins = useMemo(
     () =>
-      activities.map((a) => ({
-        id: a.id_activity,
-        name: a.title,
-        lat: a.lat,
-        lng: a.lng,
-      })),
+      activities
+        .filter((a) => ["ready", "approximate"].includes(a.geo_status ?? "ready"))
+        .map((a) => ({
+          id: a.id_activity,
+          name: a.title,
+          lat: a.lat,
+          lng: a.lng,
+        })),
     [activities]
   );
 
@@ -2,6 +2,7 @@ import React, { useEffect, useState, useRef } from "react";
 import MainLayout from "../layouts/MainLayout";
 import Map from "../components/Map";
 import { Link } from "react-router-dom";
+import { fetchMatches, isAbortError } from "../lib/matches";
 
 // ---- TYPES ----
 interface Activity {
@@ -13,6 +14,7 @@ interface Activity {
   attendees_count: number;
   lat: number;
   lng: number;
+  geo_status?: "pending" | "ready" | "approximate" | "failed";
   category?: string; // FIX – optional category
 }
 
@@ -47,6 +49,8 @@ interface ArticleType {
 export default function Home() {
 
   const [activities, setActivities] = useState<Activity[]>([]);
+  const [mapActivities, setMapActivities] = useState<Activity[]>([]);
+  const [mapBbox, setMapBbox] = useState<string | null>(null);
   const [error, setError] = useState<string | null>(null);
   const [topUsers, setTopUsers] = useState<TopUser[]>([]);
   const [topError, setTopError] = useState<string | null>(null);
@@ -54,6 +58,7 @@ export default function Home() {
   const [matchedUsers, setMatchedUsers] = useState<MatchedUser[]>([]);
   const [matchError, setMatchError] = useState<string | null>(null);
   const [matchLoading, setMatchLoading] = useState(false);
+  const [matchPending, setMatchPending] = useState(false);
   const [distanceKm, setDistanceKm] = useState<string>("");
   const [articles, setArticles] = useState<ArticleType[]>([]);
   const [articlesError, setArticlesError] = useState<string | null>(null);
@@ -115,39 +120,33 @@ export default function Home() {
 
   useEffect(() => {
     if (!currentUserId) return;
-    let cancelled = false;
+    const controller = new AbortController();
 
     (async () => {
       try {
         setMatchLoading(true);
+        setMatchPending(false);
         setMatchError(null);
         const params = new URLSearchParams({ top_n: "3" });
         if (distanceKm) {
           params.set("distance_km", distanceKm);
         }
-        const res = await fetch(`/api/match/${currentUserId}?${params.toString()}`);
-        if (!res.ok) {
-          const text = await res.text();
-          throw new Error(text || "Nepodarilo sa nacitat odporucania.");
-        }
-        const data: MatchedUser[] = await res.json();
-        if (!cancelled) {
-          setMatchedUsers(Array.isArray(data) ? data.slice(0, 3) : []);
-        }
+        const data = await fetchMatches<MatchedUser>(
+          `/api/match/${currentUserId}?${params.toString()}`,
+          { signal: controller.signal, onPending: () => setMatchPending(true) }
+        );
+        setMatchedUsers(data.slice(0, 3));
       } catch (e: any) {
-        if (!cancelled) {
-          setMatchError(e.message || "Nepodarilo sa nacitat odporucanych.");
-          setMatchedUsers([]);
-        }
-      } finally {
-        if (!cancelled) {
-          setMatchLoading(false);
-        }
+        if (isAbortError(e)) return;
+        setMatchError(e.message || "Nepodarilo sa nacitat odporucanych.");
+        setMatchedUsers([]);
       }
+      setMatchPending(false);
+      setMatchLoading(false);
     })();
 
     return () => {
-      cancelled = true;
+      controller.abort();
     };
   }, [currentUserId, distanceKm]);  
 
@@ -167,6 +166,30 @@ export default function Home() {
   }, []);
 
   // ---- SCROLL FUNCTION ----
+  // ---- LOAD MAP PINS (len aktuálny výrez mapy) ----
+
+  useEffect(() => {
+    if (!mapBbox) return;
+    const controller = new AbortController();
+    (async () => {
+      try {
+        const res = await fetch(
+          `/api/activities?bbox=${encodeURIComponent(mapBbox)}&page_size=500`,
+          { signal: controller.signal }
+        );
+        if (!res.ok) return;
+        const data = await res.json();
+        const items = Array.isArray(data) ? data : data.items ?? [];
+        setMapActivities(
+          items.map((a: any) => ({ ...a, lat: Number(a.lat), lng: Number(a.lng) }))
+        );
+      } catch (e: any) {
+        if (e?.name !== "AbortError") console.error(e);
+      }
+    })();
+    return () => controller.abort();
+  }, [mapBbox]);
+
   const scrollBy = (dir: 1 | -1) => {
     const el = scrollerRef.current;
     if (!el) return;
@@ -175,14 +198,17 @@ export default function Home() {
   };
 
   // ---- DYNAMIC MAP PINS ----
-  const dynamicPins = activities.map((a) => ({
-    id: a.id_activity,
-    name: a.title,
-    lat: a.lat,
-    lng: a.lng,
-    description: a.description || "",
-    category: a.category ?? "default",
-  }));
+  // activities still waiting for geocoding have no coordinates yet
+  const dynamicPins = mapActivities
+    .filter((a) => ["ready", "approximate"].includes(a.geo_status ?? "ready"))
+    .map((a) => ({
+      id: a.id_activity,
+      name: a.title,
+      lat: a.lat,
+      lng: a.lng,
+      description: a.description || "",
+      category: a.category ?? "default",
+    }));
 
 
   return (
@@ -309,7 +335,9 @@ export default function Home() {
             </p>
           ) : matchLoading ? (
             <p className="mt-4 text-sm text-gray-600 dark:text-gray-300">
-              Hladame ti najlepsie zhody...
+              {matchPending
+                ? "Tvoje odporucania sa este pocitaju..."
+                : "Hladame ti najlepsie zhody..."}
             </p>
           ) : matchError ? (
             <p className="mt-4 text-sm text-red-500">{matchError}</p>
@@ -410,7 +438,7 @@ export default function Home() {
 
 
         {/* === MAP === */}
-        <Map pins={dynamicPins} />
+        <Map pins={dynamicPins} onBoundsChange={setMapBbox} />
 
         {/* === TOP USERS === */}
         <section className="bg-white dark:bg-gray-900 rounded-2xl shadow-md p-6">
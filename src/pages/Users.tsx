@@ -2,6 +2,7 @@ import React, { useEffect, useMemo, useRef, useState } from "react";
 import MainLayout from "../layouts/MainLayout";
 import { useLocation, useNavigate } from "react-router-dom";
 import { useChat } from "../components/ChatContext";
+import { fetchMatches, isAbortError } from "../lib/matches";
 
 interface User {
   id_user: number;
@@ -61,6 +62,7 @@ export default function Users() {
   const [users, setUsers] = useState<User[]>([]);
   const [loading, setLoading] = useState(true);
   const [searching, setSearching] = useState(false);
+  const [matchPending, setMatchPending] = useState(false);
   const [error, setError] = useState<string | null>(null);
 
   const [q, setQ] = useState("");
@@ -133,6 +135,7 @@ export default function Users() {
   // základné načítanie zoznamu / match zoznamu
   useEffect(() => {
     let cancelled = false;
+    const controller = new AbortController();
 
     const fetchUsers = async () => {
       const isInitial = !initialFetchRef.current;
@@ -142,15 +145,20 @@ export default function Users() {
         setSearching(true);
       }
 
+      setMatchPending(false);
       try {
-        let endpoint: string;
+        let items: User[];
 
         if (isMatchMode && matchUserId) {
           const params = new URLSearchParams({
             top_n: "50",
           });
           if (distanceKm) params.set("distance_km", distanceKm);
-          endpoint = `/api/match/${matchUserId}?${params.toString()}`;
+          // 202 / 503 warming_up: odporúčania sa počítajú, fetchMatches to skúša znova
+          items = await fetchMatches<User>(`/api/match/${matchUserId}?${params.toString()}`, {
+            signal: controller.signal,
+            onPending: () => setMatchPending(true),
+          });
         } else {
           const params = new URLSearchParams({
             page: "1",
@@ -158,27 +166,28 @@ export default function Users() {
             sort: sortOption,
           });
           if (roleFilter !== "all") params.set("role", roleFilter);
-          endpoint = `/api/users?${params.toString()}`;
+          const res = await fetch(`/api/users?${params.toString()}`);
+          if (!res.ok) {
+            const text = await res.text();
+            throw new Error(text || "Chyba načítania používateľov.");
+          }
+          const data: UsersApiResp = await res.json();
+          items = (Array.isArray(data) ? data : data.items) ?? [];
         }
 
-        const res = await fetch(endpoint);
-        if (!res.ok) {
-          const text = await res.text();
-          throw new Error(text || "Chyba načítania používateľov.");
-        }
-        const data: UsersApiResp = await res.json();
-        const items = (Array.isArray(data) ? data : data.items) ?? [];
         if (!cancelled) {
           setUsers(items);
           setError(null);
         }
       } catch (e: any) {
+        if (isAbortError(e)) return;
         if (!cancelled) {
           setError(e.message || "Chyba načítania používateľov.");
           setUsers([]);
         }
       } finally {
         if (!cancelled) {
+          setMatchPending(false);
           if (!initialFetchRef.current) {
             initialFetchRef.current = true;
             setLoading(false);
@@ -193,6 +202,7 @@ export default function Users() {
 
     return () => {
       cancelled = true;
+      controller.abort();
     };
   }, [isMatchMode, matchUserId, roleFilter, sortOption, distanceKm]);
 
@@ -496,6 +506,12 @@ export default function Users() {
   const listContent = () => {
     if (error)
       return <p className="text-center text-red-500">{error}</p>;
+    if (matchPending)
+      return (
+        <p className="text-center text-gray-500">
+          Odporúčania sa počítajú…
+        </p>
+      );
     if (loading)
       return (
         <p className="text-center text-gray-500">
@@ -1,83 +1,100 @@
-﻿# server/app.py
-from flask import Flask, request, jsonify, send_from_directory, g
-from flask_cors import CORS
-from flask_bcrypt import Bcrypt
-import mysql.connector.pooling
-import os
-import re
-import base64
-from datetime import datetime
-from werkzeug.utils import secure_filename
-from contextlib import contextmanager
-import logging
-import json
-from math import radians, sin, cos, sqrt, atan2
-import numpy as np
-import uuid
-from sentence_transformers import SentenceTransformer
-EMBEDDING_MODEL_NAME = "intfloat/multilingual-e5-base"
-model = SentenceTransformer(EMBEDDING_MODEL_NAME)
-
-app = Flask(__name__)
-CORS(app, resources={r"/api/*": {"origins": "*"}})
-bcrypt = Bcrypt(app)
-
-# 🔧 DB konfigurácia
-DB_HOST = os.getenv("DB_HOST", "80.211.195.85")
-DB_USER = os.getenv("DB_USER", "admin")
-DB_PASS = os.getenv("DB_PASS", "bezpecneHeslo123!")
-DB_NAME = os.getenv("DB_NAME", "dbdata")
-DB_PORT = int(os.getenv("DB_PORT", "3306"))
-
-# 🧩 Connection pool
-pool = mysql.connector.pooling.MySQLConnectionPool(
-    pool_name="lifebridge_pool",
-    pool_size=int(os.getenv("DB_POOL_SIZE", "20")),
-    host=DB_HOST,
-    user=DB_USER,
-    password=DB_PASS,
-    database=DB_NAME,
-    port=DB_PORT,
-    autocommit=True,
-    charset="utf8mb4"
-)
-
-logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"))
-
-# Bezpečný getter s ukladaním do g + lazy
+﻿# server/app.py
+from flask import Flask, Response, request, jsonify, send_from_directory, g
+from flask_cors import CORS
+from flask_bcrypt import Bcrypt
+import mysql.connector.pooling
+import click
+import os
+import re
+import base64
+from datetime import datetime, timezone
+from decimal import Decimal
+from werkzeug.utils import secure_filename
+from contextlib import contextmanager
+from functools import wraps
+import logging
+import json
+import threading
+import time
+import hashlib
+import csv
+import abc
+import io
+import unicodedata
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict, deque
+from math import radians, degrees, sin, cos, sqrt, atan2, ceil, isfinite
+import numpy as np
+import uuid
+EMBEDDING_MODEL_NAME = "intfloat/multilingual-e5-base"
+# eager = load at import (before a pre-fork server forks), lazy = on first use, disabled = never
+EMBEDDING_MODEL_MODE = os.getenv("EMBEDDING_MODEL_MODE", "lazy").strip().lower()
+
+app = Flask(__name__)
+CORS(
+    app,
+    resources={r"/api/*": {"origins": "*"}},
+    expose_headers=["X-Match-Version", "X-Match-Cache", "X-Embedding-Status", "X-Search-Mode", "Retry-After"],
+)
+bcrypt = Bcrypt(app)
+
+# 🔧 DB konfigurácia
+DB_HOST = os.getenv("DB_HOST", "80.211.195.85")
+DB_USER = os.getenv("DB_USER", "admin")
+DB_PASS = os.getenv("DB_PASS", "bezpecneHeslo123!")
+DB_NAME = os.getenv("DB_NAME", "dbdata")
+DB_PORT = int(os.getenv("DB_PORT", "3306"))
+
+# 🧩 Connection pool
+pool = mysql.connector.pooling.MySQLConnectionPool(
+    pool_name="lifebridge_pool",
+    pool_size=int(os.getenv("DB_POOL_SIZE", "20")),
+    host=DB_HOST,
+    user=DB_USER,
+    password=DB_PASS,
+    database=DB_NAME,
+    port=DB_PORT,
+    autocommit=True,
+    charset="utf8mb4"
+)
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"))
+
+# Bezpečný getter s ukladaním do g + lazy
 def get_conn():
-    conn = getattr(g, "_db_conn", None)
-    try:
-        if conn and conn.is_connected():
-            return conn
-    except Exception:
-        # stale/closed connection left in g; drop it and reopen
-        conn = None
-        try:
-            setattr(g, "_db_conn", None)
-        except Exception:
-            pass
-
-    conn = pool.get_connection()
-    try:
-        setattr(g, "_db_conn", conn)
-    except Exception:
-        pass
+    conn = getattr(g, "_db_conn", None)
+    try:
+        if conn and conn.is_connected():
+            return conn
+    except Exception:
+        # stale/closed connection left in g; drop it and reopen
+        conn = None
+        try:
+            setattr(g, "_db_conn", None)
+        except Exception:
+            pass
+
+    conn = pool.get_connection()
+    try:
+        setattr(g, "_db_conn", conn)
+    except Exception:
+        pass
     logging.debug("DB conn acquired")
     return conn
 
 @contextmanager
 def db_conn():
-    # umožní použitie with db_conn() as conn:
-    conn = pool.get_connection()
-    logging.debug("DB conn acquired (ctx)")
-    try:
-        yield conn
-    finally:
-        try:
-            conn.close()
-            logging.debug("DB conn closed (ctx)")
-        except Exception:
+    # umožní použitie with db_conn() as conn:
+    conn = pool.get_connection()
+    logging.debug("DB conn acquired (ctx)")
+    try:
+        yield conn
+    finally:
+        try:
+            conn.close()
+            logging.debug("DB conn closed (ctx)")
+        except Exception:
             pass
 
 def _normalize_role(role) -> str | None:
@@ -98,3315 +115,7736 @@ def _is_admin_user(conn, user_id: int) -> bool:
         return _is_admin_role(row[0])
     finally:
         cur.close()
-
-def build_user_hobby_text(conn, user_id: int) -> str:
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            "SELECT id_user FROM users WHERE id_user = %s AND soft_del = 0",
-            (user_id,),
-        )
-        if not cur.fetchone():
-            raise ValueError("User not found")
-
-        cur.execute(
-            """
-            SELECT h.nazov
-            FROM user_hobby uh
-            JOIN hobby h ON h.id_hobby = uh.id_hobby
-            WHERE uh.id_user = %s
-            """,
-            (user_id,),
-        )
-        hobbies = [row[0] for row in cur.fetchall()]
-    finally:
-        cur.close()
-
-    if not hobbies:
-        return ""
-
-    return "Záľuby: " + ", ".join(hobbies) + "."
-
-
-def generate_and_save_user_embedding(user_id: int):
-    with db_conn() as conn:
-        text = build_user_hobby_text(conn, user_id)
-        if not text.strip():
-            return
-
-        emb = model.encode(text)
-        emb_list = emb.tolist()
-        cur = conn.cursor()
-        try:
-            cur.execute(
-                """
-                INSERT INTO user_embeddings (user_id, embedding, model_name)
-                VALUES (%s, %s, %s)
-                ON DUPLICATE KEY UPDATE
-                  embedding = VALUES(embedding),
-                  model_name = VALUES(model_name),
-                  updated_at = CURRENT_TIMESTAMP
-                """,
-                (user_id, json.dumps(emb_list), EMBEDDING_MODEL_NAME),
-            )
-            conn.commit()
-        finally:
-            cur.close()
-
-
-def get_user_embedding_vector(conn, user_id: int):
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            "SELECT embedding FROM user_embeddings WHERE user_id = %s",
-            (user_id,),
-        )
-        row = cur.fetchone()
-    finally:
-        cur.close()
-
-    if not row:
-        return None
-
-    return np.array(json.loads(row[0]), dtype=float)
-
-
-def cosine_similarity(a: np.ndarray, b: np.ndarray) -> float:
-    denom = np.linalg.norm(a) * np.linalg.norm(b)
-    if denom == 0.0:
-        return 0.0
-    return float(np.dot(a, b) / denom)
-
-# Simple in-memory cache so we do not geocode the same city repeatedly.
-CITY_COORD_CACHE: dict[str, tuple[float, float]] = {}
-
-
-def get_city_coordinates(city_name: str) -> tuple[float, float] | None:
-    """
-    Reuses the existing geocode_address helper to fetch coordinates for a city.
-    The cache keeps repeated calls cheap within the same process.
-    """
-    if not city_name:
-        return None
-    key = city_name.strip().lower()
-    if not key:
-        return None
-    if key in CITY_COORD_CACHE:
-        return CITY_COORD_CACHE[key]
-
-    try:
-        lat, lng = geocode_address(city_name)
-    except Exception as exc:
-        logging.warning("Failed to geocode city '%s': %s", city_name, exc)
-        return None
-
-    CITY_COORD_CACHE[key] = (lat, lng)
-    return lat, lng
-
-
-def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """Compute distance between two lat/lon pairs in kilometers."""
-    R = 6371.0
-    d_lat = radians(lat2 - lat1)
-    d_lon = radians(lon2 - lon1)
-    a = (
-        sin(d_lat / 2) ** 2
-        + cos(radians(lat1)) * cos(radians(lat2)) * sin(d_lon / 2) ** 2
-    )
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
-    return R * c
-
-
-def find_best_matches_for_user(
-    user_id: int,
-    top_n: int = 5,
-    target_role: str | None = None,
-    distance_km: float | None = None,
-):
-    with db_conn() as conn:
-        emb = get_user_embedding_vector(conn, user_id)
-        if emb is None:
-            text = build_user_hobby_text(conn, user_id)
-            if not text.strip():
-                return []
-
-            emb = model.encode(text)
-            emb_list = emb.tolist()
-            cur = conn.cursor()
-            try:
-                cur.execute(
-                    """
-                    INSERT INTO user_embeddings (user_id, embedding, model_name)
-                    VALUES (%s, %s, %s)
-                    ON DUPLICATE KEY UPDATE
-                      embedding = VALUES(embedding),
-                      model_name = VALUES(model_name),
-                      updated_at = CURRENT_TIMESTAMP
-                    """,
-                    (user_id, json.dumps(emb_list), EMBEDDING_MODEL_NAME),
-                )
-                conn.commit()
-            finally:
-                cur.close()
-
-        # Ensure we only consider users from the same city as the current user.
-        cur = conn.cursor()
-        try:
-            cur.execute(
-                "SELECT mesto FROM users WHERE id_user = %s AND soft_del = 0",
-                (user_id,),
-            )
-            city_row = cur.fetchone()
-        finally:
-            cur.close()
-
-        if not city_row:
-            return []
-
-        current_city = city_row[0]
-        if not current_city:
-            # No city info -> do not recommend cross-city users.
-            return []
-
-        current_coords = None
-        if distance_km is not None:
-            current_coords = get_city_coordinates(current_city)
-            if not current_coords:
-                # Without coordinates we cannot apply distance filter.
-                return []
-
-        params = [user_id]
-        where = ["u.id_user != %s", "u.soft_del = 0"]
-        if distance_km is None:
-            where.append("u.mesto = %s")
-            params.append(current_city)
-        else:
-            where.append("u.mesto IS NOT NULL AND u.mesto <> ''")
-        if target_role:
-            where.append("u.rola = %s")
-            params.append(target_role)
-
-        cur = conn.cursor(dictionary=True)
-        try:
-            cur.execute(
-                f"""
-                SELECT u.id_user, u.meno, u.priezvisko, u.mail, u.rola, u.mesto, e.embedding
-                FROM users u
-                JOIN user_embeddings e ON e.user_id = u.id_user
-                WHERE {" AND ".join(where)}
-                """,
-                tuple(params),
-            )
-            rows = cur.fetchall()
-        finally:
-            cur.close()
-
-        results = []
-        for row in rows:
-            # Apply distance filter before hobby similarity if requested.
-            if distance_km is not None:
-                other_city = (row.get("mesto") or "").strip()
-                if not other_city:
-                    continue
-                other_coords = get_city_coordinates(other_city)
-                if not other_coords or not current_coords:
-                    continue
-                dist_val = haversine_km(
-                    current_coords[0],
-                    current_coords[1],
-                    other_coords[0],
-                    other_coords[1],
-                )
-                if dist_val > distance_km:
-                    continue
-
-            other_emb = np.array(json.loads(row["embedding"]), dtype=float)
-            sim = cosine_similarity(emb, other_emb)
-            item = {
-                "id_user": row["id_user"],
-                "meno": row["meno"],
-                "priezvisko": row["priezvisko"],
-                "mail": row["mail"],
-                "rola": row["rola"],
-                "similarity": sim,
-                "similarity_percent": round(sim * 100, 1),
-            }
-            if distance_km is not None:
-                item["distance_km"] = round(dist_val, 1)
-            results.append(item)
-
-        # Rank same-city candidates by hobby/interest similarity (cosine distance).
-        results.sort(key=lambda x: x["similarity"], reverse=True)
-        return results[:top_n]
-
-
-# Media storage for avatars (assets/img + DB metadata)
-BASE_DIR = os.path.dirname(__file__)
-ASSETS_IMG_DIR = os.getenv("ASSETS_IMG_DIR")
-if ASSETS_IMG_DIR:
-    ASSETS_IMG_DIR = os.path.abspath(ASSETS_IMG_DIR)
-else:
-    default_assets = os.path.abspath(os.path.join(BASE_DIR, "..", "assets", "img"))
-    if not os.path.exists(default_assets):
-        alt_assets = os.path.abspath(os.path.join(BASE_DIR, "..", "..", "assets", "img"))
-        if os.path.exists(alt_assets):
-            default_assets = alt_assets
-    ASSETS_IMG_DIR = default_assets
-AVATARS_DIR = os.path.join(ASSETS_IMG_DIR, "avatars")
-POST_IMAGES_DIR = os.path.join(ASSETS_IMG_DIR, "posts")
-ACTIVITY_IMAGES_DIR = os.path.join(ASSETS_IMG_DIR, "activities")
-ARTICLE_IMAGES_DIR = os.path.join(ASSETS_IMG_DIR, "articles")
-LEGACY_AVATARS_DIR = os.path.join(BASE_DIR, "uploads", "avatars")
-os.makedirs(AVATARS_DIR, exist_ok=True)
-os.makedirs(POST_IMAGES_DIR, exist_ok=True)
-os.makedirs(ACTIVITY_IMAGES_DIR, exist_ok=True)
-os.makedirs(ARTICLE_IMAGES_DIR, exist_ok=True)
-ALLOWED_IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
-
-def _avatar_disk_path(file_uid: str, ext: str) -> str:
-    return os.path.join(AVATARS_DIR, f"{file_uid}{ext}")
-
-def _post_image_disk_path(file_uid: str, ext: str) -> str:
-    return os.path.join(POST_IMAGES_DIR, f"{file_uid}{ext}")
-
-def _activity_image_disk_path(file_uid: str, ext: str) -> str:
-    return os.path.join(ACTIVITY_IMAGES_DIR, f"{file_uid}{ext}")
-
-def _article_image_disk_path(file_uid: str, ext: str) -> str:
-    return os.path.join(ARTICLE_IMAGES_DIR, f"{file_uid}{ext}")
-
-def _legacy_avatar_path_for(user_id: int, ext: str):
-    return os.path.join(LEGACY_AVATARS_DIR, f"user_{user_id}{ext}")
-
-def _find_legacy_avatar(user_id: int):
-    for ext in ALLOWED_IMAGE_EXTS:
-        path = _legacy_avatar_path_for(user_id, ext)
-        if os.path.exists(path):
-            return path, ext
-    return None, None
-
-def _delete_avatar_records(conn, user_id: int):
-    """
-    Remove DB rows + files for a user's avatar. Keeps only media_files entries in sync.
-    """
-    cur = conn.cursor(dictionary=True)
-    try:
-        cur.execute(
-            """
-            SELECT file_uid, file_ext
-            FROM media_files
-            WHERE owner_type = 'user' AND owner_id = %s AND purpose = 'avatar'
-            """,
-            (user_id,),
-        )
-        rows = cur.fetchall()
-        for row in rows:
-            try:
-                os.remove(_avatar_disk_path(row["file_uid"], row["file_ext"]))
-            except FileNotFoundError:
-                pass
-            except Exception as exc:
-                logging.warning("Avatar file cleanup failed: %s", exc)
-        cur.execute(
-            """
-            DELETE FROM media_files
-            WHERE owner_type = 'user' AND owner_id = %s AND purpose = 'avatar'
-            """,
-            (user_id,),
-        )
-    finally:
-        cur.close()
-
-def _find_avatar_meta(conn, user_id: int):
-    """
-    Load avatar metadata (DB) or fall back to legacy file if DB is empty.
-    """
-    cur = conn.cursor(dictionary=True)
-    try:
-        cur.execute(
-            """
-            SELECT file_uid, file_ext, storage_path
-            FROM media_files
-            WHERE owner_type = 'user' AND owner_id = %s AND purpose = 'avatar'
-            ORDER BY created_at DESC
-            LIMIT 1
-            """,
-            (user_id,),
-        )
-        row = cur.fetchone()
-    finally:
-        cur.close()
-
-    if row:
-        return row
-
-    # Legacy fallback: look for old files under uploads/avatars
-    path, ext = _find_legacy_avatar(user_id)
-    if path and ext:
-        legacy_rel = f"/uploads/avatars/user_{user_id}{ext}"
-        return {"file_uid": f"legacy-{user_id}", "file_ext": ext, "storage_path": legacy_rel}
-
-    return None
-
-def _delete_post_images(conn, post_id: int):
-    """
-    Remove DB rows + files for a post's images (current implementation keeps one).
-    """
-    cur = conn.cursor(dictionary=True)
-    try:
-        cur.execute(
-            """
-            SELECT file_uid, file_ext
-            FROM media_files
-            WHERE owner_type = 'post' AND owner_id = %s AND purpose = 'post_image'
-            """,
-            (post_id,),
-        )
-        rows = cur.fetchall()
-        for row in rows:
-            try:
-                os.remove(_post_image_disk_path(row["file_uid"], row["file_ext"]))
-            except FileNotFoundError:
-                pass
-            except Exception as exc:
-                logging.warning("Post image cleanup failed: %s", exc)
-        cur.execute(
-            """
-            DELETE FROM media_files
-            WHERE owner_type = 'post' AND owner_id = %s AND purpose = 'post_image'
-            """,
-            (post_id,),
-        )
-    finally:
-        cur.close()
-
-
-def _delete_post_image_by_uid(conn, post_id: int, file_uid: str):
-    """
-    Remove a single image by uid for given post.
-    """
-    cur = conn.cursor(dictionary=True)
-    try:
-        cur.execute(
-            """
-            SELECT file_uid, file_ext, storage_path
-            FROM media_files
-            WHERE owner_type = 'post' AND owner_id = %s AND purpose = 'post_image' AND file_uid = %s
-            """,
-            (post_id, file_uid),
-        )
-        row = cur.fetchone()
-        if not row:
-            return False
-        try:
-            os.remove(_post_image_disk_path(row["file_uid"], row["file_ext"]))
-        except FileNotFoundError:
-            pass
-        except Exception as exc:
-            logging.warning("Post image cleanup failed: %s", exc)
-        cur.execute(
-            """
-            DELETE FROM media_files
-            WHERE owner_type = 'post' AND owner_id = %s AND purpose = 'post_image' AND file_uid = %s
-            """,
-            (post_id, file_uid),
-        )
-        return True
-    finally:
-        cur.close()
-
-
-def _next_post_image_sort(conn, post_id: int) -> int:
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            """
-            SELECT COALESCE(MAX(sort_order) + 1, 0) AS nxt
-            FROM media_files
-            WHERE owner_type = 'post' AND owner_id = %s AND purpose = 'post_image'
-            """,
-            (post_id,),
-        )
-        row = cur.fetchone()
-        nxt = int(row[0]) if row and row[0] is not None else 0
-        return max(1, nxt)  # rezervujeme 0 pre hlavný obrázok
-    finally:
-        cur.close()
-
-
-def _insert_post_image_record(
-    conn,
-    post_id: int,
-    *,
-    file_uid: str,
-    filename: str,
-    ext: str,
-    mime_type: str | None,
-    size_bytes: int,
-    storage_path: str,
-    is_main: bool = False,
-):
-    """
-    Insert media_files row and update posts.image depending on main flag.
-    Keeps current main (sort_order 0) intact unless is_main=True is passed.
-    """
-    storage_url = _make_abs(storage_path)
-    cur = conn.cursor(dictionary=True)
-    try:
-        cur.execute(
-            """
-            SELECT file_uid
-            FROM media_files
-            WHERE owner_type = 'post' AND owner_id = %s AND purpose = 'post_image' AND sort_order = 0
-            LIMIT 1
-            """,
-            (post_id,),
-        )
-        existing_main = cur.fetchone()
-        has_main = bool(existing_main)
-        make_main = is_main or not has_main
-
-        if make_main and has_main:
-            cur.execute(
-                """
-                UPDATE media_files
-                SET sort_order = %s
-                WHERE owner_type = 'post' AND owner_id = %s AND purpose = 'post_image' AND file_uid = %s
-                """,
-                (_next_post_image_sort(conn, post_id), post_id, existing_main["file_uid"]),
-            )
-            sort_order = 0
-        elif make_main:
-            sort_order = 0
-        else:
-            sort_order = _next_post_image_sort(conn, post_id)
-
-        cur.execute(
-            """
-            INSERT INTO media_files
-              (owner_type, owner_id, purpose, sort_order, file_uid, file_name, file_ext, mime_type, size_bytes, storage_path)
-            VALUES
-              ('post', %s, 'post_image', %s, %s, %s, %s, %s, %s, %s)
-            """,
-            (
-                post_id,
-                sort_order,
-                file_uid,
-                filename,
-                ext,
-                mime_type,
-                size_bytes,
-                storage_path,
-            ),
-        )
-
-        if make_main:
-            cur.execute("UPDATE posts SET image = %s WHERE id_post = %s", (storage_url, post_id))
-        else:
-            cur.execute("UPDATE posts SET image = COALESCE(image, %s) WHERE id_post = %s", (storage_url, post_id))
-
-        conn.commit()
-        return storage_url, sort_order
-    finally:
-        cur.close()
-
-
-def _resequence_post_images(conn, post_id: int):
-    """
-    Normalize sort_order: main stays at 0 (if present), others start at 1. Does not auto-promote other images.
-    """
-    cur = conn.cursor(dictionary=True)
-    try:
-        cur.execute(
-            """
-            SELECT file_uid, storage_path, sort_order
-            FROM media_files
-            WHERE owner_type = 'post' AND owner_id = %s AND purpose = 'post_image'
-            ORDER BY sort_order ASC, created_at ASC
-            """,
-            (post_id,),
-        )
-        rows = cur.fetchall()
-        main_url = None
-        has_main = False
-        next_idx = 1
-        for row in rows:
-            if row.get("sort_order") == 0 and not has_main:
-                target = 0
-                has_main = True
-                if row.get("storage_path"):
-                    main_url = _make_abs(row["storage_path"])
-            else:
-                target = next_idx
-                next_idx += 1
-
-            if row.get("sort_order") != target:
-                cur.execute(
-                    """
-                    UPDATE media_files
-                    SET sort_order = %s
-                    WHERE owner_type = 'post' AND owner_id = %s AND purpose = 'post_image' AND file_uid = %s
-                    """,
-                    (target, post_id, row["file_uid"]),
-                )
-
-        cur.execute("UPDATE posts SET image = %s WHERE id_post = %s", (main_url, post_id))
-        conn.commit()
-        return main_url
-    finally:
-        cur.close()
-
-
-def _normalize_storage_path(path: str) -> str:
-    """
-    Normalize stored paths so frontend gets a clean /assets/... URL.
-    Accepts legacy "../assets/..." or "assets/..." and returns "/assets/...".
-    """
-    if not path:
-        return path
-    norm = str(path).strip().replace("\\", "/")
-    while norm.startswith("./"):
-        norm = norm[2:]
-    while norm.startswith("../"):
-        norm = norm[3:]
-    if not norm.startswith("/"):
-        norm = "/" + norm
-    return norm
-
-def _make_abs(url: str) -> str:
-    """
-    Prefix relative /path with current host so frontend that uses post.image directly bude mat pln? URL.
-    """
-    if not url:
-        return url
-    if url.startswith("http://") or url.startswith("https://"):
-        return url
-    norm = _normalize_storage_path(url)
-    base = (request.host_url or "").rstrip("/")
-    return f"{base}{norm}"
-
-
-def _delete_activity_image(conn, activity_id: int):
-    """
-    Remove DB rows and files for single activity image.
-    """
-    cur = conn.cursor(dictionary=True)
-    try:
-        cur.execute(
-            """
-            SELECT file_uid, file_ext
-            FROM media_files
-            WHERE owner_type = 'activity' AND owner_id = %s AND purpose = 'activity_image'
-            """,
-            (activity_id,),
-        )
-        rows = cur.fetchall()
-        for row in rows:
-            try:
-                os.remove(_activity_image_disk_path(row["file_uid"], row["file_ext"]))
-            except FileNotFoundError:
-                pass
-            except Exception as exc:
-                logging.warning("Activity image cleanup failed: %s", exc)
-
-        cur.execute(
-            """
-            DELETE FROM media_files
-            WHERE owner_type = 'activity' AND owner_id = %s AND purpose = 'activity_image'
-            """,
-            (activity_id,),
-        )
-        cur.execute("UPDATE activities SET image_url = NULL WHERE id_activity = %s", (activity_id,))
-        conn.commit()
-    finally:
-        cur.close()
-
-
-def _delete_article_image(conn, article_id: int):
-    cur = conn.cursor(dictionary=True)
-    try:
-        cur.execute(
-            """
-            SELECT file_uid, file_ext
-            FROM media_files
-            WHERE owner_type = 'article' AND owner_id = %s AND purpose IN ('attachment','article_image')
-            """,
-            (article_id,),
-        )
-        rows = cur.fetchall()
-        for row in rows:
-            try:
-                os.remove(_article_image_disk_path(row["file_uid"], row["file_ext"]))
-            except FileNotFoundError:
-                pass
-            except Exception as exc:
-                logging.warning("Article image cleanup failed: %s", exc)
-        cur.execute(
-            """
-            DELETE FROM media_files
-            WHERE owner_type = 'article' AND owner_id = %s AND purpose IN ('attachment','article_image')
-            """,
-            (article_id,),
-        )
-    finally:
-        cur.close()
-
-
-def _save_activity_image_from_data_url(conn, activity_id: int, data_url: str):
-    """
-    Decode data:image payload, persist to disk + media_files, update activities.image_url.
-    """
-    if not data_url or not isinstance(data_url, str) or not data_url.startswith("data:image"):
-        return None
-
-    match = re.match(r"data:image/(png|jpeg|jpg|gif|webp);base64,(.+)", data_url, re.IGNORECASE | re.DOTALL)
-    if not match:
-        return None
-
-    ext_raw, b64data = match.groups()
-    ext = "." + ext_raw.lower().replace("jpeg", "jpg")
-    if ext not in ALLOWED_IMAGE_EXTS:
-        return None
-
-    try:
-        blob = base64.b64decode(b64data)
-    except Exception as exc:
-        logging.warning("Activity image base64 decode failed: %s", exc)
-        return None
-
-    file_uid = str(uuid.uuid4())
-    path = _activity_image_disk_path(file_uid, ext)
-    try:
-        with open(path, "wb") as f:
-            f.write(blob)
-    except Exception as exc:
-        logging.warning("Activity image save failed: %s", exc)
-        return None
-
-    size_bytes = os.path.getsize(path)
-    storage_path = f"/assets/img/activities/{file_uid}{ext}"
-    storage_url = _make_abs(storage_path)
-
-    # keep single image: drop previous rows/files first
-    _delete_activity_image(conn, activity_id)
-
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            """
-            INSERT INTO media_files
-              (owner_type, owner_id, purpose, sort_order, file_uid, file_name, file_ext, mime_type, size_bytes, storage_path)
-            VALUES
-              ('activity', %s, 'activity_image', 0, %s, %s, %s, %s, %s, %s)
-            """,
-            (
-                activity_id,
-                file_uid,
-                f"activity_{activity_id}{ext}",
-                ext,
-                f"image/{ext.strip('.')}",
-                size_bytes,
-                storage_path,
-            ),
-        )
-        cur.execute("UPDATE activities SET image_url = %s WHERE id_activity = %s", (storage_url, activity_id))
-        conn.commit()
-        return storage_url
-    except Exception as exc:
-        try:
-            os.remove(path)
-        except Exception:
-            pass
-        logging.warning("Activity image DB save failed: %s", exc)
-        return None
-    finally:
-        cur.close()
-
-
-def _save_post_image_from_data_url(conn, post_id: int, data_url: str):
-    """
-    Decode a data:image/...;base64 payload, save to disk, insert into media_files and posts.image.
-    Returns storage_path or None.
-    """
-    if not data_url or not data_url.startswith("data:image"):
-        return None
-
-    match = re.match(r"data:image/(png|jpeg|jpg|gif|webp);base64,(.+)", data_url, re.IGNORECASE | re.DOTALL)
-    if not match:
-        return None
-
-    ext_raw, b64data = match.groups()
-    ext = "." + ext_raw.lower().replace("jpeg", "jpg")
-    if ext not in ALLOWED_IMAGE_EXTS:
-        return None
-
-    try:
-        blob = base64.b64decode(b64data)
-    except Exception as exc:
-        logging.warning("Post image base64 decode failed: %s", exc)
-        return None
-
-    file_uid = str(uuid.uuid4())
-    path = _post_image_disk_path(file_uid, ext)
-    try:
-        with open(path, "wb") as f:
-            f.write(blob)
-    except Exception as exc:
-        logging.warning("Post image save failed: %s", exc)
-        return None
-
-    size_bytes = os.path.getsize(path)
-    storage_path = f"/assets/img/posts/{file_uid}{ext}"
-    try:
-        storage_url, _ = _insert_post_image_record(
-            conn,
-            post_id,
-            file_uid=file_uid,
-            filename=f"post_{post_id}{ext}",
-            ext=ext,
-            mime_type=f"image/{ext.strip('.')}",
-            size_bytes=size_bytes,
-            storage_path=storage_path,
-            is_main=True,
-        )
-        return storage_url
-    except Exception as exc:
-        try:
-            os.remove(path)
-        except Exception:
-            pass
-        logging.warning("Post image save failed: %s", exc)
-        return None
-
-
-def _save_article_image_from_data_url(conn, article_id: int, data_url: str):
-    """
-    Decode data:image payload for article, save to disk + media_files, update articles.image_url.
-    """
-    if not data_url or not isinstance(data_url, str) or not data_url.startswith("data:image"):
-        return None
-
-    match = re.match(r"data:image/(png|jpeg|jpg|gif|webp);base64,(.+)", data_url, re.IGNORECASE | re.DOTALL)
-    if not match:
-        return None
-
-    ext_raw, b64data = match.groups()
-    ext = "." + ext_raw.lower().replace("jpeg", "jpg")
-    if ext not in ALLOWED_IMAGE_EXTS:
-        return None
-
-    try:
-        blob = base64.b64decode(b64data)
-    except Exception as exc:
-        logging.warning("Article image base64 decode failed: %s", exc)
-        return None
-
-    file_uid = str(uuid.uuid4())
-    path = _article_image_disk_path(file_uid, ext)
-    try:
-        with open(path, "wb") as f:
-            f.write(blob)
-    except Exception as exc:
-        logging.warning("Article image save failed: %s", exc)
-        return None
-
-    size_bytes = os.path.getsize(path)
-    storage_path = f"/assets/img/articles/{file_uid}{ext}"
-    storage_url = _make_abs(storage_path)
-
-    _delete_article_image(conn, article_id)
-
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            """
-            INSERT INTO media_files
-              (owner_type, owner_id, purpose, sort_order, file_uid, file_name, file_ext, mime_type, size_bytes, storage_path)
-            VALUES
-              ('article', %s, 'attachment', 0, %s, %s, %s, %s, %s, %s)
-            """,
-            (
-                article_id,
-                file_uid,
-                f"article_{article_id}{ext}",
-                ext,
-                f"image/{ext.strip('.')}",
-                size_bytes,
-                storage_path,
-            ),
-        )
-        cur.execute("UPDATE articles SET image_url = %s WHERE id_article = %s", (storage_url, article_id))
-        conn.commit()
-        return storage_url
-    except Exception as exc:
-        try:
-            os.remove(path)
-        except Exception:
-            pass
-        logging.warning("Article image DB save failed: %s", exc)
-        return None
-    finally:
-        cur.close()
-
-# 🔒 Validácia hesla
-def validate_password(password):
-    """
-    Kontroluje bezpečnosť hesla:
-    - Min 8 znakov
-    - Aspoň 1 veľké písmeno
-    - Aspoň 1 malé písmeno
-    - Aspoť 1 číslo
-    - Aspoň 1 špeciálny znak
-    """
-    if len(password) < 8:
-        return False, "Heslo musí mať aspoň 8 znakov."
-    
-    if not re.search(r"[A-Z]", password):
-        return False, "Heslo musí obsahovať aspoň jedno veľké písmeno."
-    
-    if not re.search(r"[a-z]", password):
-        return False, "Heslo musí obsahovať aspoň jedno malé písmeno."
-    
-    if not re.search(r"\d", password):
-        return False, "Heslo musí obsahovať aspoň jedno číslo."
-    
-    if not re.search(r"[!@#$%^&*(),.?\":{}|<>]", password):
-        return False, "Heslo musí obsahovať aspoň jeden špeciálny znak (!@#$%^&* atď.)."
-    
-    return True, ""
-
-# ==========================================
-# 🎨 ZÍSKANIE VŠETKÝCH HOBBY
-# ==========================================
-
-@app.get("/api/hobby-categories")
-def get_hobby_categories():
-    conn = get_conn()
-    try:
-        cur = conn.cursor(dictionary=True)
-        cur.execute("""
-            SELECT 
-                hk.id_kategoria,
-                hk.nazov,
-                hk.ikona,
-                COUNT(h.id_hobby) as pocet_hobby
-            FROM hobby_kategoria hk
-            LEFT JOIN hobby h ON h.id_kategoria = hk.id_kategoria
-            GROUP BY hk.id_kategoria
-            ORDER BY hk.id_kategoria ASC
-        """)
-        categories = cur.fetchall()
-        return jsonify(categories), 200
-    except Exception as e:
-        return jsonify({"error": f"Chyba pri načítaní kategórií: {str(e)}"}), 500
-    finally:
-        cur.close()
-        conn.close()
-
-
-@app.get("/api/hobbies")
-def get_hobbies():
-    conn = get_conn()
-    try:
-        cur = conn.cursor(dictionary=True)
-        cur.execute("""
-            SELECT 
-                h.id_hobby,
-                h.nazov,
-                h.id_kategoria,
-                hk.nazov as kategoria_nazov,
-                hk.ikona as kategoria_ikona
-            FROM hobby h
-            LEFT JOIN hobby_kategoria hk ON h.id_kategoria = hk.id_kategoria
-            ORDER BY hk.id_kategoria ASC, h.nazov ASC
-        """)
-        hobbies = cur.fetchall()
-        return jsonify(hobbies), 200
-    except Exception as e:
-        return jsonify({"error": f"Chyba pri načítaní hobby: {str(e)}"}), 500
-    finally:
-        cur.close()
-        conn.close()
-
-# ==========================================
-# 👤 REGISTRÁCIA
-# ==========================================
-@app.post("/api/register")
-def register_user():
-    data = request.get_json(force=True)
-    name = data.get("name")
-    surname = data.get("surname")
-    email = data.get("email")
-    password = data.get("password")
-    password_confirm = data.get("password_confirm")
-    birthdate = data.get("birthdate")
-    hobbies = data.get("hobbies", [])  # Array ID hobby
-    role = data.get("role") or data.get("rola")
-    allowed_roles = {"user_senior", "user_dobrovolnik", "user_firma"}
-
-    # ✅ Kontrola povinných polí
-    if not all([name, surname, email, password, password_confirm, birthdate]):
-        return jsonify({"error": "Všetky polia sú povinné."}), 400
-
-    # ✅ Kontrola zhody hesiel
-    if role not in allowed_roles:
-        return jsonify({"error": "Neplatna rola."}), 400
-
-    if password != password_confirm:
-        return jsonify({"error": "Heslá sa nezhodujú."}), 400
-
-    # ✅ Validácia bezpečnosti hesla
-    is_valid, error_msg = validate_password(password)
-    if not is_valid:
-        return jsonify({"error": error_msg}), 400
-
-    # ✅ Hash hesla
-    hashed_pw = bcrypt.generate_password_hash(password, 12).decode("utf-8")
-
-    # ✅ Formát dátumu
-    try:
-        birthdate_obj = datetime.strptime(birthdate, "%Y-%m-%d")
-        birthdate_formatted = birthdate_obj.strftime("%Y-%m-%d")
-    except Exception:
-        return jsonify({"error": "Neplatný formát dátumu (použi YYYY-MM-DD)"}), 400
-
-    conn = get_conn()
-    try:
-        cur = conn.cursor(dictionary=True)
-        
-        # ✅ Kontrola, či email už existuje
-        cur.execute("SELECT id_user FROM users WHERE mail = %s", (email,))
-        if cur.fetchone():
-            return jsonify({"error": "Tento email je už zaregistrovaný."}), 409
-        
-        # ✅ Vloženie nového používateľa
-        cur.execute(
-            """
-            INSERT INTO users (meno, priezvisko, mail, heslo, datum_narodenia, rola)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            """,
-            (name, surname, email, hashed_pw, birthdate_formatted, role)
-        )
-        conn.commit()
-        
-        # ✅ Získanie ID novo vytvoreného používateľa
-        user_id = cur.lastrowid
-        
-        # ✅ Vloženie hobby do user_hobby tabuľky
-        if hobbies and len(hobbies) > 0:
-            for hobby_id in hobbies:
-                cur.execute(
-                    "INSERT INTO user_hobby (id_user, id_hobby) VALUES (%s, %s)",
-                    (user_id, hobby_id)
-                )
-            conn.commit()
-        try:
-            generate_and_save_user_embedding(user_id)
-        except Exception as emb_err:
-            logging.warning(
-                "Failed to generate user embedding for %s: %s",
-                user_id,
-                emb_err,
-            )
-        return jsonify({
-            "success": True, 
-            "user": f"{name} {surname}",
-            "hobbies_count": len(hobbies)
-        }), 201
-        
-    except Exception as e:
-        conn.rollback()
-        return jsonify({"error": f"Chyba databázy: {str(e)}"}), 500
-    finally:
-        cur.close()
-        conn.close()
-
-# ==========================================
-# 🔐 PRIHLÁSENIE
-# ==========================================
-@app.post("/api/login")
-def login_user():
-    data = request.get_json(force=True)
-    email = data.get("email")
-    password = data.get("password")
-
-    conn = get_conn()
-    try:
-        cur = conn.cursor(dictionary=True)
-        cur.execute("SELECT * FROM users WHERE mail = %s", (email,))
-        user = cur.fetchone()
-        if user:
-            user["rola"] = _normalize_role(user.get("rola")) or "user"
-
-        if not user:
-            return jsonify({"error": "Používateľ neexistuje."}), 404
-
-        if not bcrypt.check_password_hash(user["heslo"], password):
-            return jsonify({"error": "Nesprávne heslo."}), 401
-
-        return jsonify({
-            "success": True,
-            "user": {
-                "id": user["id_user"],
-                "name": user["meno"],
-                "surname": user["priezvisko"],
-                "email": user["mail"],
-                "birthdate": user["datum_narodenia"],
-                "role": user.get("rola") or "user",   # 👈 dôležité
-            }
-        }), 200
-    finally:
-        cur.close()
-        conn.close()
-
-# ==========================================
-# 👥 POUŽÍVATELIA – LIST (s ratingmi)
-# ==========================================
-@app.get("/api/users")
-def get_users():
-    q = request.args.get("q", "").strip()
-    sort = request.args.get("sort", "id_desc").lower()  # id_desc | id_asc | name_asc | name_desc | rating_desc | rating_asc | relevance
-    role_filter = request.args.get("role", "").strip()
-
-    # stránkovanie
-    try:
-        page = max(1, int(request.args.get("page", 1)))
-    except (TypeError, ValueError):
-        page = 1
-    try:
-        page_size = min(100, max(1, int(request.args.get("page_size", 50))))
-    except (TypeError, ValueError):
-        page_size = 50
-    offset = (page - 1) * page_size
-
-    # základné sortovanie podľa usera / ratingu
-    base_sort_sql = {
-        "id_desc": "u.id_user DESC",
-        "id_asc": "u.id_user ASC",
-        "name_asc": "u.meno ASC, u.priezvisko ASC",
-        "name_desc": "u.meno DESC, u.priezvisko DESC",
-        "rating_desc": "r.avg_rating IS NULL, r.avg_rating DESC, r.rating_count DESC, u.id_user DESC",
-        "rating_asc": "r.avg_rating IS NULL, r.avg_rating ASC, r.rating_count DESC, u.id_user DESC",
-    }.get(sort, "u.id_user DESC")
-
-    conn = get_conn()
-    try:
-        cur = conn.cursor(dictionary=True)
-
-        where = ["u.soft_del = 0"]
-        params = []
-
-        score_sql = "0"  # default (bez q)
-        score_params = []
-
-        allowed_roles = {"user_dobrovolnik", "user_firma", "user_senior"}
-        if role_filter and role_filter in allowed_roles:
-            where.append("u.rola = %s")
-            params.append(role_filter)
-
-        if q:
-            like_any = f"%{q}%"
-            like_prefix = f"{q}%"
-            like_fullname_prefix = f"{q}%"
-
-            where.append(
-                "(u.meno LIKE %s OR u.priezvisko LIKE %s OR u.mail LIKE %s OR "
-                "CONCAT(u.meno,' ',u.priezvisko) LIKE %s)"
-            )
-            params += [like_any, like_any, like_any, like_any]
-
-            score_sql = """
-                (CASE WHEN CONCAT(u.meno,' ',u.priezvisko) = %s THEN 100 ELSE 0 END) +
-                (CASE WHEN CONCAT(u.meno,' ',u.priezvisko) LIKE %s THEN 60 ELSE 0 END) +
-                (CASE WHEN u.meno LIKE %s THEN 40 ELSE 0 END) +
-                (CASE WHEN u.priezvisko LIKE %s THEN 35 ELSE 0 END) +
-                (CASE WHEN u.mail LIKE %s THEN 20 ELSE 0 END) +
-                (CASE WHEN u.meno LIKE %s THEN 10 ELSE 0 END) +
-                (CASE WHEN u.priezvisko LIKE %s THEN 8 ELSE 0 END) +
-                (CASE WHEN u.mail LIKE %s THEN 5 ELSE 0 END)
-            """
-            score_params = [
-                q,
-                like_fullname_prefix,
-                like_prefix, like_prefix, like_prefix,
-                like_any, like_any, like_any
-            ]
-
-        where_sql = " AND ".join(where)
-
-        # ak je fulltext (q), ale sort nie je rating_desc/asc, triedime primárne podľa relevancie
-        if q:
-            if sort in ("rating_desc", "rating_asc"):
-                sort_sql = base_sort_sql
-            else:
-                sort_sql = "score DESC, u.meno ASC, u.priezvisko ASC"
-        else:
-            sort_sql = base_sort_sql
-
-        # total
-        cur.execute(
-            f"SELECT COUNT(*) AS total FROM users u WHERE {where_sql}",
-            params,
-        )
-        total = cur.fetchone()["total"]
-
-        # data (JOIN na agregované ratingy)
-        if q:
-            cur.execute(
-                f"""
-                SELECT 
-                    u.id_user,
-                    u.meno,
-                    u.priezvisko,
-                    u.mail,
-                    u.rola,
-                    r.avg_rating,
-                    r.rating_count,
-                    {score_sql} AS score
-                FROM users u
-                LEFT JOIN (
-                    SELECT user_id,
-                           AVG(rating) AS avg_rating,
-                           COUNT(*)    AS rating_count
-                    FROM user_ratings
-                    GROUP BY user_id
-                ) r ON r.user_id = u.id_user
-                WHERE {where_sql}
-                ORDER BY {sort_sql}
-                LIMIT %s OFFSET %s
-                """,
-                # score placeholders come first in SELECT, then WHERE params
-                score_params + params + [page_size, offset],
-            )
-        else:
-            cur.execute(
-                f"""
-                SELECT 
-                    u.id_user,
-                    u.meno,
-                    u.priezvisko,
-                    u.mail,
-                    u.rola,
-                    r.avg_rating,
-                    r.rating_count
-                FROM users u
-                LEFT JOIN (
-                    SELECT user_id,
-                           AVG(rating) AS avg_rating,
-                           COUNT(*)    AS rating_count
-                    FROM user_ratings
-                    GROUP BY user_id
-                ) r ON r.user_id = u.id_user
-                WHERE {where_sql}
-                ORDER BY {sort_sql}
-                LIMIT %s OFFSET %s
-                """,
-                params + [page_size, offset],
-            )
-
-        rows = [_normalize_user_rating_fields(dict(row)) for row in cur.fetchall()]
-
-        if not q:
-            return jsonify(rows), 200
-
-        return jsonify({
-            "items": rows,
-            "pagination": {
-                "page": page,
-                "page_size": page_size,
-                "total": total,
-                "pages": (total + page_size - 1) // page_size
-            }
-        }), 200
-    finally:
-        cur.close()
-        conn.close()
-
-# ==========================================
-# 👥 POUŽÍVATELIA – DELETE
-# ==========================================
-@app.delete("/api/users/<int:user_id>")
-def delete_user(user_id: int):
-    # voliteľné – superadmin (id 1) sa nedá zmazať
-    if user_id == 1:
-        return jsonify({"error": "Hlavného admina nie je možné zmazať."}), 400
-
-    conn = get_conn()
-    try:
-        cur = conn.cursor()
-
-        # soft delete – aby sa ďalej neukazoval v zoznamoch
-        cur.execute(
-            "UPDATE users SET soft_del = 1 WHERE id_user = %s AND soft_del = 0",
-            (user_id,),
-        )
-
-        if cur.rowcount == 0:
-            return jsonify({
-                "error": "Používateľ neexistuje alebo je už zmazaný."
-            }), 404
-
-        conn.commit()
-        return jsonify({"success": True}), 200
-
-    except Exception as e:
-        conn.rollback()
-        return jsonify({"error": f"Chyba pri mazaní používateľa: {str(e)}"}), 500
-    finally:
-        cur.close()
-        conn.close()
-
-# ==========================================
-# HODNOTENIA POUZIVATELOV
-# ==========================================
-
-def _serialize_rating_row(row):
-    if not row:
-        return None
-    created_at = row.get("created_at")
-    if isinstance(created_at, datetime):
-        created_at_str = created_at.isoformat()
-    else:
-        created_at_str = created_at
-    first = (row.get("meno") or "").strip()
-    last = (row.get("priezvisko") or "").strip()
-    full_name = " ".join(part for part in [first, last] if part).strip()
-    return {
-        "id_rating": row.get("id_rating"),
-        "user_id": row.get("user_id"),
-        "rated_by_user_id": row.get("rated_by_user_id"),
-        "rating": row.get("rating"),
-        "comment": row.get("comment"),
-        "created_at": created_at_str,
-        "rated_by_name": full_name or None,
-    }
-
-
-def _normalize_user_rating_fields(row):
-    if not row:
-        return row
-    if "avg_rating" in row:
-        val = row.get("avg_rating")
-        if val is None:
-            row["avg_rating"] = None
-        else:
-            try:
-                row["avg_rating"] = float(val)
-            except (TypeError, ValueError):
-                row["avg_rating"] = None
-    if "rating_count" in row:
-        val = row.get("rating_count")
-        if val is None:
-            row["rating_count"] = 0
-        else:
-            try:
-                row["rating_count"] = int(val)
-            except (TypeError, ValueError):
-                row["rating_count"] = 0
-    return row
-
-
-@app.get("/api/users/<int:user_id>/ratings")
-def get_user_ratings(user_id):
-    try:
-        page = max(1, int(request.args.get("page", 1)))
-    except (TypeError, ValueError):
-        page = 1
-
-    limit_arg = request.args.get("limit")
-    try:
-        default_page_size = int(limit_arg) if limit_arg is not None else 5
-    except (TypeError, ValueError):
-        default_page_size = 5
-
-    try:
-        page_size = int(request.args.get("page_size", default_page_size))
-    except (TypeError, ValueError):
-        page_size = default_page_size
-    page_size = max(1, min(50, page_size))
-    offset = (page - 1) * page_size
-
-    rated_by_param = request.args.get("rated_by")
-    try:
-        rated_by_user_id = int(rated_by_param) if rated_by_param is not None else None
-    except (TypeError, ValueError):
-        rated_by_user_id = None
-
-    conn = get_conn()
-    try:
-        cur = conn.cursor(dictionary=True)
-        cur.execute("""
-            SELECT COUNT(*) AS total, AVG(rating) AS avg_rating
-            FROM user_ratings
-            WHERE user_id = %s
-        """, (user_id,))
-        stats_row = cur.fetchone() or {"total": 0, "avg_rating": None}
-        avg_rating = stats_row.get("avg_rating")
-        avg_value = float(avg_rating) if avg_rating is not None else None
-        total = int(stats_row.get("total") or 0)
-
-        cur.execute("""
-            SELECT r.id_rating, r.user_id, r.rated_by_user_id, r.rating, r.comment, r.created_at,
-                   u.meno, u.priezvisko
-            FROM user_ratings r
-            LEFT JOIN users u ON u.id_user = r.rated_by_user_id
-            WHERE r.user_id = %s
-            ORDER BY r.created_at DESC
-            LIMIT %s OFFSET %s
-        """, (user_id, page_size, offset))
-        rows = [_normalize_user_rating_fields(dict(row)) for row in cur.fetchall()]
-        items = [item for item in (_serialize_rating_row(row) for row in rows) if item]
-
-        my_rating = None
-        if rated_by_user_id:
-            cur.execute("""
-                SELECT r.id_rating, r.user_id, r.rated_by_user_id, r.rating, r.comment, r.created_at,
-                       u.meno, u.priezvisko
-                FROM user_ratings r
-                LEFT JOIN users u ON u.id_user = r.rated_by_user_id
-                WHERE r.user_id = %s AND r.rated_by_user_id = %s
-                LIMIT 1
-            """, (user_id, rated_by_user_id))
-            my_rating = _serialize_rating_row(cur.fetchone())
-
-        total_pages = (total + page_size - 1) // page_size
-
-        return jsonify({
-            "items": items,
-            "stats": {
-                "average": avg_value,
-                "count": total,
-            },
-            "my_rating": my_rating,
-            "page": page,
-            "page_size": page_size,
-            "total": total,
-            "pages": total_pages,
-        }), 200
-    except Exception as e:
-        return jsonify({"error": f"Chyba pri nacitani hodnoteni: {str(e)}"}), 500
-    finally:
-        cur.close()
-        conn.close()
-
-
-@app.get("/api/users/top-rated")
-def get_top_rated_users():
-    try:
-        limit = max(1, min(20, int(request.args.get("limit", 6))))
-    except (TypeError, ValueError):
-        limit = 5
-    try:
-        days = max(1, min(90, int(request.args.get("days", 7))))
-    except (TypeError, ValueError):
-        days = 7
-
-    conn = get_conn()
-    try:
-        cur = conn.cursor(dictionary=True)
-        cur.execute(
-            """
-            SELECT u.id_user,
-                   u.meno,
-                   u.priezvisko,
-                   u.mail,
-                   u.rola,
-                   AVG(r.rating) AS avg_rating,
-                   COUNT(*) AS rating_count
-            FROM user_ratings r
-            JOIN users u ON u.id_user = r.user_id
-            WHERE r.created_at >= NOW() - INTERVAL %s DAY
-              AND u.soft_del = 0
-            GROUP BY u.id_user, u.meno, u.priezvisko, u.mail, u.rola
-            HAVING rating_count > 0
-            ORDER BY avg_rating DESC, rating_count DESC, u.id_user DESC
-            LIMIT %s
-            """,
-            (days, limit),
-        )
-        rows = [_normalize_user_rating_fields(row) for row in cur.fetchall()]
-        return jsonify(rows), 200
-    except Exception as e:
-        return jsonify({"error": f"Chyba pri nacitani hodnoteni: {str(e)}"}), 500
-    finally:
-        cur.close()
-        conn.close()
-
-
-@app.post("/api/users/<int:user_id>/ratings")
-def upsert_user_rating(user_id):
-    data = request.get_json(force=True)
-    rated_by_user_id = data.get("rated_by_user_id")
-    rating_value = data.get("rating")
-    comment = (data.get("comment") or "").strip()
-
-    try:
-        rated_by_user_id = int(rated_by_user_id)
-    except (TypeError, ValueError):
-        return jsonify({"error": "Neplatne ID hodnotiaceho pouzivatela."}), 400
-
-    if rated_by_user_id == user_id:
-        return jsonify({"error": "Pouzivatel sa nemoze hodnotit sam."}), 400
-
-    try:
-        rating_value = int(rating_value)
-    except (TypeError, ValueError):
-        return jsonify({"error": "Neplatna hodnota ratingu."}), 400
-
-    if rating_value < 1 or rating_value > 5:
-        return jsonify({"error": "Hodnotenie musi byt v rozsahu 1 az 5."}), 400
-
-    if not comment:
-        comment = None
-    elif len(comment) > 1000:
-        comment = comment[:1000]
-
-    conn = get_conn()
-    cur = None
-    write_cur = None
-    detail_cur = None
-    try:
-        cur = conn.cursor(dictionary=True)
-        cur.execute("SELECT id_user FROM users WHERE id_user IN (%s, %s)", (user_id, rated_by_user_id))
-        ids = {row["id_user"] for row in cur.fetchall()}
-        if user_id not in ids:
-            return jsonify({"error": "Hodnoteny pouzivatel neexistuje."}), 404
-        if rated_by_user_id not in ids:
-            return jsonify({"error": "Hodnotiaci pouzivatel neexistuje."}), 400
-
-        cur.execute("""
-            SELECT id_rating
-            FROM user_ratings
-            WHERE user_id = %s AND rated_by_user_id = %s
-        """, (user_id, rated_by_user_id))
-        existing = cur.fetchone()
-        cur.close()
-        cur = None
-
-        write_cur = conn.cursor()
-        if existing:
-            write_cur.execute("""
-                UPDATE user_ratings
-                SET rating = %s, comment = %s, created_at = NOW()
-                WHERE id_rating = %s
-            """, (rating_value, comment, existing["id_rating"]))
-            status_code = 200
-        else:
-            write_cur.execute("""
-                INSERT INTO user_ratings (user_id, rated_by_user_id, rating, comment)
-                VALUES (%s, %s, %s, %s)
-            """, (user_id, rated_by_user_id, rating_value, comment))
-            status_code = 201
-        conn.commit()
-        write_cur.close()
-        write_cur = None
-
-        detail_cur = conn.cursor(dictionary=True)
-        detail_cur.execute("""
-            SELECT r.id_rating, r.user_id, r.rated_by_user_id, r.rating, r.comment, r.created_at,
-                   u.meno, u.priezvisko
-            FROM user_ratings r
-            LEFT JOIN users u ON u.id_user = r.rated_by_user_id
-            WHERE r.user_id = %s AND r.rated_by_user_id = %s
-            LIMIT 1
-        """, (user_id, rated_by_user_id))
-        saved = _serialize_rating_row(detail_cur.fetchone())
-
-        return jsonify({"message": "Hodnotenie ulozene.", "rating": saved}), status_code
-    except Exception as e:
-        conn.rollback()
-        return jsonify({"error": f"Chyba pri ukladani hodnotenia: {str(e)}"}), 500
-    finally:
-        if cur:
-            cur.close()
-        if write_cur:
-            write_cur.close()
-        if detail_cur:
-            detail_cur.close()
-        conn.close()
-
-# ==========================================
-# 💬 CHAT – CONVERSATIONS & MESSAGES
-# ==========================================
-
-@app.post("/api/chat/conversations")
-def create_or_get_conversation():
-    data = request.get_json(force=True) or {}
-    user_ids = data.get("user_ids")
-    title = (data.get("title") or "").strip()
-
-    if not isinstance(user_ids, list) or len(user_ids) < 2:
-        return jsonify({"error": "Potrebujem aspoň dvoch účastníkov."}), 400
-
-    # odstránime duplicity + zoradíme, nech je to deterministické
-    user_ids = sorted({int(uid) for uid in user_ids})
-    is_group = len(user_ids) > 2
-
-    # title používame len pre skupiny; pre 1:1 ho ignorujeme
-    if is_group and not title:
-        return jsonify({"error": "Chýba názov skupiny."}), 400
-
-    conn = get_conn()
-    cur = conn.cursor(dictionary=True)
-    try:
-        # 1:1 – nájdi existujúcu konverzáciu s presne tými účastníkmi
-        # (pozor: pôvodný WHERE cp.id_user IN (...) vedel omylom trafiť aj skupinu)
-        if not is_group:
-            placeholders = ", ".join(["%s"] * len(user_ids))
-            query = f"""
-                SELECT MIN(c.id_conversation) AS id_conversation
-                FROM conversations c
-                JOIN conversation_participants cp ON cp.id_conversation = c.id_conversation
-                GROUP BY c.id_conversation
-                HAVING
-                  SUM(CASE WHEN cp.id_user IN ({placeholders}) THEN 1 ELSE 0 END) = %s
-                  AND COUNT(*) = %s
-                LIMIT 1
-            """
-            cur.execute(query, (*user_ids, len(user_ids), len(user_ids)))
-            row = cur.fetchone()
-            if row and row.get("id_conversation"):
-                return jsonify({"id_conversation": row["id_conversation"], "created": False}), 200
-
-        # Skupina (alebo nové 1:1) – vytvoríme novú konverzáciu
-        if is_group:
-            cur.execute("INSERT INTO conversations (title) VALUES (%s)", (title,))
-        else:
-            cur.execute("INSERT INTO conversations () VALUES ()")
-
-        conv_id = cur.lastrowid
-
-        cur.executemany(
-            "INSERT INTO conversation_participants (id_conversation, id_user) VALUES (%s, %s)",
-            [(conv_id, uid) for uid in user_ids],
-        )
-        conn.commit()
-
-        return jsonify({"id_conversation": conv_id, "created": True}), 201
-
-    finally:
-        cur.close()
-        conn.close()
-
-
-@app.get("/api/chat/conversations")
-def list_conversations():
-    user_id = request.args.get("user_id", type=int)
-    if not user_id:
-        return jsonify({"error": "Chýba user_id."}), 400
-
-    conn = get_conn()
-    cur = conn.cursor(dictionary=True)
-    try:
-        cur.execute(
-            """
-            SELECT
-              c.id_conversation,
-              c.title,
-              COUNT(DISTINCT cp.id_user) AS participant_count,
-              (COUNT(DISTINCT cp.id_user) > 2) AS is_group,
-
-              MAX(m.created_at) AS last_message_at,
-              SUBSTRING_INDEX(
-                  MAX(CONCAT(m.created_at, '|||', m.content)),
-                  '|||', -1
-              ) AS last_message,
-              GROUP_CONCAT(DISTINCT cp.id_user) AS participant_ids,
-
-              -- "ten druhý" používateľ v 1:1 chate (pre skupiny sa ignoruje)
-              MAX(CASE WHEN cp.id_user <> %s THEN cp.id_user END) AS other_user_id,
-              MAX(
-                CASE
-                  WHEN cp.id_user <> %s THEN CONCAT(u.meno, ' ', u.priezvisko)
-                  ELSE NULL
-                END
-              ) AS other_user_name,
-
-              -- UI-friendly názov konverzácie:
-              CASE
-                WHEN c.title IS NOT NULL AND c.title <> '' THEN c.title
-                WHEN COUNT(DISTINCT cp.id_user) = 2 THEN
-                  MAX(CASE WHEN cp.id_user <> %s THEN CONCAT(u.meno, ' ', u.priezvisko) END)
-                ELSE CONCAT('Skupina (', COUNT(DISTINCT cp.id_user), ')')
-              END AS display_title,
-
-              -- počet neprečítaných správ pre aktuálneho používateľa
-              (
-                SELECT COUNT(*)
-                FROM messages m2
-                WHERE m2.id_conversation = c.id_conversation
-                  AND (cp_me.last_read_message_id IS NULL OR m2.id_message > cp_me.last_read_message_id)
-                  AND m2.sender_id <> %s
-              ) AS unread_count
-
-            FROM conversations c
-
-            JOIN conversation_participants cp_me
-              ON cp_me.id_conversation = c.id_conversation
-             AND cp_me.id_user = %s
-
-            JOIN conversation_participants cp
-              ON cp.id_conversation = c.id_conversation
-            JOIN users u
-              ON u.id_user = cp.id_user
-
-            LEFT JOIN messages m
-              ON m.id_conversation = c.id_conversation
-
-            GROUP BY c.id_conversation
-            ORDER BY last_message_at DESC
-            """,
-            (user_id, user_id, user_id, user_id, user_id),
-        )
-
-        rows = cur.fetchall()
-        return jsonify(rows), 200
-
-    finally:
-        cur.close()
-        conn.close()
-
-
-@app.get("/api/chat/conversations/<int:conv_id>/messages")
-def get_messages(conv_id):
-    page = request.args.get("page", default=1, type=int)
-    page_size = request.args.get("page_size", default=50, type=int)
-    offset = (page - 1) * page_size
-    user_id = request.args.get("user_id", type=int)
-
-    conn = get_conn()
-    cur = conn.cursor(dictionary=True)
-    try:
-        # načítaj správy
-        cur.execute(
-            """
-            SELECT
-              m.id_message,
-              m.sender_id,
-              m.content,
-              m.created_at,
-              m.is_edited,
-              m.edited_at,
-              u.meno,
-              u.priezvisko
-            FROM messages m
-            JOIN users u ON u.id_user = m.sender_id
-            WHERE m.id_conversation = %s
-            ORDER BY m.created_at ASC
-            LIMIT %s OFFSET %s
-            """,
-            (conv_id, page_size, offset),
-        )
-        rows = cur.fetchall()
-
-        # ak vieme, kto je aktuálny používateľ, označ všetky doteraz načítané správy ako prečítané
-        if user_id is not None and rows:
-            max_id = max(row["id_message"] for row in rows)
-            cur.execute(
-                """
-                UPDATE conversation_participants
-                SET last_read_message_id = %s,
-                    last_read_at = NOW()
-                WHERE id_conversation = %s
-                  AND id_user = %s
-                """,
-                (max_id, conv_id, user_id),
-            )
-            conn.commit()
-
-        return jsonify(rows), 200
-    finally:
-        cur.close()
-        conn.close()
-
-
-@app.post("/api/chat/conversations/<int:conv_id>/messages")
-def send_message(conv_id):
-    data = request.get_json(force=True) or {}
-    sender_id = data.get("sender_id")
-    content = (data.get("content") or "").strip()
-
-    if not sender_id or not content:
-        return jsonify({"error": "Chýba odosielateľ alebo obsah."}), 400
-
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            "INSERT INTO messages (id_conversation, sender_id, content) VALUES (%s, %s, %s)",
-            (conv_id, sender_id, content),
-        )
-        conn.commit()
-        msg_id = cur.lastrowid
-
-        return jsonify({"id_message": msg_id}), 201
-
-    finally:
-        cur.close()
-        conn.close()
-
-
-@app.patch("/api/chat/messages/<int:message_id>")
-def edit_message(message_id):
-    data = request.get_json(force=True) or {}
-    sender_id = data.get("sender_id")
-    new_content = (data.get("content") or "").strip()
-
-    if not sender_id or not new_content:
-        return jsonify({"error": "Chýba odosielateľ alebo obsah."}), 400
-
-    conn = get_conn()
-    cur = conn.cursor(dictionary=True)
-    try:
-        # skontroluj, že správa existuje a patrí tomuto používateľovi
-        cur.execute(
-            "SELECT id_message, sender_id FROM messages WHERE id_message = %s",
-            (message_id,),
-        )
-        row = cur.fetchone()
-        if not row:
-            return jsonify({"error": "Správa neexistuje."}), 404
-        if int(row["sender_id"]) != int(sender_id):
-            return jsonify({"error": "Nemôžeš upraviť cudziu správu."}), 403
-
-        cur.execute(
-            """
-            UPDATE messages
-            SET content = %s,
-                is_edited = 1,
-                edited_at = NOW()
-            WHERE id_message = %s
-            """,
-            (new_content, message_id),
-        )
-        conn.commit()
-        return jsonify({"success": True}), 200
-    finally:
-        cur.close()
-        conn.close()
-
-
-@app.get("/api/chat/conversations/<int:conv_id>/participants")
-def get_conversation_participants(conv_id: int):
-    user_id = request.args.get("user_id", type=int)
-    if not user_id:
-        return jsonify({"error": "Chýba user_id."}), 400
-
-    conn = get_conn()
-    cur = conn.cursor(dictionary=True)
-    try:
-        # bezpečnosť: len člen konverzácie môže vidieť členov
-        cur.execute(
-            """
-            SELECT 1
-            FROM conversation_participants
-            WHERE id_conversation = %s AND id_user = %s
-            LIMIT 1
-            """,
-            (conv_id, user_id),
-        )
-        if not cur.fetchone():
-            return jsonify({"error": "Nemáš prístup k tejto konverzácii."}), 403
-
-        cur.execute(
-            """
-            SELECT u.id_user, u.meno, u.priezvisko
-            FROM conversation_participants cp
-            JOIN users u ON u.id_user = cp.id_user
-            WHERE cp.id_conversation = %s
-            ORDER BY u.meno ASC, u.priezvisko ASC
-            """,
-            (conv_id,),
-        )
-        rows = cur.fetchall()
-        return jsonify(rows), 200
-    finally:
-        cur.close()
-        conn.close()
-
-
-# ==========================================
-# 📝 PRÍSPEVKY
-# ==========================================
-
-@app.get("/api/posts")
-def get_posts():
-    q = request.args.get("q", "").strip()
-    sort = request.args.get("sort", "id_desc").lower()
-    category_param = request.args.get("category", "").strip()
-    type_param = request.args.get("type", "").strip()
-    author_id = request.args.get("author_id", "").strip()
-    role_filter_raw = request.args.get("role", "").strip()
-
-    try:
-        page = max(1, int(request.args.get("page", 1)))
-    except (TypeError, ValueError):
-        page = 1
-    try:
-        page_size = min(100, max(1, int(request.args.get("page_size", 50))))
-    except (TypeError, ValueError):
-        page_size = 50
-    offset = (page - 1) * page_size
-
-    sort_sql = {
-        "id_desc": "p.id_post DESC",
-        "id_asc": "p.id_post ASC",
-        "title_asc": "p.title ASC",
-        "title_desc": "p.title DESC",
-    }.get(sort, "p.id_post DESC")
-
-    conn = get_conn()
-    try:
-        cur = conn.cursor(dictionary=True)
-        where = ["1=1"]
-        params = []
-
-        # multiple category/type values allowed, comma-separated
-        category_values = []
-        for raw in (category_param, type_param):
-            if raw:
-                category_values.extend([val.strip() for val in raw.split(",") if val.strip()])
-        if category_values:
-            category_values = list(dict.fromkeys(category_values))
-            placeholders = ", ".join(["%s"] * len(category_values))
-            where.append(f"p.category IN ({placeholders})")
-            params.extend(category_values)
-
-        allowed_roles = {"user_dobrovolnik", "user_firma", "user_senior"}
-        role_aliases = {
-            "dobrovolnik": "user_dobrovolnik",
-            "firma": "user_firma",
-            "senior": "user_senior",
-        }
-        role_filter = role_aliases.get(role_filter_raw.lower(), role_filter_raw) if role_filter_raw else ""
-        if role_filter and role_filter in allowed_roles:
-            where.append("u.rola = %s")
-            params.append(role_filter)
-        if author_id:
-            where.append("p.user_id = %s")
-            params.append(author_id)
-
-        score_sql = "0"
-        score_params = []
-        if q:
-            like_any = f"%{q}%"
-            like_prefix = f"{q}%"
-            fullname = "CONCAT(u.meno,' ',u.priezvisko)"
-            where.append(
-                "(p.title LIKE %s OR p.description LIKE %s OR p.category LIKE %s OR u.rola LIKE %s OR "
-                f"{fullname} LIKE %s)"
-            )
-            params += [like_any, like_any, like_any, like_any, like_any]
-            score_sql = f"""
-                (CASE WHEN p.title = %s THEN 120 ELSE 0 END) +
-                (CASE WHEN p.title LIKE %s THEN 80 ELSE 0 END) +
-                (CASE WHEN p.description LIKE %s THEN 40 ELSE 0 END) +
-                (CASE WHEN p.category LIKE %s THEN 30 ELSE 0 END) +
-                (CASE WHEN u.rola LIKE %s THEN 28 ELSE 0 END) +
-                (CASE WHEN {fullname} LIKE %s THEN 25 ELSE 0 END) +
-                (CASE WHEN p.title LIKE %s THEN 10 ELSE 0 END) +
-                (CASE WHEN p.description LIKE %s THEN 6 ELSE 0 END) +
-                (CASE WHEN p.category LIKE %s THEN 5 ELSE 0 END) +
-                (CASE WHEN u.rola LIKE %s THEN 4 ELSE 0 END)
-            """
-            score_params = [
-                q,
-                like_prefix, like_prefix, like_prefix, like_prefix, like_prefix,
-                like_any, like_any, like_any, like_any,
-            ]
-            sort_sql = "score DESC, p.title ASC, p.id_post DESC"
-
-        where_sql = " AND ".join(where)
-
-        cur.execute(f"""
-            SELECT COUNT(*) AS total
-            FROM posts p
-            JOIN users u ON u.id_user = p.user_id
-            WHERE {where_sql}
-        """, params)
-        total = cur.fetchone()["total"]
-
-        rating_join = """
-            LEFT JOIN (
-                SELECT user_id, AVG(rating) AS avg_rating
-                FROM user_ratings
-                GROUP BY user_id
-            ) r ON r.user_id = p.user_id
-        """
-
-        if q:
-            cur.execute(f"""
-                SELECT p.id_post, p.title, p.description, p.image, p.category, p.user_id,
-                       u.meno AS name, u.priezvisko AS surname,
-                       r.avg_rating, u.rola,
-                       {score_sql} AS score
-                FROM posts p
-                JOIN users u ON u.id_user = p.user_id
-                {rating_join}
-                WHERE {where_sql}
-                ORDER BY {sort_sql}
-                LIMIT %s OFFSET %s
-            """, score_params + params + [page_size, offset])
-        else:
-            cur.execute(f"""
-                SELECT p.id_post, p.title, p.description, p.image, p.category, p.user_id,
-                       u.meno AS name, u.priezvisko AS surname, u.rola,
-                       r.avg_rating
-                FROM posts p
-                JOIN users u ON u.id_user = p.user_id
-                {rating_join}
-                WHERE {where_sql}
-                ORDER BY {sort_sql}
-                LIMIT %s OFFSET %s
-            """, params + [page_size, offset])
-
-        rows = cur.fetchall()
-        for item in rows:
-            if item.get("image"):
-                item["image"] = _make_abs(item["image"])
-
-        if not q and not category_values and not role_filter and not author_id:
-            return jsonify(rows), 200
-
-        return jsonify({
-            "items": rows,
-            "pagination": {
-                "page": page,
-                "page_size": page_size,
-                "total": total,
-                "pages": (total + page_size - 1) // page_size,
-            }
-        }), 200
-    except Exception as e:
-        return jsonify({"error": f"Chyba pri načítaní príspevkov: {str(e)}"}), 500
-    finally:
-        cur.close()
-        conn.close()
-
-@app.get("/api/posts/<int:id_post>")
-def get_post_detail(id_post: int):
-    conn = get_conn()
-    try:
-        cur = conn.cursor(dictionary=True)
-        cur.execute(
-            """
-            SELECT p.id_post, p.title, p.description, p.image, p.category, p.user_id,
-                   u.meno AS name, u.priezvisko AS surname,
-                   r.avg_rating
-            FROM posts p
-            JOIN users u ON u.id_user = p.user_id
-            LEFT JOIN (
-                SELECT user_id, AVG(rating) AS avg_rating
-                FROM user_ratings
-                GROUP BY user_id
-            ) r ON r.user_id = p.user_id
-            WHERE p.id_post = %s
-            """,
-            (id_post,),
-        )
-        row = cur.fetchone()
-        if not row:
-            return jsonify({"error": "Prispevok neexistuje."}), 404
-        if row.get("image"):
-            row["image"] = _make_abs(row["image"])
-        return jsonify(row), 200
-    except Exception as e:
-        return jsonify({"error": f"Chyba pri nacitani prispevku: {str(e)}"}), 500
-    finally:
-        cur.close()
-        conn.close()
-
-@app.post("/api/posts")
-def create_post():
-    data = request.get_json(force=True)
-    title = data.get("title")
-    description = data.get("description")
-    category = data.get("category")
-    image = data.get("image")
-    user_id = data.get("user_id")
-
-    if not all([title, description, category, user_id]):
-        return jsonify({"error": "Chýbajú povinné údaje (title, description, category, user_id)."}), 400
-
-    conn = get_conn()
-    try:
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO posts (title, description, category, image, user_id)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (title, description, category, None, user_id))
-        new_id = cur.lastrowid
-        conn.commit()
-
-        if image:
-            _save_post_image_from_data_url(conn, new_id, image)
-
-        cur = conn.cursor(dictionary=True)
-        cur.execute("""
-            SELECT p.id_post, p.title, p.description, p.image, p.category, p.user_id,
-                   u.meno AS name, u.priezvisko AS surname
-            FROM posts p
-            JOIN users u ON u.id_user = p.user_id
-            WHERE p.id_post = %s
-        """, (new_id,))
-        row = cur.fetchone()
-        if row and row.get("image"):
-            row["image"] = _make_abs(row["image"])
-        return jsonify(row), 201
-    except Exception as e:
-        conn.rollback()
-        return jsonify({"error": f"Chyba pri vytváraní príspevku: {str(e)}"}), 500
-    finally:
-        cur.close()
-        conn.close()
-
-
-@app.put("/api/posts/<int:id_post>")
-def update_post(id_post):
-    data = request.get_json(force=True)
-    title = data.get("title")
-    description = data.get("description")
-    category = data.get("category")
-    image = data.get("image")
-
-    if not any([title, description, category, image is not None]):
-        return jsonify({"error": "Nie je čo aktualizovať."}), 400
-
-    conn = get_conn()
-    try:
-        cur = conn.cursor()
-        sets = []
-        params = []
-        if title is not None:
-            sets.append("title = %s"); params.append(title)
-        if description is not None:
-            sets.append("description = %s"); params.append(description)
-        if category is not None:
-            sets.append("category = %s"); params.append(category)
-        if image is not None:
-            # Ak klient pošle data URL -> uložíme ako súbor + media_files
-            if isinstance(image, str) and image.startswith("data:image"):
-                stored = _save_post_image_from_data_url(conn, id_post, image)
-                if not stored:
-                    return jsonify({"error": "Nepodarilo sa uložiť obrázok."}), 400
-                sets.append("image = %s"); params.append(stored)
-            else:
-                # prázdny string => vymazanie obrázka
-                if not image:
-                    _delete_post_images(conn, id_post)
-                    sets.append("image = %s"); params.append(None)
-                else:
-                    # URL alebo cesta; zároveň čistíme staré záznamy, aby sedel media_files
-                    _delete_post_images(conn, id_post)
-                    sets.append("image = %s"); params.append(_make_abs(image))
-
-        if not sets:
-            return jsonify({"error": "Nie je čo aktualizovať."}), 400
-
-        params.append(id_post)
-        cur.execute(f"UPDATE posts SET {', '.join(sets)} WHERE id_post = %s", tuple(params))
-        if cur.rowcount == 0:
-            # Ak sa nezmenili dáta, overíme, či príspevok existuje; ak áno, považujme za OK.
-            cur.execute("SELECT 1 FROM posts WHERE id_post = %s", (id_post,))
-            if not cur.fetchone():
-                return jsonify({"error": "Príspevok neexistuje."}), 404
-        conn.commit()
-        return jsonify({"success": True}), 200
-    except Exception as e:
-        conn.rollback()
-        return jsonify({"error": f"Chyba pri aktualizácii príspevku: {str(e)}"}), 500
-    finally:
-        cur.close()
-        conn.close()
-
-
-@app.delete("/api/posts/<int:id_post>")
-def delete_post(id_post):
-    conn = get_conn()
-    try:
-        cur = conn.cursor()
-        _delete_post_images(conn, id_post)
-        cur.execute("DELETE FROM posts WHERE id_post = %s", (id_post,))
-        if cur.rowcount == 0:
-            return jsonify({"error": "Príspevok neexistuje."}), 404
-        conn.commit()
-        return jsonify({"success": True}), 200
-    except Exception as e:
-        conn.rollback()
-        return jsonify({"error": f"Chyba pri mazaní príspevku: {str(e)}"}), 500
-    finally:
-        cur.close()
-        conn.close()
-
-# ==========================================
-# 👤 PROFIL – GET/UPDATE
-# ==========================================
-
-ALLOWED_PROFILE_FIELDS = {"meno", "priezvisko", "datum_narodenia", "mesto", "about"}
-
-def _validate_profile_payload(data: dict):
-    """Základná validácia pre update profilu."""
-    if not data or not any(k in data for k in ALLOWED_PROFILE_FIELDS):
-        return False, "Nie je čo aktualizovať."
-
-    # dĺžky a formáty
-    if "meno" in data and (not data["meno"] or len(data["meno"]) > 100):
-        return False, "Meno je povinné a môže mať max 100 znakov."
-    if "priezvisko" in data and (not data["priezvisko"] or len(data["priezvisko"]) > 100):
-        return False, "Priezvisko je povinné a môže mať max 100 znakov."
-    if "mesto" in data and (data["mesto"] is not None) and len(data["mesto"]) > 100:
-        return False, "Mesto môže mať max 100 znakov."
-    if "about" in data and (data["about"] is not None) and len(data["about"]) > 5000:
-        return False, "Text „O mne“ môže mať max 5000 znakov."
-    if "datum_narodenia" in data and data["datum_narodenia"]:
-        try:
-            # očakáva sa 'YYYY-MM-DD'
-            datetime.strptime(data["datum_narodenia"], "%Y-%m-%d")
-        except Exception:
-            return False, "Neplatný formát dátumu (použi YYYY-MM-DD)."
-
-    # nepovolené polia (napr. mail, heslo, rola) – ak by prišli, odmietneme
-    forbidden = set(data.keys()) - ALLOWED_PROFILE_FIELDS
-    if forbidden:
-        return False, f"Nasledujúce polia nie je možné meniť: {', '.join(sorted(forbidden))}"
-
-    return True, ""
-
-# Avatar endpoints (media_files + assets/img/avatars)
-@app.post("/api/profile/<int:user_id>/avatar")
-def upload_profile_avatar(user_id: int):
-    file = request.files.get("file")
-    if not file or not file.filename:
-        return jsonify({"error": "S?bor nebol dodan?."}), 400
-
-    filename = secure_filename(file.filename)
-    _, ext = os.path.splitext(filename)
-    ext = ext.lower()
-    if ext not in ALLOWED_IMAGE_EXTS:
-        return jsonify({"error": "Nepodporovan? form?t. Povolen?: jpg, jpeg, png, gif, webp"}), 400
-
-    file_uid = str(uuid.uuid4())
-    path = _avatar_disk_path(file_uid, ext)
-    try:
-        file.save(path)
-    except Exception as e:
-        return jsonify({"error": f"Ukladanie zlyhalo: {str(e)}"}), 500
-
-    size_bytes = os.path.getsize(path)
-    storage_path = f"/assets/img/avatars/{file_uid}{ext}"
-
-    conn = get_conn()
-    cur = None
-    try:
-        _delete_avatar_records(conn, user_id)  # dr??me jeden avatar
-        cur = conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO media_files
-              (owner_type, owner_id, purpose, sort_order, file_uid, file_name, file_ext, mime_type, size_bytes, storage_path)
-            VALUES
-              ('user', %s, 'avatar', 0, %s, %s, %s, %s, %s, %s)
-            """,
-            (
-                user_id,
-                file_uid,
-                filename,
-                ext,
-                file.mimetype or None,
-                size_bytes,
-                storage_path,
-            ),
-        )
-        conn.commit()
-    except Exception as exc:
-        try:
-            os.remove(path)
-        except Exception:
-            pass
-        return jsonify({"error": f"Ukladanie zlyhalo: {exc}"}), 500
-    finally:
-        if cur:
-            cur.close()
-
-    return jsonify({"url": _normalize_storage_path(storage_path), "uid": file_uid}), 201
-
-
-@app.get("/api/profile/<int:user_id>/avatar")
-def get_profile_avatar_meta(user_id: int):
-    conn = get_conn()
-    try:
-        meta = _find_avatar_meta(conn, user_id)
-        if not meta:
-            return jsonify({"error": "Avatar nen?jden?"}), 404
-        return jsonify({"url": _normalize_storage_path(meta["storage_path"]), "uid": meta["file_uid"]}), 200
-    finally:
-        conn.close()
-
-
-@app.delete("/api/profile/<int:user_id>/avatar")
-def delete_profile_avatar(user_id: int):
-    conn = get_conn()
-    try:
-        meta = _find_avatar_meta(conn, user_id)
-        if not meta:
-            return jsonify({"error": "Avatar nen?jden?"}), 404
-        _delete_avatar_records(conn, user_id)
-        return jsonify({"status": "ok"}), 200
-    except Exception as exc:
-        logging.exception("Failed to delete avatar for user %s: %s", user_id, exc)
-        return jsonify({"error": "Nepodarilo sa odstr?ni? avatar."}), 500
-    finally:
-        conn.close()
-
-
-@app.get("/assets/img/avatars/<path:filename>")
-def serve_avatar_file(filename: str):
-    return send_from_directory(AVATARS_DIR, filename, as_attachment=False)
-
-
-# Post image endpoints (media_files + assets/img/posts)
-@app.post("/api/posts/<int:post_id>/image")
-def upload_post_image(post_id: int):
-    file = request.files.get("file")
-    if not file or not file.filename:
-        return jsonify({"error": "Súbor nebol dodaný."}), 400
-
-    raw_main_flag = request.form.get("main") or request.args.get("main") or ""
-    is_main = str(raw_main_flag).lower() in {"1", "true", "yes", "on", "main"}
-
-    filename = secure_filename(file.filename)
-    _, ext = os.path.splitext(filename)
-    ext = ext.lower()
-    if ext not in ALLOWED_IMAGE_EXTS:
-        return jsonify({"error": "Nepodporovaný formát. Povolené: jpg, jpeg, png, gif, webp"}), 400
-
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute("SELECT 1 FROM posts WHERE id_post = %s", (post_id,))
-        if not cur.fetchone():
-            return jsonify({"error": "Príspevok neexistuje."}), 404
-    finally:
-        cur.close()
-
-    file_uid = str(uuid.uuid4())
-    path = _post_image_disk_path(file_uid, ext)
-    try:
-        file.save(path)
-    except Exception as exc:
-        return jsonify({"error": f"Ukladanie zlyhalo: {exc}"}), 500
-
-    size_bytes = os.path.getsize(path)
-    storage_path = f"/assets/img/posts/{file_uid}{ext}"
-
-    try:
-        storage_url, sort_order = _insert_post_image_record(
-            conn,
-            post_id,
-            file_uid=file_uid,
-            filename=filename,
-            ext=ext,
-            mime_type=file.mimetype or None,
-            size_bytes=size_bytes,
-            storage_path=storage_path,
-            is_main=is_main,
-        )
-    except Exception as exc:
-        try:
-            os.remove(path)
-        except Exception:
-            pass
-        return jsonify({"error": f"Ukladanie zlyhalo: {exc}"}), 500
-
-    return jsonify({"url": storage_url, "uid": file_uid, "storage_path": storage_path, "sort_order": sort_order, "is_main": is_main}), 201
-
-
-@app.get("/api/posts/<int:post_id>/image")
-def get_post_image_meta(post_id: int):
-    conn = get_conn()
-    try:
-        cur = conn.cursor(dictionary=True)
-        cur.execute(
-            """
-            SELECT file_uid, file_ext, storage_path
-            FROM media_files
-            WHERE owner_type = 'post' AND owner_id = %s AND purpose = 'post_image'
-            AND sort_order = 0
-            LIMIT 1
-            """,
-            (post_id,),
-        )
-        row = cur.fetchone()
-
-        if row:
-            return jsonify({"url": _make_abs(row["storage_path"]), "uid": row["file_uid"], "storage_path": row["storage_path"]}), 200
-
-        cur.execute("SELECT image FROM posts WHERE id_post = %s", (post_id,))
-        fallback = cur.fetchone()
-        if fallback and fallback[0]:
-            return jsonify({"url": _make_abs(fallback[0]), "uid": None}), 200
-
-        return jsonify({"error": "Obrázok pre príspevok neexistuje."}), 404
-    finally:
-        cur.close()
-        conn.close()
-
-
-@app.get("/api/posts/<int:post_id>/images")
-def list_post_images(post_id: int):
-    conn = get_conn()
-    try:
-        cur = conn.cursor(dictionary=True)
-        cur.execute(
-            """
-            SELECT file_uid AS uid, file_uid, storage_path, sort_order, file_name, mime_type
-            FROM media_files
-            WHERE owner_type = 'post' AND owner_id = %s AND purpose = 'post_image'
-            ORDER BY sort_order ASC, created_at ASC
-            """,
-            (post_id,),
-        )
-        rows = cur.fetchall()
-        for row in rows:
-            if row.get("storage_path"):
-                row["url"] = _make_abs(row["storage_path"])
-        return jsonify(rows), 200
-    finally:
-        cur.close()
-        conn.close()
-
-
-@app.delete("/api/posts/<int:post_id>/images/<string:file_uid>")
-def delete_post_image(post_id: int, file_uid: str):
-    conn = get_conn()
-    try:
-        existed = _delete_post_image_by_uid(conn, post_id, file_uid)
-        if not existed:
-            return jsonify({"error": "Obrázok neexistuje."}), 404
-
-        next_image = _resequence_post_images(conn, post_id)
-        return jsonify({"success": True, "next_image": next_image}), 200
-    finally:
-        conn.close()
-
-
-@app.get("/assets/img/posts/<path:filename>")
-def serve_post_image(filename: str):
-    return send_from_directory(POST_IMAGES_DIR, filename, as_attachment=False)
-
-
-@app.get("/assets/img/activities/<path:filename>")
-def serve_activity_image(filename: str):
-    return send_from_directory(ACTIVITY_IMAGES_DIR, filename, as_attachment=False)
-
-@app.get("/assets/img/articles/<path:filename>")
-def serve_article_image(filename: str):
-    return send_from_directory(ARTICLE_IMAGES_DIR, filename, as_attachment=False)
-
-
-@app.get("/api/profile/<int:user_id>")
-def get_profile(user_id: int):
-    """Načíta detaily profilu pre daného používateľa (bez hesla)."""
-    conn = get_conn()
-    try:
-        cur = conn.cursor(dictionary=True)
-        cur.execute("""
-            SELECT 
-                u.id_user, u.meno, u.priezvisko, u.mail, u.datum_narodenia,
-                u.mesto, u.about, u.rola, u.created_at
-            FROM users u
-            WHERE u.id_user = %s
-        """, (user_id,))
-        row = cur.fetchone()
-        if not row:
-            return jsonify({"error": "Používateľ neexistuje."}), 404
-        return jsonify(row), 200
-    finally:
-        cur.close()
-        conn.close()
-
-@app.put("/api/profile/<int:user_id>")
-def update_profile(user_id: int):
-    """
-    Aktualizuje profil prihláseného používateľa.
-    Meniteľné: meno, priezvisko, datum_narodenia, mesto, about
-    Nemeníme: mail, heslo, rola, soft_del, atď.
-    """
-    data = request.get_json(force=True) or {}
-    ok, msg = _validate_profile_payload(data)
-    if not ok:
-        return jsonify({"error": msg}), 400
-
-    sets = []
-    params = []
-    for field in ALLOWED_PROFILE_FIELDS:
-        if field in data:
-            sets.append(f"{field} = %s")
-            params.append(data[field])
-
-    if not sets:
-        return jsonify({"error": "Nie je čo aktualizovať."}), 400
-
-    conn = get_conn()
-    try:
-        cur = conn.cursor()
-        params.append(user_id)
-        cur.execute(
-            f"UPDATE users SET {', '.join(sets)} WHERE id_user = %s",
-            tuple(params),
-        )
-        if cur.rowcount == 0:
-            return jsonify({"error": "Používateľ neexistuje alebo je zmazaný."}), 404
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        return jsonify({"error": f"Chyba pri ukladaní profilu: {str(e)}"}), 500
-    finally:
-        cur.close()
-        conn.close()
-
-    # po úspešnom update vrátime aktualizovaný profil
-    return get_profile(user_id)
-
-# ==========================================
-# 🧩 PROFIL – HOBBY GET/PUT
-# ==========================================
-
-@app.get("/api/profile/<int:user_id>/hobbies")
-def get_user_hobbies(user_id: int):
-    conn = get_conn()
-    try:
-        cur = conn.cursor(dictionary=True)
-        cur.execute(
-            """
-            SELECT h.id_hobby, h.nazov, h.id_kategoria, hk.nazov AS kategoria_nazov
-            FROM user_hobby uh
-            JOIN hobby h ON h.id_hobby = uh.id_hobby
-            LEFT JOIN hobby_kategoria hk ON hk.id_kategoria = h.id_kategoria
-            WHERE uh.id_user = %s
-            ORDER BY hk.nazov ASC, h.nazov ASC
-            """,
-            (user_id,),
-        )
-        items = cur.fetchall()
-        return jsonify(items), 200
-    except Exception as e:
-        return jsonify({"error": f"Chyba pri načítaní záľub: {str(e)}"}), 500
-    finally:
-        cur.close()
-        conn.close()
-
-
-@app.put("/api/profile/<int:user_id>/hobbies")
-def put_user_hobbies(user_id: int):
-    data = request.get_json(force=True) or {}
-    hobbies = data.get("hobbies")
-    if not isinstance(hobbies, list):
-        return jsonify({"error": "Pole 'hobbies' musí byť zoznam ID."}), 400
-
-    try:
-        hobby_ids = sorted({int(hid) for hid in hobbies})
-    except Exception:
-        return jsonify({"error": "Neplatné ID v hobbies."}), 400
-
-    conn = get_conn()
-    try:
-        cur = conn.cursor()
-        if hobby_ids:
-            cur.execute(
-                f"SELECT COUNT(*) FROM hobby WHERE id_hobby IN ({','.join(['%s']*len(hobby_ids))})",
-                tuple(hobby_ids),
-            )
-            count = cur.fetchone()[0]
-            if count != len(hobby_ids):
-                return jsonify({"error": "Niektoré hobby ID neexistujú."}), 400
-
-        cur.execute("DELETE FROM user_hobby WHERE id_user = %s", (user_id,))
-        if hobby_ids:
-            cur.executemany(
-                "INSERT INTO user_hobby (id_user, id_hobby) VALUES (%s, %s)",
-                [(user_id, hid) for hid in hobby_ids],
-            )
-        conn.commit()
-        try:
-            generate_and_save_user_embedding(user_id)
-        except Exception as emb_err:
-            logging.warning(
-                "Failed to refresh user embedding for %s: %s",
-                user_id,
-                emb_err,
-            )
-        return jsonify({"success": True, "count": len(hobby_ids)}), 200
-    
-    except Exception as e:
-        conn.rollback()
-        return jsonify({"error": f"Chyba pri ukladaní záľub: {str(e)}"}), 500
-    finally:
-        cur.close()
-        conn.close()
-
-@app.get("/api/match/<int:user_id>")
-def api_match_user(user_id: int):
-    try:
-        top_n = int(request.args.get("top_n", 5))
-    except Exception:
-        top_n = 5
-
-    target_role = request.args.get("role") or None
-    # Read optional distance in kilometers from the request (keeps old behavior if missing).
-    distance_param = request.args.get("distance_km")
-    distance_km = None
-    if distance_param is not None and str(distance_param).strip():
-        try:
-            parsed = float(distance_param)
-            if parsed > 0:
-                distance_km = parsed
-        except (TypeError, ValueError):
-            return jsonify({"error": "Parameter distance_km must be a positive number."}), 400
-
-    try:
-        matches = find_best_matches_for_user(
-            user_id,
-            top_n=max(1, top_n),
-            target_role=target_role,
-            distance_km=distance_km,
-        )
-    except Exception as exc:
-        logging.exception("Failed to match user %s: %s", user_id, exc)
-        return jsonify({"error": str(exc)}), 500
-
-    return jsonify(matches), 200
-
-    
-# ==========================================
-# MATCH ENDPOINT
-# ==========================================
-
-
-# ------------------------------------------
-# ACTIVITIES
-# ------------------------------------------
-
-@app.get("/api/activities")
-def list_activities():
-    page_size = int(request.args.get("page_size", 20))
-    page = int(request.args.get("page", 1))
-    q = request.args.get("q", "").strip()
-    offset = (page - 1) * page_size
-
-    sql = """
-      SELECT id_activity, title, description, image_url, capacity, attendees_count, lat, lng, user_id, created_at
-      FROM activities
-    """
-    params = []
-    if q:
-        sql += " WHERE title LIKE %s OR description LIKE %s"
-        like = f"%{q}%"
-        params.extend([like, like])
-    sql_count = "SELECT COUNT(*) AS total FROM (" + sql + ") t"
-    sql += " ORDER BY created_at DESC LIMIT %s OFFSET %s"
-    params.extend([page_size, offset])
-
-    conn = get_conn()
-    try:
-        cur = conn.cursor(dictionary=True)
-        cur.execute(sql_count, params[:-2] if q else [])
-        total = cur.fetchone()["total"]
-        cur.execute(sql, params)
-        items = cur.fetchall()
-        for item in items:
-            if item.get("image_url"):
-                item["image_url"] = _make_abs(item["image_url"])
-        return jsonify({"items": items, "pagination": {
-            "page": page, "page_size": page_size,
-            "total": total, "pages": (total + page_size - 1)//page_size
-        }})
-    finally:
-        conn.close()
-
-
-import requests
-import logging
-GEOCODE_URL = "https://nominatim.openstreetmap.org/search"
-
-import requests
-import logging
-
-GEOCODE_URL = "https://nominatim.openstreetmap.org/search"
-
-def geocode_address(address: str):
-    params = {
-        "q": address,
-        "format": "json",
-        "limit": 1,
-        "addressdetails": 1,
-    }
-    headers = {
-        "User-Agent": "LifeBridgeApp/1.0 (contact@lifebridge.sk)"
-    }
-
-    try:
-        resp = requests.get(GEOCODE_URL, params=params, headers=headers, timeout=10)
-    except requests.RequestException as e:
-        logging.exception(f"Geocode request failed: {e}")
-        raise ValueError("Nepodarilo sa kontaktovať geokódovaciu službu.")
-
-    if resp.status_code != 200:
-        logging.warning(f"Nominatim HTTP {resp.status_code}: {resp.text[:200]}")
-        raise ValueError("Geokódovanie zlyhalo (chyba služby).")
-
-    try:
-        data = resp.json()
-    except ValueError:
-        logging.warning(f"Nominatim vrátil neplatný JSON: {resp.text[:200]}")
-        raise ValueError("Geokódovanie vrátilo neplatnú odpoveď.")
-
-    if not isinstance(data, list) or len(data) == 0:
-        logging.info(f"Nominatim nenašiel výsledky pre adresu: {address}")
-        raise ValueError("Pre zadanú adresu sa nenašli žiadne súradnice.")
-
-    first = data[0]
-    logging.info(f"Nominatim response for '{address}': {first}")  # DEBUG log
-    
-    lat_str = first.get("lat")
-    lon_str = first.get("lon")
-    
-    if not lat_str or not lon_str:
-        logging.warning(f"Missing lat/lon in response: {first}")
-        raise ValueError("Geokódovanie vrátilo neúplné súradnice.")
-    
-    try:
-        lat = float(lat_str)
-        lng = float(lon_str)
-    except (ValueError, TypeError) as e:
-        logging.warning(f"Chyba pri parsovaní súradníc lat={lat_str}, lon={lon_str}: {e}")
-        raise ValueError("Geokódovanie vrátilo neplatné súradnice.")
-    
-    # Extra validácia rozsahu
-    if not (-90 <= lat <= 90) or not (-180 <= lng <= 180):
-        logging.warning(f"Súradnice mimo rozsahu: lat={lat}, lon={lng}")
-        raise ValueError("Geokódovanie vrátilo súradnice mimo platného rozsahu.")
-
-    return lat, lng
-
-
-@app.post("/api/activities")
-def create_activity():
-    data = request.get_json()
-    title = data.get("title")
-    description = data.get("description")
-    image = data.get("image") or data.get("image_url")
-    capacity = data.get("capacity")
-    user_id = data.get("user_id")
-    address = data.get("address")  # nový vstup z frontendu
-
-    if not title or len(title.strip()) == 0:
-        return jsonify({"error": "Názov je povinný."}), 400
-    if not isinstance(capacity, int) or capacity < 1:
-        return jsonify({"error": "Neplatná kapacita."}), 400
-    if not user_id:
-        return jsonify({"error": "Nepodarilo sa identifikovať používateľa."}), 400
-    if not address or len(address.strip()) == 0:
-        return jsonify({"error": "Adresa je povinná."}), 400
-
-    try:
-        lat, lng = geocode_address(address)
-    except ValueError as e:
-        return jsonify({"error": str(e)}), 400
-    except Exception:
-        return jsonify({"error": "Nepodarilo sa získať súradnice z adresy."}), 502
-
-    # validácia výsledných súradníc (pre istotu)
-    if not (-90 <= lat <= 90) or not (-180 <= lng <= 180):
-        return jsonify({"error": "Geokódovanie vrátilo neplatné súradnice."}), 400
-
-    conn = get_conn()
-    try:
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO activities (title, description, image_url, capacity, lat, lng, user_id)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, (title, description, None, capacity, lat, lng, user_id))
-        activity_id = cur.lastrowid
-        conn.commit()
-
-        if image:
-            if isinstance(image, str) and image.startswith("data:image"):
-                stored = _save_activity_image_from_data_url(conn, activity_id, image)
-                if stored:
-                    image = stored
-            else:
-                image = _make_abs(str(image))
-                cur.execute(
-                    "UPDATE activities SET image_url = %s WHERE id_activity = %s",
-                    (image, activity_id),
-                )
-                conn.commit()
-
-        cur = conn.cursor(dictionary=True)
-        cur.execute("SELECT * FROM activities WHERE id_activity = %s", (activity_id,))
-        row = cur.fetchone()
-        if row and row.get("image_url"):
-            row["image_url"] = _make_abs(row["image_url"])
-        return jsonify(row), 201
-    finally:
-        conn.close()
-
-
-@app.get("/api/activities/<int:activity_id>")
-def get_activity(activity_id: int):
-    conn = get_conn()
-    try:
-        cur = conn.cursor(dictionary=True)
-        cur.execute(
-            """
-            SELECT id_activity, title, description, image_url, capacity, attendees_count, lat, lng, user_id, created_at
-            FROM activities
-            WHERE id_activity = %s
-            """,
-            (activity_id,),
-        )
-        row = cur.fetchone()
-        if not row:
-            return jsonify({"error": "Aktivita neexistuje."}), 404
-        if row.get("image_url"):
-            row["image_url"] = _make_abs(row["image_url"])
-        return jsonify(row), 200
-    finally:
-        cur.close()
-        conn.close()
-
-
-@app.post("/api/activities/<int:activity_id>/image")
-def upload_activity_image(activity_id: int):
-    file = request.files.get("file")
-    if not file or not file.filename:
-        return jsonify({"error": "Súbor nebol dodaný."}), 400
-
-    filename = secure_filename(file.filename)
-    _, ext = os.path.splitext(filename)
-    ext = ext.lower()
-    if ext not in ALLOWED_IMAGE_EXTS:
-        return jsonify({"error": "Nepodporovaný formát. Povolené: jpg, jpeg, png, gif, webp"}), 400
-
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute("SELECT 1 FROM activities WHERE id_activity = %s", (activity_id,))
-        if not cur.fetchone():
-            return jsonify({"error": "Aktivita neexistuje."}), 404
-    finally:
-        cur.close()
-
-    file_uid = str(uuid.uuid4())
-    path = _activity_image_disk_path(file_uid, ext)
-    try:
-        file.save(path)
-    except Exception as exc:
-        return jsonify({"error": f"Ukladanie zlyhalo: {exc}"}), 500
-
-    size_bytes = os.path.getsize(path)
-    storage_path = f"/assets/img/activities/{file_uid}{ext}"
-    storage_url = _make_abs(storage_path)
-
-    cur = None
-    try:
-        _delete_activity_image(conn, activity_id)
-        cur = conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO media_files
-              (owner_type, owner_id, purpose, sort_order, file_uid, file_name, file_ext, mime_type, size_bytes, storage_path)
-            VALUES
-              ('activity', %s, 'activity_image', 0, %s, %s, %s, %s, %s, %s)
-            """,
-            (
-                activity_id,
-                file_uid,
-                filename,
-                ext,
-                file.mimetype or None,
-                size_bytes,
-                storage_path,
-            ),
-        )
-        cur.execute(
-            "UPDATE activities SET image_url = %s WHERE id_activity = %s",
-            (storage_url, activity_id),
-        )
-        conn.commit()
-    except Exception as exc:
-        try:
-            os.remove(path)
-        except Exception:
-            pass
-        return jsonify({"error": f"Ukladanie zlyhalo: {exc}"}), 500
-    finally:
-        if cur:
-            cur.close()
-
-    return jsonify({"url": storage_url, "uid": file_uid, "storage_path": storage_path}), 201
-
-
-@app.get("/api/activities/<int:activity_id>/image")
-def get_activity_image_meta(activity_id: int):
-    conn = get_conn()
-    try:
-        cur = conn.cursor(dictionary=True)
-        cur.execute(
-            """
-            SELECT file_uid, storage_path
-            FROM media_files
-            WHERE owner_type = 'activity' AND owner_id = %s AND purpose = 'activity_image'
-            ORDER BY created_at DESC
-            LIMIT 1
-            """,
-            (activity_id,),
-        )
-        row = cur.fetchone()
-        if row:
-            return jsonify(
-                {
-                    "url": _make_abs(row["storage_path"]),
-                    "storage_path": row["storage_path"],
-                    "uid": row["file_uid"],
-                }
-            ), 200
-
-        cur.execute("SELECT image_url FROM activities WHERE id_activity = %s", (activity_id,))
-        fallback = cur.fetchone()
-        if fallback and fallback[0]:
-            return jsonify({"url": _make_abs(fallback[0]), "uid": None}), 200
-
-        return jsonify({"error": "Obrázok pre aktivitu neexistuje."}), 404
-    finally:
-        cur.close()
-        conn.close()
-
-
-@app.delete("/api/activities/<int:activity_id>/image")
-def delete_activity_image(activity_id: int):
-    conn = get_conn()
-    try:
-        cur = conn.cursor()
-        cur.execute("SELECT 1 FROM activities WHERE id_activity = %s", (activity_id,))
-        exists = cur.fetchone()
-        cur.close()
-        if not exists:
-            return jsonify({"error": "Aktivita neexistuje."}), 404
-
-        _delete_activity_image(conn, activity_id)
-        return jsonify({"success": True}), 200
-    except Exception as exc:
-        logging.warning("Failed to delete activity image: %s", exc)
-        return jsonify({"error": "Nepodarilo sa odstrániť obrázok."}), 500
-    finally:
-        conn.close()
-
-
-@app.put("/api/activities/<int:activity_id>")
-def update_activity(activity_id: int):
-    data = request.get_json(force=True) or {}
-    title = data.get("title")
-    description = data.get("description")
-    capacity = data.get("capacity")
-    image = data.get("image") or data.get("image_url")
-    user_id = data.get("user_id")
-    remove_image = bool(data.get("remove_image"))
-
-    if not user_id:
-        return jsonify({"error": "Chýba user_id."}), 400
-
-    conn = get_conn()
-    cur = conn.cursor(dictionary=True)
-    try:
-        cur.execute("SELECT user_id FROM activities WHERE id_activity = %s", (activity_id,))
-        owner_row = cur.fetchone()
-        if not owner_row:
-            return jsonify({"error": "Aktivita neexistuje."}), 404
-        is_admin = _is_admin_user(conn, int(user_id))
-        if int(owner_row["user_id"]) != int(user_id) and not is_admin:
-            return jsonify({"error": "Nemáš oprávnenie upraviť túto aktivitu."}), 403
-
-        sets = []
-        params: list = []
-
-        if title is not None:
-            if not str(title).strip():
-                return jsonify({"error": "Názov je povinný."}), 400
-            sets.append("title = %s"); params.append(title)
-
-        if description is not None:
-            sets.append("description = %s"); params.append(description)
-
-        if capacity is not None:
-            try:
-                capacity_int = int(capacity)
-            except Exception:
-                return jsonify({"error": "Kapacita musí byť číslo."}), 400
-            if capacity_int < 1:
-                return jsonify({"error": "Kapacita musí byť aspoň 1."}), 400
-            sets.append("capacity = %s"); params.append(capacity_int)
-
-        if image is not None or remove_image:
-            # Handle image update/removal
-            if isinstance(image, str) and image.startswith("data:image"):
-                stored = _save_activity_image_from_data_url(conn, activity_id, image)
-                if not stored:
-                    return jsonify({"error": "Nepodarilo sa uložiť obrázok."}), 400
-                sets.append("image_url = %s"); params.append(stored)
-            elif remove_image or (isinstance(image, str) and not image):
-                _delete_activity_image(conn, activity_id)
-                sets.append("image_url = %s"); params.append(None)
-            elif image:
-                _delete_activity_image(conn, activity_id)
-                abs_url = _make_abs(str(image))
-                sets.append("image_url = %s"); params.append(abs_url)
-
-        if not sets:
-            return jsonify({"error": "Nie je čo aktualizovať."}), 400
-
-        params.append(activity_id)
-        cur.execute(f"UPDATE activities SET {', '.join(sets)} WHERE id_activity = %s", tuple(params))
-        conn.commit()
-
-        cur.execute("SELECT * FROM activities WHERE id_activity = %s", (activity_id,))
-        row = cur.fetchone()
-        if row and row.get("image_url"):
-            row["image_url"] = _make_abs(row["image_url"])
-        return jsonify(row), 200
-    finally:
-        cur.close()
-        conn.close()
-
-
-@app.post("/api/activities/<int:activity_id>/signup")
-def signup_activity(activity_id):
-    data = request.get_json()
-    user_id = data.get("user_id")
-
-    if not user_id:
-        return jsonify({"error": "Nepodarilo sa identifikovat pouzivatela."}), 400
-
-    conn = get_conn()
-    try:
-        cur = conn.cursor()
-        cur.execute("SELECT capacity, attendees_count FROM activities WHERE id_activity = %s FOR UPDATE", (activity_id,))
-        row = cur.fetchone()
-        if row is None:
-            return jsonify({"error": "Aktivita neexistuje."}), 404
-        capacity, attendees_count = row
-        if attendees_count >= capacity:
-            return jsonify({"error": "Kapacita je naplnena."}), 400
-
-        cur.execute("SELECT 1 FROM activity_signups WHERE activity_id = %s AND user_id = %s", (activity_id, user_id))
-        if cur.fetchone() is not None:
-            return jsonify({"error": "Uz ste prihlaseny na tuto aktivitu."}), 400
-
-        # Vytvor prihlasenie + zvys pocet ucastnikov
-        cur.execute("INSERT INTO activity_signups (activity_id, user_id) VALUES (%s, %s)", (activity_id, user_id))
-        cur.execute("UPDATE activities SET attendees_count = attendees_count + 1 WHERE id_activity = %s", (activity_id,))
-        conn.commit()
-
-        cur.execute("SELECT attendees_count FROM activities WHERE id_activity = %s", (activity_id,))
-        attendees_count = cur.fetchone()[0]
-        return jsonify({"attendees_count": attendees_count})
-    finally:
-        conn.close()
-
-@app.delete("/api/activities/<int:activity_id>/signup")
-def cancel_signup(activity_id):
-    data = request.get_json()
-    user_id = data.get("user_id")
-
-    if not user_id:
-        return jsonify({"error": "Nepodarilo sa identifikovat pouzivatela."}), 400
-
-    conn = get_conn()
-    try:
-        cur = conn.cursor()
-        cur.execute("DELETE FROM activity_signups WHERE activity_id = %s AND user_id = %s", (activity_id, user_id))
-        cur.execute("UPDATE activities SET attendees_count = GREATEST(attendees_count - 1, 0) WHERE id_activity = %s", (activity_id,))
-        conn.commit()
-        cur.execute("SELECT attendees_count FROM activities WHERE id_activity = %s", (activity_id,))
-        attendees_count = cur.fetchone()[0]
-        return jsonify({"message": "uspesne odhlaseny", "attendees_count": attendees_count})
-    finally:
-        conn.close()
-
-@app.get("/api/activities/<int:activity_id>/signups")
-def list_activity_signups(activity_id: int):
-    conn = get_conn()
-    try:
-        cur = conn.cursor(dictionary=True)
-        cur.execute(
-            """
-            SELECT u.id_user, u.meno, u.priezvisko, u.rola, s.created_at
-            FROM activity_signups s
-            JOIN users u ON u.id_user = s.user_id
-            WHERE s.activity_id = %s
-            ORDER BY s.created_at ASC
-            """,
-            (activity_id,),
-        )
-        rows = cur.fetchall()
-        return jsonify(rows), 200
-    finally:
-        conn.close()
-
-# ==========================================
-# ARTICLES
-# ==========================================     
-
-@app.get("/api/articles")
-def list_articles():
-    conn = get_conn()
-    try:
-        cur = conn.cursor(dictionary=True)
-        cur.execute("SELECT * FROM articles ORDER BY created_at DESC")
-        rows = cur.fetchall()
-        for row in rows:
-            if row.get("image_url"):
-                row["image_url"] = _make_abs(row["image_url"])
-        return jsonify(rows)
-    finally:
-        conn.close()
-
-@app.get("/api/articles/<int:id_article>")
-def get_article(id_article):
-    conn = get_conn()
-    try:
-        cur = conn.cursor(dictionary=True)
-        cur.execute("SELECT * FROM articles WHERE id_article = %s", (id_article,))
-        article = cur.fetchone()
-        if not article:
-            return jsonify({"error": "Article not found"}), 404
-        if article.get("image_url"):
-            article["image_url"] = _make_abs(article["image_url"])
-        return jsonify(article)
-    finally:
-        conn.close()
-
-@app.delete("/api/activities/<int:activity_id>")
-def delete_activity_record(activity_id: int):
-    data = request.get_json(force=True) or {}
-    user_id = data.get("user_id")
-    if not user_id:
-        return jsonify({"error": "Chyba user_id."}), 400
-
-    conn = get_conn()
-    cur = conn.cursor(dictionary=True)
-    try:
-        cur.execute("SELECT user_id FROM activities WHERE id_activity = %s", (activity_id,))
-        row = cur.fetchone()
-        if not row:
-            return jsonify({"error": "Aktivita neexistuje."}), 404
-        is_admin = _is_admin_user(conn, int(user_id))
-        if int(row["user_id"]) != int(user_id) and not is_admin:
-            return jsonify({"error": "Nemate opravnenie zmazat tuto aktivitu."}), 403
-
-        _delete_activity_image(conn, activity_id)
-        cur.execute("DELETE FROM activity_signups WHERE activity_id = %s", (activity_id,))
-        cur.execute("DELETE FROM activities WHERE id_activity = %s", (activity_id,))
-        conn.commit()
-        return jsonify({"success": True}), 200
-    finally:
-        cur.close()
-        conn.close()
-
-@app.post("/api/articles")
-def create_article():
-    data = request.get_json()
-    title = data.get("title")
-    text = data.get("text")
-    image = data.get("image") or data.get("image_url")
-
-    if not title or not text:
-        return jsonify({"error": "Title and text are required"}), 400
-
-    conn = get_conn()
-    try:
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO articles (title, text, image_url)
-            VALUES (%s, %s, %s)
-        """, (title, text, None))
-        conn.commit()
-
-        new_id = cur.lastrowid
-        if image:
-            if isinstance(image, str) and image.startswith("data:image"):
-                stored = _save_article_image_from_data_url(conn, new_id, image)
-                if stored:
-                    image = stored
-            else:
-                image = _make_abs(str(image))
-                cur.execute("UPDATE articles SET image_url = %s WHERE id_article = %s", (image, new_id))
-                conn.commit()
-
-        return jsonify({"id_article": new_id, "image_url": _make_abs(image) if image else None}), 201
-    finally:
-        conn.close()
-
-
-@app.put("/api/articles/<int:id_article>")
-def update_article(id_article: int):
-    data = request.get_json(force=True) or {}
-    title = data.get("title")
-    text = data.get("text")
-    image = data.get("image") or data.get("image_url")
-    remove_image = bool(data.get("remove_image"))
-
-    if not any([title is not None, text is not None, image is not None, remove_image]):
-        return jsonify({"error": "Nie je co aktualizovat."}), 400
-
-    conn = get_conn()
-    try:
-        cur = conn.cursor(dictionary=True)
-        cur.execute("SELECT 1 FROM articles WHERE id_article = %s", (id_article,))
-        if not cur.fetchone():
-            return jsonify({"error": "Article not found"}), 404
-    finally:
-        cur.close()
-
-    cur = conn.cursor()
-    try:
-        sets = []
-        params = []
-        if title is not None:
-            sets.append("title = %s"); params.append(title)
-        if text is not None:
-            sets.append("text = %s"); params.append(text)
-
-        if image is not None or remove_image:
-            if isinstance(image, str) and image.startswith("data:image"):
-                stored = _save_article_image_from_data_url(conn, id_article, image)
-                if not stored:
-                    return jsonify({"error": "Nepodarilo sa ulozit obrazok."}), 400
-                sets.append("image_url = %s"); params.append(stored)
-            elif remove_image or (isinstance(image, str) and not image):
-                _delete_article_image(conn, id_article)
-                sets.append("image_url = %s"); params.append(None)
-            elif image:
-                _delete_article_image(conn, id_article)
-                abs_url = _make_abs(str(image))
-                sets.append("image_url = %s"); params.append(abs_url)
-
-        if sets:
-            params.append(id_article)
-            cur.execute(f"UPDATE articles SET {', '.join(sets)} WHERE id_article = %s", tuple(params))
-            conn.commit()
-
-        cur.close()
-        cur = conn.cursor(dictionary=True)
-        cur.execute("SELECT * FROM articles WHERE id_article = %s", (id_article,))
-        row = cur.fetchone()
-        if row and row.get("image_url"):
-            row["image_url"] = _make_abs(row["image_url"])
-        return jsonify(row), 200
-    except Exception as exc:
-        try:
-            conn.rollback()
-        except Exception:
-            pass
-        return jsonify({"error": str(exc)}), 500
-    finally:
-        cur.close()
-        conn.close()
-
-
-@app.delete("/api/articles/<int:id_article>")
-def delete_article(id_article: int):
-    conn = get_conn()
-    try:
-        cur = conn.cursor()
-        _delete_article_image(conn, id_article)
-        cur.execute("DELETE FROM articles WHERE id_article = %s", (id_article,))
-        if cur.rowcount == 0:
-            return jsonify({"error": "Article not found"}), 404
-        conn.commit()
-        return jsonify({"success": True}), 200
-    except Exception as exc:
-        try:
-            conn.rollback()
-        except Exception:
-            pass
-        return jsonify({"error": str(exc)}), 500
-    finally:
-        cur.close()
-        conn.close()
-
-@app.post("/api/articles/<int:article_id>/image")
-def upload_article_image(article_id: int):
-    file = request.files.get("file")
-    if not file or not file.filename:
-        return jsonify({"error": "Subor nebol dodany."}), 400
-
-    filename = secure_filename(file.filename)
-    _, ext = os.path.splitext(filename)
-    ext = ext.lower()
-    if ext not in ALLOWED_IMAGE_EXTS:
-        return jsonify({"error": "Nepodporovany format. Povolené: jpg, jpeg, png, gif, webp"}), 400
-
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute("SELECT 1 FROM articles WHERE id_article = %s", (article_id,))
-        if not cur.fetchone():
-            return jsonify({"error": "Article not found"}), 404
-    finally:
-        cur.close()
-
-    file_uid = str(uuid.uuid4())
-    path = _article_image_disk_path(file_uid, ext)
-    try:
-        file.save(path)
-    except Exception as exc:
-        return jsonify({"error": f"Ukladanie zlyhalo: {exc}"}), 500
-
-    size_bytes = os.path.getsize(path)
-    storage_path = f"/assets/img/articles/{file_uid}{ext}"
-    storage_url = _make_abs(storage_path)
-
-    cur = None
-    try:
-        cur = conn.cursor()
-        _delete_article_image(conn, article_id)
-        cur.execute(
-            """
-            INSERT INTO media_files
-              (owner_type, owner_id, purpose, sort_order, file_uid, file_name, file_ext, mime_type, size_bytes, storage_path)
-            VALUES
-              ('article', %s, 'attachment', 0, %s, %s, %s, %s, %s, %s)
-            """,
-            (
-                article_id,
-                file_uid,
-                filename,
-                ext,
-                file.mimetype or None,
-                size_bytes,
-                storage_path,
-            ),
-        )
-        cur.execute("UPDATE articles SET image_url = %s WHERE id_article = %s", (storage_url, article_id))
-        conn.commit()
-    except Exception as exc:
-        try:
-            os.remove(path)
-        except Exception:
-            pass
-        return jsonify({"error": f"Ukladanie zlyhalo: {exc}"}), 500
-    finally:
-        if cur:
-            cur.close()
-
-    return jsonify({"url": storage_url, "uid": file_uid, "storage_path": storage_path}), 201
-
-
-# ==========================================
-# 🚀 MAIN
-# ==========================================
-if __name__ == "__main__":
-    app.run(host="127.0.0.1", port=5000, debug=True)
-
+
+class LRUCache:
+    """Small thread-safe LRU map with optional per-entry TTL and hit/miss counters."""
+
+    _MISSING = object()
+
+    def __init__(self, maxsize: int, ttl_s: float | None = None):
+        self.maxsize = max(1, int(maxsize))
+        self.ttl_s = ttl_s
+        self._data: OrderedDict = OrderedDict()  # key -> (expires_at | None, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, self._MISSING)
+            if entry is not self._MISSING:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl_s: float | None = None) -> None:
+        ttl = self.ttl_s if ttl_s is None else ttl_s
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return default if entry is None else entry[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def pop_where(self, predicate) -> int:
+        """Drop every entry for which predicate(key, value) is true; returns how many."""
+        with self._lock:
+            doomed = [key for key, (_, value) in self._data.items() if predicate(key, value)]
+            for key in doomed:
+                del self._data[key]
+            return len(doomed)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+def encode_cursor(position: dict) -> str:
+    """Opaque pagination token for a keyset position (URL-safe base64 of compact JSON)."""
+    raw = json.dumps(position, separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> dict:
+    """Inverse of encode_cursor; ValueError for anything that is not a cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        position = json.loads(raw.decode("utf-8"))
+    except (ValueError, UnicodeDecodeError, TypeError) as exc:
+        raise ValueError("invalid cursor") from exc
+    if not isinstance(position, dict):
+        raise ValueError("invalid cursor")
+    return position
+
+
+# Keyset pagination over a sort given as keys (sql_expr, descending, row_field, null_as).
+# null_as wraps the expression in COALESCE so NULLs sort (and compare) as that value.
+def _keyset_expr(key) -> str:
+    expr, _, _, null_as = key
+    return expr if null_as is None else f"COALESCE({expr}, {null_as!r})"
+
+
+def keyset_order_sql(keys) -> str:
+    return ", ".join(f"{_keyset_expr(key)} {'DESC' if key[1] else 'ASC'}" for key in keys)
+
+
+def keyset_after_sql(keys, values) -> tuple[str, list]:
+    """Condition for rows strictly after `values` in the keys' order."""
+    ors, params = [], []
+    for i, key in enumerate(keys):
+        parts = []
+        for prev, value in zip(keys[:i], values[:i]):
+            parts.append(f"{_keyset_expr(prev)} = %s")
+            params.append(value)
+        parts.append(f"{_keyset_expr(key)} {'<' if key[1] else '>'} %s")
+        params.append(values[i])
+        ors.append("(" + " AND ".join(parts) + ")")
+    return "(" + " OR ".join(ors) + ")", params
+
+
+def keyset_values(keys, row) -> list:
+    """Sort key values of a result row, as stored in the cursor."""
+    values = []
+    for _, _, field, null_as in keys:
+        value = row.get(field)
+        if value is None:
+            value = null_as
+        elif isinstance(value, Decimal):
+            value = float(value)
+        values.append(value)
+    return values
+
+
+def _cursor_arg(sort_name: str, keys) -> list | None:
+    """Keyset position from ?cursor= for the given sort; ValueError if it belongs to another sort or is malformed."""
+    token = request.args.get("cursor")
+    if not token:
+        return None
+    position = decode_cursor(token)
+    values = position.get("v")
+    if position.get("s") != sort_name or not isinstance(values, list) or len(values) != len(keys):
+        raise ValueError("invalid cursor")
+    if not all(isinstance(v, (int, float, str)) and not isinstance(v, bool) for v in values):
+        raise ValueError("invalid cursor")
+    return values
+
+
+def table_versions(tables) -> tuple[dict[str, int], datetime | None]:
+    """
+    Change versions of the given tables (bumped by triggers on every write) and
+    the latest change time, from the table_versions bookkeeping table.
+
+    Last-Modified only has whole seconds, so while the latest change is still in
+    the current (DB clock) second no time is returned: a later write in the same
+    second would carry the same timestamp and If-Modified-Since could not see it.
+    """
+    placeholders = ", ".join(["%s"] * len(tables))
+    with db_conn() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                f"""
+                SELECT table_name, version, UNIX_TIMESTAMP(updated_at), UNIX_TIMESTAMP()
+                FROM table_versions
+                WHERE table_name IN ({placeholders})
+                """,
+                tuple(tables),
+            )
+            rows = cur.fetchall()
+        finally:
+            cur.close()
+    versions = {name: int(version) for name, version, _, _ in rows}
+    stamps = [float(ts) for _, _, ts, _ in rows if ts is not None]
+    last_modified = None
+    if stamps and int(max(stamps)) < int(rows[0][3]):
+        last_modified = datetime.fromtimestamp(int(max(stamps)), timezone.utc)
+    return versions, last_modified
+
+
+def conditional_get(tables, cache_control: str, vary=None):
+    """
+    ETag / Last-Modified for a read endpoint whose output depends only on `tables`
+    and the query string. A matching If-None-Match (or, without it, If-Modified-Since)
+    answers 304 before the view runs, so neither the query nor the JSON is built.
+    Responses to a change in the current second carry only the ETag (see table_versions).
+    vary() may return extra state the output depends on (e.g. model availability).
+    The versions are left in g.table_versions for the view.
+    """
+    tables = tuple(tables)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                versions, last_modified = table_versions(tables)
+            except Exception as exc:
+                logging.warning("table_versions unavailable, serving %s unconditionally: %s", request.path, exc)
+                return view(*args, **kwargs)
+            # views key process-local caches on these, so a body always matches its ETag
+            g.table_versions = versions
+            tag_source = json.dumps(
+                [request.path, sorted(request.args.items(multi=True)), versions, vary() if vary else None],
+                separators=(",", ":"),
+                default=str,
+            )
+            etag = hashlib.sha256(tag_source.encode("utf-8")).hexdigest()[:32]
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            else:
+                since = request.if_modified_since
+                not_modified = since is not None and last_modified is not None and last_modified <= since
+            if not_modified:
+                resp = app.response_class(status=304)
+            else:
+                resp = app.make_response(view(*args, **kwargs))
+                if resp.status_code != 200:
+                    return resp
+            resp.set_etag(etag, weak=True)
+            if last_modified is not None:
+                resp.last_modified = last_modified
+            resp.headers["Cache-Control"] = cache_control
+            return resp
+
+        return wrapper
+
+    return decorator
+
+
+class ModelWarmingUp(RuntimeError):
+    """The embedding model is still loading in the background."""
+
+
+class ModelDisabled(RuntimeError):
+    """Embedding model is turned off via EMBEDDING_MODEL_MODE=disabled."""
+
+
+class EmbeddingPending(RuntimeError):
+    """The user's vector is queued for the background embedding worker."""
+
+
+class EmbeddingModelProvider:
+    """
+    Thread-safe, lazily initialized SentenceTransformer.
+
+    Modes: "eager" loads at import so a pre-fork server (gunicorn --preload)
+    shares the weights copy-on-write, "lazy" loads on first use and "disabled"
+    never loads. Request handlers can call get(block=False) to kick off a
+    background warmup instead of holding the request thread.
+    """
+
+    def __init__(self, name: str, mode: str):
+        if mode not in {"eager", "lazy", "disabled"}:
+            logging.warning("Unknown EMBEDDING_MODEL_MODE '%s', using lazy", mode)
+            mode = "lazy"
+        self.name = name
+        self.mode = mode
+        self._model = None
+        self._lock = threading.Lock()
+        self._warmup_lock = threading.Lock()
+        self._warmup_thread: threading.Thread | None = None
+        self._error: Exception | None = None
+
+    @property
+    def ready(self) -> bool:
+        return self._model is not None
+
+    @property
+    def status(self) -> str:
+        if self.mode == "disabled":
+            return "disabled"
+        if self._model is not None:
+            return "ready"
+        if self._warmup_thread is not None and self._warmup_thread.is_alive():
+            return "warming_up"
+        if self._error is not None:
+            return "failed"
+        return "cold"
+
+    def _load(self):
+        with self._lock:
+            if self._model is None:
+                # imported here so that importing app.py stays cheap
+                from sentence_transformers import SentenceTransformer
+
+                started = datetime.now()
+                try:
+                    self._model = SentenceTransformer(self.name)
+                except Exception as exc:
+                    self._error = exc
+                    raise
+                self._error = None
+                logging.info(
+                    "Embedding model %s loaded in %.1fs",
+                    self.name,
+                    (datetime.now() - started).total_seconds(),
+                )
+            return self._model
+
+    def _warmup(self):
+        try:
+            self._load()
+        except Exception as exc:
+            logging.warning("Embedding model warmup failed: %s", exc)
+
+    def start_warmup(self) -> None:
+        if self.mode == "disabled" or self._model is not None:
+            return
+        with self._warmup_lock:
+            if self._warmup_thread is not None and self._warmup_thread.is_alive():
+                return
+            self._warmup_thread = threading.Thread(
+                target=self._warmup, name="embedding-model-warmup", daemon=True
+            )
+            self._warmup_thread.start()
+
+    def get(self, block: bool = True):
+        if self.mode == "disabled":
+            raise ModelDisabled("Embedding model is disabled.")
+        model = self._model
+        if model is not None:
+            return model
+        if not block:
+            self.start_warmup()
+            raise ModelWarmingUp("Embedding model is warming up.")
+        return self._load()
+
+    def encode(self, texts, **kwargs):
+        return self.get().encode(texts, **kwargs)
+
+
+embedding_model = EmbeddingModelProvider(EMBEDDING_MODEL_NAME, EMBEDDING_MODEL_MODE)
+if embedding_model.mode == "eager":
+    embedding_model.get()
+
+
+def _format_hobby_text(hobbies) -> str:
+    # canonical form: deduplicated and sorted, so equal hobby sets give equal text
+    hobbies = sorted({h.strip() for h in hobbies if h and h.strip()}, key=str.casefold)
+    if not hobbies:
+        return ""
+    return "Záľuby: " + ", ".join(hobbies) + "."
+
+
+def build_user_hobby_text(conn, user_id: int) -> str:
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "SELECT id_user FROM users WHERE id_user = %s AND soft_del = 0",
+            (user_id,),
+        )
+        if not cur.fetchone():
+            raise ValueError("User not found")
+
+        cur.execute(
+            """
+            SELECT h.nazov
+            FROM user_hobby uh
+            JOIN hobby h ON h.id_hobby = uh.id_hobby
+            WHERE uh.id_user = %s
+            """,
+            (user_id,),
+        )
+        hobbies = [row[0] for row in cur.fetchall()]
+    finally:
+        cur.close()
+
+    return _format_hobby_text(hobbies)
+
+
+def build_hobby_texts_for_users(conn, user_ids) -> dict[int, str]:
+    """Hobby texts for many users in two queries; deleted/unknown users are left out."""
+    user_ids = sorted({int(uid) for uid in user_ids})
+    if not user_ids:
+        return {}
+    placeholders = ", ".join(["%s"] * len(user_ids))
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            f"SELECT id_user FROM users WHERE id_user IN ({placeholders}) AND soft_del = 0",
+            tuple(user_ids),
+        )
+        hobbies: dict[int, list[str]] = {row[0]: [] for row in cur.fetchall()}
+        if not hobbies:
+            return {}
+        cur.execute(
+            f"""
+            SELECT uh.id_user, h.nazov
+            FROM user_hobby uh
+            JOIN hobby h ON h.id_hobby = uh.id_hobby
+            WHERE uh.id_user IN ({placeholders})
+            """,
+            tuple(user_ids),
+        )
+        for uid, name in cur.fetchall():
+            if uid in hobbies:
+                hobbies[uid].append(name)
+    finally:
+        cur.close()
+
+    return {uid: _format_hobby_text(names) for uid, names in hobbies.items()}
+
+
+# Binary embedding format stored in user_embeddings.embedding:
+#   b"LBE" + format version (1 byte) + dtype code (1 byte) + 3 reserved bytes,
+#   followed by the raw little-endian vector. The 8-byte header keeps the payload
+#   aligned for np.frombuffer. Legacy rows hold a JSON list of floats.
+EMBEDDING_BLOB_MAGIC = b"LBE"
+EMBEDDING_BLOB_VERSION = 1
+EMBEDDING_BLOB_HEADER_SIZE = 8
+EMBEDDING_BLOB_DTYPES = {1: np.dtype("<f4"), 2: np.dtype("<f2")}
+EMBEDDING_DTYPE_CODES = {"float32": 1, "float16": 2}
+EMBEDDING_STORAGE_DTYPE = os.getenv("EMBEDDING_STORAGE_DTYPE", "float32").strip().lower()
+if EMBEDDING_STORAGE_DTYPE not in EMBEDDING_DTYPE_CODES:
+    logging.warning("Unknown EMBEDDING_STORAGE_DTYPE '%s', using float32", EMBEDDING_STORAGE_DTYPE)
+    EMBEDDING_STORAGE_DTYPE = "float32"
+
+
+def encode_embedding(vec, dtype: str | None = None) -> bytes:
+    """Serialize a vector into the versioned binary format (float32 by default)."""
+    code = EMBEDDING_DTYPE_CODES[dtype or EMBEDDING_STORAGE_DTYPE]
+    arr = np.asarray(vec).ravel().astype(EMBEDDING_BLOB_DTYPES[code], copy=False)
+    header = EMBEDDING_BLOB_MAGIC + bytes((EMBEDDING_BLOB_VERSION, code, 0, 0, 0))
+    return header + arr.tobytes()
+
+
+def is_legacy_embedding(raw) -> bool:
+    if isinstance(raw, str):
+        return True
+    return bytes(raw[: len(EMBEDDING_BLOB_MAGIC)]) != EMBEDDING_BLOB_MAGIC
+
+
+def decode_embedding(raw) -> np.ndarray:
+    """
+    Read a stored embedding as float32. Understands both the binary format
+    and the legacy JSON text written by older versions.
+    """
+    if raw is None:
+        raise ValueError("Empty embedding")
+    if is_legacy_embedding(raw):
+        return np.asarray(json.loads(raw), dtype=np.float32)
+
+    version = raw[3]
+    if version != EMBEDDING_BLOB_VERSION:
+        raise ValueError(f"Unsupported embedding format version {version}")
+    dtype = EMBEDDING_BLOB_DTYPES.get(raw[4])
+    if dtype is None:
+        raise ValueError(f"Unsupported embedding dtype code {raw[4]}")
+    arr = np.frombuffer(raw, dtype=dtype, offset=EMBEDDING_BLOB_HEADER_SIZE)
+    return arr if dtype == np.float32 else arr.astype(np.float32)
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache keyed by sha256(model name + canonical text).
+
+    A bounded in-process LRU sits in front of the shared embedding_cache table,
+    so users with the same hobby set reuse one vector instead of re-running the model.
+    """
+
+    def __init__(self, model_name: str, maxsize: int):
+        self.model_name = model_name
+        self._lru = LRUCache(maxsize)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def key_for(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\n{text}".encode("utf-8")).hexdigest()
+
+    def lookup_many(self, conn, texts) -> dict[str, np.ndarray]:
+        found: dict[str, np.ndarray] = {}
+        missing: dict[str, str] = {}
+        for text in set(texts):
+            key = self.key_for(text)
+            vec = self._lru.get(key)
+            if vec is not None:
+                found[text] = vec
+            else:
+                missing[key] = text
+        memory_hits = len(found)
+
+        if missing:
+            placeholders = ", ".join(["%s"] * len(missing))
+            cur = conn.cursor()
+            try:
+                cur.execute(
+                    f"""
+                    SELECT cache_key, embedding
+                    FROM embedding_cache
+                    WHERE cache_key IN ({placeholders}) AND model_name = %s
+                    """,
+                    (*missing.keys(), self.model_name),
+                )
+                rows = cur.fetchall()
+            finally:
+                cur.close()
+            for key, raw in rows:
+                try:
+                    vec = decode_embedding(raw)
+                except (TypeError, ValueError):
+                    continue
+                self._lru.set(key, vec)
+                found[missing.pop(key)] = vec
+
+        with self._lock:
+            self.memory_hits += memory_hits
+            self.db_hits += len(found) - memory_hits
+            self.misses += len(missing)
+        return found
+
+    def store_many(self, conn, pairs) -> None:
+        rows = []
+        for text, vec in pairs:
+            key = self.key_for(text)
+            vec = np.asarray(vec, dtype=np.float32)
+            self._lru.set(key, vec)
+            rows.append((key, self.model_name, encode_embedding(vec)))
+        if not rows:
+            return
+        cur = conn.cursor()
+        try:
+            cur.executemany(
+                """
+                INSERT IGNORE INTO embedding_cache (cache_key, model_name, embedding)
+                VALUES (%s, %s, %s)
+                """,
+                rows,
+            )
+            conn.commit()
+        finally:
+            cur.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.db_hits + self.misses
+            hits = self.memory_hits + self.db_hits
+            return {
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "hit_ratio": round(hits / lookups, 4) if lookups else None,
+                "memory": self._lru.stats(),
+            }
+
+
+EMBEDDING_CACHE = EmbeddingCache(
+    EMBEDDING_MODEL_NAME,
+    maxsize=int(os.getenv("EMBEDDING_CACHE_SIZE", "4096")),
+)
+
+
+def encode_texts_cached(conn, texts) -> list[np.ndarray]:
+    """Embed texts in order, calling model.encode only for texts missing from the cache."""
+    texts = list(texts)
+    found = EMBEDDING_CACHE.lookup_many(conn, texts)
+    todo = [text for text in dict.fromkeys(texts) if text not in found]
+    if todo:
+        vectors = embedding_model.encode(todo)
+        fresh = list(zip(todo, vectors))
+        try:
+            EMBEDDING_CACHE.store_many(conn, fresh)
+        except Exception as exc:
+            logging.warning("Embedding cache write failed: %s", exc)
+        found.update((text, np.asarray(vec, dtype=np.float32)) for text, vec in fresh)
+    return [found[text] for text in texts]
+
+
+def _save_user_embeddings(conn, items) -> None:
+    """
+    Upsert (user_id, vector) pairs into user_embeddings as ready and mirror
+    them into EMBEDDING_INDEX.
+    """
+    items = [(int(uid), emb) for uid, emb in items]
+    if not items:
+        return
+    cur = conn.cursor()
+    try:
+        cur.executemany(
+            """
+            INSERT INTO user_embeddings (user_id, embedding, model_name, status)
+            VALUES (%s, %s, %s, 'ready')
+            ON DUPLICATE KEY UPDATE
+              embedding = VALUES(embedding),
+              model_name = VALUES(model_name),
+              status = 'ready',
+              updated_at = CURRENT_TIMESTAMP
+            """,
+            [(uid, encode_embedding(emb), EMBEDDING_MODEL_NAME) for uid, emb in items],
+        )
+        conn.commit()
+        placeholders = ", ".join(["%s"] * len(items))
+        cur.execute(
+            f"SELECT id_user, rola, mesto, soft_del, lat, lng FROM users WHERE id_user IN ({placeholders})",
+            tuple(uid for uid, _ in items),
+        )
+        meta = {row[0]: row[1:] for row in cur.fetchall()}
+    finally:
+        cur.close()
+
+    for uid, emb in items:
+        if uid in meta:
+            role, city, soft_del, lat, lng = meta[uid]
+            EMBEDDING_INDEX.upsert(uid, emb, role=role, city=city, soft_del=bool(soft_del))
+            coords = (float(lat), float(lng)) if lat is not None and lng is not None else None
+            MATCH_CACHE.invalidate_user(uid, role=role, city=city, coords=coords)
+    MATCH_TABLE_QUEUE.enqueue_many(uid for uid, _ in items)
+
+
+def _save_user_embedding(conn, user_id: int, emb) -> None:
+    _save_user_embeddings(conn, [(user_id, emb)])
+
+
+def embed_users(user_ids) -> set[int]:
+    """
+    Compute and store embeddings for a batch of users with one model.encode call.
+    Users without hobbies lose their stored vector. Returns ids that were not embedded
+    because the model is disabled.
+    """
+    with db_conn() as conn:
+        texts = build_hobby_texts_for_users(conn, user_ids)
+        empty = [uid for uid, text in texts.items() if not text.strip()]
+        todo = [(uid, text) for uid, text in texts.items() if text.strip()]
+
+        if empty:
+            placeholders = ", ".join(["%s"] * len(empty))
+            cur = conn.cursor()
+            try:
+                cur.execute(
+                    f"DELETE FROM user_embeddings WHERE user_id IN ({placeholders})",
+                    tuple(empty),
+                )
+                conn.commit()
+            finally:
+                cur.close()
+            for uid in empty:
+                EMBEDDING_INDEX.remove(uid)
+                MATCH_CACHE.invalidate_user(uid)
+            MATCH_TABLE_QUEUE.enqueue_many(empty)
+
+        if not todo:
+            return set()
+        if embedding_model.mode == "disabled":
+            logging.debug("Embedding model disabled, not embedding users %s", [uid for uid, _ in todo])
+            return {uid for uid, _ in todo}
+
+        vectors = encode_texts_cached(conn, [text for _, text in todo])
+        _save_user_embeddings(conn, zip([uid for uid, _ in todo], vectors))
+        return set()
+
+
+def generate_and_save_user_embedding(user_id: int):
+    embed_users([user_id])
+
+
+class CoalescingJobQueue:
+    """
+    Background worker for per-key jobs kept off the request path.
+
+    Repeated enqueues of the same key coalesce into one job and due keys are
+    handed to process_batch together. process_batch returns the keys to retry
+    (raising retries the whole batch); those get exponential backoff. Keys that
+    run out of attempts are passed to on_give_up (outside the lock) so the
+    caller can record it.
+    """
+
+    def __init__(
+        self,
+        process_batch,
+        *,
+        name: str,
+        batch_size: int = 32,
+        linger_s: float = 0.2,
+        max_attempts: int = 5,
+        backoff_s: float = 2.0,
+        max_backoff_s: float = 300.0,
+        on_give_up=None,
+    ):
+        self.name = name
+        self._process_batch = process_batch
+        self._on_give_up = on_give_up
+        self.batch_size = max(1, batch_size)
+        self.linger_s = linger_s
+        self.max_attempts = max_attempts
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self._cond = threading.Condition()
+        self._due: dict = {}       # key -> monotonic time when it may run
+        self._attempts: dict = {}  # key -> failed attempts so far
+        self._inflight: set = set()
+        self._thread: threading.Thread | None = None
+        self._processed = 0
+        self._failed = 0
+        self._batches = 0
+
+    def enqueue(self, key) -> None:
+        with self._cond:
+            # a fresh change resets backoff: run as soon as possible
+            self._due[key] = time.monotonic()
+            self._attempts.pop(key, None)
+            self._ensure_thread()
+            self._cond.notify()
+
+    def enqueue_many(self, keys) -> None:
+        now = time.monotonic()
+        with self._cond:
+            for key in keys:
+                self._due.setdefault(key, now)
+            self._ensure_thread()
+            self._cond.notify()
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-worker", daemon=True)
+            self._thread.start()
+
+    def _take_batch(self) -> list:
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                ready = [k for k, due in self._due.items() if due <= now]
+                if ready:
+                    break
+                timeout = min(self._due.values()) - now if self._due else None
+                self._cond.wait(timeout)
+        # let bursts of updates coalesce into the same batch
+        if self.linger_s and len(ready) < self.batch_size:
+            time.sleep(self.linger_s)
+        with self._cond:
+            now = time.monotonic()
+            ready = sorted((k for k, due in self._due.items() if due <= now), key=self._due.get)
+            batch = ready[: self.batch_size]
+            for key in batch:
+                del self._due[key]
+            self._inflight.update(batch)
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                continue
+            try:
+                failed = set(self._process_batch(batch) or ())
+                error = None
+            except Exception as exc:
+                failed = set(batch)
+                error = exc
+            given_up = []
+            with self._cond:
+                self._batches += 1
+                self._inflight.difference_update(batch)
+                self._processed += len(batch) - len(failed)
+                for key in failed:
+                    if key in self._due:
+                        continue  # re-enqueued meanwhile; the new job covers it
+                    attempts = self._attempts.get(key, 0) + 1
+                    if attempts >= self.max_attempts:
+                        self._attempts.pop(key, None)
+                        self._failed += 1
+                        given_up.append(key)
+                        logging.warning("%s: giving up on %s after %s attempts", self.name, key, attempts)
+                        continue
+                    self._attempts[key] = attempts
+                    delay = min(self.max_backoff_s, self.backoff_s * (2 ** (attempts - 1)))
+                    self._due[key] = time.monotonic() + delay
+                for key in batch:
+                    if key not in failed:
+                        self._attempts.pop(key, None)
+            if error is not None:
+                logging.warning("%s: batch of %s failed: %s", self.name, len(batch), error)
+            if given_up and self._on_give_up is not None:
+                try:
+                    self._on_give_up(given_up)
+                except Exception as exc:
+                    logging.warning("%s: give-up handler failed: %s", self.name, exc)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "pending": len(self._due),
+                "inflight": len(self._inflight),
+                "retrying": len(self._attempts),
+                "processed": self._processed,
+                "failed": self._failed,
+                "batches": self._batches,
+            }
+
+
+def _process_user_embedding_batch(user_ids):
+    # Disabled model: nothing to retry, the rows stay pending until it is enabled.
+    embed_users(user_ids)
+    return ()
+
+
+EMBEDDING_QUEUE = CoalescingJobQueue(
+    _process_user_embedding_batch,
+    name="user-embeddings",
+    batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "32")),
+)
+
+
+def request_user_embedding(conn, user_id: int) -> None:
+    """
+    Mark the user's embedding as pending (no vector yet) or stale (hobbies changed)
+    and schedule it on the background queue.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            INSERT INTO user_embeddings (user_id, embedding, model_name, status)
+            VALUES (%s, NULL, %s, 'pending')
+            ON DUPLICATE KEY UPDATE
+              status = IF(embedding IS NULL, 'pending', 'stale')
+            """,
+            (user_id, EMBEDDING_MODEL_NAME),
+        )
+        conn.commit()
+    finally:
+        cur.close()
+    EMBEDDING_QUEUE.enqueue(user_id)
+
+
+def enqueue_outstanding_embeddings() -> int:
+    """Re-schedule pending/stale rows, e.g. jobs lost when a worker restarted."""
+    with db_conn() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT user_id FROM user_embeddings WHERE status IN ('pending', 'stale')")
+            user_ids = [row[0] for row in cur.fetchall()]
+        finally:
+            cur.close()
+    EMBEDDING_QUEUE.enqueue_many(user_ids)
+    return len(user_ids)
+
+
+def get_user_embedding_vector(conn, user_id: int):
+    """
+    Stored vector of user_id. A vector the index does not know yet (written by
+    another worker or a CLI run) is mirrored into EMBEDDING_INDEX on the way out.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            SELECT e.embedding, u.rola, u.mesto, u.soft_del
+            FROM user_embeddings e
+            JOIN users u ON u.id_user = e.user_id
+            WHERE e.user_id = %s AND e.embedding IS NOT NULL AND e.model_name = %s
+            """,
+            (user_id, EMBEDDING_MODEL_NAME),
+        )
+        row = cur.fetchone()
+    finally:
+        cur.close()
+
+    if not row:
+        return None
+
+    emb = decode_embedding(row[0])
+    if EMBEDDING_INDEX.loaded:
+        try:
+            EMBEDDING_INDEX.upsert(user_id, emb, role=row[1], city=row[2], soft_del=bool(row[3]))
+        except ValueError as exc:
+            logging.warning("Embedding of user %s not indexed: %s", user_id, exc)
+    return emb
+
+
+def cosine_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    denom = np.linalg.norm(a) * np.linalg.norm(b)
+    if denom == 0.0:
+        return 0.0
+    return float(np.dot(a, b) / denom)
+
+
+def _city_key(city) -> str:
+    return (city or "").strip().lower()
+
+
+# Other workers and CLI runs write vectors this process never sees; the index
+# re-reads rows changed since its last sync at most this often (0 = never).
+EMBEDDING_INDEX_REFRESH_SECONDS = float(os.getenv("EMBEDDING_INDEX_REFRESH_SECONDS", "30"))
+# updated_at has one-second precision and in-flight writes commit late, so
+# every refresh looks a little further back than the previous sync.
+EMBEDDING_INDEX_REFRESH_OVERLAP = 5
+
+
+def _db_unix_time(conn) -> int:
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT UNIX_TIMESTAMP()")
+        return int(cur.fetchone()[0])
+    finally:
+        cur.close()
+
+
+class EmbeddingIndex:
+    """
+    Process-wide in-memory copy of user_embeddings used by matching.
+
+    Vectors are L2-normalized and stored row by row in one contiguous float32
+    matrix, so cosine similarity against every user is a single matrix-vector
+    product. user_id, role, city and soft_del live in parallel arrays with the
+    same row order. Capacity grows geometrically so incremental upserts stay cheap.
+    ensure_loaded() periodically pulls in rows other processes changed (refresh()).
+    """
+
+    label = "users"
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._loaded = False
+        self._synced_at = 0  # DB clock (unix seconds) of the last load / refresh
+        self._checked_at = 0.0  # time.monotonic() of the last load / refresh attempt
+        self._size = 0
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._user_ids = np.zeros(0, dtype=np.int64)
+        self._roles = np.zeros(0, dtype=object)
+        self._cities = np.zeros(0, dtype=np.int32)
+        self._soft_del = np.zeros(0, dtype=bool)
+        self._row_by_user: dict[int, int] = {}
+        # city names are interned to small ints so filtering stays vectorized
+        self._city_codes: dict[str, int] = {"": 0}
+        self._city_names: list[str] = [""]
+
+    def _city_code(self, city) -> int:
+        key = _city_key(city)
+        code = self._city_codes.get(key)
+        if code is None:
+            code = len(self._city_names)
+            self._city_codes[key] = code
+            self._city_names.append(key)
+        return code
+
+    @staticmethod
+    def _normalize(vec) -> np.ndarray:
+        arr = np.asarray(vec, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(arr))
+        if norm > 0.0:
+            arr = arr / norm
+        return arr
+
+    def _reserve(self, rows: int, dim: int) -> None:
+        capacity = self._matrix.shape[0]
+        if self._matrix.shape[1] != dim:
+            if self._size:
+                raise ValueError(
+                    f"Embedding dimension mismatch: index has {self._matrix.shape[1]}, got {dim}"
+                )
+            capacity = 0
+            self._matrix = np.zeros((0, dim), dtype=np.float32)
+        if rows <= capacity:
+            return
+        new_capacity = max(rows, capacity * 2, 64)
+        matrix = np.zeros((new_capacity, dim), dtype=np.float32)
+        matrix[: self._size] = self._matrix[: self._size]
+        self._matrix = matrix
+        for name, dtype in (("_user_ids", np.int64), ("_roles", object), ("_cities", np.int32), ("_soft_del", bool)):
+            old = getattr(self, name)
+            grown = np.zeros(new_capacity, dtype=dtype)
+            grown[: self._size] = old[: self._size]
+            setattr(self, name, grown)
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _load_rows(self, conn, since: int | None = None) -> list[tuple]:
+        """
+        (id, raw embedding, role, city, soft_del) for every stored vector. With
+        since (unix seconds) the raw embedding is NULL for rows not updated since then.
+        """
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                """
+                SELECT e.user_id,
+                       IF(%s IS NULL OR e.updated_at >= FROM_UNIXTIME(%s), e.embedding, NULL),
+                       u.rola, u.mesto, u.soft_del
+                FROM user_embeddings e
+                JOIN users u ON u.id_user = e.user_id
+                WHERE e.embedding IS NOT NULL AND e.model_name = %s
+                """,
+                (since, since, EMBEDDING_MODEL_NAME),
+            )
+            return cur.fetchall()
+        finally:
+            cur.close()
+
+    def load(self, conn) -> None:
+        """Replace the index content with every stored embedding."""
+        synced_at = _db_unix_time(conn)
+        rows = self._load_rows(conn)
+        vectors = []
+        user_ids, roles, cities, soft_del = [], [], [], []
+        for user_id, raw, role, city, deleted in rows:
+            try:
+                vec = self._normalize(decode_embedding(raw))
+            except (TypeError, ValueError) as exc:
+                logging.warning("Skipping unreadable embedding for user %s: %s", user_id, exc)
+                continue
+            if vectors and vec.shape[0] != vectors[0].shape[0]:
+                logging.warning("Skipping embedding for user %s with dimension %s", user_id, vec.shape[0])
+                continue
+            vectors.append(vec)
+            user_ids.append(int(user_id))
+            roles.append(role)
+            cities.append(city)
+            soft_del.append(bool(deleted))
+
+        with self._lock:
+            dim = vectors[0].shape[0] if vectors else 0
+            self._matrix = np.vstack(vectors).astype(np.float32, copy=False) if vectors else np.zeros((0, 0), dtype=np.float32)
+            self._user_ids = np.asarray(user_ids, dtype=np.int64)
+            self._roles = np.asarray(roles, dtype=object)
+            self._cities = np.asarray([self._city_code(c) for c in cities], dtype=np.int32)
+            self._soft_del = np.asarray(soft_del, dtype=bool)
+            self._size = len(user_ids)
+            self._row_by_user = {uid: i for i, uid in enumerate(user_ids)}
+            self._synced_at = synced_at
+            self._checked_at = time.monotonic()
+            self._loaded = True
+        logging.info("Embedding index loaded: %s %s, dim %s", self._size, self.label, dim)
+
+    def refresh(self, conn) -> int:
+        """
+        Apply what other processes changed since the last sync: vectors updated
+        since then are (re)indexed, role / city / soft_del are re-read for every
+        row and ids whose vector is gone are removed. Returns the number of
+        vectors updated or removed.
+        """
+        synced_at = _db_unix_time(conn)
+        with self._lock:
+            known = set(self._row_by_user)
+        rows = self._load_rows(conn, since=self._synced_at - EMBEDDING_INDEX_REFRESH_OVERLAP)
+        seen = set()
+        updated = 0
+        for row_id, raw, role, city, deleted in rows:
+            row_id = int(row_id)
+            seen.add(row_id)
+            if raw is None:
+                self.update_meta(row_id, role=role, city=city, soft_del=bool(deleted))
+                continue
+            try:
+                self.upsert(row_id, decode_embedding(raw), role=role, city=city, soft_del=bool(deleted))
+            except (TypeError, ValueError) as exc:
+                logging.warning("Skipping embedding of %s %s: %s", self.label, row_id, exc)
+                continue
+            updated += 1
+        # only ids indexed before the query: vectors saved meanwhile by this process stay
+        for row_id in known - seen:
+            self.remove(row_id)
+        self._synced_at = synced_at
+        if updated or known - seen:
+            logging.info(
+                "Embedding index refreshed: %s %s updated, %s removed", updated, self.label, len(known - seen)
+            )
+        return updated + len(known - seen)
+
+    def ensure_loaded(self) -> None:
+        """Load on first use, then refresh at most every EMBEDDING_INDEX_REFRESH_SECONDS."""
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    with db_conn() as conn:
+                        self.load(conn)
+            return
+        if EMBEDDING_INDEX_REFRESH_SECONDS <= 0:
+            return
+        if time.monotonic() - self._checked_at < EMBEDDING_INDEX_REFRESH_SECONDS:
+            return
+        if not self._refresh_lock.acquire(blocking=False):
+            return  # another thread is refreshing; serve the current content
+        try:
+            self._checked_at = time.monotonic()
+            with db_conn() as conn:
+                self.refresh(conn)
+        except Exception as exc:
+            logging.warning("Embedding index (%s) refresh failed: %s", self.label, exc)
+        finally:
+            self._refresh_lock.release()
+
+    def upsert(self, user_id: int, vec, *, role=None, city=None, soft_del: bool = False) -> None:
+        arr = self._normalize(vec)
+        with self._lock:
+            row = self._row_by_user.get(user_id)
+            if row is None:
+                self._reserve(self._size + 1, arr.shape[0])
+                row = self._size
+                self._size += 1
+                self._row_by_user[user_id] = row
+            elif self._matrix.shape[1] != arr.shape[0]:
+                raise ValueError(
+                    f"Embedding dimension mismatch: index has {self._matrix.shape[1]}, got {arr.shape[0]}"
+                )
+            self._matrix[row] = arr
+            self._user_ids[row] = user_id
+            self._roles[row] = role
+            self._cities[row] = self._city_code(city)
+            self._soft_del[row] = bool(soft_del)
+
+    def update_meta(self, user_id: int, **fields) -> None:
+        """Update role / city / soft_del of an indexed user without touching the vector."""
+        with self._lock:
+            row = self._row_by_user.get(user_id)
+            if row is None:
+                return
+            if "role" in fields:
+                self._roles[row] = fields["role"]
+            if "city" in fields:
+                self._cities[row] = self._city_code(fields["city"])
+            if "soft_del" in fields:
+                self._soft_del[row] = bool(fields["soft_del"])
+
+    def remove(self, user_id: int) -> None:
+        with self._lock:
+            row = self._row_by_user.pop(user_id, None)
+            if row is None:
+                return
+            last = self._size - 1
+            if row != last:
+                # keep rows contiguous: move the last row into the freed slot
+                self._matrix[row] = self._matrix[last]
+                self._user_ids[row] = self._user_ids[last]
+                self._roles[row] = self._roles[last]
+                self._cities[row] = self._cities[last]
+                self._soft_del[row] = self._soft_del[last]
+                self._row_by_user[int(self._user_ids[row])] = row
+            self._size = last
+
+    def snapshot(self, cities_of=None):
+        """
+        Copy of the rows that can take part in matching (not soft-deleted):
+        (user_ids, matrix, roles, city codes). cities_of limits the copy to the
+        cities of those users.
+        """
+        with self._lock:
+            n = self._size
+            mask = ~self._soft_del[:n]
+            if cities_of is not None:
+                rows = [self._row_by_user[u] for u in cities_of if u in self._row_by_user]
+                codes = np.setdiff1d(self._cities[rows], [0])
+                mask &= np.isin(self._cities[:n], codes)
+            active = np.flatnonzero(mask)
+            return (
+                self._user_ids[active].copy(),
+                self._matrix[active].copy(),
+                self._roles[active].copy(),
+                self._cities[active].copy(),
+            )
+
+    def get_vector(self, user_id: int) -> np.ndarray | None:
+        with self._lock:
+            row = self._row_by_user.get(user_id)
+            if row is None:
+                return None
+            return self._matrix[row].copy()
+
+    def search(
+        self,
+        query,
+        k: int,
+        *,
+        exclude_user_id: int | None = None,
+        role: str | None = None,
+        cities: set[str] | None = None,
+        user_ids=None,
+    ) -> list[tuple[int, float]]:
+        """
+        Return up to k (user_id, cosine similarity) pairs, best first.
+        Soft-deleted users are always skipped; role / cities / user_ids narrow the candidates.
+        """
+        if k <= 0:
+            return []
+        q = self._normalize(query)
+        with self._lock:
+            n = self._size
+            if n == 0 or self._matrix.shape[1] != q.shape[0]:
+                return []
+            mask = ~self._soft_del[:n]
+            if exclude_user_id is not None:
+                mask &= self._user_ids[:n] != exclude_user_id
+            if role:
+                mask &= self._roles[:n] == role
+            if cities is not None:
+                keys = {_city_key(c) for c in cities}
+                codes = [self._city_codes[c] for c in keys if c in self._city_codes]
+                mask &= np.isin(self._cities[:n], codes)
+            if user_ids is not None:
+                rows = [self._row_by_user[u] for u in user_ids if u in self._row_by_user]
+                allowed = np.zeros(n, dtype=bool)
+                allowed[rows] = True
+                mask &= allowed
+            candidates = np.flatnonzero(mask)
+            if candidates.size == 0:
+                return []
+            cand_scores = (self._matrix[:n] @ q)[candidates]
+            k = min(k, candidates.size)
+            top = np.argpartition(-cand_scores, k - 1)[:k]
+            top = top[np.argsort(-cand_scores[top], kind="stable")]
+            user_ids = self._user_ids[candidates[top]]
+            return [(int(uid), float(cand_scores[i])) for uid, i in zip(user_ids, top)]
+
+
+EMBEDDING_INDEX = EmbeddingIndex()
+
+
+# City coordinates are resolved offline first: in-process cache -> bundled
+# gazetteer (data/sk_obce.csv) -> city_coordinates table -> Nominatim fallback,
+# whose answers are written back to the table for every worker.
+CITY_COORD_CACHE = LRUCache(int(os.getenv("CITY_COORD_CACHE_SIZE", "4096")))
+GAZETTEER_PATH = os.getenv(
+    "GAZETTEER_PATH",
+    os.path.join(os.path.dirname(__file__), "data", "sk_obce.csv"),
+)
+_GAZETTEER: dict[str, tuple[float, float]] | None = None
+_GAZETTEER_LOCK = threading.Lock()
+_CITY_RESOLVER = ThreadPoolExecutor(max_workers=1, thread_name_prefix="city-geocode")
+_CITY_RESOLVER_PENDING: set[str] = set()
+_CITY_RESOLVER_LOCK = threading.Lock()
+
+
+def _place_key(name) -> str:
+    """Normalized lookup key: no diacritics, lowercase, single spaces."""
+    folded = unicodedata.normalize("NFKD", str(name or ""))
+    folded = "".join(ch for ch in folded if not unicodedata.combining(ch))
+    folded = re.sub(r"[\s\-–]+", " ", folded.lower())
+    return folded.strip()
+
+
+def _read_gazetteer_file(path: str) -> list[tuple[str, float, float]]:
+    places = []
+    with open(path, "r", encoding="utf-8", newline="") as fh:
+        for row in csv.DictReader(fh):
+            try:
+                places.append((row["name"].strip(), float(row["lat"]), float(row["lng"])))
+            except (KeyError, TypeError, ValueError):
+                logging.warning("Skipping malformed gazetteer row: %s", row)
+    return places
+
+
+def _gazetteer() -> dict[str, tuple[float, float]]:
+    global _GAZETTEER
+    if _GAZETTEER is None:
+        with _GAZETTEER_LOCK:
+            if _GAZETTEER is None:
+                try:
+                    places = _read_gazetteer_file(GAZETTEER_PATH)
+                except OSError as exc:
+                    logging.warning("Gazetteer %s not available: %s", GAZETTEER_PATH, exc)
+                    places = []
+                _GAZETTEER = {_place_key(name): (lat, lng) for name, lat, lng in places}
+    return _GAZETTEER
+
+
+def _lookup_city_rows(conn, keys) -> dict[str, tuple[float, float]]:
+    keys = list(keys)
+    if not keys:
+        return {}
+    placeholders = ", ".join(["%s"] * len(keys))
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            f"SELECT name_key, lat, lng FROM city_coordinates WHERE name_key IN ({placeholders})",
+            tuple(keys),
+        )
+        return {row[0]: (float(row[1]), float(row[2])) for row in cur.fetchall()}
+    finally:
+        cur.close()
+
+
+def _store_city_coordinates(conn, name: str, coords: tuple[float, float], source: str) -> None:
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            INSERT INTO city_coordinates (name_key, name, lat, lng, source)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+              lat = VALUES(lat), lng = VALUES(lng), source = VALUES(source), updated_at = CURRENT_TIMESTAMP
+            """,
+            (_place_key(name), name.strip(), coords[0], coords[1], source),
+        )
+        conn.commit()
+    finally:
+        cur.close()
+
+
+def _fill_user_coordinates(conn, city_name: str, coords: tuple[float, float]) -> int:
+    """Copy resolved city coordinates onto users in that city that have none yet."""
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "UPDATE users SET lat = %s, lng = %s WHERE mesto = %s AND lat IS NULL",
+            (coords[0], coords[1], city_name),
+        )
+        conn.commit()
+        return cur.rowcount
+    finally:
+        cur.close()
+
+
+def _set_user_coordinates(conn, user_id: int, city_name: str | None) -> tuple[float, float] | None:
+    """
+    Store coordinates for the user's city on the users row. Offline lookup only;
+    unknown cities leave lat/lng NULL and are filled in by the background resolver.
+    """
+    coords = get_city_coordinates(city_name, allow_network=False, conn=conn) if city_name else None
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "UPDATE users SET lat = %s, lng = %s WHERE id_user = %s",
+            (coords[0] if coords else None, coords[1] if coords else None, user_id),
+        )
+        conn.commit()
+    finally:
+        cur.close()
+    return coords
+
+
+def _geocode_city_online(city_name: str) -> tuple[float, float] | None:
+    try:
+        lat, lng = geocode_address(city_name)
+    except Exception as exc:
+        logging.warning("Failed to geocode city '%s': %s", city_name, exc)
+        return None
+    try:
+        with db_conn() as conn:
+            _store_city_coordinates(conn, city_name, (lat, lng), "nominatim")
+            _fill_user_coordinates(conn, city_name, (lat, lng))
+    except Exception as exc:
+        logging.warning("Could not store coordinates for '%s': %s", city_name, exc)
+    CITY_COORD_CACHE.set(_place_key(city_name), (lat, lng))
+    return lat, lng
+
+
+def _resolve_city_in_background(city_name: str) -> None:
+    key = _place_key(city_name)
+    try:
+        _geocode_city_online(city_name)
+    finally:
+        with _CITY_RESOLVER_LOCK:
+            _CITY_RESOLVER_PENDING.discard(key)
+
+
+def schedule_city_geocode(city_name: str) -> None:
+    """Resolve an unknown city via Nominatim off the request thread (deduplicated)."""
+    key = _place_key(city_name)
+    if not key:
+        return
+    with _CITY_RESOLVER_LOCK:
+        if key in _CITY_RESOLVER_PENDING:
+            return
+        _CITY_RESOLVER_PENDING.add(key)
+    _CITY_RESOLVER.submit(_resolve_city_in_background, city_name)
+
+
+def get_cities_coordinates(
+    city_names,
+    conn=None,
+    allow_network: bool = False,
+    schedule_missing: bool = True,
+) -> dict[str, tuple[float, float]]:
+    """
+    Coordinates for many cities, keyed by the name as passed in. Offline sources
+    are queried in bulk; unknown cities are geocoded online only when
+    allow_network is set, otherwise they are scheduled in the background
+    (unless schedule_missing is False) and skipped.
+    """
+    result: dict[str, tuple[float, float]] = {}
+    unresolved: dict[str, list[str]] = {}
+    gazetteer = _gazetteer()
+    for name in set(city_names):
+        key = _place_key(name)
+        if not key:
+            continue
+        coords = CITY_COORD_CACHE.get(key) or gazetteer.get(key)
+        if coords:
+            CITY_COORD_CACHE.set(key, coords)
+            result[name] = coords
+        else:
+            unresolved.setdefault(key, []).append(name)
+
+    if unresolved:
+        try:
+            if conn is None:
+                with db_conn() as own_conn:
+                    rows = _lookup_city_rows(own_conn, unresolved)
+            else:
+                rows = _lookup_city_rows(conn, unresolved)
+        except Exception as exc:
+            logging.warning("city_coordinates lookup failed: %s", exc)
+            rows = {}
+        for key, coords in rows.items():
+            CITY_COORD_CACHE.set(key, coords)
+            for name in unresolved.pop(key, []):
+                result[name] = coords
+
+    for names in unresolved.values():
+        name = names[0]
+        if allow_network:
+            coords = _geocode_city_online(name)
+            if coords:
+                for alias in names:
+                    result[alias] = coords
+        elif schedule_missing:
+            schedule_city_geocode(name)
+    return result
+
+
+def get_city_coordinates(city_name: str, allow_network: bool = True, conn=None) -> tuple[float, float] | None:
+    """
+    Coordinates for one city. Offline sources first; Nominatim only as a
+    fallback (skipped, but scheduled in the background, when allow_network is False).
+    """
+    if not city_name or not city_name.strip():
+        return None
+    return get_cities_coordinates([city_name], conn=conn, allow_network=allow_network).get(city_name)
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Compute distance between two lat/lon pairs in kilometers."""
+    R = 6371.0
+    d_lat = radians(lat2 - lat1)
+    d_lon = radians(lon2 - lon1)
+    a = (
+        sin(d_lat / 2) ** 2
+        + cos(radians(lat1)) * cos(radians(lat2)) * sin(d_lon / 2) ** 2
+    )
+    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+    return R * c
+
+
+def haversine_km_many(lat: float, lon: float, lats, lons) -> np.ndarray:
+    """Distances in kilometers from one point to arrays of points, in one NumPy pass."""
+    lat1 = np.radians(lat)
+    lat2 = np.radians(np.asarray(lats, dtype=np.float64))
+    d_lat = lat2 - lat1
+    d_lon = np.radians(np.asarray(lons, dtype=np.float64) - lon)
+    a = np.sin(d_lat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(d_lon / 2) ** 2
+    return 6371.0 * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def bounding_box(lat: float, lon: float, radius_km: float) -> tuple[float, float, float, float]:
+    """(min_lat, max_lat, min_lng, max_lng) enclosing a circle of radius_km around the point."""
+    d_lat = degrees(radius_km / 6371.0)
+    cos_lat = cos(radians(lat))
+    d_lon = 180.0 if cos_lat < 1e-6 else min(180.0, degrees(radius_km / (6371.0 * cos_lat)))
+    return (
+        max(-90.0, lat - d_lat),
+        min(90.0, lat + d_lat),
+        lon - d_lon,
+        lon + d_lon,
+    )
+
+
+def users_within_radius(conn, lat: float, lon: float, radius_km: float, exclude_user_id: int | None = None) -> dict[int, float]:
+    """
+    {user_id: distance_km} for active users within radius_km. The lat/lng bounding
+    box is evaluated in SQL (idx_users_lat_lng), exact distances in NumPy.
+    """
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lon, radius_km)
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            SELECT id_user, lat, lng FROM users
+            WHERE lat BETWEEN %s AND %s AND lng BETWEEN %s AND %s
+              AND soft_del = 0 AND id_user <> %s
+            """,
+            (min_lat, max_lat, min_lng, max_lng, exclude_user_id or 0),
+        )
+        rows = cur.fetchall()
+    finally:
+        cur.close()
+    if not rows:
+        return {}
+    ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    coords = np.array([(float(r[1]), float(r[2])) for r in rows], dtype=np.float64)
+    dist = haversine_km_many(lat, lon, coords[:, 0], coords[:, 1])
+    keep = dist <= radius_km
+    return {int(uid): float(d) for uid, d in zip(ids[keep], dist[keep])}
+
+
+MATCH_DISTANCE_BUCKET_KM = float(os.getenv("MATCH_DISTANCE_BUCKET_KM", "5"))
+
+
+def match_distance_bucket(distance_km: float | None) -> float | None:
+    """Round a radius up to the cache granularity (MATCH_DISTANCE_BUCKET_KM)."""
+    if distance_km is None:
+        return None
+    return float(ceil(distance_km / MATCH_DISTANCE_BUCKET_KM) * MATCH_DISTANCE_BUCKET_KM)
+
+
+class MatchResultCache:
+    """
+    TTL/LRU cache of ranked match lists keyed by (user_id, role, distance bucket, top_n).
+
+    Each entry remembers its owner's city/coordinates and the users it returned,
+    so a change to one user only drops the lists it can affect: the user's own
+    lists, lists that contain the user, and lists whose city or radius covers
+    the user's (new) location. A generation counter keeps a computation that
+    raced with an invalidation from being stored.
+    """
+
+    def __init__(self, maxsize: int, ttl_s: float):
+        self._lru = LRUCache(maxsize, ttl_s=ttl_s)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._seq = 0
+        self._epoch = format(int(time.time()), "x")
+        self.invalidations = 0
+
+    @staticmethod
+    def key(user_id: int, role: str | None, distance_km: float | None, top_n: int):
+        return (int(user_id), role or None, match_distance_bucket(distance_km), int(top_n))
+
+    def get(self, key):
+        return self._lru.get(key)
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def store(self, key, items, *, generation: int, city: str | None, coords, complete: bool = True) -> dict:
+        """complete=False marks a list cut at top_n (more candidates were in range)."""
+        with self._lock:
+            self._seq += 1
+            entry = {
+                "version": f"{self._epoch}.{self._seq}",
+                "items": items,
+                "complete": complete,
+                "owner": key[0],
+                "role": key[1],
+                "radius": key[2],
+                "city": _city_key(city) if city else None,
+                "coords": coords,
+                "members": frozenset(item["id_user"] for item in items),
+            }
+            stale = generation != self._generation
+        if not stale:
+            self._lru.set(key, entry)
+        return entry
+
+    def invalidate_user(self, user_id: int, *, role: str | None = None, city: str | None = None, coords=None) -> int:
+        """
+        Drop entries affected by a change to user_id. Pass the user's role, city and
+        coordinates when the user may have become a new candidate somewhere.
+        """
+        user_id = int(user_id)
+        city_key = _city_key(city) if city else None
+
+        def affected(_key, entry) -> bool:
+            if entry["owner"] == user_id or user_id in entry["members"]:
+                return True
+            if entry["role"] and role and entry["role"] != role:
+                return False
+            if entry["radius"] is None:
+                return city_key is not None and entry["city"] == city_key
+            if coords is None or entry["coords"] is None:
+                return False
+            owner_lat, owner_lng = entry["coords"]
+            return haversine_km(owner_lat, owner_lng, coords[0], coords[1]) <= entry["radius"]
+
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+        return self._lru.pop_where(affected)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+        self._lru.clear()
+
+    def stats(self) -> dict:
+        return {**self._lru.stats(), "invalidations": self.invalidations}
+
+
+MATCH_CACHE = MatchResultCache(
+    maxsize=int(os.getenv("MATCH_CACHE_SIZE", "2048")),
+    ttl_s=float(os.getenv("MATCH_CACHE_TTL_S", "300")),
+)
+
+
+def cached_matches_for_user(
+    user_id: int,
+    top_n: int = 5,
+    target_role: str | None = None,
+    distance_km: float | None = None,
+) -> tuple[list[dict], str, bool]:
+    """
+    find_best_matches_for_user through MATCH_CACHE. Lists are computed for the
+    rounded-up distance bucket and trimmed to the requested radius on the way out.
+    When the trim leaves fewer than top_n of a list that was cut at top_n, closer
+    but lower-ranked users may be missing, so the exact radius is computed (and
+    cached) instead. Items carry the exact distance; serialize them with
+    match_item_json. Returns (items, version, cache_hit).
+    """
+    key = MatchResultCache.key(user_id, target_role, distance_km, top_n)
+    entry, hit = _cached_match_entry(key)
+    items = entry["items"]
+    if distance_km is None or float(distance_km) == key[2]:
+        return items, entry["version"], hit
+    items = [item for item in items if item["distance_km"] <= distance_km]
+    if len(items) < top_n and not entry["complete"]:
+        entry, hit = _cached_match_entry(key[:2] + (float(distance_km),) + key[3:])
+        items = entry["items"]
+    return items, entry["version"], hit
+
+
+def match_item_json(item: dict) -> dict:
+    """Response form of a match item: distance_km rounded to 0.1 km."""
+    if item.get("distance_km") is None:
+        return item
+    return {**item, "distance_km": round(item["distance_km"], 1)}
+
+
+def _cached_match_entry(key) -> tuple[dict, bool]:
+    """MATCH_CACHE entry for key (user_id, role, radius, top_n), computed on a miss."""
+    entry = MATCH_CACHE.get(key)
+    if entry is not None:
+        return entry, True
+    generation = MATCH_CACHE.generation()
+    scope: dict = {}
+    items = find_best_matches_for_user(
+        key[0],
+        top_n=key[3],
+        target_role=key[1],
+        distance_km=key[2],
+        scope=scope,
+    )
+    entry = MATCH_CACHE.store(
+        key,
+        items,
+        generation=generation,
+        city=scope.get("city"),
+        coords=scope.get("coords"),
+        complete=scope.get("complete", True),
+    )
+    return entry, False
+
+
+def find_best_matches_for_user(
+    user_id: int,
+    top_n: int = 5,
+    target_role: str | None = None,
+    distance_km: float | None = None,
+    scope: dict | None = None,
+):
+    EMBEDDING_INDEX.ensure_loaded()
+    with db_conn() as conn:
+        emb = EMBEDDING_INDEX.get_vector(user_id)
+        if emb is None:
+            emb = get_user_embedding_vector(conn, user_id)
+        if emb is None:
+            text = build_user_hobby_text(conn, user_id)
+            if not text.strip() or embedding_model.mode == "disabled":
+                return []
+
+            # never encode on the request thread: hand it to the background worker
+            request_user_embedding(conn, user_id)
+            if not embedding_model.ready:
+                embedding_model.start_warmup()
+                raise ModelWarmingUp("Embedding model is warming up.")
+            raise EmbeddingPending(f"Embedding for user {user_id} is being computed.")
+
+        # Ensure we only consider users from the same city as the current user.
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                "SELECT mesto, lat, lng FROM users WHERE id_user = %s AND soft_del = 0",
+                (user_id,),
+            )
+            city_row = cur.fetchone()
+        finally:
+            cur.close()
+
+        if not city_row:
+            return []
+
+        current_city = city_row[0]
+        if scope is not None:
+            scope["city"] = current_city
+        if not current_city:
+            # No city info -> do not recommend cross-city users.
+            return []
+
+        distances_by_user: dict[int, float] = {}
+        if distance_km is None:
+            allowed_cities = {_city_key(current_city)}
+            allowed_users = None
+        else:
+            if city_row[1] is not None and city_row[2] is not None:
+                current_coords = (float(city_row[1]), float(city_row[2]))
+            else:
+                # Offline lookups only; unknown cities are geocoded in the background.
+                current_coords = get_city_coordinates(current_city, allow_network=False, conn=conn)
+            if scope is not None:
+                scope["coords"] = current_coords
+            if not current_coords:
+                # Without coordinates we cannot apply distance filter.
+                return []
+            distances_by_user = users_within_radius(
+                conn, current_coords[0], current_coords[1], distance_km, exclude_user_id=user_id
+            )
+            if not distances_by_user:
+                return []
+            allowed_cities = None
+            allowed_users = distances_by_user.keys()
+
+        # Rank candidates by hobby/interest similarity (cosine) straight from the index.
+        hits = EMBEDDING_INDEX.search(
+            emb,
+            top_n,
+            exclude_user_id=user_id,
+            role=target_role,
+            cities=allowed_cities,
+            user_ids=allowed_users,
+        )
+        if scope is not None:
+            scope["complete"] = len(hits) < top_n
+        if not hits:
+            return []
+
+        placeholders = ", ".join(["%s"] * len(hits))
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute(
+                f"""
+                SELECT u.id_user, u.meno, u.priezvisko, u.mail, u.rola, u.mesto
+                FROM users u
+                WHERE u.id_user IN ({placeholders}) AND u.soft_del = 0
+                """,
+                tuple(uid for uid, _ in hits),
+            )
+            users_by_id = {row["id_user"]: row for row in cur.fetchall()}
+        finally:
+            cur.close()
+
+        results = []
+        for other_id, sim in hits:
+            row = users_by_id.get(other_id)
+            if not row:
+                continue
+            item = {
+                "id_user": row["id_user"],
+                "meno": row["meno"],
+                "priezvisko": row["priezvisko"],
+                "mail": row["mail"],
+                "rola": row["rola"],
+                "similarity": sim,
+                "similarity_percent": round(sim * 100, 1),
+            }
+            if distance_km is not None:
+                dist_val = distances_by_user.get(other_id)
+                if dist_val is None:
+                    continue
+                item["distance_km"] = float(dist_val)  # exact; rounded in match_item_json
+            results.append(item)
+
+        return results
+
+
+# ==========================================
+# 🧮 PRECOMPUTED MATCHES (user_matches)
+# ==========================================
+# user_matches keeps, for every user with an embedding and a city, the top
+# USER_MATCHES_TOP_K same-city candidates of each role. Listing per candidate
+# role means "any role" is still exact: it is the best K of the union.
+USER_MATCHES_TOP_K = int(os.getenv("USER_MATCHES_TOP_K", "20"))
+USER_MATCHES_BLOCK_SIZE = int(os.getenv("USER_MATCHES_BLOCK_SIZE", "512"))
+
+
+def compute_user_matches(snapshot, positions, top_k: int = USER_MATCHES_TOP_K, block_size: int = USER_MATCHES_BLOCK_SIZE):
+    """
+    Top-k same-city matches per candidate role for the snapshot rows in positions.
+
+    Queries are grouped by city and scored block by block against that city's
+    rows (one matrix product per block), so memory stays at block_size x city size.
+    Yields (user_id, match_user_id, match_role, rank_pos, similarity) tuples.
+    """
+    user_ids, matrix, roles, cities = snapshot
+    positions = np.asarray(sorted(set(positions)), dtype=np.int64)
+    if positions.size == 0 or top_k <= 0:
+        return
+    for code in np.unique(cities[positions]):
+        if code == 0:
+            continue  # no city -> no matches, same rule as find_best_matches_for_user
+        members = np.flatnonzero(cities == code)
+        queries = positions[cities[positions] == code]
+        role_columns = [(role, np.flatnonzero(roles[members] == role)) for role in set(roles[members])]
+        for start in range(0, queries.size, max(1, block_size)):
+            block = queries[start:start + block_size]
+            scores = matrix[block] @ matrix[members].T
+            # a user never matches themselves
+            self_cols = np.searchsorted(members, block)
+            scores[np.arange(block.size), self_cols] = -np.inf
+            for role, cols in role_columns:
+                sub = scores[:, cols]
+                k = min(top_k, cols.size)
+                top = np.argpartition(-sub, k - 1, axis=1)[:, :k]
+                top_scores = np.take_along_axis(sub, top, axis=1)
+                order = np.argsort(-top_scores, axis=1, kind="stable")
+                top = np.take_along_axis(top, order, axis=1)
+                top_scores = np.take_along_axis(top_scores, order, axis=1)
+                for qi, query_pos in enumerate(block):
+                    uid = int(user_ids[query_pos])
+                    rank = 0
+                    for col, sim in zip(top[qi], top_scores[qi]):
+                        if not np.isfinite(sim):
+                            continue
+                        rank += 1
+                        yield uid, int(user_ids[members[cols[col]]]), role, rank, float(sim)
+
+
+def _replace_user_matches(conn, user_ids, rows) -> None:
+    """Swap the stored lists of user_ids for rows (one transaction per call)."""
+    user_ids = sorted({int(u) for u in user_ids})
+    if not user_ids:
+        return
+    cur = conn.cursor()
+    try:
+        conn.start_transaction()
+        for start in range(0, len(user_ids), 1000):
+            chunk = user_ids[start:start + 1000]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cur.execute(f"DELETE FROM user_matches WHERE user_id IN ({placeholders})", tuple(chunk))
+        if rows:
+            cur.executemany(
+                """
+                INSERT INTO user_matches (user_id, match_user_id, match_role, rank_pos, similarity)
+                VALUES (%s, %s, %s, %s, %s)
+                """,
+                rows,
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def _users_listing(conn, user_ids) -> set[int]:
+    """Users whose stored list contains any of user_ids."""
+    placeholders = ", ".join(["%s"] * len(user_ids))
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            f"SELECT DISTINCT user_id FROM user_matches WHERE match_user_id IN ({placeholders})",
+            tuple(user_ids),
+        )
+        return {int(row[0]) for row in cur.fetchall()}
+    finally:
+        cur.close()
+
+
+def _match_thresholds(conn, user_ids, role) -> dict[int, tuple[int, float]]:
+    """{user_id: (stored count, weakest similarity)} of each user's list for one role."""
+    result: dict[int, tuple[int, float]] = {}
+    user_ids = [int(u) for u in user_ids]
+    cur = conn.cursor()
+    try:
+        for start in range(0, len(user_ids), 1000):
+            chunk = user_ids[start:start + 1000]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cur.execute(
+                f"""
+                SELECT user_id, COUNT(*), MIN(similarity) FROM user_matches
+                WHERE match_role <=> %s AND user_id IN ({placeholders})
+                GROUP BY user_id
+                """,
+                (role, *chunk),
+            )
+            result.update({int(r[0]): (int(r[1]), float(r[2])) for r in cur.fetchall()})
+    finally:
+        cur.close()
+    return result
+
+
+def refresh_user_matches(user_ids):
+    """
+    Incremental update after the embedding, city, role or deletion of user_ids
+    changed: recompute their own lists (the row) and the lists they enter or
+    leave (the column), leaving every other user's list untouched.
+    """
+    changed = {int(u) for u in user_ids}
+    if not changed:
+        return ()
+    EMBEDDING_INDEX.ensure_loaded()
+    with db_conn() as conn:
+        affected = changed | _users_listing(conn, changed)
+        # only the cities the changed users and their listers live in matter
+        snapshot = EMBEDDING_INDEX.snapshot(cities_of=affected)
+        ids, matrix, roles, cities = snapshot
+        position = {int(uid): i for i, uid in enumerate(ids)}
+        for uid in changed:
+            i = position.get(uid)
+            if i is None or cities[i] == 0:
+                continue
+            same_city = np.flatnonzero(cities == cities[i])
+            sims = matrix[same_city] @ matrix[i]
+            thresholds = _match_thresholds(conn, ids[same_city], roles[i])
+            for j, sim in zip(same_city, sims):
+                other = int(ids[j])
+                if other == uid:
+                    continue
+                count, weakest = thresholds.get(other, (0, -np.inf))
+                if count < USER_MATCHES_TOP_K or sim > weakest:
+                    affected.add(other)
+        rows = list(compute_user_matches(snapshot, [position[u] for u in affected if u in position]))
+        _replace_user_matches(conn, affected, rows)
+    return ()
+
+
+MATCH_TABLE_QUEUE = CoalescingJobQueue(
+    refresh_user_matches,
+    name="user-matches",
+    batch_size=int(os.getenv("USER_MATCHES_BATCH_SIZE", "64")),
+    linger_s=1.0,
+)
+
+
+# Media storage for avatars (assets/img + DB metadata)
+BASE_DIR = os.path.dirname(__file__)
+ASSETS_IMG_DIR = os.getenv("ASSETS_IMG_DIR")
+if ASSETS_IMG_DIR:
+    ASSETS_IMG_DIR = os.path.abspath(ASSETS_IMG_DIR)
+else:
+    default_assets = os.path.abspath(os.path.join(BASE_DIR, "..", "assets", "img"))
+    if not os.path.exists(default_assets):
+        alt_assets = os.path.abspath(os.path.join(BASE_DIR, "..", "..", "assets", "img"))
+        if os.path.exists(alt_assets):
+            default_assets = alt_assets
+    ASSETS_IMG_DIR = default_assets
+AVATARS_DIR = os.path.join(ASSETS_IMG_DIR, "avatars")
+POST_IMAGES_DIR = os.path.join(ASSETS_IMG_DIR, "posts")
+ACTIVITY_IMAGES_DIR = os.path.join(ASSETS_IMG_DIR, "activities")
+ARTICLE_IMAGES_DIR = os.path.join(ASSETS_IMG_DIR, "articles")
+LEGACY_AVATARS_DIR = os.path.join(BASE_DIR, "uploads", "avatars")
+os.makedirs(AVATARS_DIR, exist_ok=True)
+os.makedirs(POST_IMAGES_DIR, exist_ok=True)
+os.makedirs(ACTIVITY_IMAGES_DIR, exist_ok=True)
+os.makedirs(ARTICLE_IMAGES_DIR, exist_ok=True)
+ALLOWED_IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+
+def _avatar_disk_path(file_uid: str, ext: str) -> str:
+    return os.path.join(AVATARS_DIR, f"{file_uid}{ext}")
+
+def _post_image_disk_path(file_uid: str, ext: str) -> str:
+    return os.path.join(POST_IMAGES_DIR, f"{file_uid}{ext}")
+
+def _activity_image_disk_path(file_uid: str, ext: str) -> str:
+    return os.path.join(ACTIVITY_IMAGES_DIR, f"{file_uid}{ext}")
+
+def _article_image_disk_path(file_uid: str, ext: str) -> str:
+    return os.path.join(ARTICLE_IMAGES_DIR, f"{file_uid}{ext}")
+
+def _legacy_avatar_path_for(user_id: int, ext: str):
+    return os.path.join(LEGACY_AVATARS_DIR, f"user_{user_id}{ext}")
+
+def _find_legacy_avatar(user_id: int):
+    for ext in ALLOWED_IMAGE_EXTS:
+        path = _legacy_avatar_path_for(user_id, ext)
+        if os.path.exists(path):
+            return path, ext
+    return None, None
+
+def _delete_avatar_records(conn, user_id: int):
+    """
+    Remove DB rows + files for a user's avatar. Keeps only media_files entries in sync.
+    """
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(
+            """
+            SELECT file_uid, file_ext
+            FROM media_files
+            WHERE owner_type = 'user' AND owner_id = %s AND purpose = 'avatar'
+            """,
+            (user_id,),
+        )
+        rows = cur.fetchall()
+        for row in rows:
+            try:
+                os.remove(_avatar_disk_path(row["file_uid"], row["file_ext"]))
+            except FileNotFoundError:
+                pass
+            except Exception as exc:
+                logging.warning("Avatar file cleanup failed: %s", exc)
+        cur.execute(
+            """
+            DELETE FROM media_files
+            WHERE owner_type = 'user' AND owner_id = %s AND purpose = 'avatar'
+            """,
+            (user_id,),
+        )
+    finally:
+        cur.close()
+
+def _find_avatar_meta(conn, user_id: int):
+    """
+    Load avatar metadata (DB) or fall back to legacy file if DB is empty.
+    """
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(
+            """
+            SELECT file_uid, file_ext, storage_path
+            FROM media_files
+            WHERE owner_type = 'user' AND owner_id = %s AND purpose = 'avatar'
+            ORDER BY created_at DESC
+            LIMIT 1
+            """,
+            (user_id,),
+        )
+        row = cur.fetchone()
+    finally:
+        cur.close()
+
+    if row:
+        return row
+
+    # Legacy fallback: look for old files under uploads/avatars
+    path, ext = _find_legacy_avatar(user_id)
+    if path and ext:
+        legacy_rel = f"/uploads/avatars/user_{user_id}{ext}"
+        return {"file_uid": f"legacy-{user_id}", "file_ext": ext, "storage_path": legacy_rel}
+
+    return None
+
+def _delete_post_images(conn, post_id: int):
+    """
+    Remove DB rows + files for a post's images (current implementation keeps one).
+    """
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(
+            """
+            SELECT file_uid, file_ext
+            FROM media_files
+            WHERE owner_type = 'post' AND owner_id = %s AND purpose = 'post_image'
+            """,
+            (post_id,),
+        )
+        rows = cur.fetchall()
+        for row in rows:
+            try:
+                os.remove(_post_image_disk_path(row["file_uid"], row["file_ext"]))
+            except FileNotFoundError:
+                pass
+            except Exception as exc:
+                logging.warning("Post image cleanup failed: %s", exc)
+        cur.execute(
+            """
+            DELETE FROM media_files
+            WHERE owner_type = 'post' AND owner_id = %s AND purpose = 'post_image'
+            """,
+            (post_id,),
+        )
+    finally:
+        cur.close()
+
+
+def _delete_post_image_by_uid(conn, post_id: int, file_uid: str):
+    """
+    Remove a single image by uid for given post.
+    """
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(
+            """
+            SELECT file_uid, file_ext, storage_path
+            FROM media_files
+            WHERE owner_type = 'post' AND owner_id = %s AND purpose = 'post_image' AND file_uid = %s
+            """,
+            (post_id, file_uid),
+        )
+        row = cur.fetchone()
+        if not row:
+            return False
+        try:
+            os.remove(_post_image_disk_path(row["file_uid"], row["file_ext"]))
+        except FileNotFoundError:
+            pass
+        except Exception as exc:
+            logging.warning("Post image cleanup failed: %s", exc)
+        cur.execute(
+            """
+            DELETE FROM media_files
+            WHERE owner_type = 'post' AND owner_id = %s AND purpose = 'post_image' AND file_uid = %s
+            """,
+            (post_id, file_uid),
+        )
+        return True
+    finally:
+        cur.close()
+
+
+def _next_post_image_sort(conn, post_id: int) -> int:
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            SELECT COALESCE(MAX(sort_order) + 1, 0) AS nxt
+            FROM media_files
+            WHERE owner_type = 'post' AND owner_id = %s AND purpose = 'post_image'
+            """,
+            (post_id,),
+        )
+        row = cur.fetchone()
+        nxt = int(row[0]) if row and row[0] is not None else 0
+        return max(1, nxt)  # rezervujeme 0 pre hlavný obrázok
+    finally:
+        cur.close()
+
+
+def _insert_post_image_record(
+    conn,
+    post_id: int,
+    *,
+    file_uid: str,
+    filename: str,
+    ext: str,
+    mime_type: str | None,
+    size_bytes: int,
+    storage_path: str,
+    is_main: bool = False,
+):
+    """
+    Insert media_files row and update posts.image depending on main flag.
+    Keeps current main (sort_order 0) intact unless is_main=True is passed.
+    """
+    storage_url = _make_abs(storage_path)
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(
+            """
+            SELECT file_uid
+            FROM media_files
+            WHERE owner_type = 'post' AND owner_id = %s AND purpose = 'post_image' AND sort_order = 0
+            LIMIT 1
+            """,
+            (post_id,),
+        )
+        existing_main = cur.fetchone()
+        has_main = bool(existing_main)
+        make_main = is_main or not has_main
+
+        if make_main and has_main:
+            cur.execute(
+                """
+                UPDATE media_files
+                SET sort_order = %s
+                WHERE owner_type = 'post' AND owner_id = %s AND purpose = 'post_image' AND file_uid = %s
+                """,
+                (_next_post_image_sort(conn, post_id), post_id, existing_main["file_uid"]),
+            )
+            sort_order = 0
+        elif make_main:
+            sort_order = 0
+        else:
+            sort_order = _next_post_image_sort(conn, post_id)
+
+        cur.execute(
+            """
+            INSERT INTO media_files
+              (owner_type, owner_id, purpose, sort_order, file_uid, file_name, file_ext, mime_type, size_bytes, storage_path)
+            VALUES
+              ('post', %s, 'post_image', %s, %s, %s, %s, %s, %s, %s)
+            """,
+            (
+                post_id,
+                sort_order,
+                file_uid,
+                filename,
+                ext,
+                mime_type,
+                size_bytes,
+                storage_path,
+            ),
+        )
+
+        if make_main:
+            cur.execute("UPDATE posts SET image = %s WHERE id_post = %s", (storage_url, post_id))
+        else:
+            cur.execute("UPDATE posts SET image = COALESCE(image, %s) WHERE id_post = %s", (storage_url, post_id))
+
+        conn.commit()
+        return storage_url, sort_order
+    finally:
+        cur.close()
+
+
+def _resequence_post_images(conn, post_id: int):
+    """
+    Normalize sort_order: main stays at 0 (if present), others start at 1. Does not auto-promote other images.
+    """
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(
+            """
+            SELECT file_uid, storage_path, sort_order
+            FROM media_files
+            WHERE owner_type = 'post' AND owner_id = %s AND purpose = 'post_image'
+            ORDER BY sort_order ASC, created_at ASC
+            """,
+            (post_id,),
+        )
+        rows = cur.fetchall()
+        main_url = None
+        has_main = False
+        next_idx = 1
+        for row in rows:
+            if row.get("sort_order") == 0 and not has_main:
+                target = 0
+                has_main = True
+                if row.get("storage_path"):
+                    main_url = _make_abs(row["storage_path"])
+            else:
+                target = next_idx
+                next_idx += 1
+
+            if row.get("sort_order") != target:
+                cur.execute(
+                    """
+                    UPDATE media_files
+                    SET sort_order = %s
+                    WHERE owner_type = 'post' AND owner_id = %s AND purpose = 'post_image' AND file_uid = %s
+                    """,
+                    (target, post_id, row["file_uid"]),
+                )
+
+        cur.execute("UPDATE posts SET image = %s WHERE id_post = %s", (main_url, post_id))
+        conn.commit()
+        return main_url
+    finally:
+        cur.close()
+
+
+def _normalize_storage_path(path: str) -> str:
+    """
+    Normalize stored paths so frontend gets a clean /assets/... URL.
+    Accepts legacy "../assets/..." or "assets/..." and returns "/assets/...".
+    """
+    if not path:
+        return path
+    norm = str(path).strip().replace("\\", "/")
+    while norm.startswith("./"):
+        norm = norm[2:]
+    while norm.startswith("../"):
+        norm = norm[3:]
+    if not norm.startswith("/"):
+        norm = "/" + norm
+    return norm
+
+def _make_abs(url: str) -> str:
+    """
+    Prefix relative /path with current host so frontend that uses post.image directly bude mat pln? URL.
+    """
+    if not url:
+        return url
+    if url.startswith("http://") or url.startswith("https://"):
+        return url
+    norm = _normalize_storage_path(url)
+    base = (request.host_url or "").rstrip("/")
+    return f"{base}{norm}"
+
+
+def _delete_activity_image(conn, activity_id: int):
+    """
+    Remove DB rows and files for single activity image.
+    """
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(
+            """
+            SELECT file_uid, file_ext
+            FROM media_files
+            WHERE owner_type = 'activity' AND owner_id = %s AND purpose = 'activity_image'
+            """,
+            (activity_id,),
+        )
+        rows = cur.fetchall()
+        for row in rows:
+            try:
+                os.remove(_activity_image_disk_path(row["file_uid"], row["file_ext"]))
+            except FileNotFoundError:
+                pass
+            except Exception as exc:
+                logging.warning("Activity image cleanup failed: %s", exc)
+
+        cur.execute(
+            """
+            DELETE FROM media_files
+            WHERE owner_type = 'activity' AND owner_id = %s AND purpose = 'activity_image'
+            """,
+            (activity_id,),
+        )
+        cur.execute("UPDATE activities SET image_url = NULL WHERE id_activity = %s", (activity_id,))
+        conn.commit()
+    finally:
+        cur.close()
+
+
+def _delete_article_image(conn, article_id: int):
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(
+            """
+            SELECT file_uid, file_ext
+            FROM media_files
+            WHERE owner_type = 'article' AND owner_id = %s AND purpose IN ('attachment','article_image')
+            """,
+            (article_id,),
+        )
+        rows = cur.fetchall()
+        for row in rows:
+            try:
+                os.remove(_article_image_disk_path(row["file_uid"], row["file_ext"]))
+            except FileNotFoundError:
+                pass
+            except Exception as exc:
+                logging.warning("Article image cleanup failed: %s", exc)
+        cur.execute(
+            """
+            DELETE FROM media_files
+            WHERE owner_type = 'article' AND owner_id = %s AND purpose IN ('attachment','article_image')
+            """,
+            (article_id,),
+        )
+    finally:
+        cur.close()
+
+
+def _save_activity_image_from_data_url(conn, activity_id: int, data_url: str):
+    """
+    Decode data:image payload, persist to disk + media_files, update activities.image_url.
+    """
+    if not data_url or not isinstance(data_url, str) or not data_url.startswith("data:image"):
+        return None
+
+    match = re.match(r"data:image/(png|jpeg|jpg|gif|webp);base64,(.+)", data_url, re.IGNORECASE | re.DOTALL)
+    if not match:
+        return None
+
+    ext_raw, b64data = match.groups()
+    ext = "." + ext_raw.lower().replace("jpeg", "jpg")
+    if ext not in ALLOWED_IMAGE_EXTS:
+        return None
+
+    try:
+        blob = base64.b64decode(b64data)
+    except Exception as exc:
+        logging.warning("Activity image base64 decode failed: %s", exc)
+        return None
+
+    file_uid = str(uuid.uuid4())
+    path = _activity_image_disk_path(file_uid, ext)
+    try:
+        with open(path, "wb") as f:
+            f.write(blob)
+    except Exception as exc:
+        logging.warning("Activity image save failed: %s", exc)
+        return None
+
+    size_bytes = os.path.getsize(path)
+    storage_path = f"/assets/img/activities/{file_uid}{ext}"
+    storage_url = _make_abs(storage_path)
+
+    # keep single image: drop previous rows/files first
+    _delete_activity_image(conn, activity_id)
+
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            INSERT INTO media_files
+              (owner_type, owner_id, purpose, sort_order, file_uid, file_name, file_ext, mime_type, size_bytes, storage_path)
+            VALUES
+              ('activity', %s, 'activity_image', 0, %s, %s, %s, %s, %s, %s)
+            """,
+            (
+                activity_id,
+                file_uid,
+                f"activity_{activity_id}{ext}",
+                ext,
+                f"image/{ext.strip('.')}",
+                size_bytes,
+                storage_path,
+            ),
+        )
+        cur.execute("UPDATE activities SET image_url = %s WHERE id_activity = %s", (storage_url, activity_id))
+        conn.commit()
+        return storage_url
+    except Exception as exc:
+        try:
+            os.remove(path)
+        except Exception:
+            pass
+        logging.warning("Activity image DB save failed: %s", exc)
+        return None
+    finally:
+        cur.close()
+
+
+def _save_post_image_from_data_url(conn, post_id: int, data_url: str):
+    """
+    Decode a data:image/...;base64 payload, save to disk, insert into media_files and posts.image.
+    Returns storage_path or None.
+    """
+    if not data_url or not data_url.startswith("data:image"):
+        return None
+
+    match = re.match(r"data:image/(png|jpeg|jpg|gif|webp);base64,(.+)", data_url, re.IGNORECASE | re.DOTALL)
+    if not match:
+        return None
+
+    ext_raw, b64data = match.groups()
+    ext = "." + ext_raw.lower().replace("jpeg", "jpg")
+    if ext not in ALLOWED_IMAGE_EXTS:
+        return None
+
+    try:
+        blob = base64.b64decode(b64data)
+    except Exception as exc:
+        logging.warning("Post image base64 decode failed: %s", exc)
+        return None
+
+    file_uid = str(uuid.uuid4())
+    path = _post_image_disk_path(file_uid, ext)
+    try:
+        with open(path, "wb") as f:
+            f.write(blob)
+    except Exception as exc:
+        logging.warning("Post image save failed: %s", exc)
+        return None
+
+    size_bytes = os.path.getsize(path)
+    storage_path = f"/assets/img/posts/{file_uid}{ext}"
+    try:
+        storage_url, _ = _insert_post_image_record(
+            conn,
+            post_id,
+            file_uid=file_uid,
+            filename=f"post_{post_id}{ext}",
+            ext=ext,
+            mime_type=f"image/{ext.strip('.')}",
+            size_bytes=size_bytes,
+            storage_path=storage_path,
+            is_main=True,
+        )
+        return storage_url
+    except Exception as exc:
+        try:
+            os.remove(path)
+        except Exception:
+            pass
+        logging.warning("Post image save failed: %s", exc)
+        return None
+
+
+def _save_article_image_from_data_url(conn, article_id: int, data_url: str):
+    """
+    Decode data:image payload for article, save to disk + media_files, update articles.image_url.
+    """
+    if not data_url or not isinstance(data_url, str) or not data_url.startswith("data:image"):
+        return None
+
+    match = re.match(r"data:image/(png|jpeg|jpg|gif|webp);base64,(.+)", data_url, re.IGNORECASE | re.DOTALL)
+    if not match:
+        return None
+
+    ext_raw, b64data = match.groups()
+    ext = "." + ext_raw.lower().replace("jpeg", "jpg")
+    if ext not in ALLOWED_IMAGE_EXTS:
+        return None
+
+    try:
+        blob = base64.b64decode(b64data)
+    except Exception as exc:
+        logging.warning("Article image base64 decode failed: %s", exc)
+        return None
+
+    file_uid = str(uuid.uuid4())
+    path = _article_image_disk_path(file_uid, ext)
+    try:
+        with open(path, "wb") as f:
+            f.write(blob)
+    except Exception as exc:
+        logging.warning("Article image save failed: %s", exc)
+        return None
+
+    size_bytes = os.path.getsize(path)
+    storage_path = f"/assets/img/articles/{file_uid}{ext}"
+    storage_url = _make_abs(storage_path)
+
+    _delete_article_image(conn, article_id)
+
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            INSERT INTO media_files
+              (owner_type, owner_id, purpose, sort_order, file_uid, file_name, file_ext, mime_type, size_bytes, storage_path)
+            VALUES
+              ('article', %s, 'attachment', 0, %s, %s, %s, %s, %s, %s)
+            """,
+            (
+                article_id,
+                file_uid,
+                f"article_{article_id}{ext}",
+                ext,
+                f"image/{ext.strip('.')}",
+                size_bytes,
+                storage_path,
+            ),
+        )
+        cur.execute("UPDATE articles SET image_url = %s WHERE id_article = %s", (storage_url, article_id))
+        conn.commit()
+        return storage_url
+    except Exception as exc:
+        try:
+            os.remove(path)
+        except Exception:
+            pass
+        logging.warning("Article image DB save failed: %s", exc)
+        return None
+    finally:
+        cur.close()
+
+# 🔒 Validácia hesla
+def validate_password(password):
+    """
+    Kontroluje bezpečnosť hesla:
+    - Min 8 znakov
+    - Aspoň 1 veľké písmeno
+    - Aspoň 1 malé písmeno
+    - Aspoť 1 číslo
+    - Aspoň 1 špeciálny znak
+    """
+    if len(password) < 8:
+        return False, "Heslo musí mať aspoň 8 znakov."
+    
+    if not re.search(r"[A-Z]", password):
+        return False, "Heslo musí obsahovať aspoň jedno veľké písmeno."
+    
+    if not re.search(r"[a-z]", password):
+        return False, "Heslo musí obsahovať aspoň jedno malé písmeno."
+    
+    if not re.search(r"\d", password):
+        return False, "Heslo musí obsahovať aspoň jedno číslo."
+    
+    if not re.search(r"[!@#$%^&*(),.?\":{}|<>]", password):
+        return False, "Heslo musí obsahovať aspoň jeden špeciálny znak (!@#$%^&* atď.)."
+    
+    return True, ""
+
+# ==========================================
+# 🎨 ZÍSKANIE VŠETKÝCH HOBBY
+# ==========================================
+
+@app.get("/api/hobby-categories")
+@conditional_get(("hobby_kategoria", "hobby"), "public, max-age=300")
+def get_hobby_categories():
+    conn = get_conn()
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute("""
+            SELECT 
+                hk.id_kategoria,
+                hk.nazov,
+                hk.ikona,
+                COUNT(h.id_hobby) as pocet_hobby
+            FROM hobby_kategoria hk
+            LEFT JOIN hobby h ON h.id_kategoria = hk.id_kategoria
+            GROUP BY hk.id_kategoria
+            ORDER BY hk.id_kategoria ASC
+        """)
+        categories = cur.fetchall()
+        return jsonify(categories), 200
+    except Exception as e:
+        return jsonify({"error": f"Chyba pri načítaní kategórií: {str(e)}"}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+
+@app.get("/api/hobbies")
+@conditional_get(("hobby", "hobby_kategoria"), "public, max-age=300")
+def get_hobbies():
+    conn = get_conn()
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute("""
+            SELECT 
+                h.id_hobby,
+                h.nazov,
+                h.id_kategoria,
+                hk.nazov as kategoria_nazov,
+                hk.ikona as kategoria_ikona
+            FROM hobby h
+            LEFT JOIN hobby_kategoria hk ON h.id_kategoria = hk.id_kategoria
+            ORDER BY hk.id_kategoria ASC, h.nazov ASC
+        """)
+        hobbies = cur.fetchall()
+        return jsonify(hobbies), 200
+    except Exception as e:
+        return jsonify({"error": f"Chyba pri načítaní hobby: {str(e)}"}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+# ==========================================
+# 👤 REGISTRÁCIA
+# ==========================================
+@app.post("/api/register")
+def register_user():
+    data = request.get_json(force=True)
+    name = data.get("name")
+    surname = data.get("surname")
+    email = data.get("email")
+    password = data.get("password")
+    password_confirm = data.get("password_confirm")
+    birthdate = data.get("birthdate")
+    hobbies = data.get("hobbies", [])  # Array ID hobby
+    role = data.get("role") or data.get("rola")
+    allowed_roles = {"user_senior", "user_dobrovolnik", "user_firma"}
+
+    # ✅ Kontrola povinných polí
+    if not all([name, surname, email, password, password_confirm, birthdate]):
+        return jsonify({"error": "Všetky polia sú povinné."}), 400
+
+    # ✅ Kontrola zhody hesiel
+    if role not in allowed_roles:
+        return jsonify({"error": "Neplatna rola."}), 400
+
+    if password != password_confirm:
+        return jsonify({"error": "Heslá sa nezhodujú."}), 400
+
+    # ✅ Validácia bezpečnosti hesla
+    is_valid, error_msg = validate_password(password)
+    if not is_valid:
+        return jsonify({"error": error_msg}), 400
+
+    # ✅ Hash hesla
+    hashed_pw = bcrypt.generate_password_hash(password, 12).decode("utf-8")
+
+    # ✅ Formát dátumu
+    try:
+        birthdate_obj = datetime.strptime(birthdate, "%Y-%m-%d")
+        birthdate_formatted = birthdate_obj.strftime("%Y-%m-%d")
+    except Exception:
+        return jsonify({"error": "Neplatný formát dátumu (použi YYYY-MM-DD)"}), 400
+
+    conn = get_conn()
+    try:
+        cur = conn.cursor(dictionary=True)
+        
+        # ✅ Kontrola, či email už existuje
+        cur.execute("SELECT id_user FROM users WHERE mail = %s", (email,))
+        if cur.fetchone():
+            return jsonify({"error": "Tento email je už zaregistrovaný."}), 409
+        
+        # ✅ Vloženie nového používateľa
+        cur.execute(
+            """
+            INSERT INTO users (meno, priezvisko, mail, heslo, datum_narodenia, rola)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            """,
+            (name, surname, email, hashed_pw, birthdate_formatted, role)
+        )
+        conn.commit()
+        
+        # ✅ Získanie ID novo vytvoreného používateľa
+        user_id = cur.lastrowid
+        
+        # ✅ Vloženie hobby do user_hobby tabuľky
+        if hobbies and len(hobbies) > 0:
+            for hobby_id in hobbies:
+                cur.execute(
+                    "INSERT INTO user_hobby (id_user, id_hobby) VALUES (%s, %s)",
+                    (user_id, hobby_id)
+                )
+            conn.commit()
+        try:
+            request_user_embedding(conn, user_id)
+        except Exception as emb_err:
+            logging.warning(
+                "Failed to schedule user embedding for %s: %s",
+                user_id,
+                emb_err,
+            )
+        return jsonify({
+            "success": True, 
+            "user": f"{name} {surname}",
+            "hobbies_count": len(hobbies)
+        }), 201
+        
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"error": f"Chyba databázy: {str(e)}"}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+# ==========================================
+# 🔐 PRIHLÁSENIE
+# ==========================================
+@app.post("/api/login")
+def login_user():
+    data = request.get_json(force=True)
+    email = data.get("email")
+    password = data.get("password")
+
+    conn = get_conn()
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute("SELECT * FROM users WHERE mail = %s", (email,))
+        user = cur.fetchone()
+        if user:
+            user["rola"] = _normalize_role(user.get("rola")) or "user"
+
+        if not user:
+            return jsonify({"error": "Používateľ neexistuje."}), 404
+
+        if not bcrypt.check_password_hash(user["heslo"], password):
+            return jsonify({"error": "Nesprávne heslo."}), 401
+
+        return jsonify({
+            "success": True,
+            "user": {
+                "id": user["id_user"],
+                "name": user["meno"],
+                "surname": user["priezvisko"],
+                "email": user["mail"],
+                "birthdate": user["datum_narodenia"],
+                "role": user.get("rola") or "user",   # 👈 dôležité
+            }
+        }), 200
+    finally:
+        cur.close()
+        conn.close()
+
+# ==========================================
+# 👥 POUŽÍVATELIA – LIST (s ratingmi)
+# ==========================================
+
+# sort keys (sql_expr, descending, row_field, null_as); users without ratings go last,
+# a missing meno/priezvisko sorts (and is stored in the cursor) as ''
+USER_SORT_KEYS = {
+    "id_desc": (("u.id_user", True, "id_user", None),),
+    "id_asc": (("u.id_user", False, "id_user", None),),
+    "name_asc": (("u.meno", False, "meno", ""), ("u.priezvisko", False, "priezvisko", ""), ("u.id_user", False, "id_user", None)),
+    "name_desc": (("u.meno", True, "meno", ""), ("u.priezvisko", True, "priezvisko", ""), ("u.id_user", True, "id_user", None)),
+    "rating_desc": (("r.avg_rating", True, "avg_rating", -1), ("r.rating_count", True, "rating_count", 0), ("u.id_user", True, "id_user", None)),
+    "rating_asc": (("r.avg_rating", False, "avg_rating", 6), ("r.rating_count", True, "rating_count", 0), ("u.id_user", True, "id_user", None)),
+}
+# relevance for q; score is a select alias, so these keys go into HAVING
+USER_SCORE_SORT_KEYS = (("score", True, "score", None), ("meno", False, "meno", ""), ("priezvisko", False, "priezvisko", ""), ("id_user", False, "id_user", None))
+
+
+@app.get("/api/users")
+# lists e-mail addresses: private, always revalidated
+@conditional_get(("users", "user_rating_stats"), "private, no-cache")
+def get_users():
+    """
+    Zoznam používateľov. Bez q a bez cursor/count vracia len pole (ako doteraz).
+    Stránkovanie: page/page_size alebo cursor (next_cursor z predchádzajúcej odpovede),
+    count=exact|estimate|none určuje, či a ako sa počíta celkový počet.
+    """
+    q = request.args.get("q", "").strip()
+    sort = request.args.get("sort", "id_desc").lower()  # id_desc | id_asc | name_asc | name_desc | rating_desc | rating_asc | relevance
+    role_filter = request.args.get("role", "").strip()
+
+    # stránkovanie
+    try:
+        page = max(1, int(request.args.get("page", 1)))
+    except (TypeError, ValueError):
+        page = 1
+    try:
+        page_size = min(100, max(1, int(request.args.get("page_size", 50))))
+    except (TypeError, ValueError):
+        page_size = 50
+    offset = (page - 1) * page_size
+    count_mode = (request.args.get("count") or "exact").strip().lower()
+    if count_mode not in COUNT_MODES:
+        return jsonify({"error": "Parameter count musí byť exact, estimate alebo none."}), 400
+    bare_list = not q and "cursor" not in request.args and "count" not in request.args
+
+    # ak je fulltext (q), ale sort nie je rating_desc/asc, triedime primárne podľa relevancie
+    sort_name = sort if sort in USER_SORT_KEYS else "id_desc"
+    if q and sort_name not in ("rating_desc", "rating_asc"):
+        sort_name = "score"
+    sort_keys = USER_SCORE_SORT_KEYS if sort_name == "score" else USER_SORT_KEYS[sort_name]
+    try:
+        position = _cursor_arg(sort_name, sort_keys)
+    except ValueError:
+        return jsonify({"error": "Neplatný kurzor."}), 400
+
+    conn = get_conn()
+    try:
+        cur = conn.cursor(dictionary=True)
+
+        where = ["u.soft_del = 0"]
+        params = []
+
+        score_sql = "0"  # default (bez q)
+        score_params = []
+
+        allowed_roles = {"user_dobrovolnik", "user_firma", "user_senior"}
+        if role_filter and role_filter in allowed_roles:
+            where.append("u.rola = %s")
+            params.append(role_filter)
+
+        if q:
+            like_any = f"%{q}%"
+            like_prefix = f"{q}%"
+            like_fullname_prefix = f"{q}%"
+
+            where.append(
+                "(u.meno LIKE %s OR u.priezvisko LIKE %s OR u.mail LIKE %s OR "
+                "CONCAT(u.meno,' ',u.priezvisko) LIKE %s)"
+            )
+            params += [like_any, like_any, like_any, like_any]
+
+            score_sql = """
+                (CASE WHEN CONCAT(u.meno,' ',u.priezvisko) = %s THEN 100 ELSE 0 END) +
+                (CASE WHEN CONCAT(u.meno,' ',u.priezvisko) LIKE %s THEN 60 ELSE 0 END) +
+                (CASE WHEN u.meno LIKE %s THEN 40 ELSE 0 END) +
+                (CASE WHEN u.priezvisko LIKE %s THEN 35 ELSE 0 END) +
+                (CASE WHEN u.mail LIKE %s THEN 20 ELSE 0 END) +
+                (CASE WHEN u.meno LIKE %s THEN 10 ELSE 0 END) +
+                (CASE WHEN u.priezvisko LIKE %s THEN 8 ELSE 0 END) +
+                (CASE WHEN u.mail LIKE %s THEN 5 ELSE 0 END)
+            """
+            score_params = [
+                q,
+                like_fullname_prefix,
+                like_prefix, like_prefix, like_prefix,
+                like_any, like_any, like_any
+            ]
+
+        count_sql = f"SELECT u.id_user FROM users u WHERE {' AND '.join(where)}"
+        count_params = list(params)
+        sort_sql = keyset_order_sql(sort_keys)
+        having_sql = ""
+        having_params = []
+        if position:
+            after_sql, after_params = keyset_after_sql(sort_keys, position)
+            if sort_keys is USER_SCORE_SORT_KEYS:
+                having_sql, having_params = f"HAVING {after_sql}", after_params
+            else:
+                where.append(after_sql)
+                params.extend(after_params)
+        where_sql = " AND ".join(where)
+        # keyset pages start after the cursor, so OFFSET only applies to page numbers
+        limit_sql = "LIMIT %s" if position else "LIMIT %s OFFSET %s"
+        limit_params = [page_size + 1] if position else [page_size + 1, offset]
+
+        # total (bare list never shows it)
+        total = None
+        if count_mode == "exact" and not bare_list:
+            cur.execute(f"SELECT COUNT(*) AS total FROM ({count_sql}) t", count_params)
+            total = cur.fetchone()["total"]
+        elif count_mode == "estimate" and not bare_list:
+            total = _estimate_rows(cur, count_sql, count_params)
+
+        # data (JOIN na predpočítané štatistiky ratingov)
+        if q:
+            cur.execute(
+                f"""
+                SELECT 
+                    u.id_user,
+                    u.meno,
+                    u.priezvisko,
+                    u.mail,
+                    u.rola,
+                    r.avg_rating,
+                    r.rating_count,
+                    {score_sql} AS score
+                FROM users u
+                LEFT JOIN user_rating_stats r ON r.user_id = u.id_user
+                WHERE {where_sql}
+                {having_sql}
+                ORDER BY {sort_sql}
+                {limit_sql}
+                """,
+                # score placeholders come first in SELECT, then WHERE and HAVING params
+                score_params + params + having_params + limit_params,
+            )
+        else:
+            cur.execute(
+                f"""
+                SELECT 
+                    u.id_user,
+                    u.meno,
+                    u.priezvisko,
+                    u.mail,
+                    u.rola,
+                    r.avg_rating,
+                    r.rating_count
+                FROM users u
+                LEFT JOIN user_rating_stats r ON r.user_id = u.id_user
+                WHERE {where_sql}
+                ORDER BY {sort_sql}
+                {limit_sql}
+                """,
+                params + limit_params,
+            )
+
+        rows = [_normalize_user_rating_fields(dict(row)) for row in cur.fetchall()]
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        if bare_list:
+            return jsonify(rows), 200
+
+        next_cursor = None
+        if has_more and rows:
+            next_cursor = encode_cursor({"s": sort_name, "v": keyset_values(sort_keys, rows[-1])})
+        return jsonify({
+            "items": rows,
+            "pagination": {
+                "page": None if position else page,
+                "page_size": page_size,
+                "count": count_mode,
+                "total": total,
+                "pages": (total + page_size - 1) // page_size if total is not None else None,
+                "next_cursor": next_cursor,
+            }
+        }), 200
+    finally:
+        cur.close()
+        conn.close()
+
+# ==========================================
+# 👥 POUŽÍVATELIA – DELETE
+# ==========================================
+@app.delete("/api/users/<int:user_id>")
+def delete_user(user_id: int):
+    # voliteľné – superadmin (id 1) sa nedá zmazať
+    if user_id == 1:
+        return jsonify({"error": "Hlavného admina nie je možné zmazať."}), 400
+
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+
+        # soft delete – aby sa ďalej neukazoval v zoznamoch
+        cur.execute(
+            "UPDATE users SET soft_del = 1 WHERE id_user = %s AND soft_del = 0",
+            (user_id,),
+        )
+
+        if cur.rowcount == 0:
+            return jsonify({
+                "error": "Používateľ neexistuje alebo je už zmazaný."
+            }), 404
+
+        conn.commit()
+        EMBEDDING_INDEX.update_meta(user_id, soft_del=True)
+        MATCH_CACHE.invalidate_user(user_id)
+        MATCH_TABLE_QUEUE.enqueue(user_id)
+        return jsonify({"success": True}), 200
+
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"error": f"Chyba pri mazaní používateľa: {str(e)}"}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+# ==========================================
+# HODNOTENIA POUZIVATELOV
+# ==========================================
+
+def _serialize_rating_row(row):
+    if not row:
+        return None
+    created_at = row.get("created_at")
+    if isinstance(created_at, datetime):
+        created_at_str = created_at.isoformat()
+    else:
+        created_at_str = created_at
+    first = (row.get("meno") or "").strip()
+    last = (row.get("priezvisko") or "").strip()
+    full_name = " ".join(part for part in [first, last] if part).strip()
+    return {
+        "id_rating": row.get("id_rating"),
+        "user_id": row.get("user_id"),
+        "rated_by_user_id": row.get("rated_by_user_id"),
+        "rating": row.get("rating"),
+        "comment": row.get("comment"),
+        "created_at": created_at_str,
+        "rated_by_name": full_name or None,
+    }
+
+
+def _normalize_user_rating_fields(row):
+    if not row:
+        return row
+    if "avg_rating" in row:
+        val = row.get("avg_rating")
+        if val is None:
+            row["avg_rating"] = None
+        else:
+            try:
+                row["avg_rating"] = float(val)
+            except (TypeError, ValueError):
+                row["avg_rating"] = None
+    if "rating_count" in row:
+        val = row.get("rating_count")
+        if val is None:
+            row["rating_count"] = 0
+        else:
+            try:
+                row["rating_count"] = int(val)
+            except (TypeError, ValueError):
+                row["rating_count"] = 0
+    return row
+
+
+@app.get("/api/users/<int:user_id>/ratings")
+def get_user_ratings(user_id):
+    try:
+        page = max(1, int(request.args.get("page", 1)))
+    except (TypeError, ValueError):
+        page = 1
+
+    limit_arg = request.args.get("limit")
+    try:
+        default_page_size = int(limit_arg) if limit_arg is not None else 5
+    except (TypeError, ValueError):
+        default_page_size = 5
+
+    try:
+        page_size = int(request.args.get("page_size", default_page_size))
+    except (TypeError, ValueError):
+        page_size = default_page_size
+    page_size = max(1, min(50, page_size))
+    offset = (page - 1) * page_size
+
+    rated_by_param = request.args.get("rated_by")
+    try:
+        rated_by_user_id = int(rated_by_param) if rated_by_param is not None else None
+    except (TypeError, ValueError):
+        rated_by_user_id = None
+
+    conn = get_conn()
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute(f"""
+            SELECT rating_count AS total, avg_rating, {RATING_HISTOGRAM_COLUMNS}
+            FROM user_rating_stats
+            WHERE user_id = %s
+        """, (user_id,))
+        stats_row = cur.fetchone() or {"total": 0, "avg_rating": None}
+        avg_rating = stats_row.get("avg_rating")
+        avg_value = float(avg_rating) if avg_rating is not None else None
+        total = int(stats_row.get("total") or 0)
+        histogram = {str(value): int(stats_row.get(f"count_{value}") or 0) for value in RATING_VALUES}
+
+        cur.execute("""
+            SELECT r.id_rating, r.user_id, r.rated_by_user_id, r.rating, r.comment, r.created_at,
+                   u.meno, u.priezvisko
+            FROM user_ratings r
+            LEFT JOIN users u ON u.id_user = r.rated_by_user_id
+            WHERE r.user_id = %s
+            ORDER BY r.created_at DESC
+            LIMIT %s OFFSET %s
+        """, (user_id, page_size, offset))
+        rows = [_normalize_user_rating_fields(dict(row)) for row in cur.fetchall()]
+        items = [item for item in (_serialize_rating_row(row) for row in rows) if item]
+
+        my_rating = None
+        if rated_by_user_id:
+            cur.execute("""
+                SELECT r.id_rating, r.user_id, r.rated_by_user_id, r.rating, r.comment, r.created_at,
+                       u.meno, u.priezvisko
+                FROM user_ratings r
+                LEFT JOIN users u ON u.id_user = r.rated_by_user_id
+                WHERE r.user_id = %s AND r.rated_by_user_id = %s
+                LIMIT 1
+            """, (user_id, rated_by_user_id))
+            my_rating = _serialize_rating_row(cur.fetchone())
+
+        total_pages = (total + page_size - 1) // page_size
+
+        return jsonify({
+            "items": items,
+            "stats": {
+                "average": avg_value,
+                "count": total,
+                "histogram": histogram,
+            },
+            "my_rating": my_rating,
+            "page": page,
+            "page_size": page_size,
+            "total": total,
+            "pages": total_pages,
+        }), 200
+    except Exception as e:
+        return jsonify({"error": f"Chyba pri nacitani hodnoteni: {str(e)}"}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+
+@app.get("/api/users/top-rated")
+def get_top_rated_users():
+    try:
+        limit = max(1, min(20, int(request.args.get("limit", 6))))
+    except (TypeError, ValueError):
+        limit = 5
+    try:
+        days = max(1, min(90, int(request.args.get("days", 7))))
+    except (TypeError, ValueError):
+        days = 7
+
+    conn = get_conn()
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute(
+            """
+            SELECT u.id_user,
+                   u.meno,
+                   u.priezvisko,
+                   u.mail,
+                   u.rola,
+                   AVG(r.rating) AS avg_rating,
+                   COUNT(*) AS rating_count
+            FROM user_ratings r
+            JOIN users u ON u.id_user = r.user_id
+            WHERE r.created_at >= NOW() - INTERVAL %s DAY
+              AND u.soft_del = 0
+            GROUP BY u.id_user, u.meno, u.priezvisko, u.mail, u.rola
+            HAVING rating_count > 0
+            ORDER BY avg_rating DESC, rating_count DESC, u.id_user DESC
+            LIMIT %s
+            """,
+            (days, limit),
+        )
+        rows = [_normalize_user_rating_fields(row) for row in cur.fetchall()]
+        return jsonify(rows), 200
+    except Exception as e:
+        return jsonify({"error": f"Chyba pri nacitani hodnoteni: {str(e)}"}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+
+RATING_VALUES = range(1, 6)
+RATING_HISTOGRAM_COLUMNS = ", ".join(f"count_{value}" for value in RATING_VALUES)
+
+
+def _apply_rating_to_stats(cur, user_id: int, rating: int, previous: int | None = None):
+    """
+    Incrementally update user_rating_stats for one new or changed rating.
+    Must run in the same transaction as the user_ratings write.
+    """
+    if previous is None:
+        cur.execute(
+            f"""
+            INSERT INTO user_rating_stats (user_id, rating_sum, rating_count, count_{rating})
+            VALUES (%s, %s, 1, 1)
+            ON DUPLICATE KEY UPDATE
+              rating_sum = rating_sum + VALUES(rating_sum),
+              rating_count = rating_count + 1,
+              count_{rating} = count_{rating} + 1
+            """,
+            (user_id, rating),
+        )
+    elif previous != rating:
+        cur.execute(
+            f"""
+            UPDATE user_rating_stats
+            SET rating_sum = rating_sum + %s,
+                count_{previous} = count_{previous} - 1,
+                count_{rating} = count_{rating} + 1
+            WHERE user_id = %s
+            """,
+            (rating - previous, user_id),
+        )
+
+
+@app.post("/api/users/<int:user_id>/ratings")
+def upsert_user_rating(user_id):
+    data = request.get_json(force=True)
+    rated_by_user_id = data.get("rated_by_user_id")
+    rating_value = data.get("rating")
+    comment = (data.get("comment") or "").strip()
+
+    try:
+        rated_by_user_id = int(rated_by_user_id)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Neplatne ID hodnotiaceho pouzivatela."}), 400
+
+    if rated_by_user_id == user_id:
+        return jsonify({"error": "Pouzivatel sa nemoze hodnotit sam."}), 400
+
+    try:
+        rating_value = int(rating_value)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Neplatna hodnota ratingu."}), 400
+
+    if rating_value < 1 or rating_value > 5:
+        return jsonify({"error": "Hodnotenie musi byt v rozsahu 1 az 5."}), 400
+
+    if not comment:
+        comment = None
+    elif len(comment) > 1000:
+        comment = comment[:1000]
+
+    conn = get_conn()
+    cur = None
+    write_cur = None
+    detail_cur = None
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute("SELECT id_user FROM users WHERE id_user IN (%s, %s)", (user_id, rated_by_user_id))
+        ids = {row["id_user"] for row in cur.fetchall()}
+        if user_id not in ids:
+            return jsonify({"error": "Hodnoteny pouzivatel neexistuje."}), 404
+        if rated_by_user_id not in ids:
+            return jsonify({"error": "Hodnotiaci pouzivatel neexistuje."}), 400
+
+        # rating row and its stats change together
+        conn.start_transaction()
+        cur.execute("""
+            SELECT id_rating, rating
+            FROM user_ratings
+            WHERE user_id = %s AND rated_by_user_id = %s
+            FOR UPDATE
+        """, (user_id, rated_by_user_id))
+        existing = cur.fetchone()
+        cur.close()
+        cur = None
+
+        write_cur = conn.cursor()
+        if existing:
+            write_cur.execute("""
+                UPDATE user_ratings
+                SET rating = %s, comment = %s, created_at = NOW()
+                WHERE id_rating = %s
+            """, (rating_value, comment, existing["id_rating"]))
+            _apply_rating_to_stats(write_cur, user_id, rating_value, previous=int(existing["rating"]))
+            status_code = 200
+        else:
+            write_cur.execute("""
+                INSERT INTO user_ratings (user_id, rated_by_user_id, rating, comment)
+                VALUES (%s, %s, %s, %s)
+            """, (user_id, rated_by_user_id, rating_value, comment))
+            _apply_rating_to_stats(write_cur, user_id, rating_value)
+            status_code = 201
+        conn.commit()
+        write_cur.close()
+        write_cur = None
+
+        detail_cur = conn.cursor(dictionary=True)
+        detail_cur.execute("""
+            SELECT r.id_rating, r.user_id, r.rated_by_user_id, r.rating, r.comment, r.created_at,
+                   u.meno, u.priezvisko
+            FROM user_ratings r
+            LEFT JOIN users u ON u.id_user = r.rated_by_user_id
+            WHERE r.user_id = %s AND r.rated_by_user_id = %s
+            LIMIT 1
+        """, (user_id, rated_by_user_id))
+        saved = _serialize_rating_row(detail_cur.fetchone())
+
+        return jsonify({"message": "Hodnotenie ulozene.", "rating": saved}), status_code
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"error": f"Chyba pri ukladani hodnotenia: {str(e)}"}), 500
+    finally:
+        if cur:
+            cur.close()
+        if write_cur:
+            write_cur.close()
+        if detail_cur:
+            detail_cur.close()
+        conn.close()
+
+# ==========================================
+# 💬 CHAT – CONVERSATIONS & MESSAGES
+# ==========================================
+
+@app.post("/api/chat/conversations")
+def create_or_get_conversation():
+    data = request.get_json(force=True) or {}
+    user_ids = data.get("user_ids")
+    title = (data.get("title") or "").strip()
+
+    if not isinstance(user_ids, list) or len(user_ids) < 2:
+        return jsonify({"error": "Potrebujem aspoň dvoch účastníkov."}), 400
+
+    # odstránime duplicity + zoradíme, nech je to deterministické
+    user_ids = sorted({int(uid) for uid in user_ids})
+    is_group = len(user_ids) > 2
+
+    # title používame len pre skupiny; pre 1:1 ho ignorujeme
+    if is_group and not title:
+        return jsonify({"error": "Chýba názov skupiny."}), 400
+
+    conn = get_conn()
+    cur = conn.cursor(dictionary=True)
+    try:
+        # 1:1 – nájdi existujúcu konverzáciu s presne tými účastníkmi
+        # (pozor: pôvodný WHERE cp.id_user IN (...) vedel omylom trafiť aj skupinu)
+        if not is_group:
+            placeholders = ", ".join(["%s"] * len(user_ids))
+            query = f"""
+                SELECT MIN(c.id_conversation) AS id_conversation
+                FROM conversations c
+                JOIN conversation_participants cp ON cp.id_conversation = c.id_conversation
+                GROUP BY c.id_conversation
+                HAVING
+                  SUM(CASE WHEN cp.id_user IN ({placeholders}) THEN 1 ELSE 0 END) = %s
+                  AND COUNT(*) = %s
+                LIMIT 1
+            """
+            cur.execute(query, (*user_ids, len(user_ids), len(user_ids)))
+            row = cur.fetchone()
+            if row and row.get("id_conversation"):
+                return jsonify({"id_conversation": row["id_conversation"], "created": False}), 200
+
+        # Skupina (alebo nové 1:1) – vytvoríme novú konverzáciu
+        if is_group:
+            cur.execute("INSERT INTO conversations (title) VALUES (%s)", (title,))
+        else:
+            cur.execute("INSERT INTO conversations () VALUES ()")
+
+        conv_id = cur.lastrowid
+
+        cur.executemany(
+            "INSERT INTO conversation_participants (id_conversation, id_user) VALUES (%s, %s)",
+            [(conv_id, uid) for uid in user_ids],
+        )
+        conn.commit()
+
+        return jsonify({"id_conversation": conv_id, "created": True}), 201
+
+    finally:
+        cur.close()
+        conn.close()
+
+
+@app.get("/api/chat/conversations")
+def list_conversations():
+    user_id = request.args.get("user_id", type=int)
+    if not user_id:
+        return jsonify({"error": "Chýba user_id."}), 400
+
+    conn = get_conn()
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(
+            """
+            SELECT
+              c.id_conversation,
+              c.title,
+              COUNT(DISTINCT cp.id_user) AS participant_count,
+              (COUNT(DISTINCT cp.id_user) > 2) AS is_group,
+
+              MAX(m.created_at) AS last_message_at,
+              SUBSTRING_INDEX(
+                  MAX(CONCAT(m.created_at, '|||', m.content)),
+                  '|||', -1
+              ) AS last_message,
+              GROUP_CONCAT(DISTINCT cp.id_user) AS participant_ids,
+
+              -- "ten druhý" používateľ v 1:1 chate (pre skupiny sa ignoruje)
+              MAX(CASE WHEN cp.id_user <> %s THEN cp.id_user END) AS other_user_id,
+              MAX(
+                CASE
+                  WHEN cp.id_user <> %s THEN CONCAT(u.meno, ' ', u.priezvisko)
+                  ELSE NULL
+                END
+              ) AS other_user_name,
+
+              -- UI-friendly názov konverzácie:
+              CASE
+                WHEN c.title IS NOT NULL AND c.title <> '' THEN c.title
+                WHEN COUNT(DISTINCT cp.id_user) = 2 THEN
+                  MAX(CASE WHEN cp.id_user <> %s THEN CONCAT(u.meno, ' ', u.priezvisko) END)
+                ELSE CONCAT('Skupina (', COUNT(DISTINCT cp.id_user), ')')
+              END AS display_title,
+
+              -- počet neprečítaných správ pre aktuálneho používateľa
+              (
+                SELECT COUNT(*)
+                FROM messages m2
+                WHERE m2.id_conversation = c.id_conversation
+                  AND (cp_me.last_read_message_id IS NULL OR m2.id_message > cp_me.last_read_message_id)
+                  AND m2.sender_id <> %s
+              ) AS unread_count
+
+            FROM conversations c
+
+            JOIN conversation_participants cp_me
+              ON cp_me.id_conversation = c.id_conversation
+             AND cp_me.id_user = %s
+
+            JOIN conversation_participants cp
+              ON cp.id_conversation = c.id_conversation
+            JOIN users u
+              ON u.id_user = cp.id_user
+
+            LEFT JOIN messages m
+              ON m.id_conversation = c.id_conversation
+
+            GROUP BY c.id_conversation
+            ORDER BY last_message_at DESC
+            """,
+            (user_id, user_id, user_id, user_id, user_id),
+        )
+
+        rows = cur.fetchall()
+        return jsonify(rows), 200
+
+    finally:
+        cur.close()
+        conn.close()
+
+
+@app.get("/api/chat/conversations/<int:conv_id>/messages")
+def get_messages(conv_id):
+    page = request.args.get("page", default=1, type=int)
+    page_size = request.args.get("page_size", default=50, type=int)
+    offset = (page - 1) * page_size
+    user_id = request.args.get("user_id", type=int)
+
+    conn = get_conn()
+    cur = conn.cursor(dictionary=True)
+    try:
+        # načítaj správy
+        cur.execute(
+            """
+            SELECT
+              m.id_message,
+              m.sender_id,
+              m.content,
+              m.created_at,
+              m.is_edited,
+              m.edited_at,
+              u.meno,
+              u.priezvisko
+            FROM messages m
+            JOIN users u ON u.id_user = m.sender_id
+            WHERE m.id_conversation = %s
+            ORDER BY m.created_at ASC
+            LIMIT %s OFFSET %s
+            """,
+            (conv_id, page_size, offset),
+        )
+        rows = cur.fetchall()
+
+        # ak vieme, kto je aktuálny používateľ, označ všetky doteraz načítané správy ako prečítané
+        if user_id is not None and rows:
+            max_id = max(row["id_message"] for row in rows)
+            cur.execute(
+                """
+                UPDATE conversation_participants
+                SET last_read_message_id = %s,
+                    last_read_at = NOW()
+                WHERE id_conversation = %s
+                  AND id_user = %s
+                """,
+                (max_id, conv_id, user_id),
+            )
+            conn.commit()
+
+        return jsonify(rows), 200
+    finally:
+        cur.close()
+        conn.close()
+
+
+@app.post("/api/chat/conversations/<int:conv_id>/messages")
+def send_message(conv_id):
+    data = request.get_json(force=True) or {}
+    sender_id = data.get("sender_id")
+    content = (data.get("content") or "").strip()
+
+    if not sender_id or not content:
+        return jsonify({"error": "Chýba odosielateľ alebo obsah."}), 400
+
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "INSERT INTO messages (id_conversation, sender_id, content) VALUES (%s, %s, %s)",
+            (conv_id, sender_id, content),
+        )
+        conn.commit()
+        msg_id = cur.lastrowid
+
+        return jsonify({"id_message": msg_id}), 201
+
+    finally:
+        cur.close()
+        conn.close()
+
+
+@app.patch("/api/chat/messages/<int:message_id>")
+def edit_message(message_id):
+    data = request.get_json(force=True) or {}
+    sender_id = data.get("sender_id")
+    new_content = (data.get("content") or "").strip()
+
+    if not sender_id or not new_content:
+        return jsonify({"error": "Chýba odosielateľ alebo obsah."}), 400
+
+    conn = get_conn()
+    cur = conn.cursor(dictionary=True)
+    try:
+        # skontroluj, že správa existuje a patrí tomuto používateľovi
+        cur.execute(
+            "SELECT id_message, sender_id FROM messages WHERE id_message = %s",
+            (message_id,),
+        )
+        row = cur.fetchone()
+        if not row:
+            return jsonify({"error": "Správa neexistuje."}), 404
+        if int(row["sender_id"]) != int(sender_id):
+            return jsonify({"error": "Nemôžeš upraviť cudziu správu."}), 403
+
+        cur.execute(
+            """
+            UPDATE messages
+            SET content = %s,
+                is_edited = 1,
+                edited_at = NOW()
+            WHERE id_message = %s
+            """,
+            (new_content, message_id),
+        )
+        conn.commit()
+        return jsonify({"success": True}), 200
+    finally:
+        cur.close()
+        conn.close()
+
+
+@app.get("/api/chat/conversations/<int:conv_id>/participants")
+def get_conversation_participants(conv_id: int):
+    user_id = request.args.get("user_id", type=int)
+    if not user_id:
+        return jsonify({"error": "Chýba user_id."}), 400
+
+    conn = get_conn()
+    cur = conn.cursor(dictionary=True)
+    try:
+        # bezpečnosť: len člen konverzácie môže vidieť členov
+        cur.execute(
+            """
+            SELECT 1
+            FROM conversation_participants
+            WHERE id_conversation = %s AND id_user = %s
+            LIMIT 1
+            """,
+            (conv_id, user_id),
+        )
+        if not cur.fetchone():
+            return jsonify({"error": "Nemáš prístup k tejto konverzácii."}), 403
+
+        cur.execute(
+            """
+            SELECT u.id_user, u.meno, u.priezvisko
+            FROM conversation_participants cp
+            JOIN users u ON u.id_user = cp.id_user
+            WHERE cp.id_conversation = %s
+            ORDER BY u.meno ASC, u.priezvisko ASC
+            """,
+            (conv_id,),
+        )
+        rows = cur.fetchall()
+        return jsonify(rows), 200
+    finally:
+        cur.close()
+        conn.close()
+
+
+# ==========================================
+# 📝 PRÍSPEVKY
+# ==========================================
+
+# POST_SEARCH_BACKEND: fulltext (post_search table, ngram FULLTEXT) | like (old LIKE scorer)
+POST_SEARCH_BACKEND = os.getenv("POST_SEARCH_BACKEND", "fulltext").strip().lower()
+POST_SEARCH_MAX_HITS = int(os.getenv("POST_SEARCH_MAX_HITS", "1000"))
+POST_SEARCH_MIN_TOKEN = 2  # innodb ngram_token_size; shorter terms fall back to LIKE
+# field weights, highest first: title > description > category > role > author name
+POST_SEARCH_WEIGHTS = (
+    ("title_f", 80),
+    ("description_f", 40),
+    ("category_f", 30),
+    ("role_f", 28),
+    ("author_f", 25),
+)
+POST_SEARCH_EXACT_TITLE = 120
+POST_SEARCH_ALL_FIELDS = ", ".join(f"ps.{field}" for field, _ in POST_SEARCH_WEIGHTS)
+# ranked id lists per query + filters, so later pages only fetch rows
+POST_SEARCH_CACHE = LRUCache(256, ttl_s=float(os.getenv("POST_SEARCH_CACHE_TTL_S", "120")))
+
+
+def _post_search_cache_key(*parts) -> tuple:
+    """
+    POST_SEARCH_CACHE key tied to the table versions conditional_get put into the
+    ETag: a write made through another worker never leaves an older cached ranking
+    behind a fresh ETag.
+    """
+    versions = getattr(g, "table_versions", None)
+    return (*parts, tuple(sorted(versions.items())) if versions else None)
+
+
+def _search_fold(value) -> str:
+    """Search form of a text: no diacritics, lowercase, single spaces (same folding as place names)."""
+    return _place_key(value)
+
+
+def _reindex_posts(conn, where_sql: str, params) -> int:
+    """Recompute post_search rows for posts matching where_sql (on posts p / users u)."""
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            f"""
+            SELECT p.id_post, p.title, p.description, p.category, u.rola, u.meno, u.priezvisko
+            FROM posts p
+            JOIN users u ON u.id_user = p.user_id
+            WHERE {where_sql}
+            """,
+            params,
+        )
+        rows = [
+            (
+                post_id,
+                _search_fold(title)[:255],
+                _search_fold(description),
+                _search_fold(category)[:255],
+                _search_fold(role)[:255],
+                _search_fold(f"{meno or ''} {priezvisko or ''}")[:255],
+            )
+            for post_id, title, description, category, role, meno, priezvisko in cur.fetchall()
+        ]
+        if rows:
+            cur.executemany(
+                """
+                REPLACE INTO post_search (post_id, title_f, description_f, category_f, role_f, author_f)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                """,
+                rows,
+            )
+        conn.commit()
+    finally:
+        cur.close()
+    POST_SEARCH_CACHE.clear()
+    return len(rows)
+
+
+def _reindex_posts_safely(conn, where_sql: str, params):
+    """Index maintenance must not fail the write that triggered it; posts-search-rebuild repairs gaps."""
+    if POST_SEARCH_BACKEND != "fulltext":
+        return
+    try:
+        _reindex_posts(conn, where_sql, params)
+    except Exception as exc:
+        logging.warning("post_search update failed (%s): %s", params, exc)
+
+
+def _ranked_post_ids(cur, q: str, filters: list[str], filter_params: list) -> list[tuple[int, float]]:
+    """
+    Ranked (id_post, score) for a search, best first, capped at POST_SEARCH_MAX_HITS.
+    Scored once per query + filters and cached, so paging is a slice of the list.
+    """
+    folded = _search_fold(q)
+    key = _post_search_cache_key(folded, tuple(filters), tuple(filter_params))
+    hits = POST_SEARCH_CACHE.get(key)
+    if hits is not None:
+        return hits
+
+    tokens = list(dict.fromkeys(re.findall(r"\w+", folded)))
+    terms = [t for t in tokens if len(t) >= POST_SEARCH_MIN_TOKEN]
+    short = [t for t in tokens if len(t) < POST_SEARCH_MIN_TOKEN]
+    if not tokens:
+        return []
+
+    conds, cond_params = list(filters), list(filter_params)
+    if terms:
+        # with the ngram parser a quoted term is a substring match; every term must occur somewhere
+        conds.append(f"MATCH({POST_SEARCH_ALL_FIELDS}) AGAINST (%s IN BOOLEAN MODE)")
+        cond_params.append(" ".join(f'+"{t}"' for t in terms))
+    # one-letter words only narrow the search when nothing longer was typed
+    for t in ([] if terms else short):
+        conds.append(f"CONCAT_WS(' ', {POST_SEARCH_ALL_FIELDS}) LIKE %s")
+        cond_params.append(f"%{t}%")
+
+    score_parts = ["(CASE WHEN ps.title_f = %s THEN %s ELSE 0 END)"]
+    score_params: list = [folded, POST_SEARCH_EXACT_TITLE]
+    if terms:
+        any_terms = " ".join(f'"{t}"' for t in terms)
+        for field, weight in POST_SEARCH_WEIGHTS:
+            score_parts.append(f"(CASE WHEN MATCH(ps.{field}) AGAINST (%s IN BOOLEAN MODE) > 0 THEN %s ELSE 0 END)")
+            score_params.extend([any_terms, weight])
+        # relevance inside the same weight class (more / rarer term hits first)
+        score_parts.append(f"LEAST(MATCH({POST_SEARCH_ALL_FIELDS}) AGAINST (%s IN BOOLEAN MODE), 9)")
+        score_params.append(any_terms)
+
+    cur.execute(
+        f"""
+        SELECT ps.post_id, {' + '.join(score_parts)} AS score
+        FROM post_search ps
+        JOIN posts p ON p.id_post = ps.post_id
+        JOIN users u ON u.id_user = p.user_id
+        WHERE {' AND '.join(conds)}
+        ORDER BY score DESC, p.title ASC, p.id_post DESC
+        LIMIT %s
+        """,
+        score_params + cond_params + [POST_SEARCH_MAX_HITS],
+    )
+    hits = [(int(row["post_id"]), float(row["score"])) for row in cur.fetchall()]
+    POST_SEARCH_CACHE.set(key, hits)
+    return hits
+
+# Semantic post search: post texts are embedded off the request path with the same
+# multilingual e5 model as user matching ("passage: " / "query: " prefixes as e5 expects).
+POST_SEARCH_MODES = ("lexical", "semantic", "hybrid")
+POST_SEMANTIC_TOP_K = int(os.getenv("POST_SEMANTIC_TOP_K", "200"))
+POST_SEMANTIC_MIN_SIMILARITY = float(os.getenv("POST_SEMANTIC_MIN_SIMILARITY", "0.8"))
+POST_HYBRID_SEMANTIC_WEIGHT = float(os.getenv("POST_HYBRID_SEMANTIC_WEIGHT", "0.5"))
+QUERY_EMBEDDING_CACHE = LRUCache(int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024")))
+
+
+class PostEmbeddingIndex(EmbeddingIndex):
+    """In-memory normalized matrix of post_embeddings; ids are post ids, role/city stay unused."""
+
+    label = "posts"
+
+    def __init__(self):
+        super().__init__()
+        self._table_version = None  # table_versions.version of post_embeddings at the last sync_version
+
+    def sync_version(self, version) -> None:
+        """
+        Refresh right away when post_embeddings moved past the version this index
+        last caught up with, instead of waiting for the periodic refresh.
+        """
+        if version is None or version == self._table_version:
+            return
+        with self._refresh_lock:
+            if version == self._table_version:
+                return
+            try:
+                with db_conn() as conn:
+                    self.refresh(conn)
+            except Exception as exc:
+                logging.warning("Embedding index (%s) refresh failed: %s", self.label, exc)
+                return
+            self._checked_at = time.monotonic()
+            self._table_version = version
+
+    def _load_rows(self, conn, since: int | None = None) -> list[tuple]:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                """
+                SELECT post_id,
+                       IF(%s IS NULL OR updated_at >= FROM_UNIXTIME(%s), embedding, NULL),
+                       NULL, NULL, 0
+                FROM post_embeddings
+                WHERE embedding IS NOT NULL AND model_name = %s
+                """,
+                (since, since, EMBEDDING_MODEL_NAME),
+            )
+            return cur.fetchall()
+        finally:
+            cur.close()
+
+    def refresh(self, conn) -> int:
+        changed = super().refresh(conn)
+        if changed:
+            # cached semantic / hybrid rankings were computed without these vectors
+            POST_SEARCH_CACHE.clear()
+        return changed
+
+
+POST_EMBEDDING_INDEX = PostEmbeddingIndex()
+
+
+def _post_passage(title, category, description) -> str:
+    parts = [str(part).strip() for part in (title, category, description) if part and str(part).strip()]
+    return "passage: " + ". ".join(parts)
+
+
+def embed_posts(post_ids) -> set[int]:
+    """
+    Compute and store embeddings for a batch of posts with one model.encode call.
+    Deleted posts leave the index. Cached search rankings are dropped whenever the
+    index changes. Returns ids left pending because the model is disabled.
+    """
+    post_ids = [int(pid) for pid in post_ids]
+    if not post_ids:
+        return set()
+    with db_conn() as conn:
+        placeholders = ", ".join(["%s"] * len(post_ids))
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                f"SELECT id_post, title, category, description FROM posts WHERE id_post IN ({placeholders})",
+                tuple(post_ids),
+            )
+            texts = {row[0]: _post_passage(*row[1:]) for row in cur.fetchall()}
+        finally:
+            cur.close()
+        gone = set(post_ids) - set(texts)
+        for pid in gone:
+            POST_EMBEDDING_INDEX.remove(pid)
+        if gone:
+            POST_SEARCH_CACHE.clear()
+        if not texts:
+            return set()
+        if embedding_model.mode == "disabled":
+            return set(texts)
+
+        ids = list(texts)
+        vectors = embedding_model.encode([texts[pid] for pid in ids], normalize_embeddings=True)
+        cur = conn.cursor()
+        try:
+            cur.executemany(
+                """
+                INSERT INTO post_embeddings (post_id, embedding, model_name, status)
+                VALUES (%s, %s, %s, 'ready')
+                ON DUPLICATE KEY UPDATE
+                  embedding = VALUES(embedding),
+                  model_name = VALUES(model_name),
+                  status = 'ready',
+                  updated_at = CURRENT_TIMESTAMP
+                """,
+                [(pid, encode_embedding(vec), EMBEDDING_MODEL_NAME) for pid, vec in zip(ids, vectors)],
+            )
+            conn.commit()
+        finally:
+            cur.close()
+    if POST_EMBEDDING_INDEX.loaded:
+        for pid, vec in zip(ids, vectors):
+            POST_EMBEDDING_INDEX.upsert(pid, vec)
+    POST_SEARCH_CACHE.clear()
+    return set()
+
+
+def _process_post_embedding_batch(post_ids):
+    embed_posts(post_ids)
+    return ()
+
+
+POST_EMBEDDING_QUEUE = CoalescingJobQueue(
+    _process_post_embedding_batch,
+    name="post-embeddings",
+    batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "32")),
+)
+
+
+def request_post_embedding(conn, post_id: int) -> None:
+    """Mark the post's embedding pending/stale and schedule it; failures only delay semantic search."""
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            INSERT INTO post_embeddings (post_id, embedding, model_name, status)
+            VALUES (%s, NULL, %s, 'pending')
+            ON DUPLICATE KEY UPDATE
+              status = IF(embedding IS NULL, 'pending', 'stale')
+            """,
+            (post_id, EMBEDDING_MODEL_NAME),
+        )
+        conn.commit()
+    except Exception as exc:
+        logging.warning("Could not mark post %s for embedding: %s", post_id, exc)
+    finally:
+        cur.close()
+    POST_EMBEDDING_QUEUE.enqueue(post_id)
+
+
+def enqueue_outstanding_post_embeddings() -> int:
+    """Re-schedule pending/stale post embeddings, e.g. jobs lost when a worker restarted."""
+    with db_conn() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT post_id FROM post_embeddings WHERE status IN ('pending', 'stale')")
+            post_ids = [row[0] for row in cur.fetchall()]
+        finally:
+            cur.close()
+    POST_EMBEDDING_QUEUE.enqueue_many(post_ids)
+    return len(post_ids)
+
+
+def encode_search_query(q: str) -> np.ndarray:
+    """
+    Normalized query vector; the only model call on the search path, LRU-cached.
+    Raises ModelWarmingUp / ModelDisabled instead of blocking the request.
+    """
+    text = "query: " + " ".join(q.split())
+    vec = QUERY_EMBEDDING_CACHE.get(text)
+    if vec is None:
+        model = embedding_model.get(block=False)
+        vec = np.asarray(model.encode([text], normalize_embeddings=True)[0], dtype=np.float32)
+        QUERY_EMBEDDING_CACHE.set(text, vec)
+    return vec
+
+
+def _semantic_post_ids(cur, q: str, mode: str, filters: list[str], filter_params: list) -> list[tuple[int, float]]:
+    """
+    Ranked (id_post, score) for mode semantic (cosine similarity) or hybrid
+    (cosine blended with the lexical score scaled to 0..1). Cached like _ranked_post_ids.
+    """
+    key = _post_search_cache_key(mode, _search_fold(q), tuple(filters), tuple(filter_params))
+    hits = POST_SEARCH_CACHE.get(key)
+    if hits is not None:
+        return hits
+
+    qvec = encode_search_query(q)
+    POST_EMBEDDING_INDEX.ensure_loaded()
+    POST_EMBEDDING_INDEX.sync_version((getattr(g, "table_versions", None) or {}).get("post_embeddings"))
+    allowed = None
+    if filters:
+        # category / role / author narrow the candidates before the top-K cut, not after it
+        cur.execute(
+            f"SELECT p.id_post FROM posts p JOIN users u ON u.id_user = p.user_id WHERE {' AND '.join(filters)}",
+            list(filter_params),
+        )
+        allowed = [row["id_post"] for row in cur.fetchall()]
+    similarity = {
+        pid: sim
+        for pid, sim in POST_EMBEDDING_INDEX.search(qvec, POST_SEMANTIC_TOP_K, user_ids=allowed)
+        if sim >= POST_SEMANTIC_MIN_SIMILARITY
+    }
+    lexical = {}
+    if mode == "hybrid" and POST_SEARCH_BACKEND == "fulltext":
+        lexical = dict(_ranked_post_ids(cur, q, filters, filter_params))
+        missing = [pid for pid in lexical if pid not in similarity]
+        if missing:
+            similarity.update(POST_EMBEDDING_INDEX.search(qvec, len(missing), user_ids=missing))
+
+    # lexical hits are filtered in SQL, semantic ones through `allowed`
+    candidates = list(dict.fromkeys([*lexical, *similarity]))
+    top_lexical = max(lexical.values(), default=0.0) or 1.0
+    weight = POST_HYBRID_SEMANTIC_WEIGHT if mode == "hybrid" else 1.0
+    scored = [
+        (pid, round(weight * similarity.get(pid, 0.0) + (1.0 - weight) * lexical.get(pid, 0.0) / top_lexical, 6))
+        for pid in candidates
+    ]
+    hits = sorted(scored, key=lambda item: (-item[1], -item[0]))
+    POST_SEARCH_CACHE.set(key, hits)
+    return hits
+
+
+# sort keys (sql_expr, descending, row_field, null_as) for keyset pagination
+POST_SORT_KEYS = {
+    "id_desc": (("p.id_post", True, "id_post", None),),
+    "id_asc": (("p.id_post", False, "id_post", None),),
+    "title_asc": (("p.title", False, "title", None), ("p.id_post", False, "id_post", None)),
+    "title_desc": (("p.title", True, "title", None), ("p.id_post", True, "id_post", None)),
+}
+# relevance for q; score is a select alias, so these keys go into HAVING
+POST_SCORE_SORT_KEYS = (("score", True, "score", None), ("title", False, "title", None), ("id_post", True, "id_post", None))
+
+
+@app.get("/api/posts")
+@conditional_get(
+    ("posts", "users", "user_rating_stats", "post_search", "post_embeddings"),
+    "no-cache",
+    # semantic modes answer lexically until the model is ready
+    vary=lambda: embedding_model.status if request.args.get("mode") in ("semantic", "hybrid") else None,
+)
+def get_posts():
+    """
+    Zoznam príspevkov. Bez q a filtrov a bez cursor/count vracia len pole (ako doteraz).
+    Stránkovanie: page/page_size alebo cursor (next_cursor z predchádzajúcej odpovede),
+    count=exact|estimate|none určuje, či a ako sa počíta celkový počet.
+    mode=lexical|semantic|hybrid (pri q) – hľadanie podľa slov, podľa významu alebo oboje.
+    """
+    q = request.args.get("q", "").strip()
+    sort = request.args.get("sort", "id_desc").lower()
+    category_param = request.args.get("category", "").strip()
+    type_param = request.args.get("type", "").strip()
+    author_id = request.args.get("author_id", "").strip()
+    role_filter_raw = request.args.get("role", "").strip()
+
+    try:
+        page = max(1, int(request.args.get("page", 1)))
+    except (TypeError, ValueError):
+        page = 1
+    try:
+        page_size = min(100, max(1, int(request.args.get("page_size", 50))))
+    except (TypeError, ValueError):
+        page_size = 50
+    offset = (page - 1) * page_size
+    count_mode = (request.args.get("count") or "exact").strip().lower()
+    if count_mode not in COUNT_MODES:
+        return jsonify({"error": "Parameter count musí byť exact, estimate alebo none."}), 400
+
+    mode = (request.args.get("mode") or "lexical").strip().lower()
+    if mode not in POST_SEARCH_MODES:
+        return jsonify({"error": "Parameter mode musí byť lexical, semantic alebo hybrid."}), 400
+
+    sort_name = ("score" if mode == "lexical" else f"score_{mode}") if q else (sort if sort in POST_SORT_KEYS else "id_desc")
+    sort_keys = POST_SCORE_SORT_KEYS if q else POST_SORT_KEYS[sort_name]
+    try:
+        position = _cursor_arg(sort_name, sort_keys)
+    except ValueError:
+        return jsonify({"error": "Neplatný kurzor."}), 400
+
+    conn = get_conn()
+    try:
+        cur = conn.cursor(dictionary=True)
+        where = ["1=1"]
+        params = []
+
+        # multiple category/type values allowed, comma-separated
+        category_values = []
+        for raw in (category_param, type_param):
+            if raw:
+                category_values.extend([val.strip() for val in raw.split(",") if val.strip()])
+        if category_values:
+            category_values = list(dict.fromkeys(category_values))
+            placeholders = ", ".join(["%s"] * len(category_values))
+            where.append(f"p.category IN ({placeholders})")
+            params.extend(category_values)
+
+        allowed_roles = {"user_dobrovolnik", "user_firma", "user_senior"}
+        role_aliases = {
+            "dobrovolnik": "user_dobrovolnik",
+            "firma": "user_firma",
+            "senior": "user_senior",
+        }
+        role_filter = role_aliases.get(role_filter_raw.lower(), role_filter_raw) if role_filter_raw else ""
+        if role_filter and role_filter in allowed_roles:
+            where.append("u.rola = %s")
+            params.append(role_filter)
+        if author_id:
+            where.append("p.user_id = %s")
+            params.append(author_id)
+
+        rating_join = "LEFT JOIN user_rating_stats r ON r.user_id = p.user_id"
+
+        search_mode = mode
+        hits = None
+        if q and mode != "lexical":
+            try:
+                hits = _semantic_post_ids(cur, q, mode, where[1:], params)
+            except (ModelWarmingUp, ModelDisabled):
+                # no model yet: answer lexically rather than keep the user waiting
+                search_mode = "lexical"
+        if q and hits is None and POST_SEARCH_BACKEND == "fulltext":
+            hits = _ranked_post_ids(cur, q, where[1:], params)
+        if hits is not None:
+            total = len(hits)
+            start = offset
+            if position:
+                # resume after the cursor's post; if it dropped out of the ranking, after its score
+                after_id = position[2]
+                start = next((i + 1 for i, (post_id, _) in enumerate(hits) if post_id == after_id), None)
+                if start is None:
+                    start = next((i for i, (_, score) in enumerate(hits) if score < position[0]), total)
+            page_hits = hits[start:start + page_size]
+            rows = []
+            if page_hits:
+                scores = dict(page_hits)
+                placeholders = ", ".join(["%s"] * len(page_hits))
+                cur.execute(f"""
+                    SELECT p.id_post, p.title, p.description, p.image, p.category, p.user_id,
+                           u.meno AS name, u.priezvisko AS surname,
+                           r.avg_rating, u.rola
+                    FROM posts p
+                    JOIN users u ON u.id_user = p.user_id
+                    {rating_join}
+                    WHERE p.id_post IN ({placeholders})
+                """, list(scores))
+                by_id = {row["id_post"]: row for row in cur.fetchall()}
+                for post_id, score in page_hits:
+                    row = by_id.get(post_id)
+                    if row is not None:
+                        row["score"] = score
+                        if row.get("image"):
+                            row["image"] = _make_abs(row["image"])
+                        rows.append(row)
+            next_cursor = None
+            if start + page_size < total and rows:
+                next_cursor = encode_cursor({"s": sort_name, "v": keyset_values(sort_keys, rows[-1])})
+            # the ranked list is already in hand, so the total is exact whatever count says
+            resp = jsonify({
+                "items": rows,
+                "pagination": {
+                    "page": None if position else page,
+                    "page_size": page_size,
+                    "count": "exact",
+                    "total": total,
+                    "pages": (total + page_size - 1) // page_size,
+                    "next_cursor": next_cursor,
+                }
+            })
+            resp.headers["X-Search-Mode"] = search_mode
+            return resp, 200
+
+        score_sql = "0"
+        score_params = []
+        if q:
+            like_any = f"%{q}%"
+            like_prefix = f"{q}%"
+            fullname = "CONCAT(u.meno,' ',u.priezvisko)"
+            where.append(
+                "(p.title LIKE %s OR p.description LIKE %s OR p.category LIKE %s OR u.rola LIKE %s OR "
+                f"{fullname} LIKE %s)"
+            )
+            params += [like_any, like_any, like_any, like_any, like_any]
+            score_sql = f"""
+                (CASE WHEN p.title = %s THEN 120 ELSE 0 END) +
+                (CASE WHEN p.title LIKE %s THEN 80 ELSE 0 END) +
+                (CASE WHEN p.description LIKE %s THEN 40 ELSE 0 END) +
+                (CASE WHEN p.category LIKE %s THEN 30 ELSE 0 END) +
+                (CASE WHEN u.rola LIKE %s THEN 28 ELSE 0 END) +
+                (CASE WHEN {fullname} LIKE %s THEN 25 ELSE 0 END) +
+                (CASE WHEN p.title LIKE %s THEN 10 ELSE 0 END) +
+                (CASE WHEN p.description LIKE %s THEN 6 ELSE 0 END) +
+                (CASE WHEN p.category LIKE %s THEN 5 ELSE 0 END) +
+                (CASE WHEN u.rola LIKE %s THEN 4 ELSE 0 END)
+            """
+            score_params = [
+                q,
+                like_prefix, like_prefix, like_prefix, like_prefix, like_prefix,
+                like_any, like_any, like_any, like_any,
+            ]
+
+        bare_list = (
+            not q and not category_values and not role_filter and not author_id
+            and "cursor" not in request.args and "count" not in request.args
+        )
+        count_sql = f"SELECT p.id_post FROM posts p JOIN users u ON u.id_user = p.user_id WHERE {' AND '.join(where)}"
+        count_params = list(params)
+        sort_sql = keyset_order_sql(sort_keys)
+        having_sql = ""
+        having_params = []
+        if position:
+            after_sql, after_params = keyset_after_sql(sort_keys, position)
+            if q:
+                having_sql, having_params = f"HAVING {after_sql}", after_params
+            else:
+                where.append(after_sql)
+                params.extend(after_params)
+        where_sql = " AND ".join(where)
+        # keyset pages start after the cursor, so OFFSET only applies to page numbers
+        limit_sql = "LIMIT %s" if position else "LIMIT %s OFFSET %s"
+        limit_params = [page_size + 1] if position else [page_size + 1, offset]
+
+        # the bare list never shows the total
+        total = None
+        if count_mode == "exact" and not bare_list:
+            cur.execute(f"SELECT COUNT(*) AS total FROM ({count_sql}) t", count_params)
+            total = cur.fetchone()["total"]
+        elif count_mode == "estimate" and not bare_list:
+            total = _estimate_rows(cur, count_sql, count_params)
+
+        if q:
+            cur.execute(f"""
+                SELECT p.id_post, p.title, p.description, p.image, p.category, p.user_id,
+                       u.meno AS name, u.priezvisko AS surname,
+                       r.avg_rating, u.rola,
+                       {score_sql} AS score
+                FROM posts p
+                JOIN users u ON u.id_user = p.user_id
+                {rating_join}
+                WHERE {where_sql}
+                {having_sql}
+                ORDER BY {sort_sql}
+                {limit_sql}
+            """, score_params + params + having_params + limit_params)
+        else:
+            cur.execute(f"""
+                SELECT p.id_post, p.title, p.description, p.image, p.category, p.user_id,
+                       u.meno AS name, u.priezvisko AS surname, u.rola,
+                       r.avg_rating
+                FROM posts p
+                JOIN users u ON u.id_user = p.user_id
+                {rating_join}
+                WHERE {where_sql}
+                ORDER BY {sort_sql}
+                {limit_sql}
+            """, params + limit_params)
+
+        rows = cur.fetchall()
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        for item in rows:
+            if item.get("image"):
+                item["image"] = _make_abs(item["image"])
+
+        if bare_list:
+            return jsonify(rows), 200
+
+        next_cursor = None
+        if has_more and rows:
+            next_cursor = encode_cursor({"s": sort_name, "v": keyset_values(sort_keys, rows[-1])})
+        return jsonify({
+            "items": rows,
+            "pagination": {
+                "page": None if position else page,
+                "page_size": page_size,
+                "count": count_mode,
+                "total": total,
+                "pages": (total + page_size - 1) // page_size if total is not None else None,
+                "next_cursor": next_cursor,
+            }
+        }), 200
+    except Exception as e:
+        return jsonify({"error": f"Chyba pri načítaní príspevkov: {str(e)}"}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+@app.get("/api/posts/<int:id_post>")
+def get_post_detail(id_post: int):
+    conn = get_conn()
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute(
+            """
+            SELECT p.id_post, p.title, p.description, p.image, p.category, p.user_id,
+                   u.meno AS name, u.priezvisko AS surname,
+                   r.avg_rating
+            FROM posts p
+            JOIN users u ON u.id_user = p.user_id
+            LEFT JOIN user_rating_stats r ON r.user_id = p.user_id
+            WHERE p.id_post = %s
+            """,
+            (id_post,),
+        )
+        row = cur.fetchone()
+        if not row:
+            return jsonify({"error": "Prispevok neexistuje."}), 404
+        if row.get("image"):
+            row["image"] = _make_abs(row["image"])
+        return jsonify(row), 200
+    except Exception as e:
+        return jsonify({"error": f"Chyba pri nacitani prispevku: {str(e)}"}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+@app.post("/api/posts")
+def create_post():
+    data = request.get_json(force=True)
+    title = data.get("title")
+    description = data.get("description")
+    category = data.get("category")
+    image = data.get("image")
+    user_id = data.get("user_id")
+
+    if not all([title, description, category, user_id]):
+        return jsonify({"error": "Chýbajú povinné údaje (title, description, category, user_id)."}), 400
+
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO posts (title, description, category, image, user_id)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (title, description, category, None, user_id))
+        new_id = cur.lastrowid
+        conn.commit()
+
+        if image:
+            _save_post_image_from_data_url(conn, new_id, image)
+        _reindex_posts_safely(conn, "p.id_post = %s", (new_id,))
+        request_post_embedding(conn, new_id)
+
+        cur = conn.cursor(dictionary=True)
+        cur.execute("""
+            SELECT p.id_post, p.title, p.description, p.image, p.category, p.user_id,
+                   u.meno AS name, u.priezvisko AS surname
+            FROM posts p
+            JOIN users u ON u.id_user = p.user_id
+            WHERE p.id_post = %s
+        """, (new_id,))
+        row = cur.fetchone()
+        if row and row.get("image"):
+            row["image"] = _make_abs(row["image"])
+        return jsonify(row), 201
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"error": f"Chyba pri vytváraní príspevku: {str(e)}"}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+
+@app.put("/api/posts/<int:id_post>")
+def update_post(id_post):
+    data = request.get_json(force=True)
+    title = data.get("title")
+    description = data.get("description")
+    category = data.get("category")
+    image = data.get("image")
+
+    if not any([title, description, category, image is not None]):
+        return jsonify({"error": "Nie je čo aktualizovať."}), 400
+
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        sets = []
+        params = []
+        if title is not None:
+            sets.append("title = %s"); params.append(title)
+        if description is not None:
+            sets.append("description = %s"); params.append(description)
+        if category is not None:
+            sets.append("category = %s"); params.append(category)
+        if image is not None:
+            # Ak klient pošle data URL -> uložíme ako súbor + media_files
+            if isinstance(image, str) and image.startswith("data:image"):
+                stored = _save_post_image_from_data_url(conn, id_post, image)
+                if not stored:
+                    return jsonify({"error": "Nepodarilo sa uložiť obrázok."}), 400
+                sets.append("image = %s"); params.append(stored)
+            else:
+                # prázdny string => vymazanie obrázka
+                if not image:
+                    _delete_post_images(conn, id_post)
+                    sets.append("image = %s"); params.append(None)
+                else:
+                    # URL alebo cesta; zároveň čistíme staré záznamy, aby sedel media_files
+                    _delete_post_images(conn, id_post)
+                    sets.append("image = %s"); params.append(_make_abs(image))
+
+        if not sets:
+            return jsonify({"error": "Nie je čo aktualizovať."}), 400
+
+        params.append(id_post)
+        cur.execute(f"UPDATE posts SET {', '.join(sets)} WHERE id_post = %s", tuple(params))
+        if cur.rowcount == 0:
+            # Ak sa nezmenili dáta, overíme, či príspevok existuje; ak áno, považujme za OK.
+            cur.execute("SELECT 1 FROM posts WHERE id_post = %s", (id_post,))
+            if not cur.fetchone():
+                return jsonify({"error": "Príspevok neexistuje."}), 404
+        conn.commit()
+        if title is not None or description is not None or category is not None:
+            _reindex_posts_safely(conn, "p.id_post = %s", (id_post,))
+            request_post_embedding(conn, id_post)
+        return jsonify({"success": True}), 200
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"error": f"Chyba pri aktualizácii príspevku: {str(e)}"}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+
+@app.delete("/api/posts/<int:id_post>")
+def delete_post(id_post):
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        _delete_post_images(conn, id_post)
+        cur.execute("DELETE FROM posts WHERE id_post = %s", (id_post,))
+        if cur.rowcount == 0:
+            return jsonify({"error": "Príspevok neexistuje."}), 404
+        conn.commit()
+        # post_search / post_embeddings rows go with the post (ON DELETE CASCADE)
+        POST_SEARCH_CACHE.clear()
+        POST_EMBEDDING_INDEX.remove(id_post)
+        return jsonify({"success": True}), 200
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"error": f"Chyba pri mazaní príspevku: {str(e)}"}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+# ==========================================
+# 👤 PROFIL – GET/UPDATE
+# ==========================================
+
+ALLOWED_PROFILE_FIELDS = {"meno", "priezvisko", "datum_narodenia", "mesto", "about"}
+
+def _validate_profile_payload(data: dict):
+    """Základná validácia pre update profilu."""
+    if not data or not any(k in data for k in ALLOWED_PROFILE_FIELDS):
+        return False, "Nie je čo aktualizovať."
+
+    # dĺžky a formáty
+    if "meno" in data and (not data["meno"] or len(data["meno"]) > 100):
+        return False, "Meno je povinné a môže mať max 100 znakov."
+    if "priezvisko" in data and (not data["priezvisko"] or len(data["priezvisko"]) > 100):
+        return False, "Priezvisko je povinné a môže mať max 100 znakov."
+    if "mesto" in data and (data["mesto"] is not None) and len(data["mesto"]) > 100:
+        return False, "Mesto môže mať max 100 znakov."
+    if "about" in data and (data["about"] is not None) and len(data["about"]) > 5000:
+        return False, "Text „O mne“ môže mať max 5000 znakov."
+    if "datum_narodenia" in data and data["datum_narodenia"]:
+        try:
+            # očakáva sa 'YYYY-MM-DD'
+            datetime.strptime(data["datum_narodenia"], "%Y-%m-%d")
+        except Exception:
+            return False, "Neplatný formát dátumu (použi YYYY-MM-DD)."
+
+    # nepovolené polia (napr. mail, heslo, rola) – ak by prišli, odmietneme
+    forbidden = set(data.keys()) - ALLOWED_PROFILE_FIELDS
+    if forbidden:
+        return False, f"Nasledujúce polia nie je možné meniť: {', '.join(sorted(forbidden))}"
+
+    return True, ""
+
+# Avatar endpoints (media_files + assets/img/avatars)
+@app.post("/api/profile/<int:user_id>/avatar")
+def upload_profile_avatar(user_id: int):
+    file = request.files.get("file")
+    if not file or not file.filename:
+        return jsonify({"error": "S?bor nebol dodan?."}), 400
+
+    filename = secure_filename(file.filename)
+    _, ext = os.path.splitext(filename)
+    ext = ext.lower()
+    if ext not in ALLOWED_IMAGE_EXTS:
+        return jsonify({"error": "Nepodporovan? form?t. Povolen?: jpg, jpeg, png, gif, webp"}), 400
+
+    file_uid = str(uuid.uuid4())
+    path = _avatar_disk_path(file_uid, ext)
+    try:
+        file.save(path)
+    except Exception as e:
+        return jsonify({"error": f"Ukladanie zlyhalo: {str(e)}"}), 500
+
+    size_bytes = os.path.getsize(path)
+    storage_path = f"/assets/img/avatars/{file_uid}{ext}"
+
+    conn = get_conn()
+    cur = None
+    try:
+        _delete_avatar_records(conn, user_id)  # dr??me jeden avatar
+        cur = conn.cursor()
+        cur.execute(
+            """
+            INSERT INTO media_files
+              (owner_type, owner_id, purpose, sort_order, file_uid, file_name, file_ext, mime_type, size_bytes, storage_path)
+            VALUES
+              ('user', %s, 'avatar', 0, %s, %s, %s, %s, %s, %s)
+            """,
+            (
+                user_id,
+                file_uid,
+                filename,
+                ext,
+                file.mimetype or None,
+                size_bytes,
+                storage_path,
+            ),
+        )
+        conn.commit()
+    except Exception as exc:
+        try:
+            os.remove(path)
+        except Exception:
+            pass
+        return jsonify({"error": f"Ukladanie zlyhalo: {exc}"}), 500
+    finally:
+        if cur:
+            cur.close()
+
+    return jsonify({"url": _normalize_storage_path(storage_path), "uid": file_uid}), 201
+
+
+@app.get("/api/profile/<int:user_id>/avatar")
+def get_profile_avatar_meta(user_id: int):
+    conn = get_conn()
+    try:
+        meta = _find_avatar_meta(conn, user_id)
+        if not meta:
+            return jsonify({"error": "Avatar nen?jden?"}), 404
+        return jsonify({"url": _normalize_storage_path(meta["storage_path"]), "uid": meta["file_uid"]}), 200
+    finally:
+        conn.close()
+
+
+@app.delete("/api/profile/<int:user_id>/avatar")
+def delete_profile_avatar(user_id: int):
+    conn = get_conn()
+    try:
+        meta = _find_avatar_meta(conn, user_id)
+        if not meta:
+            return jsonify({"error": "Avatar nen?jden?"}), 404
+        _delete_avatar_records(conn, user_id)
+        return jsonify({"status": "ok"}), 200
+    except Exception as exc:
+        logging.exception("Failed to delete avatar for user %s: %s", user_id, exc)
+        return jsonify({"error": "Nepodarilo sa odstr?ni? avatar."}), 500
+    finally:
+        conn.close()
+
+
+@app.get("/assets/img/avatars/<path:filename>")
+def serve_avatar_file(filename: str):
+    return send_from_directory(AVATARS_DIR, filename, as_attachment=False)
+
+
+# Post image endpoints (media_files + assets/img/posts)
+@app.post("/api/posts/<int:post_id>/image")
+def upload_post_image(post_id: int):
+    file = request.files.get("file")
+    if not file or not file.filename:
+        return jsonify({"error": "Súbor nebol dodaný."}), 400
+
+    raw_main_flag = request.form.get("main") or request.args.get("main") or ""
+    is_main = str(raw_main_flag).lower() in {"1", "true", "yes", "on", "main"}
+
+    filename = secure_filename(file.filename)
+    _, ext = os.path.splitext(filename)
+    ext = ext.lower()
+    if ext not in ALLOWED_IMAGE_EXTS:
+        return jsonify({"error": "Nepodporovaný formát. Povolené: jpg, jpeg, png, gif, webp"}), 400
+
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT 1 FROM posts WHERE id_post = %s", (post_id,))
+        if not cur.fetchone():
+            return jsonify({"error": "Príspevok neexistuje."}), 404
+    finally:
+        cur.close()
+
+    file_uid = str(uuid.uuid4())
+    path = _post_image_disk_path(file_uid, ext)
+    try:
+        file.save(path)
+    except Exception as exc:
+        return jsonify({"error": f"Ukladanie zlyhalo: {exc}"}), 500
+
+    size_bytes = os.path.getsize(path)
+    storage_path = f"/assets/img/posts/{file_uid}{ext}"
+
+    try:
+        storage_url, sort_order = _insert_post_image_record(
+            conn,
+            post_id,
+            file_uid=file_uid,
+            filename=filename,
+            ext=ext,
+            mime_type=file.mimetype or None,
+            size_bytes=size_bytes,
+            storage_path=storage_path,
+            is_main=is_main,
+        )
+    except Exception as exc:
+        try:
+            os.remove(path)
+        except Exception:
+            pass
+        return jsonify({"error": f"Ukladanie zlyhalo: {exc}"}), 500
+
+    return jsonify({"url": storage_url, "uid": file_uid, "storage_path": storage_path, "sort_order": sort_order, "is_main": is_main}), 201
+
+
+@app.get("/api/posts/<int:post_id>/image")
+def get_post_image_meta(post_id: int):
+    conn = get_conn()
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute(
+            """
+            SELECT file_uid, file_ext, storage_path
+            FROM media_files
+            WHERE owner_type = 'post' AND owner_id = %s AND purpose = 'post_image'
+            AND sort_order = 0
+            LIMIT 1
+            """,
+            (post_id,),
+        )
+        row = cur.fetchone()
+
+        if row:
+            return jsonify({"url": _make_abs(row["storage_path"]), "uid": row["file_uid"], "storage_path": row["storage_path"]}), 200
+
+        cur.execute("SELECT image FROM posts WHERE id_post = %s", (post_id,))
+        fallback = cur.fetchone()
+        if fallback and fallback[0]:
+            return jsonify({"url": _make_abs(fallback[0]), "uid": None}), 200
+
+        return jsonify({"error": "Obrázok pre príspevok neexistuje."}), 404
+    finally:
+        cur.close()
+        conn.close()
+
+
+@app.get("/api/posts/<int:post_id>/images")
+def list_post_images(post_id: int):
+    conn = get_conn()
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute(
+            """
+            SELECT file_uid AS uid, file_uid, storage_path, sort_order, file_name, mime_type
+            FROM media_files
+            WHERE owner_type = 'post' AND owner_id = %s AND purpose = 'post_image'
+            ORDER BY sort_order ASC, created_at ASC
+            """,
+            (post_id,),
+        )
+        rows = cur.fetchall()
+        for row in rows:
+            if row.get("storage_path"):
+                row["url"] = _make_abs(row["storage_path"])
+        return jsonify(rows), 200
+    finally:
+        cur.close()
+        conn.close()
+
+
+@app.delete("/api/posts/<int:post_id>/images/<string:file_uid>")
+def delete_post_image(post_id: int, file_uid: str):
+    conn = get_conn()
+    try:
+        existed = _delete_post_image_by_uid(conn, post_id, file_uid)
+        if not existed:
+            return jsonify({"error": "Obrázok neexistuje."}), 404
+
+        next_image = _resequence_post_images(conn, post_id)
+        return jsonify({"success": True, "next_image": next_image}), 200
+    finally:
+        conn.close()
+
+
+@app.get("/assets/img/posts/<path:filename>")
+def serve_post_image(filename: str):
+    return send_from_directory(POST_IMAGES_DIR, filename, as_attachment=False)
+
+
+@app.get("/assets/img/activities/<path:filename>")
+def serve_activity_image(filename: str):
+    return send_from_directory(ACTIVITY_IMAGES_DIR, filename, as_attachment=False)
+
+@app.get("/assets/img/articles/<path:filename>")
+def serve_article_image(filename: str):
+    return send_from_directory(ARTICLE_IMAGES_DIR, filename, as_attachment=False)
+
+
+@app.get("/api/profile/<int:user_id>")
+def get_profile(user_id: int):
+    """Načíta detaily profilu pre daného používateľa (bez hesla)."""
+    conn = get_conn()
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute("""
+            SELECT 
+                u.id_user, u.meno, u.priezvisko, u.mail, u.datum_narodenia,
+                u.mesto, u.about, u.rola, u.created_at
+            FROM users u
+            WHERE u.id_user = %s
+        """, (user_id,))
+        row = cur.fetchone()
+        if not row:
+            return jsonify({"error": "Používateľ neexistuje."}), 404
+        return jsonify(row), 200
+    finally:
+        cur.close()
+        conn.close()
+
+@app.put("/api/profile/<int:user_id>")
+def update_profile(user_id: int):
+    """
+    Aktualizuje profil prihláseného používateľa.
+    Meniteľné: meno, priezvisko, datum_narodenia, mesto, about
+    Nemeníme: mail, heslo, rola, soft_del, atď.
+    """
+    data = request.get_json(force=True) or {}
+    ok, msg = _validate_profile_payload(data)
+    if not ok:
+        return jsonify({"error": msg}), 400
+
+    sets = []
+    params = []
+    for field in ALLOWED_PROFILE_FIELDS:
+        if field in data:
+            sets.append(f"{field} = %s")
+            params.append(data[field])
+
+    if not sets:
+        return jsonify({"error": "Nie je čo aktualizovať."}), 400
+
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        params.append(user_id)
+        cur.execute(
+            f"UPDATE users SET {', '.join(sets)} WHERE id_user = %s",
+            tuple(params),
+        )
+        if cur.rowcount == 0:
+            return jsonify({"error": "Používateľ neexistuje alebo je zmazaný."}), 404
+        conn.commit()
+        if "mesto" in data:
+            EMBEDDING_INDEX.update_meta(user_id, city=data["mesto"])
+            coords = _set_user_coordinates(conn, user_id, data["mesto"])
+            MATCH_CACHE.invalidate_user(user_id, city=data["mesto"], coords=coords)
+            MATCH_TABLE_QUEUE.enqueue(user_id)
+        if "meno" in data or "priezvisko" in data:
+            # author name is part of the post search text
+            _reindex_posts_safely(conn, "p.user_id = %s", (user_id,))
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"error": f"Chyba pri ukladaní profilu: {str(e)}"}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+    # po úspešnom update vrátime aktualizovaný profil
+    return get_profile(user_id)
+
+# ==========================================
+# 🧩 PROFIL – HOBBY GET/PUT
+# ==========================================
+
+@app.get("/api/profile/<int:user_id>/hobbies")
+def get_user_hobbies(user_id: int):
+    conn = get_conn()
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute(
+            """
+            SELECT h.id_hobby, h.nazov, h.id_kategoria, hk.nazov AS kategoria_nazov
+            FROM user_hobby uh
+            JOIN hobby h ON h.id_hobby = uh.id_hobby
+            LEFT JOIN hobby_kategoria hk ON hk.id_kategoria = h.id_kategoria
+            WHERE uh.id_user = %s
+            ORDER BY hk.nazov ASC, h.nazov ASC
+            """,
+            (user_id,),
+        )
+        items = cur.fetchall()
+        return jsonify(items), 200
+    except Exception as e:
+        return jsonify({"error": f"Chyba pri načítaní záľub: {str(e)}"}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+
+@app.put("/api/profile/<int:user_id>/hobbies")
+def put_user_hobbies(user_id: int):
+    data = request.get_json(force=True) or {}
+    hobbies = data.get("hobbies")
+    if not isinstance(hobbies, list):
+        return jsonify({"error": "Pole 'hobbies' musí byť zoznam ID."}), 400
+
+    try:
+        hobby_ids = sorted({int(hid) for hid in hobbies})
+    except Exception:
+        return jsonify({"error": "Neplatné ID v hobbies."}), 400
+
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        if hobby_ids:
+            cur.execute(
+                f"SELECT COUNT(*) FROM hobby WHERE id_hobby IN ({','.join(['%s']*len(hobby_ids))})",
+                tuple(hobby_ids),
+            )
+            count = cur.fetchone()[0]
+            if count != len(hobby_ids):
+                return jsonify({"error": "Niektoré hobby ID neexistujú."}), 400
+
+        cur.execute("DELETE FROM user_hobby WHERE id_user = %s", (user_id,))
+        if hobby_ids:
+            cur.executemany(
+                "INSERT INTO user_hobby (id_user, id_hobby) VALUES (%s, %s)",
+                [(user_id, hid) for hid in hobby_ids],
+            )
+        conn.commit()
+        MATCH_CACHE.invalidate_user(user_id)
+        try:
+            request_user_embedding(conn, user_id)
+        except Exception as emb_err:
+            logging.warning(
+                "Failed to schedule user embedding refresh for %s: %s",
+                user_id,
+                emb_err,
+            )
+        return jsonify({"success": True, "count": len(hobby_ids)}), 200
+    
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"error": f"Chyba pri ukladaní záľub: {str(e)}"}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+@app.get("/api/match/<int:user_id>")
+def api_match_user(user_id: int):
+    try:
+        top_n = int(request.args.get("top_n", 5))
+    except Exception:
+        top_n = 5
+
+    target_role = request.args.get("role") or None
+    # Read optional distance in kilometers from the request (keeps old behavior if missing).
+    distance_param = request.args.get("distance_km")
+    distance_km = None
+    if distance_param is not None and str(distance_param).strip():
+        try:
+            parsed = float(distance_param)
+            if parsed > 0:
+                distance_km = parsed
+        except (TypeError, ValueError):
+            return jsonify({"error": "Parameter distance_km must be a positive number."}), 400
+
+    try:
+        matches, version, cache_hit = cached_matches_for_user(
+            user_id,
+            top_n=max(1, top_n),
+            target_role=target_role,
+            distance_km=distance_km,
+        )
+    except ModelWarmingUp:
+        resp = jsonify({"status": "warming_up", "error": "Odporúčania sa pripravujú, skúste to o chvíľu."})
+        resp.headers["Retry-After"] = "5"
+        return resp, 503
+    except EmbeddingPending:
+        # vector is being computed in the background; keep the list shape for clients
+        resp = jsonify([])
+        resp.headers["X-Embedding-Status"] = "pending"
+        resp.headers["Retry-After"] = "2"
+        return resp, 202
+    except Exception as exc:
+        logging.exception("Failed to match user %s: %s", user_id, exc)
+        return jsonify({"error": str(exc)}), 500
+
+    resp = jsonify([match_item_json(item) for item in matches])
+    resp.headers["X-Match-Version"] = version
+    resp.headers["X-Match-Cache"] = "hit" if cache_hit else "miss"
+    return resp, 200
+
+
+MATCH_BATCH_MAX_USERS = 500
+
+
+@app.post("/api/match/batch")
+def api_match_batch():
+    """
+    Matches for many users in one call, served from the precomputed user_matches
+    table (same-city lists). Body: {"user_ids": [...], "top_n": 5, "role": "..."}.
+    Users without a stored list are reported in "missing".
+    """
+    data = request.get_json(silent=True) or {}
+    raw_ids = data.get("user_ids")
+    if not isinstance(raw_ids, list) or not raw_ids:
+        return jsonify({"error": "Pole user_ids je povinné."}), 400
+    try:
+        user_ids = list(dict.fromkeys(int(uid) for uid in raw_ids))
+    except (TypeError, ValueError):
+        return jsonify({"error": "user_ids musia byť celé čísla."}), 400
+    if len(user_ids) > MATCH_BATCH_MAX_USERS:
+        return jsonify({"error": f"Naraz je možné načítať najviac {MATCH_BATCH_MAX_USERS} používateľov."}), 400
+    try:
+        top_n = int(data.get("top_n", 5))
+    except (TypeError, ValueError):
+        top_n = 5
+    top_n = max(1, min(top_n, USER_MATCHES_TOP_K))
+    target_role = data.get("role") or None
+
+    placeholders = ", ".join(["%s"] * len(user_ids))
+    params: list = list(user_ids)
+    role_sql = ""
+    if target_role:
+        role_sql = "AND m.match_role = %s"
+        params.append(target_role)
+
+    conn = get_conn()
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(
+            f"""
+            SELECT m.user_id, m.similarity,
+                   u.id_user, u.meno, u.priezvisko, u.mail, u.rola
+            FROM user_matches m
+            JOIN users u ON u.id_user = m.match_user_id AND u.soft_del = 0
+            WHERE m.user_id IN ({placeholders}) {role_sql}
+            ORDER BY m.user_id, m.similarity DESC
+            """,
+            tuple(params),
+        )
+        rows = cur.fetchall()
+    except Exception as exc:
+        logging.exception("Batch match failed: %s", exc)
+        return jsonify({"error": str(exc)}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+    results: dict[int, list] = {}
+    for row in rows:
+        items = results.setdefault(row["user_id"], [])
+        if len(items) >= top_n:
+            continue
+        sim = float(row["similarity"])
+        items.append({
+            "id_user": row["id_user"],
+            "meno": row["meno"],
+            "priezvisko": row["priezvisko"],
+            "mail": row["mail"],
+            "rola": row["rola"],
+            "similarity": sim,
+            "similarity_percent": round(sim * 100, 1),
+        })
+    return jsonify({
+        "results": {str(uid): results[uid] for uid in user_ids if uid in results},
+        "missing": [uid for uid in user_ids if uid not in results],
+    }), 200
+
+
+@app.get("/api/match/status")
+def api_match_status():
+    return jsonify({
+        "model": embedding_model.name,
+        "model_status": embedding_model.status,
+        "ready": embedding_model.ready,
+        "index_loaded": EMBEDDING_INDEX.loaded,
+        "indexed_users": len(EMBEDDING_INDEX),
+        "queue": EMBEDDING_QUEUE.stats(),
+    }), 200
+
+
+@app.get("/api/metrics")
+def api_metrics():
+    """Process-local counters for caches and background workers."""
+    return jsonify({
+        "embedding_cache": EMBEDDING_CACHE.stats(),
+        "embedding_queue": EMBEDDING_QUEUE.stats(),
+        "post_embedding_queue": POST_EMBEDDING_QUEUE.stats(),
+        "post_embedding_index": {"loaded": POST_EMBEDDING_INDEX.loaded, "size": len(POST_EMBEDDING_INDEX)},
+        "query_embedding_cache": QUERY_EMBEDDING_CACHE.stats(),
+        "match_cache": MATCH_CACHE.stats(),
+        "match_table_queue": MATCH_TABLE_QUEUE.stats(),
+        "geocode_cache": GEOCODE_CACHE.stats(),
+        "geocoder": GEOCODER.name,
+        "geocoding_client": GEOCODING_CLIENT.stats(),
+        "geocoder_breaker": GEOCODER_BREAKER.stats(),
+        "activity_geocode_queue": ACTIVITY_GEOCODE_QUEUE.stats(),
+        "activity_clusters": ACTIVITY_CLUSTERS.stats(),
+        "activity_counts": ACTIVITY_COUNT_CACHE.stats(),
+        "post_search": POST_SEARCH_CACHE.stats(),
+        "city_coord_cache": CITY_COORD_CACHE.stats(),
+    }), 200
+
+    
+# ==========================================
+# MATCH ENDPOINT
+# ==========================================
+
+
+# ------------------------------------------
+# ACTIVITIES
+# ------------------------------------------
+
+# ==========================================
+# 🗺️ GEOHASH (viewport / radius filters)
+# ==========================================
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9
+
+
+def geohash_encode(lat: float, lng: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_lo, lat_hi, lng_lo, lng_hi = -90.0, 90.0, -180.0, 180.0
+    chars = []
+    bits = ch = 0
+    even = True  # geohash interleaves bits starting with longitude
+    while len(chars) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            if lng >= mid:
+                ch = (ch << 1) | 1
+                lng_lo = mid
+            else:
+                ch <<= 1
+                lng_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch = (ch << 1) | 1
+                lat_lo = mid
+            else:
+                ch <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_BASE32[ch])
+            bits = ch = 0
+    return "".join(chars)
+
+
+def geohash_cell_size(precision: int) -> tuple[float, float]:
+    """(height, width) of a geohash cell in degrees."""
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = (5 * precision) // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def geohash_cover(min_lat: float, min_lng: float, max_lat: float, max_lng: float, max_cells: int = 24) -> list[str]:
+    """
+    Geohash prefixes whose cells cover the box, at the finest precision that
+    needs at most max_cells prefixes. [] means "no useful prefix" (huge box).
+    """
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = geohash_cell_size(precision)
+        rows = range(int((min_lat + 90.0) // height), int((max_lat + 90.0) // height) + 1)
+        cols = range(int((min_lng + 180.0) // width), int((max_lng + 180.0) // width) + 1)
+        if len(rows) * len(cols) > max_cells:
+            continue
+        cells = set()
+        for i in rows:
+            lat = min(89.999999, (i + 0.5) * height - 90.0)
+            for j in cols:
+                lng = min(179.999999, (j + 0.5) * width - 180.0)
+                cells.add(geohash_encode(lat, lng, precision))
+        return sorted(cells)
+    return []
+
+
+def _parse_floats(raw: str | None, count: int) -> list[float] | None:
+    if raw is None or not str(raw).strip():
+        return None
+    parts = [p.strip() for p in str(raw).split(",")]
+    if len(parts) != count:
+        raise ValueError
+    values = [float(p) for p in parts]
+    if not all(isfinite(v) for v in values):
+        raise ValueError
+    return values
+
+
+def parse_bbox(raw: str | None) -> tuple[float, float, float, float] | None:
+    """bbox=minLat,minLng,maxLat,maxLng -> tuple, None when absent; ValueError when invalid."""
+    values = _parse_floats(raw, 4)
+    if values is None:
+        return None
+    min_lat, min_lng, max_lat, max_lng = values
+    if not (-90 <= min_lat <= max_lat <= 90) or not (-180 <= min_lng <= max_lng <= 180):
+        raise ValueError
+    return min_lat, min_lng, max_lat, max_lng
+
+
+def geo_filter_sql(bbox) -> tuple[str, list]:
+    """WHERE fragment (geohash prefix ranges + exact box) for activities inside bbox."""
+    min_lat, min_lng, max_lat, max_lng = bbox
+    clauses = ["lat BETWEEN %s AND %s", "lng BETWEEN %s AND %s"]
+    params: list = [min_lat, max_lat, min_lng, max_lng]
+    prefixes = geohash_cover(min_lat, min_lng, max_lat, max_lng)
+    if prefixes:
+        clauses.insert(0, "(" + " OR ".join(["geohash LIKE %s"] * len(prefixes)) + ")")
+        params[:0] = [f"{prefix}%" for prefix in prefixes]
+    return " AND ".join(clauses), params
+
+
+ACTIVITY_PAGE_SIZE_MAX = 500
+COUNT_MODES = ("exact", "estimate", "none")
+# exact totals per filter combination; cleared whenever activities change
+ACTIVITY_COUNT_CACHE = LRUCache(512, ttl_s=float(os.getenv("ACTIVITY_COUNT_TTL_S", "30")))
+
+
+def _int_arg(name: str, default: int, low: int, high: int) -> int:
+    """Integer query parameter within [low, high]; ValueError when malformed or out of range."""
+    raw = request.args.get(name)
+    if raw is None or not raw.strip():
+        return default
+    value = int(raw)
+    if not low <= value <= high:
+        raise ValueError(name)
+    return value
+
+
+def _estimate_rows(cur, sql: str, params) -> int:
+    """
+    Optimizer row estimate for a query (EXPLAIN), without executing it. The
+    outer query's plan rows form a nested-loop join, so the result size is the
+    product of rows * filtered / 100 over them (not the first table's rows).
+    """
+    cur.execute("EXPLAIN " + sql, params)
+    plan = cur.fetchall()
+    outer = [row for row in plan if row.get("id") in (1, None)] or plan[:1]
+    if not outer:
+        return 0
+    estimate = 1.0
+    for row in outer:
+        # NULL rows: "Impossible WHERE", no matching const row -> empty result
+        estimate *= float(row.get("rows") or 0) * float(row.get("filtered") or 100.0) / 100.0
+    return int(round(estimate))
+
+
+@app.get("/api/activities")
+def list_activities():
+    """
+    Zoznam aktivít. Voliteľné filtre:
+      bbox=minLat,minLng,maxLat,maxLng   – len aktivity vo výreze mapy
+      near=lat,lng&radius_km=10          – okruh okolo bodu, zoradené podľa vzdialenosti
+    Stránkovanie: page/page_size alebo cursor (next_cursor z predchádzajúcej odpovede).
+    count=exact|estimate|none určuje, či a ako sa počíta celkový počet.
+    """
+    try:
+        page_size = _int_arg("page_size", 20, 1, ACTIVITY_PAGE_SIZE_MAX)
+        page = _int_arg("page", 1, 1, 1_000_000)
+    except ValueError:
+        return jsonify({"error": f"page musí byť kladné celé číslo a page_size v rozsahu 1 – {ACTIVITY_PAGE_SIZE_MAX}."}), 400
+    count_mode = (request.args.get("count") or "exact").strip().lower()
+    if count_mode not in COUNT_MODES:
+        return jsonify({"error": "Parameter count musí byť exact, estimate alebo none."}), 400
+    q = request.args.get("q", "").strip()
+
+    try:
+        bbox = parse_bbox(request.args.get("bbox"))
+    except ValueError:
+        return jsonify({"error": "Parameter bbox musí mať tvar minLat,minLng,maxLat,maxLng."}), 400
+    try:
+        near = _parse_floats(request.args.get("near"), 2)
+        if near and not (-90 <= near[0] <= 90 and -180 <= near[1] <= 180):
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": "Parameter near musí mať tvar lat,lng."}), 400
+    radius_km = None
+    if near:
+        try:
+            radius_km = float(request.args.get("radius_km", 10))
+        except (TypeError, ValueError):
+            radius_km = -1
+        if not (0 < radius_km <= 20000):
+            return jsonify({"error": "Parameter radius_km musí byť kladné číslo."}), 400
+
+    cursor = None
+    if request.args.get("cursor"):
+        try:
+            cursor = decode_cursor(request.args["cursor"])
+            if near:
+                cursor = (float(cursor["d"]), int(cursor["i"]))
+            else:
+                cursor = (datetime.fromisoformat(cursor["t"]), int(cursor["i"]))
+        except (ValueError, KeyError, TypeError):
+            return jsonify({"error": "Neplatný kurzor."}), 400
+
+    count_key = (q, request.args.get("bbox"), tuple(near) if near else None, radius_km)
+    empty_page = {"items": [], "pagination": {
+        "page": None if cursor else page, "page_size": page_size, "count": count_mode,
+        "total": 0 if count_mode != "none" else None, "pages": 0 if count_mode != "none" else None,
+        "next_cursor": None,
+    }}
+
+    select_cols = "id_activity, title, description, image_url, capacity, attendees_count, lat, lng, geo_status, user_id, created_at"
+    where: list[str] = []
+    params = []
+    if q:
+        where.append("(title LIKE %s OR description LIKE %s)")
+        like = f"%{q}%"
+        params.extend([like, like])
+    if near:
+        # the circle's bounding box goes through the geohash index, the exact distance is computed in SQL
+        min_lat, max_lat, min_lng, max_lng = bounding_box(near[0], near[1], radius_km)
+        near_box = (min_lat, max(-180.0, min_lng), max_lat, min(180.0, max_lng))
+        if bbox:
+            near_box = (
+                max(bbox[0], near_box[0]), max(bbox[1], near_box[1]),
+                min(bbox[2], near_box[2]), min(bbox[3], near_box[3]),
+            )
+        bbox = near_box
+        select_cols += """,
+          6371 * ACOS(LEAST(1, COS(RADIANS(%s)) * COS(RADIANS(lat)) * COS(RADIANS(lng) - RADIANS(%s))
+                      + SIN(RADIANS(%s)) * SIN(RADIANS(lat)))) AS distance_km"""
+    if bbox:
+        if bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+            return jsonify(empty_page)
+        geo_sql, geo_params = geo_filter_sql(bbox)
+        where.append(geo_sql)
+        params.extend(geo_params)
+    select_params = [near[0], near[1], near[0]] if near else []
+    having = ["distance_km <= %s"] if near else []
+    having_params = [radius_km] if near else []
+
+    def build(with_cursor: bool) -> tuple[str, list]:
+        conds, cond_params = list(where), list(params)
+        hav, hav_params = list(having), list(having_params)
+        if with_cursor and cursor:
+            if near:
+                hav.append("(distance_km > %s OR (distance_km = %s AND id_activity > %s))")
+                hav_params.extend([cursor[0], cursor[0], cursor[1]])
+            else:
+                conds.append("(created_at < %s OR (created_at = %s AND id_activity < %s))")
+                cond_params.extend([cursor[0], cursor[0], cursor[1]])
+        sql = f"SELECT {select_cols} FROM activities"
+        if conds:
+            sql += " WHERE " + " AND ".join(conds)
+        if hav:
+            sql += " HAVING " + " AND ".join(hav)
+        return sql, select_params + cond_params + hav_params
+
+    filtered_sql, filtered_params = build(with_cursor=False)
+    page_sql, page_params = build(with_cursor=True)
+    page_sql += (
+        " ORDER BY distance_km ASC, id_activity ASC" if near
+        else " ORDER BY created_at DESC, id_activity DESC"
+    )
+    page_sql += " LIMIT %s"
+    page_params.append(page_size + 1)
+    if not cursor:
+        page_sql += " OFFSET %s"
+        page_params.append((page - 1) * page_size)
+
+    conn = get_conn()
+    try:
+        cur = conn.cursor(dictionary=True)
+        total = None
+        if count_mode == "exact":
+            total = ACTIVITY_COUNT_CACHE.get(count_key)
+            if total is None:
+                cur.execute("SELECT COUNT(*) AS total FROM (" + filtered_sql + ") t", filtered_params)
+                total = int(cur.fetchone()["total"])
+                ACTIVITY_COUNT_CACHE.set(count_key, total)
+        elif count_mode == "estimate":
+            # a recent exact count is better than the optimizer's guess
+            total = ACTIVITY_COUNT_CACHE.get(count_key)
+            if total is None:
+                total = _estimate_rows(cur, filtered_sql, filtered_params)
+        cur.execute(page_sql, page_params)
+        items = cur.fetchall()
+        has_more = len(items) > page_size
+        items = items[:page_size]
+        next_cursor = None
+        if has_more and items:
+            last = items[-1]
+            if near:
+                next_cursor = encode_cursor({"d": float(last["distance_km"]), "i": last["id_activity"]})
+            else:
+                next_cursor = encode_cursor({"t": last["created_at"].isoformat(), "i": last["id_activity"]})
+        for item in items:
+            if item.get("image_url"):
+                item["image_url"] = _make_abs(item["image_url"])
+        return jsonify({"items": items, "pagination": {
+            "page": None if cursor else page, "page_size": page_size,
+            "count": count_mode,
+            "total": total,
+            "pages": (total + page_size - 1) // page_size if total is not None else None,
+            "next_cursor": next_cursor,
+        }})
+    finally:
+        conn.close()
+
+
+# Zoom levels below CLUSTER_MAX_ZOOM get geohash clusters, from there on single pins.
+CLUSTER_MAX_ZOOM = int(os.getenv("CLUSTER_MAX_ZOOM", "13"))
+CLUSTER_SAMPLE_IDS = 5
+CLUSTER_MAX_ITEMS = 1000
+
+
+def cluster_precision_for_zoom(zoom: int) -> int:
+    """Geohash length whose cells are roughly a few map tiles wide at this zoom."""
+    return max(1, min(GEOHASH_PRECISION, (zoom + 1) // 2))
+
+
+class ActivityClusterCache:
+    """
+    Per-precision cluster aggregates of all geocoded activities, computed with one
+    GROUP BY over the geohash prefix and kept until an activity is created, edited
+    or deleted (invalidate) or the TTL runs out (changes from other workers).
+    """
+
+    def __init__(self, ttl_s: float):
+        self._lru = LRUCache(GEOHASH_PRECISION, ttl_s=ttl_s)
+        self._lock = threading.Lock()
+        self.version = 0
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self.version += 1
+        self._lru.clear()
+
+    def clusters(self, conn, precision: int) -> list[dict]:
+        cached = self._lru.get(precision)
+        if cached is not None:
+            return cached
+        version = self.version
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                """
+                SELECT LEFT(geohash, %s) AS cell, COUNT(*), AVG(lat), AVG(lng),
+                       SUBSTRING_INDEX(GROUP_CONCAT(id_activity ORDER BY id_activity DESC), ',', %s)
+                FROM activities
+                WHERE geohash IS NOT NULL AND geo_status IN ('ready', 'approximate')
+                GROUP BY cell
+                """,
+                (precision, CLUSTER_SAMPLE_IDS),
+            )
+            rows = cur.fetchall()
+        finally:
+            cur.close()
+        clusters = [
+            {
+                "cell": cell,
+                "count": int(count),
+                "lat": float(lat),
+                "lng": float(lng),
+                "sample_ids": [int(x) for x in str(sample).split(",") if x],
+            }
+            for cell, count, lat, lng, sample in rows
+        ]
+        with self._lock:
+            if version == self.version:
+                self._lru.set(precision, clusters)
+        return clusters
+
+    def stats(self) -> dict:
+        return {**self._lru.stats(), "version": self.version}
+
+
+ACTIVITY_CLUSTERS = ActivityClusterCache(ttl_s=float(os.getenv("CLUSTER_CACHE_TTL_S", "60")))
+
+
+@app.get("/api/activities/clusters")
+def activity_clusters():
+    """
+    Zhluky aktivít pre mapu: ?bbox=minLat,minLng,maxLat,maxLng&zoom=7
+    Pri malom priblížení vracia zhluky (počet, ťažisko, ukážkové id),
+    od CLUSTER_MAX_ZOOM jednotlivé aktivity.
+    """
+    try:
+        bbox = parse_bbox(request.args.get("bbox")) or (-90.0, -180.0, 90.0, 180.0)
+    except ValueError:
+        return jsonify({"error": "Parameter bbox musí mať tvar minLat,minLng,maxLat,maxLng."}), 400
+    try:
+        zoom = int(request.args.get("zoom", 7))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Parameter zoom musí byť celé číslo."}), 400
+    if not 0 <= zoom <= 22:
+        return jsonify({"error": "Parameter zoom musí byť v rozsahu 0 – 22."}), 400
+
+    min_lat, min_lng, max_lat, max_lng = bbox
+    conn = get_conn()
+    try:
+        if zoom >= CLUSTER_MAX_ZOOM:
+            geo_sql, geo_params = geo_filter_sql(bbox)
+            cur = conn.cursor(dictionary=True)
+            try:
+                cur.execute(
+                    f"""
+                    SELECT id_activity, title, description, capacity, attendees_count, lat, lng
+                    FROM activities
+                    WHERE {geo_sql}
+                    ORDER BY created_at DESC
+                    LIMIT %s
+                    """,
+                    (*geo_params, CLUSTER_MAX_ITEMS),
+                )
+                items = cur.fetchall()
+            finally:
+                cur.close()
+            return jsonify({"zoom": zoom, "mode": "items", "items": items}), 200
+
+        precision = cluster_precision_for_zoom(zoom)
+        clusters = [
+            c for c in ACTIVITY_CLUSTERS.clusters(conn, precision)
+            if min_lat <= c["lat"] <= max_lat and min_lng <= c["lng"] <= max_lng
+        ]
+        return jsonify({
+            "zoom": zoom,
+            "mode": "clusters",
+            "precision": precision,
+            "version": ACTIVITY_CLUSTERS.version,
+            "clusters": clusters,
+        }), 200
+    finally:
+        conn.close()
+
+
+import requests
+import logging
+GEOCODE_URL = "https://nominatim.openstreetmap.org/search"
+
+import requests
+import logging
+
+GEOCODE_URL = "https://nominatim.openstreetmap.org/search"
+
+
+class GeocodeNotFound(ValueError):
+    """The geocoder answered, but has no coordinates for the address."""
+
+
+class GeocoderUnavailable(RuntimeError):
+    """Geocoding cannot be attempted right now; retrying later may succeed."""
+
+
+class GeocodeRateLimited(GeocoderUnavailable):
+    """No upstream request slot became free within the allowed queue wait."""
+
+
+class GeocodeDeadlineExceeded(GeocoderUnavailable):
+    """The request's geocoding time budget ran out."""
+
+
+class CircuitOpen(GeocoderUnavailable):
+    """The circuit breaker is open: the dependency is failing, calls are not attempted."""
+
+
+class Deadline:
+    """Time budget for one request, shared by every step that may block on it."""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def check(self) -> float:
+        """Remaining seconds; raises GeocodeDeadlineExceeded when the budget is spent."""
+        remaining = self.remaining()
+        if remaining <= 0.0:
+            raise GeocodeDeadlineExceeded("Geocoding deadline exceeded.")
+        return remaining
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures; calls are then
+    rejected for `reset_timeout_s`. After that the breaker is half-open and lets
+    `half_open_max` probe calls through: a success closes it, a failure re-opens it.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout_s: float = 30.0, half_open_max: int = 1):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout_s = reset_timeout_s
+        self.half_open_max = max(1, half_open_max)
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self.trips = 0
+        self.rejected = 0
+        self.last_failure: str | None = None
+        self._on_close: list = []
+
+    def on_close(self, callback) -> None:
+        """Call callback() (outside the lock) each time the breaker closes after being open."""
+        self._on_close.append(callback)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self) -> None:
+        if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout_s:
+            self._state = "half_open"
+            self._probes = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == "closed":
+                return True
+            if self._state == "half_open" and self._probes < self.half_open_max:
+                self._probes += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def release(self) -> None:
+        """Give back an admitted call that never reached the dependency."""
+        with self._lock:
+            if self._state == "half_open" and self._probes > 0:
+                self._probes -= 1
+
+    def record_success(self) -> None:
+        with self._lock:
+            recovered = self._state != "closed"
+            self._state = "closed"
+            self._failures = 0
+            self._probes = 0
+        if recovered:
+            for callback in self._on_close:
+                try:
+                    callback()
+                except Exception as exc:
+                    logging.warning("Circuit %s close callback failed: %s", self.name, exc)
+
+    def record_failure(self, error=None) -> None:
+        with self._lock:
+            self._failures += 1
+            self.last_failure = str(error) if error is not None else None
+            if self._state == "half_open" or self._failures >= self.failure_threshold:
+                if self._state != "open":
+                    self.trips += 1
+                    logging.warning("Circuit %s opened after %s failures: %s", self.name, self._failures, error)
+                self._state = "open"
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._maybe_half_open()
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "trips": self.trips,
+                "rejected": self.rejected,
+                "last_failure": self.last_failure,
+                "retry_in_s": round(max(0.0, self.reset_timeout_s - (time.monotonic() - self._opened_at)), 1)
+                if self._state == "open" else None,
+            }
+
+
+class LatencyStats:
+    """Count / mean / max and percentiles over the last `window` samples (seconds)."""
+
+    def __init__(self, window: int = 512):
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+            self.total_s += seconds
+            self.max_s = max(self.max_s, seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = np.asarray(self._samples, dtype=np.float64)
+            result = {
+                "count": self.count,
+                "mean_ms": round(self.total_s / self.count * 1000, 2) if self.count else None,
+                "max_ms": round(self.max_s * 1000, 2),
+            }
+        for name, q in (("p50_ms", 50), ("p95_ms", 95), ("p99_ms", 99)):
+            result[name] = round(float(np.percentile(samples, q)) * 1000, 2) if samples.size else None
+        return result
+
+
+class TokenBucket:
+    """Blocking token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: float | None = None) -> bool:
+        """Take one token, waiting for it at most `timeout` seconds. False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return True
+                wait = (1.0 - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class GeocodingClient:
+    """
+    Upstream access for geocoding: one pooled requests.Session, a process-wide
+    token bucket (Nominatim allows 1 request/s) and single-flight coalescing,
+    so concurrent lookups of the same address share one upstream call.
+    """
+
+    def __init__(self, rate_per_s: float, burst: float, max_queue_wait_s: float, pool_size: int):
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["User-Agent"] = "LifeBridgeApp/1.0 (contact@lifebridge.sk)"
+        self.bucket = TokenBucket(rate_per_s, burst)
+        self.max_queue_wait_s = max_queue_wait_s
+        self.queue_wait = LatencyStats()
+        self.upstream_latency = LatencyStats()
+        self._flights: dict = {}  # key -> [Event, result, error]
+        self._flights_lock = threading.Lock()
+        self.upstream_calls = 0
+        self.upstream_errors = 0
+        self.coalesced = 0
+        self.rate_limited = 0
+
+    def get(self, url: str, deadline: Deadline | None = None, timeout: float = 10.0, **kwargs):
+        """
+        Rate-limited session.get. The queue wait and the HTTP timeout both come
+        out of `deadline`; raises GeocodeRateLimited / GeocodeDeadlineExceeded.
+        """
+        max_wait = self.max_queue_wait_s
+        if deadline is not None:
+            max_wait = min(max_wait, deadline.check())
+        started = time.monotonic()
+        acquired = self.bucket.acquire(timeout=max_wait)
+        self.queue_wait.add(time.monotonic() - started)
+        if not acquired:
+            self.rate_limited += 1
+            raise GeocodeRateLimited("Geocoding rate limit: no request slot available.")
+        if deadline is not None:
+            timeout = min(timeout, deadline.check())
+        started = time.monotonic()
+        self.upstream_calls += 1
+        try:
+            return self.session.get(url, timeout=timeout, **kwargs)
+        except requests.RequestException:
+            self.upstream_errors += 1
+            raise
+        finally:
+            self.upstream_latency.add(time.monotonic() - started)
+
+    def single_flight(self, key, fn, timeout: float | None = None):
+        """
+        Run fn() once per key at a time; concurrent callers get the same result or
+        error. Followers wait at most `timeout` seconds (GeocodeDeadlineExceeded).
+        """
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = [threading.Event(), None, None]
+            else:
+                self.coalesced += 1
+        event = flight[0]
+        if not leader:
+            if not event.wait(timeout):
+                raise GeocodeDeadlineExceeded("Geocoding deadline exceeded while waiting for a shared lookup.")
+            if flight[2] is not None:
+                raise flight[2]
+            return flight[1]
+        try:
+            flight[1] = fn()
+            return flight[1]
+        except BaseException as exc:
+            flight[2] = exc
+            raise
+        finally:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+            event.set()
+
+    def stats(self) -> dict:
+        with self._flights_lock:
+            inflight = len(self._flights)
+        return {
+            "upstream_calls": self.upstream_calls,
+            "upstream_errors": self.upstream_errors,
+            "coalesced": self.coalesced,
+            "rate_limited": self.rate_limited,
+            "inflight": inflight,
+            "queue_wait": self.queue_wait.snapshot(),
+            "upstream_latency": self.upstream_latency.snapshot(),
+        }
+
+
+GEOCODE_DEADLINE_S = float(os.getenv("GEOCODE_DEADLINE_S", "4"))
+GEOCODER_BREAKER = CircuitBreaker(
+    "geocoder",
+    failure_threshold=int(os.getenv("GEOCODE_BREAKER_FAILURES", "5")),
+    reset_timeout_s=float(os.getenv("GEOCODE_BREAKER_RESET_S", "30")),
+)
+GEOCODING_CLIENT = GeocodingClient(
+    rate_per_s=float(os.getenv("GEOCODE_RATE_PER_S", "1")),
+    burst=float(os.getenv("GEOCODE_BURST", "1")),
+    max_queue_wait_s=float(os.getenv("GEOCODE_MAX_QUEUE_WAIT_S", "10")),
+    pool_size=int(os.getenv("GEOCODE_POOL_SIZE", "4")),
+)
+
+
+def _address_key(address) -> str:
+    """Cache key for an address: folded like city names, punctuation runs unified."""
+    key = _place_key(address)
+    key = re.sub(r"\s*[,;]+\s*", ", ", key)
+    return key.strip(" ,.")
+
+
+class GeocodeCache:
+    """
+    Geocoding results shared by all workers through the geocode_cache table,
+    with an in-process LRU in front. "No result" answers are cached too
+    (lat/lng NULL) with a shorter TTL, so a bad address does not reach
+    Nominatim again on every retry. Service errors are never cached.
+    """
+
+    _MISS = object()
+
+    def __init__(self, maxsize: int, ttl_s: float, negative_ttl_s: float):
+        self.ttl_s = ttl_s
+        self.negative_ttl_s = negative_ttl_s
+        self._lru = LRUCache(maxsize)
+        self.db_hits = 0
+        self.db_misses = 0
+
+    @staticmethod
+    def _hash(key: str) -> str:
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def lookup(self, address):
+        """
+        (lat, lng) for a cached hit, None for a cached "not found",
+        GeocodeCache._MISS when the address has to be geocoded.
+        """
+        key = _address_key(address)
+        if not key:
+            return self._MISS
+        cached = self._lru.get(key, self._MISS)
+        if cached is not self._MISS:
+            return cached
+        try:
+            with db_conn() as conn:
+                cur = conn.cursor()
+                try:
+                    cur.execute(
+                        """
+                        SELECT lat, lng, TIMESTAMPDIFF(SECOND, NOW(), expires_at)
+                        FROM geocode_cache
+                        WHERE key_hash = %s AND expires_at > NOW()
+                        """,
+                        (self._hash(key),),
+                    )
+                    row = cur.fetchone()
+                finally:
+                    cur.close()
+        except Exception as exc:
+            logging.warning("geocode_cache lookup failed: %s", exc)
+            return self._MISS
+        if row is None:
+            self.db_misses += 1
+            return self._MISS
+        self.db_hits += 1
+        lat, lng, remaining_s = row
+        value = (float(lat), float(lng)) if lat is not None and lng is not None else None
+        self._lru.set(key, value, ttl_s=max(1, int(remaining_s or 0)))
+        return value
+
+    def store(self, address, coords: tuple[float, float] | None) -> None:
+        key = _address_key(address)
+        if not key:
+            return
+        ttl = self.ttl_s if coords else self.negative_ttl_s
+        self._lru.set(key, coords, ttl_s=ttl)
+        try:
+            with db_conn() as conn:
+                cur = conn.cursor()
+                try:
+                    cur.execute(
+                        """
+                        INSERT INTO geocode_cache (key_hash, query, lat, lng, expires_at)
+                        VALUES (%s, %s, %s, %s, NOW() + INTERVAL %s SECOND)
+                        ON DUPLICATE KEY UPDATE
+                          query = VALUES(query), lat = VALUES(lat), lng = VALUES(lng),
+                          expires_at = VALUES(expires_at), updated_at = CURRENT_TIMESTAMP
+                        """,
+                        (
+                            self._hash(key),
+                            key[:500],
+                            coords[0] if coords else None,
+                            coords[1] if coords else None,
+                            int(ttl),
+                        ),
+                    )
+                    conn.commit()
+                finally:
+                    cur.close()
+        except Exception as exc:
+            logging.warning("geocode_cache store failed: %s", exc)
+
+    def stats(self) -> dict:
+        return {**self._lru.stats(), "db_hits": self.db_hits, "db_misses": self.db_misses}
+
+
+GEOCODE_CACHE = GeocodeCache(
+    maxsize=int(os.getenv("GEOCODE_CACHE_SIZE", "4096")),
+    ttl_s=float(os.getenv("GEOCODE_CACHE_TTL_S", str(30 * 24 * 3600))),
+    negative_ttl_s=float(os.getenv("GEOCODE_NEGATIVE_TTL_S", str(24 * 3600))),
+)
+
+
+class GeocoderBackend(abc.ABC):
+    """
+    Turns an address into (lat, lng). Raises GeocodeNotFound when the backend
+    has no answer and ValueError (with a message for the user) on failures.
+    """
+
+    name = "base"
+    # answers worth keeping in geocode_cache (local lookups are already instant)
+    cacheable = True
+
+    @abc.abstractmethod
+    def geocode(self, address: str, deadline: Deadline | None = None) -> tuple[float, float]:
+        ...
+
+
+class NominatimBackend(GeocoderBackend):
+    """Nominatim behind GEOCODER_BREAKER: while it is open, calls fail fast with CircuitOpen."""
+
+    name = "nominatim"
+
+    def __init__(self, url: str = GEOCODE_URL, breaker: CircuitBreaker | None = None):
+        self.url = url
+        self.breaker = breaker or GEOCODER_BREAKER
+
+    def geocode(self, address: str, deadline: Deadline | None = None) -> tuple[float, float]:
+        if not self.breaker.allow():
+            raise CircuitOpen("Geocoding service is temporarily unavailable.")
+        try:
+            coords = _nominatim_geocode(address, url=self.url, deadline=deadline)
+        except GeocodeNotFound:
+            self.breaker.record_success()
+            raise
+        except GeocoderUnavailable:
+            # throttled or out of budget before reaching Nominatim: says nothing about its health
+            self.breaker.release()
+            raise
+        except ValueError as exc:
+            self.breaker.record_failure(exc)
+            raise
+        self.breaker.record_success()
+        return coords
+
+
+class LocalGazetteerBackend(GeocoderBackend):
+    """
+    Offline geocoder over a fixture gazetteer: a CSV with name,lat,lng columns or
+    an SQLite file with a places(name, lat, lng) table. Exact address keys win;
+    otherwise the comma-separated parts are tried from the last one (usually the
+    town, postcode digits dropped), so "Hlavná 5, 949 01 Nitra" resolves to Nitra.
+    exact_only=True skips that town-level guess (used in front of a real geocoder).
+    """
+
+    name = "local"
+    cacheable = False
+
+    def __init__(self, path: str, exact_only: bool = False):
+        self.path = path
+        self.exact_only = exact_only
+        if path.lower().endswith((".sqlite", ".sqlite3", ".db")):
+            places = self._read_sqlite(path)
+        else:
+            places = _read_gazetteer_file(path)
+        self._places = {_address_key(name): (lat, lng) for name, lat, lng in places}
+
+    @staticmethod
+    def _read_sqlite(path: str) -> list[tuple[str, float, float]]:
+        with sqlite3.connect(f"file:{path}?mode=ro", uri=True) as db:
+            rows = db.execute("SELECT name, lat, lng FROM places").fetchall()
+        return [(name, float(lat), float(lng)) for name, lat, lng in rows]
+
+    def geocode(self, address: str, deadline: Deadline | None = None) -> tuple[float, float]:
+        coords = self._places.get(_address_key(address))
+        if coords:
+            return coords
+        if self.exact_only:
+            raise GeocodeNotFound("Pre zadanú adresu sa nenašli žiadne súradnice.")
+        for part in reversed(str(address or "").split(",")):
+            coords = self._places.get(_address_key(re.sub(r"\d+", " ", part)))
+            if coords:
+                return coords
+        raise GeocodeNotFound("Pre zadanú adresu sa nenašli žiadne súradnice.")
+
+
+class ChainedBackend(GeocoderBackend):
+    """Try backends in order; the first answer wins, misses and failures fall through."""
+
+    name = "chained"
+
+    def __init__(self, backends: list[GeocoderBackend]):
+        self.backends = backends
+        self.name = "+".join(b.name for b in backends)
+
+    def geocode(self, address: str, deadline: Deadline | None = None) -> tuple[float, float]:
+        error: Exception | None = None
+        for backend in self.backends:
+            try:
+                return backend.geocode(address, deadline=deadline)
+            except GeocodeNotFound:
+                continue
+            except Exception as exc:
+                logging.warning("Geocoder %s failed for '%s': %s", backend.name, address, exc)
+                error = exc
+        if error is not None:
+            raise error
+        raise GeocodeNotFound("Pre zadanú adresu sa nenašli žiadne súradnice.")
+
+
+def build_geocoder(kind: str) -> GeocoderBackend:
+    """
+    GEOCODER_BACKEND: nominatim (default) | local | chained (exact local hits,
+    then nominatim, so street addresses still reach Nominatim).
+    """
+    kind = (kind or "nominatim").strip().lower()
+    if kind not in ("nominatim", "local", "chained"):
+        logging.warning("Unknown GEOCODER_BACKEND '%s', using nominatim", kind)
+        kind = "nominatim"
+    local_path = os.getenv("GEOCODER_LOCAL_PATH", GAZETTEER_PATH)
+    if kind == "local":
+        return LocalGazetteerBackend(local_path)
+    if kind == "chained":
+        return ChainedBackend([
+            LocalGazetteerBackend(local_path, exact_only=True),
+            NominatimBackend(os.getenv("GEOCODE_URL", GEOCODE_URL)),
+        ])
+    return NominatimBackend(os.getenv("GEOCODE_URL", GEOCODE_URL))
+
+
+GEOCODER = build_geocoder(os.getenv("GEOCODER_BACKEND", "nominatim"))
+# Used while the configured geocoder is failing or its breaker is open
+# (GEOCODE_FALLBACK=none disables it): town-level coordinates beat a 10 s hang.
+GEOCODE_FALLBACK = (
+    None if os.getenv("GEOCODE_FALLBACK", "local").strip().lower() == "none"
+    else LocalGazetteerBackend(os.getenv("GEOCODER_LOCAL_PATH", GAZETTEER_PATH))
+)
+
+
+def geocode_address(address: str, deadline: Deadline | None = None):
+    """
+    (lat, lng) for an address: GEOCODE_CACHE first, the configured GEOCODER on a
+    miss, GEOCODE_FALLBACK when the geocoder is down. The whole lookup runs within
+    `deadline` (GEOCODE_DEADLINE_S by default).
+    Raises ValueError (GeocodeNotFound when there is no result) with a message for
+    the user, or GeocoderUnavailable when the service cannot be used right now.
+    """
+    lat, lng, _approximate = resolve_address(address, deadline)
+    return lat, lng
+
+
+def resolve_address(
+    address: str, deadline: Deadline | None = None, *, allow_fallback: bool = True
+) -> tuple[float, float, bool]:
+    """
+    geocode_address that also says whether the answer is approximate, i.e. a
+    town-level GEOCODE_FALLBACK guess to be replaced once the geocoder is back.
+    allow_fallback=False raises instead of guessing.
+    """
+    deadline = deadline or Deadline(GEOCODE_DEADLINE_S)
+    if not GEOCODER.cacheable:
+        lat, lng = GEOCODER.geocode(address, deadline=deadline)
+        return lat, lng, False
+    cached = GEOCODE_CACHE.lookup(address)
+    if cached is None:
+        raise GeocodeNotFound("Pre zadanú adresu sa nenašli žiadne súradnice.")
+    if cached is not GeocodeCache._MISS:
+        return cached[0], cached[1], False
+    try:
+        lat, lng = GEOCODING_CLIENT.single_flight(
+            _address_key(address),
+            lambda: _geocode_uncached(address, deadline),
+            timeout=deadline.remaining(),
+        )
+        return lat, lng, False
+    except GeocodeNotFound:
+        raise
+    except (GeocoderUnavailable, ValueError) as exc:
+        if GEOCODE_FALLBACK is None or not allow_fallback:
+            raise
+        try:
+            lat, lng = GEOCODE_FALLBACK.geocode(address)
+        except GeocodeNotFound:
+            raise exc
+        logging.info("Geocoder unavailable (%s), used local fallback for '%s'", exc, address)
+        return lat, lng, True
+
+
+def _geocode_uncached(address: str, deadline: Deadline | None = None):
+    try:
+        lat, lng = GEOCODER.geocode(address, deadline=deadline)
+    except GeocodeNotFound:
+        GEOCODE_CACHE.store(address, None)
+        raise
+    GEOCODE_CACHE.store(address, (lat, lng))
+    return lat, lng
+
+
+def _nominatim_geocode(address: str, url: str = GEOCODE_URL, deadline: Deadline | None = None):
+    params = {
+        "q": address,
+        "format": "json",
+        "limit": 1,
+        "addressdetails": 1,
+    }
+    try:
+        resp = GEOCODING_CLIENT.get(url, params=params, timeout=10, deadline=deadline)
+    except requests.RequestException as e:
+        logging.exception(f"Geocode request failed: {e}")
+        raise ValueError("Nepodarilo sa kontaktovať geokódovaciu službu.")
+
+    if resp.status_code != 200:
+        logging.warning(f"Nominatim HTTP {resp.status_code}: {resp.text[:200]}")
+        raise ValueError("Geokódovanie zlyhalo (chyba služby).")
+
+    try:
+        data = resp.json()
+    except ValueError:
+        logging.warning(f"Nominatim vrátil neplatný JSON: {resp.text[:200]}")
+        raise ValueError("Geokódovanie vrátilo neplatnú odpoveď.")
+
+    if not isinstance(data, list) or len(data) == 0:
+        logging.info(f"Nominatim nenašiel výsledky pre adresu: {address}")
+        raise GeocodeNotFound("Pre zadanú adresu sa nenašli žiadne súradnice.")
+
+    first = data[0]
+    logging.info(f"Nominatim response for '{address}': {first}")  # DEBUG log
+    
+    lat_str = first.get("lat")
+    lon_str = first.get("lon")
+    
+    if not lat_str or not lon_str:
+        logging.warning(f"Missing lat/lon in response: {first}")
+        raise ValueError("Geokódovanie vrátilo neúplné súradnice.")
+    
+    try:
+        lat = float(lat_str)
+        lng = float(lon_str)
+    except (ValueError, TypeError) as e:
+        logging.warning(f"Chyba pri parsovaní súradníc lat={lat_str}, lon={lon_str}: {e}")
+        raise ValueError("Geokódovanie vrátilo neplatné súradnice.")
+    
+    # Extra validácia rozsahu
+    if not (-90 <= lat <= 90) or not (-180 <= lng <= 180):
+        logging.warning(f"Súradnice mimo rozsahu: lat={lat}, lon={lng}")
+        raise ValueError("Geokódovanie vrátilo súradnice mimo platného rozsahu.")
+
+    return lat, lng
+
+
+# sync: geocode before the insert (the request waits for it)
+# deferred: insert with geo_status = 'pending' and resolve lat/lng in the background
+ACTIVITY_GEOCODE_MODE = os.getenv("ACTIVITY_GEOCODE_MODE", "sync").strip().lower()
+
+
+def _process_activity_geocode_batch(activity_ids):
+    """
+    Resolve pending activities and refine approximate ones. Unknown or invalid
+    addresses end as 'failed'; an unavailable geocoder leaves the row pending
+    (or stores the town-level fallback as 'approximate') and the id is retried.
+    Approximate rows only ever take a real geocoder answer.
+    """
+    retry = []
+    with db_conn() as conn:
+        placeholders = ", ".join(["%s"] * len(activity_ids))
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                f"""
+                SELECT id_activity, address, geo_status FROM activities
+                WHERE id_activity IN ({placeholders}) AND geo_status IN ('pending', 'approximate')
+                """,
+                tuple(activity_ids),
+            )
+            rows = cur.fetchall()
+            for activity_id, address, geo_status in rows:
+                refine = geo_status == "approximate"
+                try:
+                    lat, lng, approximate = resolve_address(address or "", allow_fallback=not refine)
+                except GeocoderUnavailable as exc:
+                    logging.info("Geocoding of activity %s postponed: %s", activity_id, exc)
+                    retry.append(activity_id)
+                    continue
+                except GeocodeNotFound as exc:
+                    if refine:
+                        # the geocoder does not know the street: the town-level guess stays
+                        logging.info("Activity %s stays approximate: %s", activity_id, exc)
+                        continue
+                    cur.execute(
+                        "UPDATE activities SET geo_status = 'failed', geo_error = %s WHERE id_activity = %s",
+                        (str(exc)[:255], activity_id),
+                    )
+                    conn.commit()
+                    continue
+                except ValueError as exc:
+                    if refine:
+                        retry.append(activity_id)
+                        continue
+                    cur.execute(
+                        "UPDATE activities SET geo_status = 'failed', geo_error = %s WHERE id_activity = %s",
+                        (str(exc)[:255], activity_id),
+                    )
+                    conn.commit()
+                    continue
+                cur.execute(
+                    """
+                    UPDATE activities
+                    SET lat = %s, lng = %s, geohash = %s, geo_status = %s, geo_error = NULL
+                    WHERE id_activity = %s AND geo_status = %s
+                    """,
+                    (
+                        lat, lng, geohash_encode(lat, lng),
+                        "approximate" if approximate else "ready",
+                        activity_id, geo_status,
+                    ),
+                )
+                conn.commit()
+                if approximate:
+                    retry.append(activity_id)
+                ACTIVITY_CLUSTERS.invalidate()
+                ACTIVITY_COUNT_CACHE.clear()
+        finally:
+            cur.close()
+    return retry
+
+
+def _fail_exhausted_activity_geocodes(activity_ids) -> None:
+    """Out of retries: pending rows end as 'failed'; approximate ones keep their town-level guess."""
+    with db_conn() as conn:
+        placeholders = ", ".join(["%s"] * len(activity_ids))
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                f"""
+                UPDATE activities SET geo_status = 'failed', geo_error = %s
+                WHERE id_activity IN ({placeholders}) AND geo_status = 'pending'
+                """,
+                ("Geokódovacia služba bola dlhodobo nedostupná.", *activity_ids),
+            )
+            conn.commit()
+        finally:
+            cur.close()
+
+
+ACTIVITY_GEOCODE_QUEUE = CoalescingJobQueue(
+    _process_activity_geocode_batch,
+    name="activity-geocode",
+    batch_size=8,
+    linger_s=0.0,
+    max_attempts=int(os.getenv("ACTIVITY_GEOCODE_MAX_ATTEMPTS", "8")),
+    backoff_s=5.0,
+    on_give_up=_fail_exhausted_activity_geocodes,
+)
+
+
+def enqueue_pending_activity_geocodes() -> int:
+    """
+    Re-schedule activities still waiting for coordinates or holding approximate
+    ones (e.g. after a restart or once the geocoder recovered).
+    """
+    with db_conn() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT id_activity FROM activities WHERE geo_status IN ('pending', 'approximate')")
+            activity_ids = [row[0] for row in cur.fetchall()]
+        finally:
+            cur.close()
+    ACTIVITY_GEOCODE_QUEUE.enqueue_many(activity_ids)
+    return len(activity_ids)
+
+
+def _requeue_activity_geocodes_in_background() -> None:
+    # called from the request that closed the breaker: keep the query off it
+    threading.Thread(target=enqueue_pending_activity_geocodes, name="activity-geocode-requeue", daemon=True).start()
+
+
+GEOCODER_BREAKER.on_close(_requeue_activity_geocodes_in_background)
+
+
+@app.post("/api/activities")
+def create_activity():
+    data = request.get_json()
+    title = data.get("title")
+    description = data.get("description")
+    image = data.get("image") or data.get("image_url")
+    capacity = data.get("capacity")
+    user_id = data.get("user_id")
+    address = data.get("address")  # nový vstup z frontendu
+
+    if not title or len(title.strip()) == 0:
+        return jsonify({"error": "Názov je povinný."}), 400
+    if not isinstance(capacity, int) or capacity < 1:
+        return jsonify({"error": "Neplatná kapacita."}), 400
+    if not user_id:
+        return jsonify({"error": "Nepodarilo sa identifikovať používateľa."}), 400
+    if not address or len(address.strip()) == 0:
+        return jsonify({"error": "Adresa je povinná."}), 400
+    address = address.strip()[:500]
+
+    deferred = ACTIVITY_GEOCODE_MODE == "deferred"
+    lat = lng = None
+    approximate = False
+    if not deferred:
+        try:
+            lat, lng, approximate = resolve_address(address)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except GeocoderUnavailable:
+            resp = jsonify({"error": "Geokódovacia služba je dočasne nedostupná, skúste to o chvíľu."})
+            resp.headers["Retry-After"] = "30"
+            return resp, 503
+        except Exception:
+            return jsonify({"error": "Nepodarilo sa získať súradnice z adresy."}), 502
+
+        # validácia výsledných súradníc (pre istotu)
+        if not (-90 <= lat <= 90) or not (-180 <= lng <= 180):
+            return jsonify({"error": "Geokódovanie vrátilo neplatné súradnice."}), 400
+
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO activities (title, description, image_url, capacity, lat, lng, geohash, address, geo_status, user_id)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, (
+            title, description, None, capacity, lat, lng,
+            geohash_encode(lat, lng) if lat is not None else None,
+            address, "pending" if deferred else "approximate" if approximate else "ready", user_id,
+        ))
+        activity_id = cur.lastrowid
+        conn.commit()
+        ACTIVITY_COUNT_CACHE.clear()
+        if deferred or approximate:
+            # approximate: town-level fallback, replaced once the geocoder answers
+            ACTIVITY_GEOCODE_QUEUE.enqueue(activity_id)
+        if not deferred:
+            ACTIVITY_CLUSTERS.invalidate()
+
+        if image:
+            if isinstance(image, str) and image.startswith("data:image"):
+                stored = _save_activity_image_from_data_url(conn, activity_id, image)
+                if stored:
+                    image = stored
+            else:
+                image = _make_abs(str(image))
+                cur.execute(
+                    "UPDATE activities SET image_url = %s WHERE id_activity = %s",
+                    (image, activity_id),
+                )
+                conn.commit()
+
+        cur = conn.cursor(dictionary=True)
+        cur.execute("SELECT * FROM activities WHERE id_activity = %s", (activity_id,))
+        row = cur.fetchone()
+        if row and row.get("image_url"):
+            row["image_url"] = _make_abs(row["image_url"])
+        return jsonify(row), 201
+    finally:
+        conn.close()
+
+
+@app.get("/api/activities/<int:activity_id>")
+def get_activity(activity_id: int):
+    conn = get_conn()
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute(
+            """
+            SELECT id_activity, title, description, image_url, capacity, attendees_count, lat, lng,
+                   address, geo_status, geo_error, user_id, created_at
+            FROM activities
+            WHERE id_activity = %s
+            """,
+            (activity_id,),
+        )
+        row = cur.fetchone()
+        if not row:
+            return jsonify({"error": "Aktivita neexistuje."}), 404
+        if row.get("image_url"):
+            row["image_url"] = _make_abs(row["image_url"])
+        return jsonify(row), 200
+    finally:
+        cur.close()
+        conn.close()
+
+
+@app.post("/api/activities/<int:activity_id>/image")
+def upload_activity_image(activity_id: int):
+    file = request.files.get("file")
+    if not file or not file.filename:
+        return jsonify({"error": "Súbor nebol dodaný."}), 400
+
+    filename = secure_filename(file.filename)
+    _, ext = os.path.splitext(filename)
+    ext = ext.lower()
+    if ext not in ALLOWED_IMAGE_EXTS:
+        return jsonify({"error": "Nepodporovaný formát. Povolené: jpg, jpeg, png, gif, webp"}), 400
+
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT 1 FROM activities WHERE id_activity = %s", (activity_id,))
+        if not cur.fetchone():
+            return jsonify({"error": "Aktivita neexistuje."}), 404
+    finally:
+        cur.close()
+
+    file_uid = str(uuid.uuid4())
+    path = _activity_image_disk_path(file_uid, ext)
+    try:
+        file.save(path)
+    except Exception as exc:
+        return jsonify({"error": f"Ukladanie zlyhalo: {exc}"}), 500
+
+    size_bytes = os.path.getsize(path)
+    storage_path = f"/assets/img/activities/{file_uid}{ext}"
+    storage_url = _make_abs(storage_path)
+
+    cur = None
+    try:
+        _delete_activity_image(conn, activity_id)
+        cur = conn.cursor()
+        cur.execute(
+            """
+            INSERT INTO media_files
+              (owner_type, owner_id, purpose, sort_order, file_uid, file_name, file_ext, mime_type, size_bytes, storage_path)
+            VALUES
+              ('activity', %s, 'activity_image', 0, %s, %s, %s, %s, %s, %s)
+            """,
+            (
+                activity_id,
+                file_uid,
+                filename,
+                ext,
+                file.mimetype or None,
+                size_bytes,
+                storage_path,
+            ),
+        )
+        cur.execute(
+            "UPDATE activities SET image_url = %s WHERE id_activity = %s",
+            (storage_url, activity_id),
+        )
+        conn.commit()
+    except Exception as exc:
+        try:
+            os.remove(path)
+        except Exception:
+            pass
+        return jsonify({"error": f"Ukladanie zlyhalo: {exc}"}), 500
+    finally:
+        if cur:
+            cur.close()
+
+    return jsonify({"url": storage_url, "uid": file_uid, "storage_path": storage_path}), 201
+
+
+@app.get("/api/activities/<int:activity_id>/image")
+def get_activity_image_meta(activity_id: int):
+    conn = get_conn()
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute(
+            """
+            SELECT file_uid, storage_path
+            FROM media_files
+            WHERE owner_type = 'activity' AND owner_id = %s AND purpose = 'activity_image'
+            ORDER BY created_at DESC
+            LIMIT 1
+            """,
+            (activity_id,),
+        )
+        row = cur.fetchone()
+        if row:
+            return jsonify(
+                {
+                    "url": _make_abs(row["storage_path"]),
+                    "storage_path": row["storage_path"],
+                    "uid": row["file_uid"],
+                }
+            ), 200
+
+        cur.execute("SELECT image_url FROM activities WHERE id_activity = %s", (activity_id,))
+        fallback = cur.fetchone()
+        if fallback and fallback[0]:
+            return jsonify({"url": _make_abs(fallback[0]), "uid": None}), 200
+
+        return jsonify({"error": "Obrázok pre aktivitu neexistuje."}), 404
+    finally:
+        cur.close()
+        conn.close()
+
+
+@app.delete("/api/activities/<int:activity_id>/image")
+def delete_activity_image(activity_id: int):
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1 FROM activities WHERE id_activity = %s", (activity_id,))
+        exists = cur.fetchone()
+        cur.close()
+        if not exists:
+            return jsonify({"error": "Aktivita neexistuje."}), 404
+
+        _delete_activity_image(conn, activity_id)
+        return jsonify({"success": True}), 200
+    except Exception as exc:
+        logging.warning("Failed to delete activity image: %s", exc)
+        return jsonify({"error": "Nepodarilo sa odstrániť obrázok."}), 500
+    finally:
+        conn.close()
+
+
+@app.put("/api/activities/<int:activity_id>")
+def update_activity(activity_id: int):
+    data = request.get_json(force=True) or {}
+    title = data.get("title")
+    description = data.get("description")
+    capacity = data.get("capacity")
+    image = data.get("image") or data.get("image_url")
+    user_id = data.get("user_id")
+    remove_image = bool(data.get("remove_image"))
+
+    if not user_id:
+        return jsonify({"error": "Chýba user_id."}), 400
+
+    conn = get_conn()
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute("SELECT user_id FROM activities WHERE id_activity = %s", (activity_id,))
+        owner_row = cur.fetchone()
+        if not owner_row:
+            return jsonify({"error": "Aktivita neexistuje."}), 404
+        is_admin = _is_admin_user(conn, int(user_id))
+        if int(owner_row["user_id"]) != int(user_id) and not is_admin:
+            return jsonify({"error": "Nemáš oprávnenie upraviť túto aktivitu."}), 403
+
+        sets = []
+        params: list = []
+
+        if title is not None:
+            if not str(title).strip():
+                return jsonify({"error": "Názov je povinný."}), 400
+            sets.append("title = %s"); params.append(title)
+
+        if description is not None:
+            sets.append("description = %s"); params.append(description)
+
+        if capacity is not None:
+            try:
+                capacity_int = int(capacity)
+            except Exception:
+                return jsonify({"error": "Kapacita musí byť číslo."}), 400
+            if capacity_int < 1:
+                return jsonify({"error": "Kapacita musí byť aspoň 1."}), 400
+            sets.append("capacity = %s"); params.append(capacity_int)
+
+        if image is not None or remove_image:
+            # Handle image update/removal
+            if isinstance(image, str) and image.startswith("data:image"):
+                stored = _save_activity_image_from_data_url(conn, activity_id, image)
+                if not stored:
+                    return jsonify({"error": "Nepodarilo sa uložiť obrázok."}), 400
+                sets.append("image_url = %s"); params.append(stored)
+            elif remove_image or (isinstance(image, str) and not image):
+                _delete_activity_image(conn, activity_id)
+                sets.append("image_url = %s"); params.append(None)
+            elif image:
+                _delete_activity_image(conn, activity_id)
+                abs_url = _make_abs(str(image))
+                sets.append("image_url = %s"); params.append(abs_url)
+
+        if not sets:
+            return jsonify({"error": "Nie je čo aktualizovať."}), 400
+
+        params.append(activity_id)
+        cur.execute(f"UPDATE activities SET {', '.join(sets)} WHERE id_activity = %s", tuple(params))
+        conn.commit()
+        if capacity is not None:
+            # a raised capacity frees seats for people on the waitlist
+            promote_cur = conn.cursor()
+            try:
+                conn.start_transaction()
+                _lock_activity(promote_cur, activity_id)
+                _promote_from_waitlist(promote_cur, activity_id)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                promote_cur.close()
+        ACTIVITY_CLUSTERS.invalidate()
+        ACTIVITY_COUNT_CACHE.clear()
+
+        cur.execute("SELECT * FROM activities WHERE id_activity = %s", (activity_id,))
+        row = cur.fetchone()
+        if row and row.get("image_url"):
+            row["image_url"] = _make_abs(row["image_url"])
+        return jsonify(row), 200
+    finally:
+        cur.close()
+        conn.close()
+
+
+def _lock_activity(cur, activity_id: int):
+    """
+    Take the row lock on the activity. Every signup/cancel/promotion path holds it
+    (the fast signup path via its conditional UPDATE) before touching
+    activity_signups or activity_waitlist, so writers for one activity queue up
+    instead of deadlocking on FK checks.
+    """
+    cur.execute(
+        "SELECT capacity, attendees_count FROM activities WHERE id_activity = %s FOR UPDATE",
+        (activity_id,),
+    )
+    return cur.fetchone()
+
+
+def _promote_from_waitlist(cur, activity_id: int) -> list[int]:
+    """
+    Move people from the head of the waitlist onto free seats (FIFO). Runs inside
+    the caller's transaction after _lock_activity.
+    """
+    promoted = []
+    while True:
+        cur.execute(
+            """
+            SELECT id_waitlist, user_id FROM activity_waitlist
+            WHERE activity_id = %s ORDER BY id_waitlist LIMIT 1 FOR UPDATE
+            """,
+            (activity_id,),
+        )
+        head = cur.fetchone()
+        if head is None:
+            break
+        waitlist_id, user_id = head
+        cur.execute(
+            """
+            UPDATE activities SET attendees_count = attendees_count + 1
+            WHERE id_activity = %s AND attendees_count < capacity
+            """,
+            (activity_id,),
+        )
+        if cur.rowcount == 0:
+            break
+        cur.execute(
+            "INSERT IGNORE INTO activity_signups (activity_id, user_id) VALUES (%s, %s)",
+            (activity_id, user_id),
+        )
+        if cur.rowcount == 0:
+            # already signed up: give the seat back
+            cur.execute(
+                "UPDATE activities SET attendees_count = attendees_count - 1 WHERE id_activity = %s",
+                (activity_id,),
+            )
+        else:
+            promoted.append(user_id)
+        cur.execute("DELETE FROM activity_waitlist WHERE id_waitlist = %s", (waitlist_id,))
+    return promoted
+
+
+@app.post("/api/activities/<int:activity_id>/signup")
+def signup_activity(activity_id):
+    """
+    Prihlásenie na aktivitu. Miesto sa berie jedným podmieneným UPDATE
+    (attendees_count < capacity) v tej istej transakcii ako INSERT prihlásenia,
+    takže ani pri veľa súbežných požiadavkách nedôjde k prekročeniu kapacity.
+    S {"waitlist": true} sa pri plnej kapacite používateľ zaradí na čakaciu listinu.
+    """
+    data = request.get_json(silent=True) or {}
+    user_id = data.get("user_id")
+    join_waitlist = bool(data.get("waitlist"))
+
+    if not user_id:
+        return jsonify({"error": "Nepodarilo sa identifikovat pouzivatela."}), 400
+
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        conn.start_transaction()
+        # claims the seat and takes the activity row lock in one round trip;
+        # LAST_INSERT_ID(expr) hands the new count back without another SELECT
+        cur.execute(
+            """
+            UPDATE activities SET attendees_count = LAST_INSERT_ID(attendees_count + 1)
+            WHERE id_activity = %s AND attendees_count < capacity
+            """,
+            (activity_id,),
+        )
+        if cur.rowcount == 1:
+            attendees_count = cur.lastrowid
+            try:
+                cur.execute("INSERT INTO activity_signups (activity_id, user_id) VALUES (%s, %s)", (activity_id, user_id))
+            except mysql.connector.IntegrityError as exc:
+                conn.rollback()
+                if exc.errno == 1062:
+                    return jsonify({"error": "Uz ste prihlaseny na tuto aktivitu."}), 400
+                return jsonify({"error": "Pouzivatel neexistuje."}), 404
+            conn.commit()
+            return jsonify({"status": "signed_up", "attendees_count": attendees_count})
+
+        # full (or missing): decide under the row lock so a concurrent
+        # cancellation either sees our waitlist row or frees the seat first
+        row = _lock_activity(cur, activity_id)
+        if row is None:
+            conn.rollback()
+            return jsonify({"error": "Aktivita neexistuje."}), 404
+        attendees_count = row[1]
+        cur.execute("SELECT 1 FROM activity_signups WHERE activity_id = %s AND user_id = %s", (activity_id, user_id))
+        if cur.fetchone() is not None:
+            conn.rollback()
+            return jsonify({"error": "Uz ste prihlaseny na tuto aktivitu."}), 400
+        if not join_waitlist:
+            conn.rollback()
+            return jsonify({"error": "Kapacita je naplnena."}), 400
+        try:
+            cur.execute(
+                "INSERT IGNORE INTO activity_waitlist (activity_id, user_id) VALUES (%s, %s)",
+                (activity_id, user_id),
+            )
+        except mysql.connector.IntegrityError:
+            conn.rollback()
+            return jsonify({"error": "Pouzivatel neexistuje."}), 404
+        cur.execute(
+            """
+            SELECT COUNT(*) FROM activity_waitlist
+            WHERE activity_id = %s AND id_waitlist <= (
+              SELECT id_waitlist FROM activity_waitlist WHERE activity_id = %s AND user_id = %s
+            )
+            """,
+            (activity_id, activity_id, user_id),
+        )
+        position = cur.fetchone()[0]
+        conn.commit()
+        return jsonify({
+            "status": "waitlisted",
+            "position": position,
+            "attendees_count": attendees_count,
+        }), 202
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+@app.delete("/api/activities/<int:activity_id>/signup")
+def cancel_signup(activity_id):
+    """
+    Odhlásenie z aktivity (alebo z čakacej listiny). Uvoľnené miesto v tej istej
+    transakcii dostane prvý človek z čakacej listiny.
+    """
+    data = request.get_json(silent=True) or {}
+    user_id = data.get("user_id")
+
+    if not user_id:
+        return jsonify({"error": "Nepodarilo sa identifikovat pouzivatela."}), 400
+
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        conn.start_transaction()
+        row = _lock_activity(cur, activity_id)
+        if row is None:
+            conn.rollback()
+            return jsonify({"error": "Aktivita neexistuje."}), 404
+        attendees_count = row[1]
+        promoted: list[int] = []
+        message = "uspesne odhlaseny"
+        cur.execute("DELETE FROM activity_signups WHERE activity_id = %s AND user_id = %s", (activity_id, user_id))
+        if cur.rowcount:
+            cur.execute(
+                "UPDATE activities SET attendees_count = GREATEST(attendees_count - 1, 0) WHERE id_activity = %s",
+                (activity_id,),
+            )
+            promoted = _promote_from_waitlist(cur, activity_id)
+            attendees_count = max(attendees_count - 1, 0) + len(promoted)
+        else:
+            cur.execute("DELETE FROM activity_waitlist WHERE activity_id = %s AND user_id = %s", (activity_id, user_id))
+            if cur.rowcount:
+                message = "odstraneny z cakacej listiny"
+        conn.commit()
+        return jsonify({"message": message, "attendees_count": attendees_count, "promoted": promoted})
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+@app.get("/api/activities/<int:activity_id>/waitlist")
+def list_activity_waitlist(activity_id: int):
+    conn = get_conn()
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute(
+            """
+            SELECT u.id_user, u.meno, u.priezvisko, w.created_at
+            FROM activity_waitlist w
+            JOIN users u ON u.id_user = w.user_id
+            WHERE w.activity_id = %s
+            ORDER BY w.id_waitlist ASC
+            """,
+            (activity_id,),
+        )
+        rows = cur.fetchall()
+        for position, row in enumerate(rows, start=1):
+            row["position"] = position
+        return jsonify(rows), 200
+    finally:
+        conn.close()
+
+SIGNUP_PAGE_SIZE_MAX = 500
+SIGNUP_EXPORT_BATCH = 500
+SIGNUP_EXPORT_COLUMNS = ("id_user", "meno", "priezvisko", "rola", "created_at")
+SIGNUP_EXPORT_SQL = """
+    SELECT u.id_user, u.meno, u.priezvisko, u.rola, s.created_at
+    FROM activity_signups s
+    JOIN users u ON u.id_user = s.user_id
+    WHERE s.activity_id = %s
+    ORDER BY s.id_signup ASC
+"""
+
+
+@app.get("/api/activities/<int:activity_id>/signups")
+def list_activity_signups(activity_id: int):
+    """Prihlásení na aktivitu v poradí prihlásenia, stránkované kurzorom (page_size, cursor)."""
+    try:
+        page_size = _int_arg("page_size", 100, 1, SIGNUP_PAGE_SIZE_MAX)
+    except ValueError:
+        return jsonify({"error": f"page_size musí byť v rozsahu 1 – {SIGNUP_PAGE_SIZE_MAX}."}), 400
+    after_id = 0
+    if request.args.get("cursor"):
+        try:
+            after_id = int(decode_cursor(request.args["cursor"])["i"])
+        except (ValueError, KeyError, TypeError):
+            return jsonify({"error": "Neplatný kurzor."}), 400
+
+    conn = get_conn()
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(
+            """
+            SELECT s.id_signup, u.id_user, u.meno, u.priezvisko, u.rola, s.created_at
+            FROM activity_signups s
+            JOIN users u ON u.id_user = s.user_id
+            WHERE s.activity_id = %s AND s.id_signup > %s
+            ORDER BY s.id_signup ASC
+            LIMIT %s
+            """,
+            (activity_id, after_id, page_size + 1),
+        )
+        rows = cur.fetchall()
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        next_cursor = encode_cursor({"i": rows[-1]["id_signup"]}) if has_more else None
+        return jsonify({"items": rows, "pagination": {
+            "page_size": page_size,
+            "next_cursor": next_cursor,
+        }}), 200
+    finally:
+        cur.close()
+        conn.close()
+
+
+def _stream_signups(activity_id: int, fmt: str):
+    """
+    Yield the export in chunks straight from an unbuffered cursor; at most
+    SIGNUP_EXPORT_BATCH rows are held in memory at a time.
+    """
+    with db_conn() as conn:
+        cur = conn.cursor(buffered=False)
+        finished = False
+        try:
+            cur.execute(SIGNUP_EXPORT_SQL, (activity_id,))
+            if fmt == "csv":
+                buf = io.StringIO()
+                writer = csv.writer(buf)
+                # BOM so spreadsheet apps read the diacritics as UTF-8
+                buf.write("\ufeff")
+                writer.writerow(SIGNUP_EXPORT_COLUMNS)
+                yield buf.getvalue()
+            while True:
+                rows = cur.fetchmany(SIGNUP_EXPORT_BATCH)
+                if not rows:
+                    break
+                rows = [(*row[:-1], row[-1].isoformat() if row[-1] else None) for row in rows]
+                if fmt == "csv":
+                    buf.seek(0)
+                    buf.truncate()
+                    writer.writerows(rows)
+                    yield buf.getvalue()
+                else:
+                    yield "".join(
+                        json.dumps(dict(zip(SIGNUP_EXPORT_COLUMNS, row)), ensure_ascii=False) + "\n"
+                        for row in rows
+                    )
+            finished = True
+        finally:
+            if not finished:
+                # client went away mid-stream: drain so the pooled connection is reusable
+                try:
+                    conn.consume_results()
+                except Exception:
+                    pass
+            cur.close()
+
+
+@app.get("/api/activities/<int:activity_id>/signups/export")
+def export_activity_signups(activity_id: int):
+    """Export prihlásených ako CSV alebo NDJSON; odpoveď sa streamuje (chunked), nič sa nenačíta celé do pamäte."""
+    fmt = (request.args.get("format") or "csv").strip().lower()
+    if fmt not in ("csv", "ndjson"):
+        return jsonify({"error": "Parameter format musí byť csv alebo ndjson."}), 400
+
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1 FROM activities WHERE id_activity = %s", (activity_id,))
+        if cur.fetchone() is None:
+            return jsonify({"error": "Aktivita neexistuje."}), 404
+    finally:
+        conn.close()
+
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    # no Content-Length: the server sends the generator with chunked transfer encoding
+    return Response(
+        _stream_signups(activity_id, fmt),
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": f'attachment; filename="activity-{activity_id}-signups.{fmt}"',
+            "X-Accel-Buffering": "no",
+            "Cache-Control": "no-store",
+        },
+    )
+
+# ==========================================
+# ARTICLES
+# ==========================================     
+
+@app.get("/api/articles")
+@conditional_get(("articles",), "public, no-cache")
+def list_articles():
+    conn = get_conn()
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute("SELECT * FROM articles ORDER BY created_at DESC")
+        rows = cur.fetchall()
+        for row in rows:
+            if row.get("image_url"):
+                row["image_url"] = _make_abs(row["image_url"])
+        return jsonify(rows)
+    finally:
+        conn.close()
+
+@app.get("/api/articles/<int:id_article>")
+def get_article(id_article):
+    conn = get_conn()
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute("SELECT * FROM articles WHERE id_article = %s", (id_article,))
+        article = cur.fetchone()
+        if not article:
+            return jsonify({"error": "Article not found"}), 404
+        if article.get("image_url"):
+            article["image_url"] = _make_abs(article["image_url"])
+        return jsonify(article)
+    finally:
+        conn.close()
+
+@app.delete("/api/activities/<int:activity_id>")
+def delete_activity_record(activity_id: int):
+    data = request.get_json(force=True) or {}
+    user_id = data.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Chyba user_id."}), 400
+
+    conn = get_conn()
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute("SELECT user_id FROM activities WHERE id_activity = %s", (activity_id,))
+        row = cur.fetchone()
+        if not row:
+            return jsonify({"error": "Aktivita neexistuje."}), 404
+        is_admin = _is_admin_user(conn, int(user_id))
+        if int(row["user_id"]) != int(user_id) and not is_admin:
+            return jsonify({"error": "Nemate opravnenie zmazat tuto aktivitu."}), 403
+
+        _delete_activity_image(conn, activity_id)
+        cur.execute("DELETE FROM activity_signups WHERE activity_id = %s", (activity_id,))
+        cur.execute("DELETE FROM activities WHERE id_activity = %s", (activity_id,))
+        conn.commit()
+        ACTIVITY_CLUSTERS.invalidate()
+        ACTIVITY_COUNT_CACHE.clear()
+        return jsonify({"success": True}), 200
+    finally:
+        cur.close()
+        conn.close()
+
+@app.post("/api/articles")
+def create_article():
+    data = request.get_json()
+    title = data.get("title")
+    text = data.get("text")
+    image = data.get("image") or data.get("image_url")
+
+    if not title or not text:
+        return jsonify({"error": "Title and text are required"}), 400
+
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO articles (title, text, image_url)
+            VALUES (%s, %s, %s)
+        """, (title, text, None))
+        conn.commit()
+
+        new_id = cur.lastrowid
+        if image:
+            if isinstance(image, str) and image.startswith("data:image"):
+                stored = _save_article_image_from_data_url(conn, new_id, image)
+                if stored:
+                    image = stored
+            else:
+                image = _make_abs(str(image))
+                cur.execute("UPDATE articles SET image_url = %s WHERE id_article = %s", (image, new_id))
+                conn.commit()
+
+        return jsonify({"id_article": new_id, "image_url": _make_abs(image) if image else None}), 201
+    finally:
+        conn.close()
+
+
+@app.put("/api/articles/<int:id_article>")
+def update_article(id_article: int):
+    data = request.get_json(force=True) or {}
+    title = data.get("title")
+    text = data.get("text")
+    image = data.get("image") or data.get("image_url")
+    remove_image = bool(data.get("remove_image"))
+
+    if not any([title is not None, text is not None, image is not None, remove_image]):
+        return jsonify({"error": "Nie je co aktualizovat."}), 400
+
+    conn = get_conn()
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute("SELECT 1 FROM articles WHERE id_article = %s", (id_article,))
+        if not cur.fetchone():
+            return jsonify({"error": "Article not found"}), 404
+    finally:
+        cur.close()
+
+    cur = conn.cursor()
+    try:
+        sets = []
+        params = []
+        if title is not None:
+            sets.append("title = %s"); params.append(title)
+        if text is not None:
+            sets.append("text = %s"); params.append(text)
+
+        if image is not None or remove_image:
+            if isinstance(image, str) and image.startswith("data:image"):
+                stored = _save_article_image_from_data_url(conn, id_article, image)
+                if not stored:
+                    return jsonify({"error": "Nepodarilo sa ulozit obrazok."}), 400
+                sets.append("image_url = %s"); params.append(stored)
+            elif remove_image or (isinstance(image, str) and not image):
+                _delete_article_image(conn, id_article)
+                sets.append("image_url = %s"); params.append(None)
+            elif image:
+                _delete_article_image(conn, id_article)
+                abs_url = _make_abs(str(image))
+                sets.append("image_url = %s"); params.append(abs_url)
+
+        if sets:
+            params.append(id_article)
+            cur.execute(f"UPDATE articles SET {', '.join(sets)} WHERE id_article = %s", tuple(params))
+            conn.commit()
+
+        cur.close()
+        cur = conn.cursor(dictionary=True)
+        cur.execute("SELECT * FROM articles WHERE id_article = %s", (id_article,))
+        row = cur.fetchone()
+        if row and row.get("image_url"):
+            row["image_url"] = _make_abs(row["image_url"])
+        return jsonify(row), 200
+    except Exception as exc:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        return jsonify({"error": str(exc)}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+
+@app.delete("/api/articles/<int:id_article>")
+def delete_article(id_article: int):
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        _delete_article_image(conn, id_article)
+        cur.execute("DELETE FROM articles WHERE id_article = %s", (id_article,))
+        if cur.rowcount == 0:
+            return jsonify({"error": "Article not found"}), 404
+        conn.commit()
+        return jsonify({"success": True}), 200
+    except Exception as exc:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        return jsonify({"error": str(exc)}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+@app.post("/api/articles/<int:article_id>/image")
+def upload_article_image(article_id: int):
+    file = request.files.get("file")
+    if not file or not file.filename:
+        return jsonify({"error": "Subor nebol dodany."}), 400
+
+    filename = secure_filename(file.filename)
+    _, ext = os.path.splitext(filename)
+    ext = ext.lower()
+    if ext not in ALLOWED_IMAGE_EXTS:
+        return jsonify({"error": "Nepodporovany format. Povolené: jpg, jpeg, png, gif, webp"}), 400
+
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT 1 FROM articles WHERE id_article = %s", (article_id,))
+        if not cur.fetchone():
+            return jsonify({"error": "Article not found"}), 404
+    finally:
+        cur.close()
+
+    file_uid = str(uuid.uuid4())
+    path = _article_image_disk_path(file_uid, ext)
+    try:
+        file.save(path)
+    except Exception as exc:
+        return jsonify({"error": f"Ukladanie zlyhalo: {exc}"}), 500
+
+    size_bytes = os.path.getsize(path)
+    storage_path = f"/assets/img/articles/{file_uid}{ext}"
+    storage_url = _make_abs(storage_path)
+
+    cur = None
+    try:
+        cur = conn.cursor()
+        _delete_article_image(conn, article_id)
+        cur.execute(
+            """
+            INSERT INTO media_files
+              (owner_type, owner_id, purpose, sort_order, file_uid, file_name, file_ext, mime_type, size_bytes, storage_path)
+            VALUES
+              ('article', %s, 'attachment', 0, %s, %s, %s, %s, %s, %s)
+            """,
+            (
+                article_id,
+                file_uid,
+                filename,
+                ext,
+                file.mimetype or None,
+                size_bytes,
+                storage_path,
+            ),
+        )
+        cur.execute("UPDATE articles SET image_url = %s WHERE id_article = %s", (storage_url, article_id))
+        conn.commit()
+    except Exception as exc:
+        try:
+            os.remove(path)
+        except Exception:
+            pass
+        return jsonify({"error": f"Ukladanie zlyhalo: {exc}"}), 500
+    finally:
+        if cur:
+            cur.close()
+
+    return jsonify({"url": storage_url, "uid": file_uid, "storage_path": storage_path}), 201
+
+
+# ==========================================
+# 🛠️ CLI (flask --app app <príkaz>)
+# ==========================================
+
+@app.cli.command("embeddings-convert")
+@click.option("--batch-size", default=500, show_default=True, type=int, help="Rows converted per batch.")
+@click.option(
+    "--dtype",
+    type=click.Choice(sorted(EMBEDDING_DTYPE_CODES)),
+    default=None,
+    help="Target storage dtype (defaults to EMBEDDING_STORAGE_DTYPE).",
+)
+def embeddings_convert_command(batch_size: int, dtype: str | None):
+    """Convert legacy JSON rows in user_embeddings to the binary format."""
+    batch_size = max(1, batch_size)
+    last_user_id = 0
+    converted = 0
+    skipped = 0
+    with db_conn() as conn:
+        while True:
+            cur = conn.cursor()
+            try:
+                # keyset over user_id, only rows without the binary header
+                cur.execute(
+                    """
+                    SELECT user_id, embedding
+                    FROM user_embeddings
+                    WHERE user_id > %s AND SUBSTRING(embedding, 1, 3) <> %s
+                    ORDER BY user_id ASC
+                    LIMIT %s
+                    """,
+                    (last_user_id, EMBEDDING_BLOB_MAGIC, batch_size),
+                )
+                rows = cur.fetchall()
+                if not rows:
+                    break
+                last_user_id = rows[-1][0]
+
+                updates = []
+                for user_id, raw in rows:
+                    if not is_legacy_embedding(raw):
+                        continue
+                    try:
+                        vec = decode_embedding(raw)
+                    except (TypeError, ValueError) as exc:
+                        logging.warning("Skipping unreadable embedding for user %s: %s", user_id, exc)
+                        skipped += 1
+                        continue
+                    updates.append((encode_embedding(vec, dtype), user_id))
+
+                if updates:
+                    # keep updated_at: the vector itself does not change
+                    cur.executemany(
+                        "UPDATE user_embeddings SET embedding = %s, updated_at = updated_at WHERE user_id = %s",
+                        updates,
+                    )
+                    conn.commit()
+                converted += len(updates)
+                click.echo(f"converted {converted} rows (last user_id {last_user_id})")
+            finally:
+                cur.close()
+
+    click.echo(f"Done: {converted} converted, {skipped} skipped.")
+
+
+# Process-pool workers for embeddings-reembed; each worker loads its own model copy.
+_REEMBED_WORKER_MODEL = None
+
+
+def _reembed_worker_init(model_name: str):
+    global _REEMBED_WORKER_MODEL
+    from sentence_transformers import SentenceTransformer
+
+    _REEMBED_WORKER_MODEL = SentenceTransformer(model_name)
+
+
+def _reembed_worker_encode(texts):
+    return np.asarray(_REEMBED_WORKER_MODEL.encode(texts), dtype=np.float32)
+
+
+def _iter_user_hobby_texts(conn, after_user_id: int, only_outdated: bool, batch_size: int):
+    """
+    Stream (user_id, hobby text) in user_id order from one unbuffered cursor,
+    so the whole user table never has to sit in memory.
+    """
+    where = ["u.soft_del = 0", "u.id_user > %s"]
+    params: list = [after_user_id]
+    if only_outdated:
+        where.append("(e.user_id IS NULL OR e.embedding IS NULL OR e.model_name <> %s OR e.status <> 'ready')")
+        params.append(EMBEDDING_MODEL_NAME)
+    cur = conn.cursor(buffered=False)
+    try:
+        cur.execute(
+            f"""
+            SELECT u.id_user, h.nazov
+            FROM users u
+            JOIN user_hobby uh ON uh.id_user = u.id_user
+            JOIN hobby h ON h.id_hobby = uh.id_hobby
+            LEFT JOIN user_embeddings e ON e.user_id = u.id_user
+            WHERE {" AND ".join(where)}
+            ORDER BY u.id_user ASC
+            """,
+            tuple(params),
+        )
+        current_id = None
+        names: list[str] = []
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            for uid, name in rows:
+                if uid != current_id:
+                    if current_id is not None:
+                        yield current_id, _format_hobby_text(names)
+                    current_id, names = uid, []
+                names.append(name)
+        if current_id is not None:
+            yield current_id, _format_hobby_text(names)
+    finally:
+        try:
+            # discard unread rows (early stop) so the connection is reusable
+            conn.consume_results()
+        except Exception:
+            pass
+        cur.close()
+
+
+def _read_reembed_checkpoint(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            data = json.load(fh)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as exc:
+        raise click.ClickException(f"Checkpoint {path} is unreadable: {exc}")
+    if data.get("model_name") != EMBEDDING_MODEL_NAME:
+        click.echo(f"Checkpoint is for model {data.get('model_name')}, starting over.")
+        return {}
+    return data
+
+
+def _write_reembed_checkpoint(path: str, data: dict) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump(data, fh)
+    os.replace(tmp_path, path)
+
+
+@app.cli.command("embeddings-reembed")
+@click.option("--batch-size", default=512, show_default=True, type=int, help="Users encoded and written per batch.")
+@click.option("--workers", default=0, show_default=True, type=int, help="Encoding processes (0 = encode in this process).")
+@click.option(
+    "--checkpoint",
+    default=lambda: os.getenv("REEMBED_CHECKPOINT", os.path.join(BASE_DIR, ".reembed_checkpoint.json")),
+    show_default="server/.reembed_checkpoint.json",
+    help="File recording the last finished user_id.",
+)
+@click.option("--restart", is_flag=True, help="Ignore an existing checkpoint.")
+@click.option("--all-users", is_flag=True, help="Re-embed everyone, not only rows from another model or not ready.")
+@click.option("--dry-run", is_flag=True, help="Encode a sample without writing and report throughput.")
+@click.option("--limit", default=None, type=int, help="Stop after this many users (dry-run default: 2000).")
+def embeddings_reembed_command(batch_size, workers, checkpoint, restart, all_users, dry_run, limit):
+    """Regenerate user embeddings with the active EMBEDDING_MODEL_NAME."""
+    batch_size = max(1, batch_size)
+    if dry_run and limit is None:
+        limit = 2000
+    state = {} if restart or dry_run else _read_reembed_checkpoint(checkpoint)
+    last_user_id = int(state.get("last_user_id", 0))
+    done = int(state.get("done", 0))
+    if last_user_id:
+        click.echo(f"Resuming after user_id {last_user_id} ({done} users already done).")
+
+    pool_exec = None
+    if workers > 0:
+        from concurrent.futures import ProcessPoolExecutor
+
+        pool_exec = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_reembed_worker_init,
+            initargs=(EMBEDDING_MODEL_NAME,),
+        )
+
+    def encode(texts):
+        if not texts:
+            return []
+        if pool_exec is None:
+            return list(embedding_model.encode(texts))
+        chunk = max(1, -(-len(texts) // workers))
+        parts = [texts[i:i + chunk] for i in range(0, len(texts), chunk)]
+        out = []
+        for vectors in pool_exec.map(_reembed_worker_encode, parts):
+            out.extend(vectors)
+        return out
+
+    started = time.monotonic()
+    encode_seconds = 0.0
+    processed = 0
+    cache_hits = 0
+    try:
+        with db_conn() as read_conn, db_conn() as write_conn:
+            batch: list[tuple[int, str]] = []
+            stream = _iter_user_hobby_texts(read_conn, last_user_id, not all_users, batch_size)
+
+            def flush(items):
+                nonlocal encode_seconds, cache_hits, done, last_user_id
+                texts = [text for _, text in items]
+                found = EMBEDDING_CACHE.lookup_many(write_conn, texts)
+                todo = [text for text in dict.fromkeys(texts) if text not in found]
+                cache_hits += sum(1 for text in texts if text in found)
+                t0 = time.monotonic()
+                fresh = list(zip(todo, encode(todo)))
+                encode_seconds += time.monotonic() - t0
+                if dry_run:
+                    return
+                EMBEDDING_CACHE.store_many(write_conn, fresh)
+                found.update(fresh)
+                _save_user_embeddings(write_conn, [(uid, found[text]) for uid, text in items])
+                done += len(items)
+                last_user_id = items[-1][0]
+                _write_reembed_checkpoint(
+                    checkpoint,
+                    {"model_name": EMBEDDING_MODEL_NAME, "last_user_id": last_user_id, "done": done},
+                )
+
+            for user_id, text in stream:
+                batch.append((user_id, text))
+                processed += 1
+                if len(batch) >= batch_size:
+                    flush(batch)
+                    batch = []
+                    elapsed = time.monotonic() - started
+                    click.echo(f"{processed} users, {processed / elapsed:.1f} users/s")
+                if limit is not None and processed >= limit:
+                    break
+            if batch:
+                flush(batch)
+            stream.close()
+    finally:
+        if pool_exec is not None:
+            pool_exec.shutdown()
+
+    elapsed = max(time.monotonic() - started, 1e-9)
+    click.echo(
+        f"{'Dry run: ' if dry_run else ''}{processed} users in {elapsed:.1f}s "
+        f"({processed / elapsed:.1f} users/s, encoding {encode_seconds:.1f}s, {cache_hits} cache hits)"
+    )
+    if dry_run:
+        with db_conn() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute(
+                    """
+                    SELECT COUNT(DISTINCT u.id_user)
+                    FROM users u
+                    JOIN user_hobby uh ON uh.id_user = u.id_user
+                    LEFT JOIN user_embeddings e ON e.user_id = u.id_user
+                    WHERE u.soft_del = 0
+                      AND (%s OR e.user_id IS NULL OR e.embedding IS NULL OR e.model_name <> %s OR e.status <> 'ready')
+                    """,
+                    (bool(all_users), EMBEDDING_MODEL_NAME),
+                )
+                remaining = cur.fetchone()[0]
+            finally:
+                cur.close()
+        if processed:
+            click.echo(f"{remaining} users to re-embed, estimated {remaining * elapsed / processed / 60:.1f} min.")
+    elif limit is None or processed < limit:
+        try:
+            os.remove(checkpoint)
+        except FileNotFoundError:
+            pass
+        click.echo(f"Done: {done} users on {EMBEDDING_MODEL_NAME}.")
+
+
+@app.cli.command("gazetteer-load")
+@click.option("--file", "path", default=None, help="CSV with name,lat,lng columns (defaults to GAZETTEER_PATH).")
+def gazetteer_load_command(path: str | None):
+    """Load the bundled municipality gazetteer into city_coordinates."""
+    path = path or GAZETTEER_PATH
+    places = _read_gazetteer_file(path)
+    with db_conn() as conn:
+        cur = conn.cursor()
+        try:
+            # never overwrite rows that were corrected by hand
+            cur.executemany(
+                """
+                INSERT INTO city_coordinates (name_key, name, lat, lng, source)
+                VALUES (%s, %s, %s, %s, 'gazetteer')
+                ON DUPLICATE KEY UPDATE
+                  lat = IF(source = 'manual', lat, VALUES(lat)),
+                  lng = IF(source = 'manual', lng, VALUES(lng)),
+                  source = IF(source = 'manual', source, VALUES(source))
+                """,
+                [(_place_key(name), name, lat, lng) for name, lat, lng in places],
+            )
+            conn.commit()
+        finally:
+            cur.close()
+    click.echo(f"Loaded {len(places)} places from {path}.")
+
+
+@app.cli.command("matches-build")
+@click.option("--block-size", default=USER_MATCHES_BLOCK_SIZE, show_default=True, help="Query rows per matrix product.")
+def matches_build_command(block_size: int):
+    """Rebuild user_matches for every indexed user (top-K same-city matches per role)."""
+    with db_conn() as conn:
+        EMBEDDING_INDEX.load(conn)
+        snapshot = EMBEDDING_INDEX.snapshot()
+        ids, _, _, cities = snapshot
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT NOW()")
+            started_at = cur.fetchone()[0]
+        finally:
+            cur.close()
+
+        users = pairs = 0
+        with click.progressbar(list(np.unique(cities)), label="Cities") as codes:
+            for code in codes:
+                positions = np.flatnonzero(cities == code)
+                rows = list(compute_user_matches(snapshot, positions, block_size=block_size))
+                _replace_user_matches(conn, ids[positions].tolist(), rows)
+                users += positions.size
+                pairs += len(rows)
+
+        # lists of users that left the index (deleted, no hobbies, no embedding)
+        cur = conn.cursor()
+        try:
+            cur.execute("DELETE FROM user_matches WHERE updated_at < %s", (started_at,))
+            removed = cur.rowcount
+            conn.commit()
+        finally:
+            cur.close()
+    click.echo(f"Stored {pairs} matches for {users} users; removed {removed} stale rows.")
+
+
+@app.cli.command("geocode-cache-purge")
+def geocode_cache_purge_command():
+    """Delete expired rows from geocode_cache."""
+    with db_conn() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("DELETE FROM geocode_cache WHERE expires_at <= NOW()")
+            removed = cur.rowcount
+            conn.commit()
+        finally:
+            cur.close()
+    click.echo(f"Removed {removed} expired geocode entries.")
+
+
+@app.cli.command("activities-geohash")
+def activities_geohash_command():
+    """Fill activities.geohash for rows with coordinates (run once after the migration)."""
+    with db_conn() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT id_activity, lat, lng FROM activities WHERE lat IS NOT NULL AND lng IS NOT NULL")
+            rows = [(geohash_encode(float(lat), float(lng)), activity_id) for activity_id, lat, lng in cur.fetchall()]
+            cur.executemany("UPDATE activities SET geohash = %s WHERE id_activity = %s", rows)
+            conn.commit()
+        finally:
+            cur.close()
+    click.echo(f"Updated geohash for {len(rows)} activities.")
+
+
+@app.cli.command("signup-stress")
+@click.option("--target", required=True, help="DB host the run writes to; must equal DB_HOST (set explicitly).")
+@click.option("--users", "user_count", default=200, show_default=True, help="Existing users to sign up.")
+@click.option("--capacity", default=10, show_default=True)
+@click.option("--threads", type=int, default=None, help="Concurrent requests (default and maximum: DB_POOL_SIZE).")
+def signup_stress_command(target: str, user_count: int, capacity: int, threads: int | None):
+    """
+    Hammer signup/cancel for a throwaway activity from many threads and check that
+    every response is an expected one and that attendees_count, activity_signups
+    and the waitlist stay consistent. Only runs against an explicitly chosen DB_HOST.
+    """
+    if "DB_HOST" not in os.environ:
+        raise click.ClickException("Set DB_HOST to a test database; the default host is never stressed.")
+    if target != DB_HOST:
+        raise click.ClickException(f"--target {target} does not match DB_HOST {DB_HOST}.")
+    # every in-flight request holds a pooled connection; more threads would only hit PoolError
+    threads = threads or pool.pool_size
+    if not 1 <= threads <= pool.pool_size:
+        raise click.ClickException(f"--threads must be 1 – {pool.pool_size}; raise DB_POOL_SIZE for more concurrency.")
+    # requests go through app.test_client(); keep the serving-process startup out of it
+    app.config["SKIP_BACKGROUND_JOBS"] = True
+
+    with db_conn() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT id_user FROM users WHERE soft_del = 0 ORDER BY id_user LIMIT %s", (user_count,))
+            user_ids = [row[0] for row in cur.fetchall()]
+            if len(user_ids) < 2:
+                raise click.ClickException("Need at least two users in the database.")
+            cur.execute(
+                """
+                INSERT INTO activities (title, description, capacity, geo_status, user_id)
+                VALUES ('signup-stress', 'temporary activity', %s, 'failed', %s)
+                """,
+                (capacity, user_ids[0]),
+            )
+            activity_id = cur.lastrowid
+            conn.commit()
+        finally:
+            cur.close()
+
+    def call(method: str, user_id: int) -> str:
+        """Outcome of one request: signed_up / waitlisted / duplicate / cancelled, or unexpected:<status>."""
+        with app.test_client() as client:
+            resp = client.open(
+                f"/api/activities/{activity_id}/signup",
+                method=method,
+                json={"user_id": user_id, "waitlist": True},
+            )
+        body = resp.get_json(silent=True) or {}
+        if method == "DELETE":
+            return "cancelled" if resp.status_code == 200 else f"unexpected:{resp.status_code}"
+        if resp.status_code == 200 and body.get("status") == "signed_up":
+            return "signed_up"
+        if resp.status_code == 202 and body.get("status") == "waitlisted":
+            return "waitlisted"
+        if resp.status_code == 400 and body.get("error") == "Uz ste prihlaseny na tuto aktivitu.":
+            return "duplicate"
+        return f"unexpected:{resp.status_code}"
+
+    def tally(phase: str, outcomes: list[str]) -> list[str]:
+        counts = {outcome: outcomes.count(outcome) for outcome in sorted(set(outcomes))}
+        click.echo(f"{phase} responses: {counts}")
+        unexpected = {k: v for k, v in counts.items() if k.startswith("unexpected:")}
+        return [f"{phase}: unexpected responses {unexpected}"] if unexpected else []
+
+    def check(phase: str, expected_signed: int | None = None):
+        with db_conn() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute(
+                    """
+                    SELECT a.attendees_count, a.capacity,
+                      (SELECT COUNT(*) FROM activity_signups s WHERE s.activity_id = a.id_activity),
+                      (SELECT COUNT(*) FROM activity_waitlist w WHERE w.activity_id = a.id_activity),
+                      (SELECT COUNT(*) FROM activity_waitlist w
+                       JOIN activity_signups s ON s.activity_id = w.activity_id AND s.user_id = w.user_id
+                       WHERE w.activity_id = a.id_activity)
+                    FROM activities a WHERE a.id_activity = %s
+                    """,
+                    (activity_id,),
+                )
+                attendees, cap, signed, waiting, both = cur.fetchone()
+            finally:
+                cur.close()
+        click.echo(f"{phase}: attendees_count={attendees} signups={signed} waitlist={waiting} capacity={cap}")
+        problems = []
+        if expected_signed is not None and signed != expected_signed:
+            problems.append(f"{expected_signed} signed_up responses but {signed} signups stored")
+        if attendees != signed:
+            problems.append("attendees_count does not match signups")
+        if signed > cap:
+            problems.append("capacity exceeded")
+        if signed < cap and waiting:
+            problems.append("free seats while people are waiting")
+        if both:
+            problems.append("users both signed up and waitlisted")
+        return problems
+
+    problems = []
+    try:
+        # every user twice to exercise the duplicate path
+        with ThreadPoolExecutor(max_workers=threads) as pool_:
+            outcomes = list(pool_.map(lambda uid: call("POST", uid), user_ids + user_ids))
+        problems += tally("signup", outcomes)
+        if "signed_up" not in outcomes:
+            problems.append("no signup succeeded")
+        problems += check("after signups", expected_signed=outcomes.count("signed_up"))
+
+        # cancel half of everyone (seated and waiting) concurrently
+        with ThreadPoolExecutor(max_workers=threads) as pool_:
+            outcomes = list(pool_.map(lambda uid: call("DELETE", uid), user_ids[::2]))
+        problems += tally("cancel", outcomes)
+        problems += check("after cancellations")
+    finally:
+        with db_conn() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute("DELETE FROM activities WHERE id_activity = %s", (activity_id,))
+                conn.commit()
+            finally:
+                cur.close()
+
+    if problems:
+        raise click.ClickException("; ".join(problems))
+    click.echo("OK")
+
+
+@app.cli.command("posts-search-rebuild")
+def posts_search_rebuild_command():
+    """Fill post_search from posts (run once after the migration, or to repair it)."""
+    with db_conn() as conn:
+        indexed = _reindex_posts(conn, "1=1", ())
+    click.echo(f"Indexed {indexed} posts.")
+
+
+RATING_STATS_AGGREGATE_SQL = f"""
+    SELECT user_id, SUM(rating) AS rating_sum, COUNT(*) AS rating_count,
+           {", ".join(f"SUM(rating = {value}) AS count_{value}" for value in RATING_VALUES)}
+    FROM user_ratings
+    GROUP BY user_id
+"""
+
+
+@app.cli.command("rating-stats-rebuild")
+def rating_stats_rebuild_command():
+    """Recompute user_rating_stats from user_ratings and report rows that had drifted."""
+    columns = ("rating_sum", "rating_count", *(f"count_{value}" for value in RATING_VALUES))
+    with db_conn() as conn:
+        cur = conn.cursor()
+        try:
+            conn.start_transaction()
+            cur.execute(
+                f"""
+                SELECT COUNT(*) FROM user_rating_stats s
+                LEFT JOIN ({RATING_STATS_AGGREGATE_SQL}) a ON a.user_id = s.user_id
+                WHERE a.user_id IS NULL OR {" OR ".join(f"s.{col} <> a.{col}" for col in columns)}
+                """
+            )
+            drifted = cur.fetchone()[0]
+            cur.execute(
+                f"""
+                SELECT COUNT(*) FROM ({RATING_STATS_AGGREGATE_SQL}) a
+                LEFT JOIN user_rating_stats s ON s.user_id = a.user_id
+                WHERE s.user_id IS NULL
+                """
+            )
+            drifted += cur.fetchone()[0]
+            cur.execute(
+                """
+                DELETE s FROM user_rating_stats s
+                LEFT JOIN (SELECT DISTINCT user_id FROM user_ratings) a ON a.user_id = s.user_id
+                WHERE a.user_id IS NULL
+                """
+            )
+            cur.execute(
+                f"""
+                INSERT INTO user_rating_stats (user_id, {", ".join(columns)})
+                SELECT user_id, {", ".join(columns)} FROM ({RATING_STATS_AGGREGATE_SQL}) a
+                ON DUPLICATE KEY UPDATE {", ".join(f"{col} = VALUES({col})" for col in columns)}
+                """
+            )
+            cur.execute("SELECT COUNT(*) FROM user_rating_stats")
+            total = cur.fetchone()[0]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+    click.echo(f"Rebuilt stats for {total} users; {drifted} existing rows had drifted.")
+
+
+@app.cli.command("posts-embed")
+@click.option("--all", "embed_all", is_flag=True, help="Re-embed every post, not only missing / outdated ones.")
+@click.option("--batch-size", default=64, show_default=True)
+def posts_embed_command(embed_all: bool, batch_size: int):
+    """Compute post_embeddings synchronously (initial fill or after a model change)."""
+    with db_conn() as conn:
+        cur = conn.cursor()
+        try:
+            if embed_all:
+                cur.execute("SELECT id_post FROM posts")
+            else:
+                cur.execute(
+                    """
+                    SELECT p.id_post FROM posts p
+                    LEFT JOIN post_embeddings e ON e.post_id = p.id_post
+                    WHERE e.post_id IS NULL OR e.status <> 'ready' OR e.model_name <> %s
+                    """,
+                    (EMBEDDING_MODEL_NAME,),
+                )
+            post_ids = [row[0] for row in cur.fetchall()]
+        finally:
+            cur.close()
+    if post_ids and embedding_model.mode == "disabled":
+        raise click.ClickException("Embedding model is disabled (EMBEDDING_MODEL_MODE).")
+    with click.progressbar(range(0, len(post_ids), batch_size), label="Posts") as starts:
+        for start in starts:
+            embed_posts(post_ids[start:start + batch_size])
+    click.echo(f"Embedded {len(post_ids)} posts.")
+
+
+@app.cli.command("users-geocode")
+@click.option("--online/--offline", default=False, help="Fall back to Nominatim for cities missing offline.")
+def users_geocode_command(online: bool):
+    """Backfill users.lat/lng from users.mesto for rows without coordinates."""
+    with db_conn() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                """
+                SELECT DISTINCT mesto FROM users
+                WHERE lat IS NULL AND mesto IS NOT NULL AND mesto <> '' AND soft_del = 0
+                """
+            )
+            cities = [row[0] for row in cur.fetchall()]
+        finally:
+            cur.close()
+        coords = get_cities_coordinates(cities, conn=conn, allow_network=online, schedule_missing=False)
+        updated = 0
+        for city, city_coords in coords.items():
+            updated += _fill_user_coordinates(conn, city, city_coords)
+    missing = len(cities) - len(coords)
+    click.echo(f"Updated {updated} users across {len(coords)} cities; {missing} cities unresolved.")
+
+
+# ==========================================
+# 🔁 ŠTART SERVERA (background jobs)
+# ==========================================
+# Runs once per serving process (python app.py, flask run or a WSGI worker) on its
+# first request. Test clients (tests, signup-stress) set SKIP_BACKGROUND_JOBS so
+# their requests do not load the model or re-queue embeddings and geocoding.
+_STARTUP_LOCK = threading.Lock()
+_STARTUP_DONE = False
+
+
+def _run_startup_tasks() -> None:
+    try:
+        EMBEDDING_INDEX.ensure_loaded()
+    except Exception as exc:
+        logging.warning("Embedding index preload failed, will retry on first match: %s", exc)
+    try:
+        enqueue_outstanding_embeddings()
+    except Exception as exc:
+        logging.warning("Could not re-schedule pending embeddings: %s", exc)
+    try:
+        enqueue_outstanding_post_embeddings()
+    except Exception as exc:
+        logging.warning("Could not re-schedule pending post embeddings: %s", exc)
+    try:
+        enqueue_pending_activity_geocodes()
+    except Exception as exc:
+        logging.warning("Could not re-schedule pending activity geocoding: %s", exc)
+
+
+@app.before_request
+def start_background_jobs():
+    global _STARTUP_DONE
+    if _STARTUP_DONE or app.config.get("SKIP_BACKGROUND_JOBS"):
+        return None
+    with _STARTUP_LOCK:
+        if _STARTUP_DONE:
+            return None
+        _STARTUP_DONE = True
+    # off the request thread: the index load and the re-queue queries must not delay it
+    threading.Thread(target=_run_startup_tasks, name="startup-jobs", daemon=True).start()
+    return None
+
+
+# ==========================================
+# 🚀 MAIN
+# ==========================================
+if __name__ == "__main__":
+    app.run(host="127.0.0.1", port=5000, debug=True)
+
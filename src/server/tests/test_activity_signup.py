@@ -0,0 +1,173 @@
+"""Concurrent signups for one activity: no overbooking, FIFO waitlist."""
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+SIGNUPS = 300
+CAPACITY = 10
+
+
+class ConnectionPool:
+    """
+    Real connections for the test's concurrent requests. mysql.connector pools stop
+    at 32 connections, so the app's own pool (DB_POOL_SIZE) cannot carry hundreds
+    of simultaneous signups; this one is sized for the load instead.
+    """
+
+    def __init__(self, server, size: int):
+        import mysql.connector
+
+        self._idle: queue.Queue = queue.Queue()
+        self.pool_size = size
+        for _ in range(size):
+            self._idle.put(mysql.connector.connect(
+                host=server.DB_HOST,
+                user=server.DB_USER,
+                password=server.DB_PASS,
+                database=server.DB_NAME,
+                port=server.DB_PORT,
+                autocommit=True,
+                charset="utf8mb4",
+            ))
+
+    def get_connection(self):
+        return _Lease(self, self._idle.get(timeout=60))
+
+    def release(self, cnx) -> None:
+        if cnx.in_transaction:
+            cnx.rollback()
+        self._idle.put(cnx)
+
+    def close(self) -> None:
+        while not self._idle.empty():
+            self._idle.get_nowait().close()
+
+
+class _Lease:
+    """A borrowed connection; close() hands it back like a pooled connection."""
+
+    def __init__(self, pool: ConnectionPool, cnx):
+        self._pool = pool
+        self._cnx = cnx
+
+    def __getattr__(self, name):
+        return getattr(self._cnx, name)
+
+    def close(self) -> None:
+        if self._cnx is not None:
+            self._pool.release(self._cnx)
+            self._cnx = None
+
+
+@pytest.fixture
+def signup_pool(server, monkeypatch):
+    # leave room for the app's own pool and other clients of the test server
+    with server.db_conn() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT @@max_connections")
+            max_connections = cur.fetchone()[0]
+            cur.execute("SHOW STATUS LIKE 'Threads_connected'")
+            connected = int(cur.fetchone()[1])
+        finally:
+            cur.close()
+    size = min(SIGNUPS, max_connections - connected - 10)
+    if size < 100:
+        pytest.skip(f"test database allows only {size} more connections")
+    test_pool = ConnectionPool(server, size)
+    monkeypatch.setattr(server, "pool", test_pool)
+    yield test_pool
+    test_pool.close()
+
+
+@pytest.fixture
+def activity(server, make_users):
+    owner = make_users(1)[0]
+    with server.db_conn() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                """
+                INSERT INTO activities (title, description, capacity, geo_status, user_id)
+                VALUES ('pytest signup', 'temporary activity', %s, 'failed', %s)
+                """,
+                (CAPACITY, owner),
+            )
+            activity_id = cur.lastrowid
+            conn.commit()
+        finally:
+            cur.close()
+    yield activity_id
+    with server.db_conn() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("DELETE FROM activities WHERE id_activity = %s", (activity_id,))
+            conn.commit()
+        finally:
+            cur.close()
+
+
+def _state(server, activity_id: int):
+    with server.db_conn() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT attendees_count FROM activities WHERE id_activity = %s", (activity_id,))
+            attendees = cur.fetchone()[0]
+            cur.execute("SELECT user_id FROM activity_signups WHERE activity_id = %s", (activity_id,))
+            confirmed = {row[0] for row in cur.fetchall()}
+            cur.execute(
+                "SELECT user_id FROM activity_waitlist WHERE activity_id = %s ORDER BY id_waitlist",
+                (activity_id,),
+            )
+            waitlist = [row[0] for row in cur.fetchall()]
+        finally:
+            cur.close()
+    return attendees, confirmed, waitlist
+
+
+def test_concurrent_signups_fill_capacity_and_queue_the_rest(server, make_users, signup_pool, activity):
+    user_ids = make_users(SIGNUPS)
+    start = threading.Barrier(SIGNUPS)
+
+    def signup(user_id: int):
+        with server.app.test_client() as client:
+            start.wait()
+            resp = client.post(
+                f"/api/activities/{activity}/signup",
+                json={"user_id": user_id, "waitlist": True},
+            )
+        return user_id, resp.status_code, resp.get_json(silent=True) or {}
+
+    with ThreadPoolExecutor(max_workers=SIGNUPS) as executor:
+        responses = list(executor.map(signup, user_ids))
+
+    statuses = {(code, body.get("status")) for _, code, body in responses}
+    assert statuses <= {(200, "signed_up"), (202, "waitlisted")}, statuses
+    signed_up = {uid for uid, code, _ in responses if code == 200}
+    positions = {uid: body["position"] for uid, code, body in responses if code == 202}
+
+    attendees, confirmed, waitlist = _state(server, activity)
+    assert attendees <= CAPACITY
+    assert attendees == len(confirmed) == CAPACITY
+    assert confirmed == signed_up
+    assert len(waitlist) == SIGNUPS - CAPACITY
+    assert not confirmed & set(waitlist)
+    # the position each request was told is its place in the stored queue
+    assert positions == {uid: i for i, uid in enumerate(waitlist, start=1)}
+
+    # freed seats go to the head of the queue, in order
+    leaving = sorted(confirmed)[:3]
+    promoted = []
+    with server.app.test_client() as client:
+        for uid in leaving:
+            resp = client.delete(f"/api/activities/{activity}/signup", json={"user_id": uid})
+            assert resp.status_code == 200
+            promoted += resp.get_json()["promoted"]
+    assert promoted == waitlist[:3]
+
+    attendees, confirmed_after, waitlist_after = _state(server, activity)
+    assert attendees == len(confirmed_after) == CAPACITY
+    assert confirmed_after == (confirmed - set(leaving)) | set(waitlist[:3])
+    assert waitlist_after == waitlist[3:]
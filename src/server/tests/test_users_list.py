@@ -0,0 +1,30 @@
+"""Keyset pagination of /api/users."""
+
+
+def _walk(client, until: set[int], **params) -> list[int]:
+    """User ids page by page (page_size=1, so every row ends a page) until all of until were seen."""
+    query = {"page_size": 1, "count": "none", **params}
+    seen: list[int] = []
+    while True:
+        resp = client.get("/api/users", query_string=query)
+        assert resp.status_code == 200, resp.get_data(as_text=True)
+        body = resp.get_json()
+        seen += [row["id_user"] for row in body["items"]]
+        cursor = body["pagination"]["next_cursor"]
+        if until <= set(seen) or cursor is None:
+            return seen
+        query = {**query, "cursor": cursor}
+
+
+def test_name_sort_pages_past_users_without_a_name(server, make_users):
+    # NULL sorts as '' so these come first in name_asc, ordered by surname then id
+    first, second = make_users(2, meno=None, priezvisko=None)
+    third = make_users(1, meno=None, priezvisko="Pytest")[0]
+    named = make_users(1, meno="", priezvisko="Pytest")[0]
+
+    with server.app.test_client() as client:
+        seen = _walk(client, {first, second, third, named}, sort="name_asc")
+
+    assert len(seen) == len(set(seen))
+    ours = [uid for uid in seen if uid in {first, second, third, named}]
+    assert ours == [first, second, third, named]